@@ -0,0 +1 @@
+# Comandos executados fora do servidor (cron, deploy)
@@ -0,0 +1,25 @@
+# app/commands/archive_trips.py
+# Uso (cron diário, por exemplo):
+#   python -m app.commands.archive_trips
+#   python -m app.commands.archive_trips --days 60 --batch-size 500
+import argparse
+
+from ..config.database import SessionLocal
+# Registra todos os modelos (os relacionamentos são resolvidos por nome)
+from ..models import bus, user, faculty, bus_stop, trip, student_trip, trip_bus_stop, trip_bus_stop_transition, stop_travel_stat, archive  # noqa: F401
+from ..services.archive import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, archive_completed_trips
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move as viagens concluídas antigas para as tabelas de arquivo")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="Idade mínima (em dias) das viagens concluídas")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="Viagens movidas por transação")
+    args = parser.parse_args(argv)
+
+    with SessionLocal() as session:
+        totals = archive_completed_trips(session, args.days, args.batch_size)
+    print(f"Arquivamento concluído: {totals}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# app/commands/bootstrap_db.py
+# Cria as tabelas, adiciona as colunas novas e insere os dados iniciais. Roda uma vez
+# por implantação (comando de pré-implantação), e não a cada inicialização de cada worker:
+#   python -m app.commands.bootstrap_db
+from sqlalchemy.orm import Session
+
+from ..config.database import Base, SessionLocal, engine
+from ..config.migrations import add_missing_columns, add_missing_indexes
+# Registra todos os modelos no metadata antes do create_all
+from ..models import (  # noqa: F401
+    archive, background_job, bus, bus_stop, cache_version, device_token, faculty, idempotency_key, ridership_rollup,
+    stop_travel_stat, student_trip, trip, trip_bus_stop, trip_bus_stop_transition, trip_position, user, user_type
+)
+from ..models.user_type import UserType, UserTypeNames
+from ..services.active_trips import ensure_version
+from ..services.archive import backfill_completed_dates
+from ..services.devices import import_user_device_tokens
+from ..services.waitlist import backfill_waitlist_positions
+
+
+def create_tables():
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+    # As posições da fila são normalizadas antes do índice único
+    with SessionLocal() as session:
+        backfill_waitlist_positions(session)
+    add_missing_indexes(engine)
+
+def create_user_types(session: Session):
+    if not session.query(UserType).first():
+        user_types = [
+            UserType(description=UserTypeNames.STUDENT),
+            UserType(description=UserTypeNames.DRIVER),
+            UserType(description=UserTypeNames.ADMIN),
+        ]
+        session.add_all(user_types)
+        session.commit()
+
+def bootstrap():
+    create_tables()
+    with SessionLocal() as session:
+        create_user_types(session)
+        ensure_version(session)
+        import_user_device_tokens(session)
+        backfill_completed_dates(session)
+
+
+def main():
+    bootstrap()
+    print("Banco de dados preparado")
+
+
+if __name__ == "__main__":
+    main()
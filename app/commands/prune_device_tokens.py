@@ -0,0 +1,24 @@
+# app/commands/prune_device_tokens.py
+# Remove os aparelhos que não se registram há muito tempo. Uso (cron diário, por exemplo):
+#   python -m app.commands.prune_device_tokens
+#   python -m app.commands.prune_device_tokens --days 30
+import argparse
+
+from ..config.database import SessionLocal
+# Os relacionamentos de User precisam dos outros modelos registrados
+from ..models import bus, bus_stop, device_token, faculty, student_trip, trip, trip_bus_stop, user, user_type  # noqa: F401
+from ..services.devices import STALE_DEVICE_DAYS, purge_stale_devices
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Remove os aparelhos sem registro recente")
+    parser.add_argument("--days", type=int, default=STALE_DEVICE_DAYS, help="Dias sem registro até a remoção")
+    args = parser.parse_args(argv)
+
+    with SessionLocal() as session:
+        removed = purge_stale_devices(session, args.days)
+    print(f"Aparelhos removidos: {removed}")
+
+
+if __name__ == "__main__":
+    main()
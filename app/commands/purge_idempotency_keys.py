@@ -0,0 +1,23 @@
+# app/commands/purge_idempotency_keys.py
+# Remove as chaves de idempotência vencidas. Uso (cron a cada hora, por exemplo):
+#   python -m app.commands.purge_idempotency_keys
+#   python -m app.commands.purge_idempotency_keys --batch-size 1000
+import argparse
+
+from ..config.database import SessionLocal
+from ..models import idempotency_key  # noqa: F401
+from ..services.idempotency import PURGE_BATCH_SIZE, purge_expired_keys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Remove as chaves de idempotência vencidas")
+    parser.add_argument("--batch-size", type=int, default=PURGE_BATCH_SIZE, help="Chaves removidas por transação")
+    args = parser.parse_args(argv)
+
+    with SessionLocal() as session:
+        purged = purge_expired_keys(session, args.batch_size)
+    print(f"Chaves de idempotência removidas: {purged}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+# app/commands/rebuild_ridership.py
+# Recalcula os totais de relatório a partir do histórico (primeira implantação
+# ou correção manual de dados). Uso:
+#   python -m app.commands.rebuild_ridership
+import argparse
+
+from ..config.database import SessionLocal
+# Registra todos os modelos (os relacionamentos são resolvidos por nome)
+from ..models import bus, user, faculty, bus_stop, trip, student_trip, trip_bus_stop, archive, ridership_rollup  # noqa: F401
+from ..services.ridership import REBUILD_BATCH_SIZE, rebuild_ridership
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recalcula os totais diários de passageiros")
+    parser.add_argument("--batch-size", type=int, default=REBUILD_BATCH_SIZE, help="Viagens somadas por transação")
+    args = parser.parse_args(argv)
+
+    with SessionLocal() as session:
+        total = rebuild_ridership(session, args.batch_size)
+    print(f"Totais recalculados a partir de {total} viagens concluídas")
+
+
+if __name__ == "__main__":
+    main()
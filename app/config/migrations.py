@@ -0,0 +1,53 @@
+from sqlalchemy import inspect, text
+from .database import Base
+
+# Colunas adicionadas a tabelas já existentes. O create_all só cria tabelas novas,
+# então estas colunas são adicionadas aqui quando ainda não existirem no banco.
+ADDED_COLUMNS = [
+    ("trip_bus_stops", "version", "INTEGER NOT NULL DEFAULT 0"),
+    ("bus_stops", "latitude", "FLOAT"),
+    ("bus_stops", "longitude", "FLOAT"),
+    ("trip_bus_stops", "previous_status", "INTEGER"),
+    ("trips", "archived_date", "TIMESTAMP"),
+    ("student_trips", "waitlist_position", "INTEGER"),
+    ("student_trips_archive", "waitlist_position", "INTEGER"),
+    ("trips", "change_seq", "INTEGER NOT NULL DEFAULT 0"),
+    ("trips", "reset_seq", "INTEGER NOT NULL DEFAULT 0"),
+    ("student_trips", "change_seq", "INTEGER NOT NULL DEFAULT 0"),
+    ("student_trips_archive", "change_seq", "INTEGER NOT NULL DEFAULT 0"),
+    ("trip_bus_stops", "change_seq", "INTEGER NOT NULL DEFAULT 0"),
+    ("trip_bus_stops_archive", "change_seq", "INTEGER NOT NULL DEFAULT 0"),
+    ("trips", "completed_date", "TIMESTAMP"),
+    ("trips", "waitlist_tail", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+# Índices de tabelas já existentes, criados depois das colunas de que dependem
+ADDED_INDEXES = [
+    ("student_trips", "ux_student_trips_trip_waitlist"),
+    ("student_trips", "ix_student_trips_trip_change"),
+    ("trip_bus_stops", "ix_trip_bus_stops_trip_change"),
+]
+
+# Índices substituídos por outros, removidos antes da criação dos novos
+DROPPED_INDEXES = [
+    "ix_student_trips_trip_waitlist",
+]
+
+def add_missing_columns(engine):
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as connection:
+        for table, column, definition in ADDED_COLUMNS:
+            if table not in existing_tables:
+                continue
+            columns = {info["name"] for info in inspector.get_columns(table)}
+            if column not in columns:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+
+def add_missing_indexes(engine):
+    with engine.begin() as connection:
+        for name in DROPPED_INDEXES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    for table, name in ADDED_INDEXES:
+        index = next(index for index in Base.metadata.tables[table].indexes if index.name == name)
+        index.create(bind=engine, checkfirst=True)
@@ -0,0 +1,16 @@
+# Classe de resposta padrão da aplicação. Com o orjson instalado o JSON é gerado por ele
+# (datas, enums e chaves numéricas incluídos); sem ele, pelo json da biblioteca padrão.
+from typing import Any
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
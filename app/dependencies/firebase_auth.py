@@ -1,14 +1,18 @@
-from pyrebase import pyrebase
+from functools import lru_cache
 from dotenv import load_dotenv
 import os
 
-load_dotenv()  
+load_dotenv()
 
+@lru_cache(maxsize=1)
 def get_firebase():
+    # O cliente é criado uma vez por processo, no primeiro uso
+    from pyrebase import pyrebase
+
     config = {
         "apiKey": os.getenv("FIREBASE_API_KEY"),
         "authDomain": os.getenv("FIREBASE_AUTH_DOMAIN"),
-        "databaseURL": os.getenv("FIREBASE_DATABASE_URL"), 
+        "databaseURL": os.getenv("FIREBASE_DATABASE_URL"),
         "projectId": os.getenv("FIREBASE_PROJECT_ID"),
         "storageBucket": os.getenv("FIREBASE_STORAGE_BUCKET"),
         "messagingSenderId": os.getenv("FIREBASE_MESSAGING_SENDER_ID"),
@@ -17,4 +21,3 @@ def get_firebase():
     }
     firebase = pyrebase.initialize_app(config)
     return firebase.auth()
-
@@ -1,28 +1,43 @@
-import firebase_admin
-from firebase_admin import credentials, messaging
 import os
 import json
+from functools import lru_cache
 from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from app.services.background import background_jobs
+from app.services.devices import prune_tokens
 
-# Carregar as credenciais do Firebase a partir da variável de ambiente
-firebase_credentials = os.getenv('FIREBASE_CREDENTIALS_JSON')
+@lru_cache(maxsize=1)
+def get_firebase_app():
+    # Inicializado no primeiro envio, e não na importação: o firebase_admin e as
+    # bibliotecas do Google custam ~100 ms para importar e a inicialização não pode
+    # impedir a aplicação de subir
+    import firebase_admin
+    from firebase_admin import credentials
 
-# Verificar se as credenciais foram fornecidas
-if not firebase_credentials:
-    raise ValueError("As credenciais do Firebase não foram fornecidas ou estão vazias. Certifique-se de definir a variável de ambiente 'FIREBASE_CREDENTIALS_JSON'.")
+    # Carregar as credenciais do Firebase a partir da variável de ambiente
+    firebase_credentials = os.getenv('FIREBASE_CREDENTIALS_JSON')
 
-try:
-    # Carregar as credenciais em formato JSON
-    cred_dict = json.loads(firebase_credentials)
-    cred = credentials.Certificate(cred_dict)
-except json.JSONDecodeError as e:
-    raise ValueError(f"Erro ao decodificar as credenciais do Firebase: {str(e)}")
+    # Verificar se as credenciais foram fornecidas
+    if not firebase_credentials:
+        raise ValueError("As credenciais do Firebase não foram fornecidas ou estão vazias. Certifique-se de definir a variável de ambiente 'FIREBASE_CREDENTIALS_JSON'.")
 
-# Inicializar o aplicativo Firebase somente se ainda não estiver inicializado
-if not firebase_admin._apps:
-    firebase_admin.initialize_app(cred)
+    try:
+        # Carregar as credenciais em formato JSON
+        cred_dict = json.loads(firebase_credentials)
+        cred = credentials.Certificate(cred_dict)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Erro ao decodificar as credenciais do Firebase: {str(e)}")
+
+    # Inicializar o aplicativo Firebase somente se ainda não estiver inicializado
+    if not firebase_admin._apps:
+        return firebase_admin.initialize_app(cred)
+    return firebase_admin.get_app()
+
+@background_jobs.register("push_notification")
+def deliver_push_notification(token: str, title: str, body: str) -> str:
+    # Envio bloqueante; também é o tipo de tarefa usado pela fila em segundo plano
+    from firebase_admin import messaging
 
-async def send_push_notification(token: str, title: str, body: str):
     # Cria a mensagem de notificação
     message = messaging.Message(
         notification=messaging.Notification(
@@ -32,9 +47,89 @@ async def send_push_notification(token: str, title: str, body: str):
         token=token,
     )
 
-    # Envia a notificação usando o Firebase Admin SDK
+    # Envia a notificação usando o Firebase Admin SDK; o token recusado é removido
     try:
-        response = messaging.send(message)
+        return messaging.send(message, app=get_firebase_app())
+    except (messaging.UnregisteredError, messaging.SenderIdMismatchError):
+        prune_tokens([token])
+        raise
+
+async def send_push_notification(token: str, title: str, body: str):
+    # O envio roda no threadpool para não bloquear o event loop durante a chamada ao FCM
+    try:
+        response = await run_in_threadpool(deliver_push_notification, token, title, body)
         return {"success": True, "message_id": response}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Falha ao enviar notificação: {str(e)}")
+
+def queue_push_notification(token: str, title: str, body: str) -> bool:
+    # Envio sem esperar pelo FCM, pela fila em segundo plano
+    return background_jobs.submit("push_notification", token=token, title=title, body=body)
+
+# Respostas do FCM para tokens de aparelhos desinstalados ou que nunca foram válidos
+INVALID_TOKEN_REASONS = {"NOT_FOUND", "INVALID_ARGUMENT", "UNREGISTERED"}
+# Limite de tokens por chamada de inscrição em tópico
+TOPIC_BATCH_SIZE = 1000
+
+@background_jobs.register("topic_notification")
+def deliver_topic_notification(topic: str, title: str, body: str, unsubscribe_tokens: list = None) -> str:
+    # Um único envio alcança todos os aparelhos inscritos no tópico; unsubscribe_tokens
+    # saem do tópico só depois do envio
+    from firebase_admin import messaging
+
+    message = messaging.Message(
+        notification=messaging.Notification(
+            title=title,
+            body=body,
+        ),
+        topic=topic,
+    )
+    message_id = messaging.send(message, app=get_firebase_app())
+    if unsubscribe_tokens:
+        manage_topic_subscription(unsubscribe_tokens, topic, subscribe=False)
+    return message_id
+
+@background_jobs.register("topic_subscription")
+def manage_topic_subscription(tokens: list, topic: str, subscribe: bool = True) -> int:
+    from firebase_admin import messaging
+
+    manage = messaging.subscribe_to_topic if subscribe else messaging.unsubscribe_from_topic
+    succeeded = 0
+    invalid = []
+    for start in range(0, len(tokens), TOPIC_BATCH_SIZE):
+        batch = tokens[start:start + TOPIC_BATCH_SIZE]
+        response = manage(batch, topic, app=get_firebase_app())
+        succeeded += response.success_count
+        invalid.extend(batch[error.index] for error in response.errors if error.reason in INVALID_TOKEN_REASONS)
+    # Os aparelhos recusados saem da tabela e não entram nos próximos envios
+    prune_tokens(invalid)
+    return succeeded
+
+# Limite de tokens por chamada de envio em lote
+MULTICAST_BATCH_SIZE = 500
+
+@background_jobs.register("multicast_notification")
+def deliver_multicast_notification(tokens: list, title: str, body: str) -> int:
+    # A mesma notificação para vários aparelhos, em lotes: uma chamada ao FCM por lote
+    # em vez de uma por aparelho. Retorna quantas foram entregues
+    from firebase_admin import messaging
+
+    delivered = 0
+    invalid = []
+    for start in range(0, len(tokens), MULTICAST_BATCH_SIZE):
+        batch = tokens[start:start + MULTICAST_BATCH_SIZE]
+        message = messaging.MulticastMessage(
+            notification=messaging.Notification(
+                title=title,
+                body=body,
+            ),
+            tokens=batch,
+        )
+        response = messaging.send_each_for_multicast(message, app=get_firebase_app())
+        delivered += response.success_count
+        invalid.extend(
+            token for token, result in zip(batch, response.responses)
+            if isinstance(result.exception, (messaging.UnregisteredError, messaging.SenderIdMismatchError))
+        )
+    prune_tokens(invalid)
+    return delivered
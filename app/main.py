@@ -1,31 +1,26 @@
 from fastapi import FastAPI
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
 import os
 from dotenv import load_dotenv
-from .models.user_type import UserType, UserTypeNames
-from .routers import users, buses, bus_stops, auth, trips, student_trips, trip_bus_stops, faculty, notifications
-from .models import bus, user, trip, student_trip, trip_bus_stop
+from .routers import users, buses, bus_stops, auth, trips, student_trips, trip_bus_stops, faculty, notifications, reports, health
+from .models import bus, user, trip, student_trip, trip_bus_stop, trip_position, trip_bus_stop_transition, stop_travel_stat, archive, cache_version, ridership_rollup, background_job, idempotency_key, device_token
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.middleware.base import BaseHTTPMiddleware
 from fastapi.responses import FileResponse
 
 load_dotenv()
 
-# Configuração da conexão com o banco de dados
-DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Sessões do engine único da aplicação (app/config/database.py)
+from app.config.database import SessionLocal
+from app.config.responses import FastJSONResponse
+from app.services.stop_index import stop_index
+from app.services.positions import trip_positions
+from app.services.active_trips import active_trips
+from app.services.background import background_jobs
+from app.services.waitlist import waitlist_notifier
+from app.services.replicas import read_router, read_your_writes
 
-# Importar o Base dos modelos
-from app.config.database import Base
-
-# Importar modelos
-from app.models.user import User
-from app.models.user_type import UserType
-
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -36,6 +31,11 @@ app.add_middleware(
 )
 
 
+# Leituras do próprio cliente no primário logo após as suas escritas; sem réplicas
+# configuradas o middleware não é instalado
+if read_router.replicas:
+    app.add_middleware(BaseHTTPMiddleware, dispatch=read_your_writes)
+
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(buses.router)
@@ -45,25 +45,36 @@ app.include_router(student_trips.router)
 app.include_router(trip_bus_stops.router)
 app.include_router(faculty.router)
 app.include_router(notifications.router)
+app.include_router(reports.router)
+app.include_router(health.router)
 
-def create_tables():
-    Base.metadata.create_all(bind=engine)
-
-def create_user_types(session: Session):
-    if not session.query(UserType).first():
-        user_types = [
-            UserType(description=UserTypeNames.STUDENT),
-            UserType(description=UserTypeNames.DRIVER),
-            UserType(description=UserTypeNames.ADMIN),
-        ]
-        session.add_all(user_types)
-        session.commit()
-        
 @app.on_event("startup")
 async def startup_event():
-    create_tables()  
+    # Tabelas e dados iniciais são criados por python -m app.commands.bootstrap_db na
+    # implantação; BOOTSTRAP_DB_ON_STARTUP=1 mantém a criação na subida (desenvolvimento local)
+    if os.getenv("BOOTSTRAP_DB_ON_STARTUP") == "1":
+        from app.commands.bootstrap_db import bootstrap
+        bootstrap()
+    # Só leituras: os caches em memória já sobem carregados
     with SessionLocal() as session:
-        create_user_types(session)  
+        stop_index.load(session)
+        active_trips.load(session)
+    trip_positions.start()
+    read_router.start()
+    background_jobs.start()
+    waitlist_notifier.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # O servidor já parou de aceitar conexões e concluiu as requisições em andamento.
+    # A fila para de aceitar tarefas, termina o que der dentro do prazo e grava o resto
+    # no banco; roda no threadpool para não bloquear o event loop durante a espera.
+    # Os avisos de vaga ainda na janela entram na fila antes
+    waitlist_notifier.stop()
+    await run_in_threadpool(background_jobs.stop)
+    # Grava as posições que ainda estão no buffer
+    trip_positions.stop()
+    read_router.stop()
 
 @app.get("/reset-password")
 def serve_reset_password_page():
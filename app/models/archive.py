@@ -0,0 +1,57 @@
+# app/models/archive.py
+# Tabelas de arquivo das viagens concluídas. As linhas mantêm o mesmo id das
+# tabelas ativas, de onde são movidas em lote por app/services/archive.py.
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy.orm import relationship
+from ..config.database import Base
+from datetime import datetime
+
+class StudentTripArchive(Base):
+    __tablename__ = "student_trips_archive"
+
+    id = Column(Integer, primary_key=True, index=True)
+    trip_id = Column(Integer, ForeignKey("trips.id"), index=True)
+    student_id = Column(Integer, ForeignKey("users.id"))
+    status = Column(Integer, nullable=False)
+    point_id = Column(Integer, ForeignKey("bus_stops.id"))
+    waitlist_position = Column(Integer, nullable=True)
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
+
+    system_deleted = Column(Integer, default=0)
+    update_date = Column(DateTime)
+    create_date = Column(DateTime)
+    archived_date = Column(DateTime, default=datetime.utcnow)
+
+    student = relationship("User")
+    bus_stop = relationship("BusStop")
+
+class TripBusStopArchive(Base):
+    __tablename__ = "trip_bus_stops_archive"
+
+    id = Column(Integer, primary_key=True, index=True)
+    trip_id = Column(Integer, ForeignKey("trips.id"), nullable=False, index=True)
+    bus_stop_id = Column(Integer, ForeignKey("bus_stops.id"), nullable=False)
+    status = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False, default=0)
+    previous_status = Column(Integer, nullable=True)
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
+
+    system_deleted = Column(Integer, default=0)
+    update_date = Column(DateTime)
+    create_date = Column(DateTime)
+    archived_date = Column(DateTime, default=datetime.utcnow)
+
+    bus_stop = relationship("BusStop")
+
+class TripBusStopTransitionArchive(Base):
+    __tablename__ = "trip_bus_stop_transitions_archive"
+
+    id = Column(Integer, primary_key=True, index=True)
+    trip_id = Column(Integer, ForeignKey("trips.id"), nullable=False, index=True)
+    trip_bus_stop_id = Column(Integer, nullable=False)
+    bus_stop_id = Column(Integer, ForeignKey("bus_stops.id"), nullable=False)
+    from_status = Column(Integer, nullable=True)
+    to_status = Column(Integer, nullable=False)
+
+    create_date = Column(DateTime, nullable=False)
+    archived_date = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,15 @@
+# app/models/background_job.py
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from ..config.database import Base
+from datetime import datetime
+
+class BackgroundJob(Base):
+    # Tarefas em segundo plano (push, e-mail) que não terminaram antes do desligamento
+    # de um worker; a próxima instância que subir retoma a fila a partir desta tabela
+    __tablename__ = 'background_jobs'
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)
+    payload = Column(Text, nullable=False)
+
+    create_date = Column(DateTime, default=datetime.utcnow)
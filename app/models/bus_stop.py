@@ -1,5 +1,5 @@
 # app/models/bus_stop.py
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float
 from sqlalchemy.orm import relationship
 from ..config.database import Base
 from datetime import datetime
@@ -9,6 +9,8 @@ class BusStop(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
     faculty_id = Column(Integer, ForeignKey('faculties.id'), nullable=False)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
     
     system_deleted = Column(Integer, default=0) 
     update_date = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,15 @@
+# app/models/cache_version.py
+from sqlalchemy import Column, Integer, String, DateTime
+from ..config.database import Base
+from datetime import datetime
+
+class CacheVersion(Base):
+    # Contador incrementado depois do commit que altera os dados de um cache em memória, numa
+    # transação curta própria (ActiveTripRegistry.publish); cada instância da aplicação compara
+    # com a versão que carregou para saber se está desatualizada
+    __tablename__ = 'cache_versions'
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+    update_date = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,17 @@
+# app/models/device_token.py
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from ..config.database import Base
+from datetime import datetime
+
+class DeviceToken(Base):
+    # Um registro por aparelho: o mesmo usuário pode ter vários. Tokens recusados pelo
+    # FCM são removidos no envio; os que não aparecem há muito tempo, pelo comando
+    # app.commands.prune_device_tokens
+    __tablename__ = 'device_tokens'
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    token = Column(String, nullable=False, unique=True)
+    last_seen = Column(DateTime, default=datetime.utcnow, index=True)
+
+    create_date = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,26 @@
+# app/models/idempotency_key.py
+from sqlalchemy import Column, Integer, String, LargeBinary, DateTime, UniqueConstraint
+from ..config.database import Base
+from datetime import datetime
+
+class IdempotencyKey(Base):
+    # Resposta gravada para cada Idempotency-Key; uma nova tentativa com a mesma chave
+    # recebe esta resposta sem executar a rota de novo. status_code nulo indica que a
+    # primeira requisição ainda está em andamento.
+    __tablename__ = 'idempotency_keys'
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String(255), nullable=False)
+    # Método e caminho da requisição: a mesma chave em outra rota é outra operação
+    scope = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)
+    media_type = Column(String(100), nullable=True)
+    body = Column(LargeBinary, nullable=True)
+
+    create_date = Column(DateTime, default=datetime.utcnow)
+    expires_date = Column(DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        UniqueConstraint('scope', 'key', name='uq_idempotency_keys_scope_key'),
+    )
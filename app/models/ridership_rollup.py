@@ -0,0 +1,31 @@
+# app/models/ridership_rollup.py
+from sqlalchemy import Column, Integer, String, Date, DateTime, UniqueConstraint
+from ..config.database import Base
+from datetime import datetime
+from enum import Enum
+
+class RidershipDimensionEnum(str, Enum):
+    BUS = "bus"
+    STOP = "stop"
+    FACULTY = "faculty"
+
+class RidershipRollup(Base):
+    # Totais diários por ônibus, ponto ou faculdade do aluno, somados quando cada viagem é concluída
+    __tablename__ = 'ridership_rollups'
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    dimension = Column(String(10), nullable=False)
+    # Id do ônibus, do ponto ou da faculdade, conforme a dimensão
+    key_id = Column(Integer, nullable=False)
+    trip_type = Column(Integer, nullable=False)
+    trips = Column(Integer, nullable=False, default=0)
+    riders = Column(Integer, nullable=False, default=0)
+    waitlisted = Column(Integer, nullable=False, default=0)
+    not_returning = Column(Integer, nullable=False, default=0)
+
+    update_date = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('dimension', 'day', 'key_id', 'trip_type', name='uq_ridership_rollups_key'),
+    )
@@ -0,0 +1,22 @@
+# app/models/stop_travel_stat.py
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, UniqueConstraint
+from ..config.database import Base
+from datetime import datetime
+
+class StopTravelStat(Base):
+    # Estatísticas do tempo entre a chegada em um ponto e a chegada no seguinte
+    __tablename__ = 'stop_travel_stats'
+
+    id = Column(Integer, primary_key=True, index=True)
+    from_bus_stop_id = Column(Integer, ForeignKey('bus_stops.id'), nullable=False)
+    to_bus_stop_id = Column(Integer, ForeignKey('bus_stops.id'), nullable=False)
+    sample_count = Column(Integer, nullable=False, default=0)
+    mean_seconds = Column(Float, nullable=False, default=0.0)
+    median_seconds = Column(Float, nullable=False, default=0.0)
+    p90_seconds = Column(Float, nullable=False, default=0.0)
+
+    update_date = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('from_bus_stop_id', 'to_bus_stop_id', name='uq_stop_travel_stats_pair'),
+    )
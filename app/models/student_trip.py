@@ -1,5 +1,5 @@
 from enum import Enum
-from sqlalchemy import Column, Integer, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..config.database import Base
@@ -31,6 +31,10 @@ class StudentTrip(Base):
     student_id = Column(Integer, ForeignKey("users.id"))
     status = Column(Integer, nullable=False)
     point_id = Column(Integer, ForeignKey("bus_stops.id"))
+    # Ordem de chegada na fila de espera da viagem; vazio fora da fila
+    waitlist_position = Column(Integer, nullable=True)
+    # Valor de trips.change_seq na última alteração da linha
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
     
     system_deleted = Column(Integer, default=0)
     update_date = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -40,3 +44,10 @@ class StudentTrip(Base):
     student = relationship("User", back_populates="student_trips")
     bus_stop = relationship("BusStop", back_populates="student_trips")
 
+    # Cabeça da fila e posição de um aluno sem percorrer os alunos da viagem; a posição
+    # é única na viagem (alunos fora da fila ficam com NULL)
+    __table_args__ = (
+        Index('ux_student_trips_trip_waitlist', 'trip_id', 'waitlist_position', unique=True),
+        Index('ix_student_trips_trip_change', 'trip_id', 'change_seq'),
+    )
+
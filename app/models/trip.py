@@ -27,6 +27,17 @@ class Trip(Base):
     system_deleted = Column(Integer, default=0)
     update_date = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     create_date = Column(DateTime, default=datetime.utcnow)
+    # Momento da conclusão; o arquivamento conta a partir dele, e não de update_date,
+    # que muda a cada alteração da viagem
+    completed_date = Column(DateTime, nullable=True)
+    # Preenchido quando os alunos e pontos da viagem concluída vão para as tabelas de arquivo
+    archived_date = Column(DateTime, nullable=True)
+    # Sequência de alterações dos alunos e pontos da viagem (app/services/changes.py);
+    # reset_seq marca a última alteração que exige recarregar tudo (linha removida)
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
+    reset_seq = Column(Integer, nullable=False, default=0, server_default="0")
+    # Última posição entregue na fila de espera da viagem (app/services/waitlist.py)
+    waitlist_tail = Column(Integer, nullable=False, default=0, server_default="0")
 
     bus = relationship("Bus", back_populates="trips")
     driver = relationship("User", back_populates="trips")
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, ForeignKey, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, Index
+from sqlalchemy.orm import relationship, mapped_column
 from ..config.database import Base
 from enum import Enum
 from datetime import datetime
@@ -29,7 +29,14 @@ class TripBusStop(Base):
     id = Column(Integer, primary_key=True, index=True)
     trip_id = Column(Integer, ForeignKey('trips.id'), nullable=False)
     bus_stop_id = Column(Integer, ForeignKey('bus_stops.id'), nullable=False)
-    status = Column(Integer, nullable=False)
+    # active_history carrega o status antigo mesmo com o objeto expirado, para o histórico de transições
+    status = mapped_column(Integer, nullable=False, active_history=True)
+    # Versão para controle otimista de concorrência (incrementada a cada UPDATE)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Status anterior, preenchido pelo mesmo UPDATE que altera o status
+    previous_status = Column(Integer, nullable=True)
+    # Valor de trips.change_seq na última alteração da linha
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
    
     system_deleted = Column(Integer, default=0)
     update_date = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -37,3 +44,10 @@ class TripBusStop(Base):
 
     trip = relationship("Trip", back_populates="trip_bus_stops")
     bus_stop = relationship("BusStop", back_populates="trip_bus_stops")
+
+    __mapper_args__ = {"version_id_col": version}
+
+    # Alterações da viagem desde o cursor do cliente, sem percorrer os demais pontos
+    __table_args__ = (
+        Index('ix_trip_bus_stops_trip_change', 'trip_id', 'change_seq'),
+    )
@@ -0,0 +1,24 @@
+# app/models/trip_bus_stop_transition.py
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from ..config.database import Base
+from datetime import datetime
+
+class TripBusStopTransition(Base):
+    # Histórico somente de inserção das mudanças de status dos pontos da viagem
+    __tablename__ = 'trip_bus_stop_transitions'
+
+    id = Column(Integer, primary_key=True, index=True)
+    trip_id = Column(Integer, ForeignKey('trips.id'), nullable=False)
+    trip_bus_stop_id = Column(Integer, ForeignKey('trip_bus_stops.id'), nullable=False)
+    bus_stop_id = Column(Integer, ForeignKey('bus_stops.id'), nullable=False)
+    from_status = Column(Integer, nullable=True)
+    to_status = Column(Integer, nullable=False)
+
+    create_date = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    trip_bus_stop = relationship("TripBusStop")
+
+    __table_args__ = (
+        Index('ix_trip_bus_stop_transitions_trip_status', 'trip_id', 'to_status', 'id'),
+    )
@@ -0,0 +1,20 @@
+# app/models/trip_position.py
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Index
+from ..config.database import Base
+from datetime import datetime
+
+class TripPosition(Base):
+    __tablename__ = 'trip_positions'
+    id = Column(Integer, primary_key=True, index=True)
+    trip_id = Column(Integer, ForeignKey('trips.id'), nullable=False)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    speed = Column(Float, nullable=True)
+    heading = Column(Float, nullable=True)
+    recorded_at = Column(DateTime, nullable=False)
+
+    create_date = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_trip_positions_trip_recorded', 'trip_id', 'recorded_at'),
+    )
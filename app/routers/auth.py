@@ -3,6 +3,9 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from ..config.database import SessionLocal
 from ..models.user import User
+from ..services.unit_of_work import get_transaction, on_commit
+from ..services.active_trips import active_trips
+from ..services.devices import register_device, subscribe_to_trip
 import bcrypt
 from datetime import datetime, timedelta, timezone
 import secrets
@@ -118,7 +121,7 @@ async def login(login_data: LoginData, db: Session = Depends(get_db)):
         raise HTTPException(status_code=401, detail="Sem autorização")
 
 @router.post("/forgot-password")
-def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(get_db)):
+def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(get_transaction)):
     # Busca o usuário pelo CPF
     user = db.query(User).filter(User.cpf == request.cpf, User.system_deleted == 0).first()
 
@@ -130,15 +133,14 @@ def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(get_db
 
     # Salva o token no banco de dados (ou em uma tabela de tokens)
     user.reset_token = reset_token
-    db.commit()
 
-    # Envia o e-mail de redefinição de senha
-    send_reset_password_email(user.email, reset_token)
+    # Envia o e-mail de redefinição de senha depois de gravar o token
+    on_commit(db, send_reset_password_email, user.email, reset_token)
 
     return {"message": "Um email foi enviado com as orientações para a troca de senha"}
 
 @router.post("/reset-password")
-def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db)):
+def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_transaction)):
     # Busca o usuário pelo token de redefinição
     user = db.query(User).filter(User.reset_token == request.token).first()
 
@@ -148,24 +150,31 @@ def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db))
     # Atualiza a senha do usuário
     user.set_password(request.new_password)
     user.reset_token = None  # Limpa o token após o uso
-    db.commit()
 
     return {"message": "Senha redefinida com sucesso."}
 
 @router.put("/update-device-token")
-async def update_device_token(request: UpdateDeviceTokenRequest, db: Session = Depends(get_db)):
+def update_device_token(request: UpdateDeviceTokenRequest, db: Session = Depends(get_transaction)):
     user = db.query(User).filter(User.id == request.user_id).first()
 
     if not user:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
+    # Um registro por aparelho; users.device_token guarda o último, como antes
     user.device_token = request.device_token
-    db.commit()
+    register_device(db, user.id, request.device_token)
+
+    # Aparelho novo de um aluno já inscrito: entra no tópico da viagem ativa
+    active_trips.sync(db)
+    active_trip = active_trips.student_trip(user.id)
+    if active_trip:
+        db.flush()
+        subscribe_to_trip(db, [user.id], active_trip[0].trip_id)
 
     return {"status": "success", "message": "Device token updated successfully"}
 
 @router.post("/set-new-password")
-async def set_new_password(request: SetNewPasswordRequest, db: Session = Depends(get_db)):
+async def set_new_password(request: SetNewPasswordRequest, db: Session = Depends(get_transaction)):
     user = db.query(User).filter(User.id == request.user_id).first()
 
     if not user:
@@ -174,6 +183,5 @@ async def set_new_password(request: SetNewPasswordRequest, db: Session = Depends
     # Atualiza a senha do usuário
     user.set_password(request.new_password)
     user.first_login = "false"  # Após a redefinição, marque o primeiro login como falso
-    db.commit()
 
     return {"status": "success", "message": "Password updated successfully"}
@@ -8,7 +8,10 @@ from ..models.trip_bus_stop import TripBusStop as TripBusStopModel
 from ..models.trip import Trip as TripModel, TripTypeEnum  
 from ..models.student_trip import StudentTrip as StudentTripModel  
 from ..models.trip_bus_stop import TripBusStopStatusEnum 
-from ..schemas.bus_stop import BusStop, BusStopCreate, BusStopUpdate
+from ..schemas.bus_stop import BusStop, BusStopCreate, BusStopUpdate, TripBusStopOption
+from ..services.stop_index import stop_index
+from ..services.replicas import get_read_db
+from ..services.unit_of_work import get_transaction, on_commit
 from typing import List, Optional
 
 
@@ -17,11 +20,47 @@ router = APIRouter(
     tags=["Bus Stops"]
 )
 
-@router.get("/action/trip", response_model=List[dict])
+@router.get("/nearest", response_model=List[dict])
+def get_nearest_bus_stops(
+    lat: float = Query(..., ge=-90, le=90, description="Latitude do aluno"),
+    lon: float = Query(..., ge=-180, le=180, description="Longitude do aluno"),
+    k: int = Query(5, ge=1, le=50, description="Quantidade de pontos"),
+    db: Session = Depends(get_db)
+):
+    # Respondido pelo índice em memória; o banco só é consultado quando o índice expira
+    if stop_index.is_stale():
+        stop_index.load(db)
+
+    nearest = stop_index.nearest(lat, lon, k)
+    if not nearest:
+        raise HTTPException(status_code=404, detail="Nenhum ponto de ônibus encontrado")
+
+    return [
+        {
+            "id": bus_stop_id,
+            "name": name,
+            "distance": round(distance)
+        }
+        for distance, bus_stop_id, name in nearest
+    ]
+
+def refresh_stop_index(db: Session, bus_stop: BusStopModel):
+    # Atualiza somente o ponto alterado no índice espacial
+    faculty_name = db.query(FacultyModel.name).filter(
+        FacultyModel.id == bus_stop.faculty_id,
+        FacultyModel.system_deleted == 0
+    ).scalar()
+    # O índice só muda depois do commit
+    if faculty_name is None:
+        on_commit(db, stop_index.remove, bus_stop.id)
+    else:
+        on_commit(db, stop_index.upsert, bus_stop, faculty_name)
+
+@router.get("/action/trip", response_model=List[TripBusStopOption])
 def get_bus_stops_for_trip(
     student_id: int = Query(..., description="ID do aluno"),
     trip_id: int = Query(..., description="ID da viagem selecionada"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     trip = db.query(TripModel).filter(
         TripModel.id == trip_id,
@@ -113,7 +152,7 @@ def get_bus_stops_for_trip(
     return result
 
 @router.post("/", response_model=schemas.BusStop)
-def create_bus_stop(bus_stop: schemas.BusStopCreate, db: Session = Depends(get_db)):
+def create_bus_stop(bus_stop: schemas.BusStopCreate, db: Session = Depends(get_transaction)):
     # Verifica se o nome já está registrado e não está deletado
     db_bus_stop = db.query(BusStopModel).filter(
         (BusStopModel.name == bus_stop.name) &
@@ -130,22 +169,26 @@ def create_bus_stop(bus_stop: schemas.BusStopCreate, db: Session = Depends(get_d
     if db_bus_stop_deleted:
         db_bus_stop_deleted.system_deleted = 0
         db_bus_stop_deleted.faculty_id = bus_stop.faculty_id
-        db.commit()
-        db.refresh(db_bus_stop_deleted)
+        db_bus_stop_deleted.latitude = bus_stop.latitude
+        db_bus_stop_deleted.longitude = bus_stop.longitude
+        db.flush()
+        refresh_stop_index(db, db_bus_stop_deleted)
         return db_bus_stop_deleted
     
     new_bus_stop = BusStopModel(
         name=bus_stop.name,
         faculty_id=bus_stop.faculty_id,
+        latitude=bus_stop.latitude,
+        longitude=bus_stop.longitude,
         system_deleted=0
     )
     db.add(new_bus_stop)
-    db.commit()
-    db.refresh(new_bus_stop)
+    db.flush()
+    refresh_stop_index(db, new_bus_stop)
     return new_bus_stop
 
 @router.get("/", response_model=List[schemas.BusStop])
-def read_bus_stops(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_bus_stops(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     bus_stops = db.query(BusStopModel).filter(BusStopModel.system_deleted == 0).offset(skip).limit(limit).all()
     return bus_stops
 
@@ -157,24 +200,24 @@ def read_bus_stop(bus_stop_id: int, db: Session = Depends(get_db)):
     return bus_stop
 
 @router.put("/{bus_stop_id}", response_model=schemas.BusStop)
-def update_bus_stop(bus_stop_id: int, bus_stop: schemas.BusStopUpdate, db: Session = Depends(get_db)):
+def update_bus_stop(bus_stop_id: int, bus_stop: schemas.BusStopUpdate, db: Session = Depends(get_transaction)):
     db_bus_stop = db.query(BusStopModel).filter(BusStopModel.id == bus_stop_id, BusStopModel.system_deleted == 0).first()
     if not db_bus_stop:
         raise HTTPException(status_code=404, detail="Ponto de ônibus não encontrado")
     for var, value in vars(bus_stop).items():
         if value is not None:
             setattr(db_bus_stop, var, value)
-    db.commit()
-    db.refresh(db_bus_stop)
+    db.flush()
+    refresh_stop_index(db, db_bus_stop)
     return db_bus_stop
 
 @router.delete("/{bus_stop_id}", response_model=dict)
-def delete_bus_stop(bus_stop_id: int, db: Session = Depends(get_db)):
+def delete_bus_stop(bus_stop_id: int, db: Session = Depends(get_transaction)):
     db_bus_stop = db.query(BusStopModel).filter(BusStopModel.id == bus_stop_id).first()
     if not db_bus_stop:
         raise HTTPException(status_code=404, detail="Ponto de ônibus não encontrado")
     db_bus_stop.system_deleted = 1
-    db.commit()
+    on_commit(db, stop_index.remove, bus_stop_id)
     return {"ok": True}
 
 @router.get("/list/faculty_names", response_model=List[dict])
@@ -8,7 +8,12 @@ from ..models.trip import Trip as TripModel, TripStatusEnum, TripTypeEnum
 from ..models.bus import Bus as BusModel
 from ..models.student_trip import StudentTrip as StudentTripModel, StudentStatusEnum
 from ..models.trip_bus_stop import TripBusStop as TripBusStopModel 
-from ..schemas.bus import Bus, BusCreate, BusUpdate
+from ..schemas.bus import Bus, BusCreate, BusUpdate, ActiveBus
+from ..services.active_trips import active_trips
+from ..services.coalescing import read_coalescer
+from ..services.queries import ACTIVE_BUSES, ACTIVE_BUSES_EXCEPT
+from ..services.replicas import get_read_db, read_source
+from ..services.unit_of_work import get_transaction
 
 
 router = APIRouter(
@@ -16,48 +21,21 @@ router = APIRouter(
     tags=["Buses"]
 )
 
-@router.get("/active_trips", response_model=List[dict])
-def get_active_buses(db: Session = Depends(get_db)):
-    trip_alias = aliased(TripModel)
-    student_trip_alias = aliased(StudentTripModel)
-
-    active_buses = (
-        db.query(
-            BusModel.id.label("bus_id"),
-            BusModel.registration_number,
-            BusModel.name,
-            BusModel.capacity,
-            trip_alias.id.label("trip_id"),
-            trip_alias.trip_type,
-            func.count(student_trip_alias.id).label("occupied_seats")  
-        )
-        .select_from(BusModel)  
-        .join(trip_alias, BusModel.id == trip_alias.bus_id)  
-        .outerjoin(
-            student_trip_alias,  
-            (student_trip_alias.trip_id == trip_alias.id) &
-            (student_trip_alias.status.in_([1, 2, 3])) &
-            (student_trip_alias.system_deleted == 0)
-        )
-        .filter(
-            trip_alias.status == TripStatusEnum.ATIVA,
-            trip_alias.system_deleted == 0,
-            BusModel.system_deleted == 0
-        )
-        .group_by(
-            BusModel.id,
-            BusModel.registration_number,
-            BusModel.name,
-            BusModel.capacity,
-            trip_alias.id,
-            trip_alias.trip_type
-        )
-        .all()
-    )
+read_coalescer.register("active_buses", [BusModel.__tablename__, TripModel.__tablename__, StudentTripModel.__tablename__])
+
+@router.get("/active_trips", response_model=List[ActiveBus])
+def get_active_buses(db: Session = Depends(get_read_db)):
+    # Lista consultada por todos os alunos ao mesmo tempo: uma consulta atende as
+    # requisições simultâneas e o resultado vale por um intervalo curto
+    return read_coalescer.run("active_buses", (read_source(db),), lambda: _active_buses(db))
+
+def _active_buses(db: Session) -> list:
+    active_buses = db.execute(ACTIVE_BUSES).all()
 
     if not active_buses:
         raise HTTPException(status_code=404, detail="Nenhum ônibus ativo encontrado")
 
+    # Os dicionários têm o formato de ActiveBus; a resposta é validada pelo response_model
     return [
         {
             "bus_id": bus_id,
@@ -90,44 +68,8 @@ def get_available_buses_for_student(student_id: int = Query(...), db: Session =
         print("Nenhuma viagem associada ao estudante.")
         raise HTTPException(status_code=404, detail="Nenhuma viagem associada ao estudante.")
 
-    # Alias para evitar ambiguidades
-    trip_alias = aliased(TripModel)
-    student_trip_alias = aliased(StudentTripModel)
-
     # Obter ônibus em viagens ativas, excluindo o ônibus que o aluno está vinculado
-    active_buses = (
-        db.query(
-            BusModel.id.label("bus_id"),
-            BusModel.registration_number,
-            BusModel.name,
-            BusModel.capacity,
-            trip_alias.id.label("trip_id"),
-            trip_alias.trip_type,
-            func.count(student_trip_alias.id).label("occupied_seats")  # Conta os student_trips válidos
-        )
-        .join(trip_alias, BusModel.id == trip_alias.bus_id)
-        .outerjoin(
-            student_trip_alias,
-            (student_trip_alias.trip_id == trip_alias.id) &
-            (student_trip_alias.status.in_([1, 2, 3])) &
-            (student_trip_alias.system_deleted == 0)
-        )
-        .filter(
-            trip_alias.status == TripStatusEnum.ATIVA,
-            trip_alias.system_deleted == 0,
-            BusModel.system_deleted == 0,
-            trip_alias.bus_id != current_trip.trip.bus_id  # Exclui o ônibus vinculado ao aluno
-        )
-        .group_by(
-            BusModel.id,
-            BusModel.registration_number,
-            BusModel.name,
-            BusModel.capacity,
-            trip_alias.id,
-            trip_alias.trip_type
-        )
-        .all()
-    )
+    active_buses = db.execute(ACTIVE_BUSES_EXCEPT, {"exclude_bus_id": current_trip.trip.bus_id}).all()
     
     if not active_buses:
         print("Nenhum ônibus ativo encontrado.")
@@ -150,7 +92,7 @@ def get_available_buses_for_student(student_id: int = Query(...), db: Session =
 
 
 @router.post("/", response_model=schemas.Bus)
-def create_bus(bus: schemas.BusCreate, db: Session = Depends(get_db)):
+def create_bus(bus: schemas.BusCreate, db: Session = Depends(get_transaction)):
     db_bus = db.query(BusModel).filter(
         ((BusModel.registration_number == bus.registration_number.upper()) |
          (BusModel.name == bus.name)) &
@@ -172,8 +114,7 @@ def create_bus(bus: schemas.BusCreate, db: Session = Depends(get_db)):
         db_bus_deleted.registration_number = bus.registration_number.upper()
         db_bus_deleted.name = bus.name
         db_bus_deleted.capacity = bus.capacity
-        db.commit()
-        db.refresh(db_bus_deleted)
+        db.flush()
         return db_bus_deleted
 
     new_bus = BusModel(
@@ -182,22 +123,21 @@ def create_bus(bus: schemas.BusCreate, db: Session = Depends(get_db)):
         capacity=bus.capacity
     )
     db.add(new_bus)
-    db.commit()
-    db.refresh(new_bus)
+    db.flush()
     return new_bus
 
 @router.get("/", response_model=List[schemas.Bus])
-def read_buses(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_buses(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     buses = db.query(BusModel).filter(BusModel.system_deleted == 0).offset(skip).limit(limit).all()
     return buses
 
 @router.get("/available", response_model=List[schemas.Bus])
 def read_available_buses(db: Session = Depends(get_db)):
-    buses = db.query(BusModel).filter(
-        BusModel.system_deleted == 0,
-        ~db.query(models.Trip).filter(models.Trip.bus_id == BusModel.id, models.Trip.status == 1, models.Trip.system_deleted == 0).exists()
-    ).all()
-    return buses
+    # Ônibus em viagens ativas vêm do registro em memória, sem a subconsulta em trips
+    active_trips.sync(db)
+    busy = active_trips.busy_buses()
+    buses = db.query(BusModel).filter(BusModel.system_deleted == 0).all()
+    return [bus for bus in buses if bus.id not in busy]
 
 @router.get("/{bus_id}", response_model=schemas.Bus)
 def read_bus(bus_id: int, db: Session = Depends(get_db)):
@@ -207,7 +147,7 @@ def read_bus(bus_id: int, db: Session = Depends(get_db)):
     return bus
 
 @router.put("/{bus_id}", response_model=schemas.Bus)
-def update_bus(bus_id: int, bus: schemas.BusUpdate, db: Session = Depends(get_db)):
+def update_bus(bus_id: int, bus: schemas.BusUpdate, db: Session = Depends(get_transaction)):
     db_bus = db.query(BusModel).filter(BusModel.id == bus_id, BusModel.system_deleted == 0).first()
     if not db_bus:
         raise HTTPException(status_code=404, detail="Bus not found")
@@ -221,16 +161,15 @@ def update_bus(bus_id: int, bus: schemas.BusUpdate, db: Session = Depends(get_db
     for var, value in vars(bus).items():
         if value:
             setattr(db_bus, var, value)
-    db.commit()
+    db.flush()
     return db_bus
 
 @router.delete("/{bus_id}", response_model=dict)
-def delete_bus(bus_id: int, db: Session = Depends(get_db)):
+def delete_bus(bus_id: int, db: Session = Depends(get_transaction)):
     db_bus = db.query(BusModel).filter(BusModel.id == bus_id).first()
     if not db_bus:
         raise HTTPException(status_code=404, detail="Bus not found")
     db_bus.system_deleted = 1
-    db.commit()
     return {"ok": True}
 
 from sqlalchemy import func  # Certifique-se de que func está importado corretamente
@@ -4,6 +4,8 @@ from typing import List
 from ..config.database import get_db
 from ..models import faculty as faculty_model, bus_stop as bus_stop_model, user as user_model
 from ..schemas import faculty as faculty_schema
+from ..services.replicas import get_read_db
+from ..services.unit_of_work import get_transaction
 
 router = APIRouter(
     prefix="/faculties",
@@ -11,7 +13,7 @@ router = APIRouter(
 )
 
 @router.post("/", response_model=faculty_schema.Faculty)
-def create_faculty(faculty: faculty_schema.FacultyCreate, db: Session = Depends(get_db)):
+def create_faculty(faculty: faculty_schema.FacultyCreate, db: Session = Depends(get_transaction)):
     # Verifica se já existe uma faculdade com o mesmo nome que não esteja deletada
     existing_faculty = db.query(faculty_model.Faculty).filter(faculty_model.Faculty.name == faculty.name, faculty_model.Faculty.system_deleted == 0).first()
     if existing_faculty:
@@ -19,12 +21,11 @@ def create_faculty(faculty: faculty_schema.FacultyCreate, db: Session = Depends(
 
     db_faculty = faculty_model.Faculty(name=faculty.name)
     db.add(db_faculty)
-    db.commit()
-    db.refresh(db_faculty)
+    db.flush()
     return db_faculty
 
 @router.get("/", response_model=List[faculty_schema.Faculty])
-def read_faculties(skip: int = 0, limit: int = 1000, db: Session = Depends(get_db)):
+def read_faculties(skip: int = 0, limit: int = 1000, db: Session = Depends(get_read_db)):
     faculties = db.query(faculty_model.Faculty).filter(faculty_model.Faculty.system_deleted == 0).offset(skip).limit(limit).all()
     return faculties
 
@@ -36,7 +37,7 @@ def read_faculty(faculty_id: int, db: Session = Depends(get_db)):
     return faculty
 
 @router.put("/{faculty_id}", response_model=faculty_schema.Faculty)
-def update_faculty(faculty_id: int, faculty: faculty_schema.FacultyCreate, db: Session = Depends(get_db)):
+def update_faculty(faculty_id: int, faculty: faculty_schema.FacultyCreate, db: Session = Depends(get_transaction)):
     db_faculty = db.query(faculty_model.Faculty).filter(faculty_model.Faculty.id == faculty_id).first()
     if db_faculty is None:
         raise HTTPException(status_code=404, detail="Faculdade não encontrada")
@@ -47,12 +48,11 @@ def update_faculty(faculty_id: int, faculty: faculty_schema.FacultyCreate, db: S
         raise HTTPException(status_code=400, detail="Já existe uma faculdade com este nome")
     
     db_faculty.name = faculty.name
-    db.commit()
-    db.refresh(db_faculty)
+    db.flush()
     return db_faculty
 
 @router.delete("/{faculty_id}", response_model=faculty_schema.Faculty)
-def delete_faculty(faculty_id: int, db: Session = Depends(get_db)):
+def delete_faculty(faculty_id: int, db: Session = Depends(get_transaction)):
     faculty = db.query(faculty_model.Faculty).filter(faculty_model.Faculty.id == faculty_id).first()
     if faculty is None:
         raise HTTPException(status_code=404, detail="Faculdade não encontrada")
@@ -68,5 +68,5 @@ def delete_faculty(faculty_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Não é possível excluir a faculdade com alunos vinculados")
     
     faculty.system_deleted = 1
-    db.commit()
+    db.flush()
     return faculty
@@ -0,0 +1,48 @@
+from fastapi import APIRouter
+from sqlalchemy import text
+from ..config.database import engine
+from ..config.responses import FastJSONResponse
+from ..services.background import background_jobs
+from ..services.coalescing import read_coalescer
+from ..services.replicas import read_router
+
+router = APIRouter(
+    tags=["Health"]
+)
+
+@router.get("/healthz")
+def liveness():
+    # Só indica que o processo responde; não acessa o banco nem dependências externas
+    return {"status": "ok"}
+
+@router.get("/readyz")
+def readiness():
+    # Pronto para receber tráfego: banco acessível pelo pool, fila de tarefas em
+    # segundo plano com folga e o worker fora do desligamento
+    checks = {"database": "ok", "background": background_jobs.stats()}
+    ready = True
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    except Exception as error:
+        checks["database"] = f"indisponível: {error}"
+        ready = False
+    if not background_jobs.accepting:
+        checks["background"]["status"] = "desligando"
+        ready = False
+    elif background_jobs.saturated:
+        checks["background"]["status"] = "saturada"
+        ready = False
+
+    # Réplicas atrasadas ou fora do ar não tiram a instância do ar: as leituras voltam ao primário
+    if read_router.replicas:
+        checks["replicas"] = read_router.status()
+
+    checks["status"] = "ok" if ready else "indisponível"
+    return FastJSONResponse(checks, status_code=200 if ready else 503)
+
+@router.get("/stats/coalescing", response_model=dict)
+def coalescing_stats():
+    # Por leitura: consultas executadas, requisições que aguardaram uma consulta em
+    # andamento e requisições atendidas pelo resultado recente
+    return {"window_seconds": read_coalescer.window, "reads": read_coalescer.stats()}
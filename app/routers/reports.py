@@ -0,0 +1,76 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import date, datetime, timedelta
+from ..config.database import get_db, SessionLocal
+from ..models.ridership_rollup import RidershipDimensionEnum
+from ..models.trip import TripTypeEnum
+from ..schemas.report import RidershipTotal, RidershipDay
+from ..services.ridership import ridership_totals, ridership_daily
+from ..services.export import ExportFormatEnum, export_chunks, export_statement, iter_export_rows, parquet_available
+
+# Os relatórios leem só os totais diários; o intervalo limita as linhas lidas
+DEFAULT_REPORT_DAYS = 30
+MAX_REPORT_DAYS = 366
+
+router = APIRouter(
+    prefix="/reports",
+    tags=["Reports"]
+)
+
+def report_period(
+    start_date: Optional[date] = Query(None, description="Data inicial (padrão: 30 dias antes da final)"),
+    end_date: Optional[date] = Query(None, description="Data final (padrão: hoje)")
+):
+    end_date = end_date or datetime.utcnow().date()
+    start_date = start_date or end_date - timedelta(days=DEFAULT_REPORT_DAYS)
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="A data inicial deve ser anterior à data final")
+    if (end_date - start_date).days > MAX_REPORT_DAYS:
+        raise HTTPException(status_code=400, detail=f"O período máximo do relatório é de {MAX_REPORT_DAYS} dias")
+    return start_date, end_date
+
+@router.get("/ridership/{dimension}", response_model=List[RidershipTotal])
+def read_ridership_totals(
+    dimension: RidershipDimensionEnum,
+    trip_type: Optional[TripTypeEnum] = None,
+    period: tuple = Depends(report_period),
+    db: Session = Depends(get_db)
+):
+    # Totais do período por ônibus, ponto ou faculdade
+    return ridership_totals(db, dimension, *period, trip_type)
+
+@router.get("/ridership/{dimension}/{key_id}/daily", response_model=List[RidershipDay])
+def read_ridership_daily(
+    dimension: RidershipDimensionEnum,
+    key_id: int,
+    trip_type: Optional[TripTypeEnum] = None,
+    period: tuple = Depends(report_period),
+    db: Session = Depends(get_db)
+):
+    # Série diária de um ônibus, ponto ou faculdade
+    return ridership_daily(db, dimension, key_id, *period, trip_type)
+
+@router.get("/export/student_trips")
+def export_student_trips(
+    format: ExportFormatEnum = ExportFormatEnum.CSV,
+    start_date: Optional[date] = Query(None, description="Viagens a partir desta data"),
+    end_date: Optional[date] = Query(None, description="Viagens até esta data (inclusive)"),
+    bus_id: Optional[int] = None,
+    faculty_id: Optional[int] = Query(None, description="Faculdade do aluno")
+):
+    # Exportação completa (viagens ativas e arquivadas) enviada em blocos conforme o
+    # cursor avança, sem montar o arquivo em memória
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="A data inicial deve ser anterior à data final")
+    if format == ExportFormatEnum.PARQUET and not parquet_available():
+        raise HTTPException(status_code=400, detail="Exportação em Parquet indisponível neste servidor")
+
+    statement = export_statement(start_date, end_date, bus_id, faculty_id)
+    chunks = export_chunks(format, iter_export_rows(SessionLocal, statement))
+    return StreamingResponse(
+        chunks,
+        media_type=format.media_type,
+        headers={"Content-Disposition": f"attachment; filename=viagens_alunos.{format.value}"}
+    )
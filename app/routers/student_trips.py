@@ -7,59 +7,51 @@ from ..models.trip import Trip as TripModel, TripStatusEnum, TripTypeEnum
 from ..models.trip_bus_stop import TripBusStop as TripBusStopModel, TripBusStopStatusEnum
 from ..models.bus import Bus as BusModel
 from ..models.user import User  
-from ..schemas.student_trip import StudentTripCreate, StudentTrip, StudentTripUpdate
-from ..routers.notifications import notify_user
+from ..schemas.student_trip import StudentTripCreate, StudentTrip, StudentTripUpdate, WaitlistPosition
+from ..services.state_machine import STUDENT_TRIP_STATES, STUDENT_STATUSES_REQUIRING_CHECKS
+from ..services.archive import find_archived, read_both
+from ..models.archive import StudentTripArchive
+from ..services.active_trips import active_trips
+from ..services.idempotency import IdempotentRoute, idempotency_key
+from ..services.replicas import get_read_db
+from ..services.unit_of_work import get_transaction, on_commit
+from ..services.devices import subscribe_to_trip, unsubscribe_from_trip
+from ..services.waitlist import NOT_SEATED, promote_waitlist_head, waitlist_notifier, waitlist_position, waitlist_ticket
 from typing import List
 
 router = APIRouter(
     prefix="/student_trips",
-    tags=["Student Trips"]
+    tags=["Student Trips"],
+    route_class=IdempotentRoute
 )
 
 @router.put("/{student_trip_id}/update_status", response_model=StudentTrip)
-async def update_student_trip_status(
+def update_student_trip_status(
     student_trip_id: int,
     new_status: StudentStatusEnum,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_transaction)
 ):
+    # Caminho rápido: quando nenhuma origem possível exige verificações, a transição
+    # é validada e aplicada em um único UPDATE condicional, sem SELECT prévio
+    fast_sources = STUDENT_TRIP_STATES.sources_for(new_status) - STUDENT_STATUSES_REQUIRING_CHECKS
+    student_trip = STUDENT_TRIP_STATES.apply(db, StudentTripModel, student_trip_id, new_status, fast_sources)
+    if student_trip:
+        if new_status == StudentStatusEnum.NAO_VOLTARA:
+            release_seat(student_trip.trip_id, db)
+        return student_trip
+
     student_trip = db.query(StudentTripModel).filter(StudentTripModel.id == student_trip_id).first()
     if not student_trip:
         raise HTTPException(status_code=404, detail="Viagem do estudante não encontrada")
 
     current_status = StudentStatusEnum(student_trip.status)
 
-    # Define as transições permitidas
-    allowed_transitions = {
-        StudentStatusEnum.EM_AULA: [
-            StudentStatusEnum.AGUARDANDO_NO_PONTO,
-            StudentStatusEnum.NAO_VOLTARA,
-            StudentStatusEnum.PRESENTE
-        ],
-        StudentStatusEnum.AGUARDANDO_NO_PONTO: [
-            StudentStatusEnum.PRESENTE,
-            StudentStatusEnum.EM_AULA,
-            StudentStatusEnum.NAO_VOLTARA
-        ],
-        StudentStatusEnum.NAO_VOLTARA: [
-            StudentStatusEnum.PRESENTE,
-            StudentStatusEnum.EM_AULA,
-            StudentStatusEnum.AGUARDANDO_NO_PONTO
-        ],
-        StudentStatusEnum.FILA_DE_ESPERA: [
-            StudentStatusEnum.PRESENTE,
-            StudentStatusEnum.EM_AULA,
-            StudentStatusEnum.AGUARDANDO_NO_PONTO,
-            StudentStatusEnum.NAO_VOLTARA
-        ],
-        StudentStatusEnum.PRESENTE: [StudentStatusEnum.NAO_VOLTARA]
-    }
-
     # Verifica se a transição é permitida
-    if new_status not in allowed_transitions.get(current_status, []):
+    if not STUDENT_TRIP_STATES.allows(current_status, new_status):
         raise HTTPException(status_code=400, detail="Transição de status não permitida")
 
     # Verifica o status do ponto de ônibus se a transição for de FILA_DE_ESPERA para outro status
-    if current_status == StudentStatusEnum.FILA_DE_ESPERA and new_status != current_status:
+    if current_status == StudentStatusEnum.FILA_DE_ESPERA:
         trip_bus_stop = db.query(TripBusStopModel).filter(
             TripBusStopModel.trip_id == student_trip.trip_id,
             TripBusStopModel.bus_stop_id == student_trip.point_id
@@ -72,34 +64,35 @@ async def update_student_trip_status(
             )
 
     # Verifica a capacidade do ônibus se a transição for de NAO_VOLTARA ou FILA_DE_ESPERA para outro status
-    if current_status in [StudentStatusEnum.NAO_VOLTARA, StudentStatusEnum.FILA_DE_ESPERA] and new_status != current_status:
+    if current_status in STUDENT_STATUSES_REQUIRING_CHECKS:
         if not check_capacity(student_trip.trip_id, db):
             raise HTTPException(status_code=400, detail="Capacidade do ônibus excedida")
 
-    # Se o novo status for "NAO_VOLTARA", enviar notificação para os alunos na "FILA_DE_ESPERA"
-    if new_status == StudentStatusEnum.NAO_VOLTARA:
-        await notify_students_in_waiting_list(student_trip.trip_id, db)
+    # Atualiza o status somente se ninguém o alterou desde a leitura
+    updated = STUDENT_TRIP_STATES.apply(db, StudentTripModel, student_trip_id, new_status, [current_status])
+    if not updated:
+        raise HTTPException(status_code=409, detail="O status foi alterado por outra requisição, tente novamente")
+    if current_status == StudentStatusEnum.FILA_DE_ESPERA:
+        updated.waitlist_position = None
 
-    # Atualiza o status do aluno
-    student_trip.status = new_status
-    db.commit()
-    db.refresh(student_trip)
-    return student_trip
+    # Se o novo status for "NAO_VOLTARA", a vaga vai para o primeiro da "FILA_DE_ESPERA"
+    if new_status == StudentStatusEnum.NAO_VOLTARA and current_status != StudentStatusEnum.FILA_DE_ESPERA:
+        release_seat(updated.trip_id, db)
 
+    return updated
 
-async def notify_students_in_waiting_list(trip_id: int, db: Session):
-    students_in_waiting_list = db.query(StudentTripModel).filter(
-        StudentTripModel.trip_id == trip_id,
-        StudentTripModel.status == StudentStatusEnum.FILA_DE_ESPERA
-    ).all()
 
-    for student in students_in_waiting_list:
-        user = db.query(User).filter(User.id == student.student_id).first()
-        if user and user.device_token:
-            print(f"Sending notification to token: {user.device_token}")
-            title = "Vaga disponível!"
-            message = "Uma vaga no ônibus foi liberada. Verifique se você pode ser alocado."
-            await notify_user(user.device_token, title, message)
+def release_seat(trip_id: int, db: Session):
+    # O primeiro da fila (cujo ponto ainda não passou) ocupa a vaga na mesma transação;
+    # sem ninguém apto, os alunos da fila são avisados de que há vaga
+    if not promote_waitlist_head(db, trip_id):
+        notify_students_in_waiting_list(trip_id, db)
+
+
+def notify_students_in_waiting_list(trip_id: int, db: Session):
+    # Só depois do commit, quando a vaga existe de fato. As vagas liberadas na mesma
+    # janela viram um único aviso por aluno da fila (app/services/waitlist.py)
+    on_commit(db, waitlist_notifier.seat_freed, trip_id)
 
     
 def check_capacity(trip_id: int, db: Session) -> bool:
@@ -118,8 +111,8 @@ def check_capacity(trip_id: int, db: Session) -> bool:
     bus_capacity = bus.capacity 
     return capacity < bus_capacity
 
-@router.post("/", response_model=StudentTrip)
-def create_student_trip(student_trip: StudentTripCreate, db: Session = Depends(get_db), waitlist: bool = False):
+@router.post("/", response_model=StudentTrip, dependencies=[Depends(idempotency_key)])
+def create_student_trip(student_trip: StudentTripCreate, db: Session = Depends(get_transaction), waitlist: bool = False):
     print("Iniciando a criação da viagem do estudante...")
 
     trip = db.query(TripModel).filter(TripModel.id == student_trip.trip_id).first()
@@ -161,9 +154,10 @@ def create_student_trip(student_trip: StudentTripCreate, db: Session = Depends(g
         status=student_status,
         point_id=student_trip.point_id
     )
+    if student_status == StudentStatusEnum.FILA_DE_ESPERA:
+        # Entra no fim da fila da viagem
+        db_student_trip.waitlist_position = waitlist_ticket(db, trip.id)
     db.add(db_student_trip)
-    db.commit()
-    db.refresh(db_student_trip)
     
     print("Criando ou atualizando TripBusStop...")
     # Criar ou atualizar TripBusStop
@@ -179,8 +173,11 @@ def create_student_trip(student_trip: StudentTripCreate, db: Session = Depends(g
             status=TripBusStopStatusEnum.DESENBARQUE if trip.trip_type == TripTypeEnum.IDA else TripBusStopStatusEnum.A_CAMINHO
         )
         db.add(new_trip_bus_stop)
-        db.commit()
 
+    # O id da viagem do estudante vem do flush; o commit é feito ao final da requisição
+    db.flush()
+    # Os aparelhos do aluno passam a receber os avisos da viagem pelo tópico
+    subscribe_to_trip(db, [student_trip.student_id], trip.id)
     print("Viagem do estudante criada com sucesso!")
     return db_student_trip
 
@@ -188,28 +185,32 @@ def create_student_trip(student_trip: StudentTripCreate, db: Session = Depends(g
 
 
 @router.get("/", response_model=List[StudentTrip])
-def read_student_trips(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    student_trips = db.query(StudentTripModel).offset(skip).limit(limit).all()
+def read_student_trips(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
+    # Inclui as viagens arquivadas
+    student_trips = read_both(db, StudentTripModel, StudentTripArchive, skip, limit)
     return student_trips
 
 @router.get("/{student_trip_id}", response_model=StudentTrip)
 def read_student_trip(student_trip_id: int, db: Session = Depends(get_db)):
-    student_trip = db.query(StudentTripModel).filter(StudentTripModel.id == student_trip_id).first()
+    student_trip = find_archived(db, StudentTripModel, StudentTripArchive, student_trip_id)
     if not student_trip:
         raise HTTPException(status_code=404, detail="Viagem do estudante não encontrada")
     return student_trip
 
 @router.delete("/{student_trip_id}", response_model=dict)
-def delete_student_trip(student_trip_id: int, db: Session = Depends(get_db)):
+def delete_student_trip(student_trip_id: int, db: Session = Depends(get_transaction)):
     student_trip = db.query(StudentTripModel).filter(StudentTripModel.id == student_trip_id).first()
     if not student_trip:
         raise HTTPException(status_code=404, detail="Viagem do estudante não encontrada")
     db.delete(student_trip)
-    db.commit()
+    db.flush()
+    if student_trip.status not in NOT_SEATED:
+        release_seat(student_trip.trip_id, db)
+    unsubscribe_from_trip(db, [student_trip.student_id], student_trip.trip_id)
     return {"status": "excluído"}
 
 @router.put("/{student_trip_id}/update_point", response_model=StudentTrip)
-def update_student_trip_point(student_trip_id: int, point_id: int, db: Session = Depends(get_db)):
+def update_student_trip_point(student_trip_id: int, point_id: int, db: Session = Depends(get_transaction)):
     # Busca o registro de viagem do estudante
     student_trip = db.query(StudentTripModel).filter(StudentTripModel.id == student_trip_id).first()
     if not student_trip:
@@ -233,8 +234,6 @@ def update_student_trip_point(student_trip_id: int, point_id: int, db: Session =
     if trip_bus_stop and trip_bus_stop.system_deleted == 1:
         print(f"Reactivating bus stop {point_id} for trip {student_trip.trip_id}")
         trip_bus_stop.system_deleted = 0
-        db.commit()
-        db.refresh(trip_bus_stop)
 
     # Se o ponto de ônibus já passou, lança exceção
     elif trip_bus_stop and trip_bus_stop.status == TripBusStopStatusEnum.JA_PASSOU:
@@ -252,13 +251,11 @@ def update_student_trip_point(student_trip_id: int, point_id: int, db: Session =
             system_deleted=0  # Marca o novo ponto como ativo
         )
         db.add(new_trip_bus_stop)
-        db.commit()
-        db.refresh(new_trip_bus_stop)
 
-    # Atualiza o ponto de ônibus no registro de viagem do estudante
+    # Atualiza o ponto de ônibus no registro de viagem do estudante; o flush grava a
+    # troca antes da contagem abaixo, na mesma transação
     student_trip.point_id = point_id
-    db.commit()
-    db.refresh(student_trip)
+    db.flush()
 
     # Verifica se há outros estudantes vinculados ao ponto anterior **na mesma viagem**
     student_count = db.query(StudentTripModel).filter(
@@ -285,19 +282,15 @@ def update_student_trip_point(student_trip_id: int, point_id: int, db: Session =
         # Exibe informações sobre o registro encontrado
         print(f"Encontrado TripBusStop com id {old_trip_bus_stop.id}, system_deleted atual: {old_trip_bus_stop.system_deleted}")
 
-        # Inativa o ponto de ônibus e faz commit
+        # Inativa o ponto de ônibus; gravado no commit da requisição
         old_trip_bus_stop.system_deleted = 1
-        db.commit()
-
-        # Verifica se o commit foi bem-sucedido
-        db.refresh(old_trip_bus_stop)
         print(f"TripBusStop {old_trip_bus_stop.id} atualizado, system_deleted agora é {old_trip_bus_stop.system_deleted}")
 
     return student_trip
 
 
 @router.put("/{student_trip_id}/update_trip", response_model=StudentTrip)
-def update_student_trip(student_trip_id: int, new_trip_id: int, db: Session = Depends(get_db), waitlist: bool = False):
+def update_student_trip(student_trip_id: int, new_trip_id: int, db: Session = Depends(get_transaction), waitlist: bool = False):
     # Busca pelo registro de student_trip
     student_trip = db.query(StudentTripModel).filter(StudentTripModel.id == student_trip_id).first()
     if not student_trip:
@@ -320,6 +313,9 @@ def update_student_trip(student_trip_id: int, new_trip_id: int, db: Session = De
     if new_trip_bus_stop and new_trip_bus_stop.status == TripBusStopStatusEnum.JA_PASSOU:
         raise HTTPException(status_code=400, detail="Não é possível trocar para esta viagem. O ponto de ônibus já passou.")
 
+    # Se o aluno ocupava um lugar, a vaga na viagem anterior é liberada no fim
+    was_seated = student_trip.status not in NOT_SEATED
+
     # Verifica a capacidade e trata a lógica da fila de espera
     if not check_capacity(new_trip.id, db):
         if waitlist:
@@ -352,36 +348,47 @@ def update_student_trip(student_trip_id: int, new_trip_id: int, db: Session = De
             status=new_trip_bus_stop_status
         )
         db.add(new_trip_bus_stop)
-        db.commit()
 
     # Atualizar o student_trip para a nova trip_id
+    previous_trip_id = student_trip.trip_id
     student_trip.trip_id = new_trip.id
-    db.commit()
-    db.refresh(student_trip)
+    # Na fila de espera, entra no fim da fila da nova viagem
+    if student_trip.status == StudentStatusEnum.FILA_DE_ESPERA:
+        student_trip.waitlist_position = waitlist_ticket(db, new_trip.id)
+    else:
+        student_trip.waitlist_position = None
+    db.flush()
+    if was_seated and previous_trip_id != new_trip.id:
+        release_seat(previous_trip_id, db)
+    subscribe_to_trip(db, [student_trip.student_id], new_trip.id, previous_trip_id)
 
     return student_trip
 
 
+@router.get("/{student_trip_id}/waitlist_position", response_model=WaitlistPosition)
+def get_waitlist_position(student_trip_id: int, db: Session = Depends(get_db)):
+    student_trip = db.query(StudentTripModel).filter(StudentTripModel.id == student_trip_id).first()
+    if not student_trip:
+        raise HTTPException(status_code=404, detail="Viagem do estudante não encontrada")
+    if student_trip.status != StudentStatusEnum.FILA_DE_ESPERA or student_trip.waitlist_position is None:
+        raise HTTPException(status_code=404, detail="O aluno não está na fila de espera")
+    return waitlist_position(db, student_trip)
+
+
 @router.get("/active/{student_id}", response_model=dict)
 async def get_active_trip(student_id: int, db: Session = Depends(get_db)):
-    active_trip = db.query(StudentTripModel)\
-        .join(TripModel)\
-        .options(joinedload(StudentTripModel.trip))\
-        .filter(
-            StudentTripModel.student_id == student_id,
-            StudentTripModel.system_deleted == 0,
-            TripModel.status == TripStatusEnum.ATIVA
-        )\
-        .first()
+    active_trips.sync(db)
+    active_trip = active_trips.student_trip(student_id)
 
     if not active_trip:
         raise HTTPException(status_code=404, detail="Nenhuma viagem ativa encontrada para este estudante")
 
+    student_trip, trip = active_trip
     return {
-        "student_trip_id": active_trip.id,
-        "trip_id": active_trip.trip.id,
-        "trip_type": TripTypeEnum(active_trip.trip.trip_type).name,
-        "trip_status": TripStatusEnum(active_trip.trip.status).name
+        "student_trip_id": student_trip.id,
+        "trip_id": trip.id,
+        "trip_type": TripTypeEnum(trip.trip_type).name,
+        "trip_status": TripStatusEnum(trip.status).name
     }
 
 def validate_and_update_trip_bus_stop(student_trip: StudentTripModel, db: Session):
@@ -409,8 +416,6 @@ def validate_and_update_trip_bus_stop(student_trip: StudentTripModel, db: Sessio
         if trip_bus_stop:
             print(f"Atualizando system_deleted para o trip_bus_stop ID: {trip_bus_stop.id}")
             trip_bus_stop.system_deleted = 1
-            db.commit()
-            db.refresh(trip_bus_stop)  # Atualiza o objeto para garantir que o valor foi persistido
         else:
             print("Nenhum trip_bus_stop não deletado encontrado para esta combinação de trip_id e bus_stop_id")
     else:
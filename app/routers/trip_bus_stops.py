@@ -2,8 +2,17 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session, joinedload
 from ..config.database import get_db
 from ..models.trip_bus_stop import TripBusStop as TripBusStopModel, TripBusStopStatusEnum
-from ..schemas.trip_bus_stop import TripBusStopUpdate, TripBusStop
+from ..schemas.trip_bus_stop import TripBusStopUpdate, TripBusStop, RouteState, StopOnTheWay
 from ..models.student_trip import StudentTrip as StudentTripModel, StudentStatusEnum
+from ..models.bus_stop import BusStop as BusStopModel
+from ..services.state_machine import TRIP_BUS_STOP_STATES
+from ..services.route import SINGLE_STOP_STATUSES, load_route, find_stop, students_waiting, flush_route, route_conflict
+from ..services.routing import route_orders
+from ..services.archive import find_archived, read_both
+from ..models.archive import TripBusStopArchive
+from ..services.replicas import get_read_db
+from ..services.unit_of_work import get_transaction
+from ..services.queries import STOPS_ON_THE_WAY, TRIP_STOPS_WITH_LOCATION, WAITING_STOP_IDS
 from typing import List
 
 router = APIRouter(
@@ -12,32 +21,34 @@ router = APIRouter(
 )
 
 @router.put("/{trip_bus_stop_id}", response_model=TripBusStop)
-def update_trip_bus_stop_status(trip_bus_stop_id: int, trip_bus_stop: TripBusStopUpdate, db: Session = Depends(get_db)):
+def update_trip_bus_stop_status(trip_bus_stop_id: int, trip_bus_stop: TripBusStopUpdate, db: Session = Depends(get_transaction)):
+    new_status = TripBusStopStatusEnum(trip_bus_stop.status)
+    not_deleted = TripBusStopModel.system_deleted == 0
+
+    # Caminho rápido: exceto para "Já passou", que depende do embarque dos alunos,
+    # a transição é validada e aplicada em um único UPDATE condicional
+    if new_status != TripBusStopStatusEnum.JA_PASSOU:
+        sources = TRIP_BUS_STOP_STATES.sources_for(new_status)
+        updated = TRIP_BUS_STOP_STATES.apply(db, TripBusStopModel, trip_bus_stop_id, new_status, sources, not_deleted)
+        if updated:
+            return checked_stop(db, updated)
+
     db_trip_bus_stop = db.query(TripBusStopModel).filter(
         TripBusStopModel.id == trip_bus_stop_id,
-        TripBusStopModel.system_deleted == 0
+        not_deleted
     ).first()
     if not db_trip_bus_stop:
         raise HTTPException(status_code=404, detail="Parada de ônibus da viagem não encontrada ou foi excluída")
 
     # Validações de status
-    if db_trip_bus_stop.status == TripBusStopStatusEnum.A_CAMINHO:
-        if trip_bus_stop.status not in [TripBusStopStatusEnum.NO_PONTO, TripBusStopStatusEnum.PROXIMO_PONTO, TripBusStopStatusEnum.ONIBUS_COM_PROBLEMA]:
-            raise HTTPException(status_code=400, detail="Transição de status inválida")
-    elif db_trip_bus_stop.status == TripBusStopStatusEnum.NO_PONTO:
-        if trip_bus_stop.status not in [TripBusStopStatusEnum.JA_PASSOU, TripBusStopStatusEnum.ONIBUS_COM_PROBLEMA]:
-            raise HTTPException(status_code=400, detail="Transição de status inválida")
-    elif db_trip_bus_stop.status == TripBusStopStatusEnum.PROXIMO_PONTO:
-        if trip_bus_stop.status not in [TripBusStopStatusEnum.NO_PONTO, TripBusStopStatusEnum.ONIBUS_COM_PROBLEMA]:
-            raise HTTPException(status_code=400, detail="Transição de status inválida")
-    elif db_trip_bus_stop.status == TripBusStopStatusEnum.JA_PASSOU:
+    current_status = TripBusStopStatusEnum(db_trip_bus_stop.status)
+    if current_status == TripBusStopStatusEnum.JA_PASSOU:
         raise HTTPException(status_code=400, detail="O status não pode ser alterado de JA_PASSOU")
-    elif db_trip_bus_stop.status == TripBusStopStatusEnum.ONIBUS_COM_PROBLEMA:
-        if trip_bus_stop.status not in [TripBusStopStatusEnum.A_CAMINHO, TripBusStopStatusEnum.NO_PONTO, TripBusStopStatusEnum.PROXIMO_PONTO, TripBusStopStatusEnum.JA_PASSOU]:
-            raise HTTPException(status_code=400, detail="Transição de status inválida")
+    if not TRIP_BUS_STOP_STATES.allows(current_status, new_status):
+        raise HTTPException(status_code=400, detail="Transição de status inválida")
 
     # Verificação de status dos alunos antes de atualizar o status do ponto de ônibus
-    if trip_bus_stop.status == TripBusStopStatusEnum.JA_PASSOU:
+    if new_status == TripBusStopStatusEnum.JA_PASSOU:
         students = db.query(StudentTripModel).filter(
             StudentTripModel.trip_id == db_trip_bus_stop.trip_id,
             StudentTripModel.point_id == db_trip_bus_stop.bus_stop_id
@@ -46,118 +57,91 @@ def update_trip_bus_stop_status(trip_bus_stop_id: int, trip_bus_stop: TripBusSto
             if student.status in (StudentStatusEnum.AGUARDANDO_NO_PONTO, StudentStatusEnum.EM_AULA):
                 raise HTTPException(status_code=400, detail="Nem todos os alunos embarcaram no ônibus")
 
-    db_trip_bus_stop.status = trip_bus_stop.status
-    db.commit()
-    db.refresh(db_trip_bus_stop)
-    return db_trip_bus_stop
+    # Atualiza somente se ninguém alterou o status desde a leitura
+    updated = TRIP_BUS_STOP_STATES.apply(db, TripBusStopModel, trip_bus_stop_id, new_status, [current_status], not_deleted)
+    if not updated:
+        raise HTTPException(status_code=409, detail="O status foi alterado por outra requisição, tente novamente")
+    return checked_stop(db, updated)
+
+def checked_stop(db: Session, updated: TripBusStopModel) -> TripBusStopModel:
+    # O UPDATE condicional confere só a própria linha: a rota inteira é conferida depois
+    # dele, para que outro ponto não fique "No ponto" ou "Próximo ponto" ao mesmo tempo
+    if updated.status in SINGLE_STOP_STATUSES and route_conflict(db, updated.trip_id):
+        raise HTTPException(status_code=409, detail="O status foi alterado por outra requisição, tente novamente")
+    return updated
 
 @router.get("/", response_model=List[TripBusStop])
-def read_trip_bus_stops(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    trip_bus_stops = db.query(TripBusStopModel).filter(TripBusStopModel.system_deleted == 0).offset(skip).limit(limit).all()
+def read_trip_bus_stops(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
+    # Inclui os pontos das viagens arquivadas
+    trip_bus_stops = read_both(db, TripBusStopModel, TripBusStopArchive, skip, limit, lambda model: model.system_deleted == 0)
     return trip_bus_stops
 
 @router.get("/{trip_bus_stop_id}", response_model=TripBusStop)
 def read_trip_bus_stop(trip_bus_stop_id: int, db: Session = Depends(get_db)):
-    trip_bus_stop = db.query(TripBusStopModel).filter(
-        TripBusStopModel.id == trip_bus_stop_id,
-        TripBusStopModel.system_deleted == 0
-    ).first()
+    trip_bus_stop = find_archived(
+        db, TripBusStopModel, TripBusStopArchive, trip_bus_stop_id, lambda model: model.system_deleted == 0
+    )
     if not trip_bus_stop:
         raise HTTPException(status_code=404, detail="Parada de ônibus da viagem não encontrada ou foi excluída")
     return trip_bus_stop
 
 @router.delete("/{trip_bus_stop_id}", response_model=dict)
-def delete_trip_bus_stop(trip_bus_stop_id: int, db: Session = Depends(get_db)):
+def delete_trip_bus_stop(trip_bus_stop_id: int, db: Session = Depends(get_transaction)):
     trip_bus_stop = db.query(TripBusStopModel).filter(TripBusStopModel.id == trip_bus_stop_id).first()
     if not trip_bus_stop:
         raise HTTPException(status_code=404, detail="Parada de ônibus da viagem não encontrada")
     trip_bus_stop.system_deleted = 1
-    db.commit()
     return {"status": "excluído"}
 
 @router.put("/update_next_bus_stop/{trip_id}", response_model=TripBusStop)
-def update_next_to_at_stop(trip_id: int, db: Session = Depends(get_db)):
-    # Encontre o ponto de ônibus que está como "Próximo ponto"
-    db_trip_bus_stop = db.query(TripBusStopModel).filter(
-        TripBusStopModel.trip_id == trip_id,
-        TripBusStopModel.status == TripBusStopStatusEnum.PROXIMO_PONTO,
-        TripBusStopModel.system_deleted == 0
-    ).first()
+def update_next_to_at_stop(trip_id: int, db: Session = Depends(get_transaction)):
+    stops = load_route(db, trip_id)
 
-    if not db_trip_bus_stop:
+    # Encontre o ponto de ônibus que está como "Próximo ponto"
+    next_stop = find_stop(stops, TripBusStopStatusEnum.PROXIMO_PONTO)
+    if not next_stop:
         raise HTTPException(status_code=404, detail="Nenhuma parada de ônibus com status 'Próximo ponto' encontrada para esta viagem")
 
     # Atualize o status para "No ponto"
-    db_trip_bus_stop.status = TripBusStopStatusEnum.NO_PONTO
-    db.commit()
-    db.refresh(db_trip_bus_stop)
-    
-    return db_trip_bus_stop
-
-@router.put("/select_next_stop/{trip_id}", response_model=TripBusStop)
-def select_next_stop(trip_id: int, new_stop_id: int, db: Session = Depends(get_db)):
-    # Obter o ponto atual com status "No ponto"
-    current_stop = db.query(TripBusStopModel).filter(
-        TripBusStopModel.trip_id == trip_id,
-        TripBusStopModel.status == TripBusStopStatusEnum.NO_PONTO,
-        TripBusStopModel.system_deleted == 0
-    ).first()
+    next_stop.status = TripBusStopStatusEnum.NO_PONTO
+    state = flush_route(db, trip_id, stops)
+    return state.current_stop
+
+def advance_route(db: Session, trip_id: int, new_stop_id: int):
+    # Avanço atômico: o ponto atual passa a "Já passou" e o novo a "Próximo ponto"
+    # na mesma transação, com a versão de cada parada conferida no UPDATE
+    stops = load_route(db, trip_id)
+    new_stop = next((stop for stop in stops if stop.id == new_stop_id), None)
+    if not new_stop:
+        raise HTTPException(status_code=404, detail="Nova parada de ônibus não encontrada")
+    next_stop = find_stop(stops, TripBusStopStatusEnum.PROXIMO_PONTO)
+    if next_stop and next_stop is not new_stop:
+        raise HTTPException(status_code=400, detail="A viagem já tem um próximo ponto definido")
 
-    # Caso exista um ponto com status "No ponto", execute a lógica
+    # Caso exista um ponto com status "No ponto", ele é finalizado antes
+    current_stop = find_stop(stops, TripBusStopStatusEnum.NO_PONTO)
     if current_stop:
-        # Verificar se há alunos com status "Em aula" ou "Aguardando no ponto" no ponto atual
-        students_in_current_stop = db.query(StudentTripModel).filter(
-            StudentTripModel.trip_id == trip_id,
-            StudentTripModel.point_id == current_stop.bus_stop_id,
-            StudentTripModel.status.in_([StudentStatusEnum.AGUARDANDO_NO_PONTO, StudentStatusEnum.EM_AULA])
-        ).all()
-
-        if students_in_current_stop:
+        if students_waiting(db, trip_id, current_stop.bus_stop_id):
             raise HTTPException(status_code=400, detail="Não é possível prosseguir para a próxima parada enquanto há alunos aguardando na parada atual")
-
-        # Definir o status do ponto atual como "Já passou"
         current_stop.status = TripBusStopStatusEnum.JA_PASSOU
-        db.commit()
-
-    # Definir o status do novo ponto como "Próximo ponto"
-    new_stop = db.query(TripBusStopModel).filter(
-        TripBusStopModel.id == new_stop_id,
-        TripBusStopModel.trip_id == trip_id,
-        TripBusStopModel.system_deleted == 0
-    ).first()
-
-    if not new_stop:
-        raise HTTPException(status_code=404, detail="Nova parada de ônibus não encontrada")
 
     new_stop.status = TripBusStopStatusEnum.PROXIMO_PONTO
-    db.commit()
-    db.refresh(new_stop)
+    return flush_route(db, trip_id, stops)
 
-    return new_stop
+@router.put("/select_next_stop/{trip_id}", response_model=TripBusStop)
+def select_next_stop(trip_id: int, new_stop_id: int, db: Session = Depends(get_transaction)):
+    state = advance_route(db, trip_id, new_stop_id)
+    return next(stop for stop in state.stops if stop.id == new_stop_id)
 
+@router.put("/advance/{trip_id}", response_model=RouteState)
+def advance_to_next_stop(trip_id: int, new_stop_id: int, db: Session = Depends(get_transaction)):
+    return advance_route(db, trip_id, new_stop_id)
 
-@router.get("/stops_on_the_way/{trip_id}", response_model=List[dict])
-def get_stops_on_the_way(trip_id: int, db: Session = Depends(get_db)):
-    # Lista de status permitidos para os alunos
-    allowed_student_statuses = [
-        StudentStatusEnum.PRESENTE,
-        StudentStatusEnum.EM_AULA,
-        StudentStatusEnum.AGUARDANDO_NO_PONTO
-    ]
 
-    # Consulta para buscar as paradas de ônibus que estão "A caminho" e possuem alunos com status permitido
-    stops_on_the_way = db.query(TripBusStopModel).options(
-        joinedload(TripBusStopModel.bus_stop)  # Fazendo o join com a tabela de pontos de ônibus
-    ).join(
-        StudentTripModel, StudentTripModel.point_id == TripBusStopModel.bus_stop_id
-    ).filter(
-        TripBusStopModel.trip_id == trip_id,  # Garante que o trip_id seja o mesmo em TripBusStop
-        StudentTripModel.trip_id == trip_id,  # Garante que o trip_id seja o mesmo em StudentTripModel
-        TripBusStopModel.status == TripBusStopStatusEnum.A_CAMINHO,
-        TripBusStopModel.system_deleted == 0,  # Filtra apenas paradas não deletadas
-        StudentTripModel.status.in_(allowed_student_statuses),  # Verifica os status dos alunos
-        StudentTripModel.system_deleted == 0  # Filtra apenas student_trips não deletados
-    ).distinct().all()  # Usando distinct() para evitar duplicatas
+@router.get("/stops_on_the_way/{trip_id}", response_model=List[StopOnTheWay])
+def get_stops_on_the_way(trip_id: int, db: Session = Depends(get_db)):
+    # Paradas "A caminho" que ainda têm alunos com status permitido
+    stops_on_the_way = db.execute(STOPS_ON_THE_WAY, {"trip_id": trip_id}).all()
 
     if not stops_on_the_way:
         raise HTTPException(status_code=404, detail="Nenhuma parada no caminho encontrada")
@@ -165,43 +149,83 @@ def get_stops_on_the_way(trip_id: int, db: Session = Depends(get_db)):
     # Transformando o resultado para incluir o nome do ponto de ônibus
     result = [
         {
-            "trip_id": stop.trip_id,
-            "bus_stop_id": stop.bus_stop_id,
-            "status": stop.status,
-            "id": stop.id,
-            "name": stop.bus_stop.name  # Incluindo o nome do ponto de ônibus
-        } for stop in stops_on_the_way
+            "trip_id": stop_trip_id,
+            "bus_stop_id": bus_stop_id,
+            "status": status,
+            "id": stop_id,
+            "name": name  # Incluindo o nome do ponto de ônibus
+        } for stop_trip_id, bus_stop_id, status, stop_id, name in stops_on_the_way
     ]
 
     return result
 
 
+@router.get("/route_order/{trip_id}", response_model=List[dict])
+def get_route_order(trip_id: int, db: Session = Depends(get_db)):
+    # Todos os pontos da viagem com as coordenadas, em uma única consulta
+    trip_stops = db.execute(TRIP_STOPS_WITH_LOCATION, {"trip_id": trip_id}).all()
+
+    # Pontos com alunos que ainda serão buscados
+    waiting_stop_ids = set(db.execute(WAITING_STOP_IDS, {"trip_id": trip_id}).scalars())
+
+    by_bus_stop = {stop.bus_stop_id: (stop, bus_stop) for stop, bus_stop in trip_stops}
+    pending = [
+        stop.bus_stop_id for stop, _ in trip_stops
+        if stop.status == TripBusStopStatusEnum.A_CAMINHO and stop.bus_stop_id in waiting_stop_ids
+    ]
+    if not pending:
+        raise HTTPException(status_code=404, detail="Nenhuma parada no caminho encontrada")
+
+    # O percurso parte do próximo ponto já escolhido, do ponto atual ou do último ponto visitado
+    origin = (
+        find_stop([stop for stop, _ in trip_stops], TripBusStopStatusEnum.PROXIMO_PONTO)
+        or find_stop([stop for stop, _ in trip_stops], TripBusStopStatusEnum.NO_PONTO)
+        or max(
+            (stop for stop, _ in trip_stops if stop.status == TripBusStopStatusEnum.JA_PASSOU),
+            key=lambda stop: stop.update_date, default=None
+        )
+    )
+
+    located = tuple(sorted(
+        (bus_stop.id, bus_stop.latitude, bus_stop.longitude)
+        for _, bus_stop in by_bus_stop.values()
+        if bus_stop.latitude is not None and bus_stop.longitude is not None
+    ))
+    legs = route_orders.order(trip_id, located, origin.bus_stop_id if origin else None, pending)
+
+    # Pontos sem coordenadas ficam no fim, na ordem de criação
+    ordered_ids = {bus_stop_id for bus_stop_id, _ in legs}
+    legs += [(bus_stop_id, None) for bus_stop_id in pending if bus_stop_id not in ordered_ids]
+
+    return [
+        {
+            "trip_id": trip_id,
+            "bus_stop_id": bus_stop_id,
+            "status": by_bus_stop[bus_stop_id][0].status,
+            "id": by_bus_stop[bus_stop_id][0].id,
+            "name": by_bus_stop[bus_stop_id][1].name,
+            "latitude": by_bus_stop[bus_stop_id][1].latitude,
+            "longitude": by_bus_stop[bus_stop_id][1].longitude,
+            "distance": round(distance) if distance is not None else None
+        } for bus_stop_id, distance in legs
+    ]
+
+
 @router.put("/finalize_current_stop/{trip_id}", response_model=TripBusStop)
-def finalize_current_stop(trip_id: int, db: Session = Depends(get_db)):
-    # Obter o ponto atual com status "No ponto"
-    current_stop = db.query(TripBusStopModel).filter(
-        TripBusStopModel.trip_id == trip_id,
-        TripBusStopModel.status == TripBusStopStatusEnum.NO_PONTO,
-        TripBusStopModel.system_deleted == 0
-    ).first()
+def finalize_current_stop(trip_id: int, db: Session = Depends(get_transaction)):
+    stops = load_route(db, trip_id)
 
+    # Obter o ponto atual com status "No ponto"
+    current_stop = find_stop(stops, TripBusStopStatusEnum.NO_PONTO)
     if not current_stop:
         raise HTTPException(status_code=404, detail="Nenhuma parada de ônibus com status 'No ponto' encontrada")
 
     # Verificar se há alunos com status "Em aula" ou "Aguardando no ponto" no ponto atual
-    students_in_current_stop = db.query(StudentTripModel).filter(
-        StudentTripModel.trip_id == trip_id,
-        StudentTripModel.point_id == current_stop.bus_stop_id,
-        StudentTripModel.status.in_([StudentStatusEnum.AGUARDANDO_NO_PONTO, StudentStatusEnum.EM_AULA])
-    ).all()
-
-    if students_in_current_stop:
-        print(f"Alunos aguardando ou em aula: {students_in_current_stop}")
+    if students_waiting(db, trip_id, current_stop.bus_stop_id):
         raise HTTPException(status_code=400, detail="Não é possível finalizar a parada enquanto há alunos aguardando na parada atual")
 
     # Definir o status do ponto atual como "Já passou"
     current_stop.status = TripBusStopStatusEnum.JA_PASSOU
-    db.commit()
-    db.refresh(current_stop)
-
-    return current_stop
+    current_stop_id = current_stop.id
+    state = flush_route(db, trip_id, stops)
+    return next(stop for stop in state.stops if stop.id == current_stop_id)
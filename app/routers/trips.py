@@ -6,35 +6,55 @@ from ..models.trip import Trip as TripModel, TripTypeEnum, TripStatusEnum
 from ..models.student_trip import StudentTrip as StudentTripModel, StudentStatusEnum
 from ..models.trip_bus_stop import TripBusStop, TripBusStopStatusEnum
 from ..models.bus_stop import BusStop
-from ..schemas.trip import Trip, TripCreate
+from ..schemas.trip import Trip, TripChanges, TripCreate, TripStudentDetail
+from ..schemas.trip_position import TripPosition, TripPositionPing
+from ..services.positions import trip_positions
+from ..services.stop_history import estimate_arrivals
+from ..services.archive import trip_models
+from ..services.active_trips import active_trips
+from ..services.ridership import record_trip_ridership
+from ..services.idempotency import IdempotentRoute, idempotency_key
+from ..services.coalescing import read_coalescer
+from ..services.queries import TRIP_CHANGED_STOPS, TRIP_CHANGED_STUDENTS, TRIP_DETAILS, TRIP_STOPS_WITH_RIDERS
+from ..models.trip_bus_stop_transition import TripBusStopTransition
+from ..models.stop_travel_stat import StopTravelStat
+from ..models.archive import StudentTripArchive
 from ..models.bus import Bus
+from ..services.replicas import get_read_db
+from ..services.unit_of_work import get_transaction, on_commit
+from ..services.devices import notify_trip, subscribe_to_trip
+from ..services.state_machine import complete_trip
 
 
 router = APIRouter(
     prefix="/trips",
-    tags=["Trips"]
+    tags=["Trips"],
+    route_class=IdempotentRoute
 )
 
+read_coalescer.register("trip_bus_stops", [
+    model.__tablename__ for model in (TripModel, BusStop, TripBusStop, StudentTripModel, StudentTripArchive,
+                                      TripBusStopTransition, StopTravelStat)
+])
+
 @router.put("/{trip_id}/report_bus_issue", response_model=Trip)
-def report_bus_issue(trip_id: int, db: Session = Depends(get_db)):
+def report_bus_issue(trip_id: int, db: Session = Depends(get_transaction)):
     trip = db.query(TripModel).filter(TripModel.id == trip_id).first()
     if not trip:
         raise HTTPException(status_code=404, detail="Viagem não encontrada")
 
     trip.bus_issue = not trip.bus_issue  # Alterna o estado do problema do ônibus
-    db.commit()
-    db.refresh(trip)
+    db.flush()
+    if trip.bus_issue:
+        # Aviso à viagem inteira: um único envio ao tópico, e não um por aluno
+        notify_trip(db, trip_id, "Ônibus com problema", "O ônibus da sua viagem está com problema. Aguarde novas informações.")
     return trip
 
-@router.post("/", response_model=Trip)
-def create_trip(trip: TripCreate, db: Session = Depends(get_db)):
-    active_trip = db.query(TripModel).filter(
-        (TripModel.bus_id == trip.bus_id) | (TripModel.driver_id == trip.driver_id),
-        TripModel.status == TripStatusEnum.ATIVA,
-        TripModel.system_deleted == int(False)
-    ).first()
-
-    if active_trip:
+@router.post("/", response_model=Trip, dependencies=[Depends(idempotency_key)])
+def create_trip(trip: TripCreate, db: Session = Depends(get_transaction)):
+    # A versão é conferida antes da verificação, que não pode usar dados de outra instância desatualizados
+    active_trips.sync(db, force=True)
+    if active_trips.has_conflict(trip.bus_id, trip.driver_id):
         raise HTTPException(status_code=400, detail="Já existe uma viagem ativa com este ônibus ou motorista.")
 
     db_trip = TripModel(
@@ -44,12 +64,11 @@ def create_trip(trip: TripCreate, db: Session = Depends(get_db)):
         driver_id=trip.driver_id
     )
     db.add(db_trip)
-    db.commit()
-    db.refresh(db_trip)
+    db.flush()
     return db_trip
 
-@router.put("/{trip_id}/finalize_outbound_trip")
-def finalizar_viagem_ida(trip_id: int, db: Session = Depends(get_db)):
+@router.put("/{trip_id}/finalize_outbound_trip", dependencies=[Depends(idempotency_key)])
+def finalizar_viagem_ida(trip_id: int, db: Session = Depends(get_transaction)):
     trip = db.query(TripModel).filter(TripModel.id == trip_id).first()
     if not trip:
         raise HTTPException(status_code=404, detail="Viagem não encontrada")
@@ -57,8 +76,11 @@ def finalizar_viagem_ida(trip_id: int, db: Session = Depends(get_db)):
     if trip.status != TripStatusEnum.ATIVA or trip.trip_type != TripTypeEnum.IDA:
         raise HTTPException(status_code=400, detail="A viagem não é uma viagem de ida ativa.")
 
-    trip.status = TripStatusEnum.CONCLUIDA
-    db.commit()
+    if complete_trip(db, trip_id, TripTypeEnum.IDA) is None:
+        raise HTTPException(status_code=409, detail="A viagem já foi finalizada por outra requisição")
+    # Totais de relatório somados na mesma transação da conclusão
+    record_trip_ridership(db, trip)
+    on_commit(db, trip_positions.close, trip_id)
 
     # Create return trip
     return_trip = TripModel(
@@ -68,41 +90,45 @@ def finalizar_viagem_ida(trip_id: int, db: Session = Depends(get_db)):
         driver_id=trip.driver_id
     )
     db.add(return_trip)
-    db.commit()
-    db.refresh(return_trip)
+    db.flush()
 
+    # Volta, alunos e pontos são gravados juntos no commit da requisição: uma falha no
+    # meio não deixa a ida concluída sem a volta
     student_trips = db.query(StudentTripModel).filter(StudentTripModel.trip_id == trip.id).all()
+    return_stop_ids = set()
     for student_trip in student_trips:
         if student_trip.status == StudentStatusEnum.FILA_DE_ESPERA:
             student_trip.status = StudentStatusEnum.FILA_DE_ESPERA
         else:
             student_trip.status = StudentStatusEnum.EM_AULA
-        db.commit()
 
         db_student_trip = StudentTripModel(
             trip_id=return_trip.id,
             student_id=student_trip.student_id,
             status=student_trip.status, 
-            point_id=student_trip.point_id
+            point_id=student_trip.point_id,
+            # A fila de espera da volta mantém a ordem da ida
+            waitlist_position=student_trip.waitlist_position
         )
         db.add(db_student_trip)
-        db.commit()
-        db.refresh(db_student_trip)
+        # O contador da fila da volta continua depois das posições copiadas
+        return_trip.waitlist_tail = max(return_trip.waitlist_tail or 0, student_trip.waitlist_position or 0)
 
         # Add trip bus stops for return trip
-        trip_bus_stop = db.query(TripBusStop).filter(
-            TripBusStop.trip_id == return_trip.id,
-            TripBusStop.bus_stop_id == student_trip.point_id
-        ).first()
-        if not trip_bus_stop:
-            new_trip_bus_stop = TripBusStop(
+        if student_trip.point_id not in return_stop_ids:
+            return_stop_ids.add(student_trip.point_id)
+            db.add(TripBusStop(
                 trip_id=return_trip.id,
                 bus_stop_id=student_trip.point_id,
                 status=TripBusStopStatusEnum.A_CAMINHO
-            )
-            db.add(new_trip_bus_stop)
-            db.commit()
-            db.refresh(new_trip_bus_stop)
+            ))
+    db.flush()
+
+    # Os alunos foram levados para a volta: os aparelhos entram no tópico da volta e só
+    # saem do da ida depois do aviso de finalização, na mesma tarefa do envio
+    student_ids = [student_trip.student_id for student_trip in student_trips]
+    notify_trip(db, trip.id, "Viagem finalizada", "A viagem de ida foi finalizada.", unsubscribe_user_ids=student_ids)
+    subscribe_to_trip(db, student_ids, return_trip.id)
 
     response = {
         "trip": {
@@ -122,7 +148,7 @@ def finalizar_viagem_ida(trip_id: int, db: Session = Depends(get_db)):
     return response
 
 @router.get("/", response_model=List[Trip])
-def read_trips(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_trips(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     trips = db.query(TripModel).offset(skip).limit(limit).all()
     return trips
 
@@ -134,16 +160,16 @@ def read_trip(trip_id: int, db: Session = Depends(get_db)):
     return trip
 
 @router.delete("/{trip_id}", response_model=dict)
-def delete_trip(trip_id: int, db: Session = Depends(get_db)):
+def delete_trip(trip_id: int, db: Session = Depends(get_transaction)):
     trip = db.query(TripModel).filter(TripModel.id == trip_id).first()
     if not trip:
         raise HTTPException(status_code=404, detail="Viagem não encontrada")
     trip.system_deleted = int(True)
-    db.commit()
+    on_commit(db, trip_positions.close, trip_id)
     return {"status": "excluída"}
 
-@router.put("/{trip_id}/finalize_return_trip", response_model=Trip)
-def finalizar_viagem_volta(trip_id: int, db: Session = Depends(get_db)):
+@router.put("/{trip_id}/finalize_return_trip", response_model=Trip, dependencies=[Depends(idempotency_key)])
+def finalizar_viagem_volta(trip_id: int, db: Session = Depends(get_transaction)):
     
     trip = db.query(TripModel).filter(TripModel.id == trip_id).first()
     print(f"Viagem encontrada: {trip}")
@@ -166,9 +192,12 @@ def finalizar_viagem_volta(trip_id: int, db: Session = Depends(get_db)):
 
     if not bus_stops:
         print("Nenhuma parada de ônibus encontrada, finalizando viagem")
-        trip.status = TripStatusEnum.CONCLUIDA
-        db.commit()
-        db.refresh(trip)
+        if complete_trip(db, trip_id, TripTypeEnum.VOLTA) is None:
+            raise HTTPException(status_code=409, detail="A viagem já foi finalizada por outra requisição")
+        record_trip_ridership(db, trip)
+        db.flush()
+        on_commit(db, trip_positions.close, trip_id)
+        notify_trip(db, trip_id, "Viagem finalizada", "A viagem de volta foi finalizada.")
         print(f"Viagem {trip_id} concluída")
         return trip
 
@@ -196,90 +225,148 @@ def finalizar_viagem_volta(trip_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Ainda há alunos presentes ou aguardando no ponto")
 
     print("Nenhuma parada de ônibus com alunos presentes, finalizando viagem")
-    trip.status = TripStatusEnum.CONCLUIDA
-    db.commit()
-    db.refresh(trip)
+    if complete_trip(db, trip_id, TripTypeEnum.VOLTA) is None:
+        raise HTTPException(status_code=409, detail="A viagem já foi finalizada por outra requisição")
+    record_trip_ridership(db, trip)
+    db.flush()
+    on_commit(db, trip_positions.close, trip_id)
+    notify_trip(db, trip_id, "Viagem finalizada", "A viagem de volta foi finalizada.")
     print(f"Viagem {trip_id} concluída")
     return trip
 
+@router.post("/{trip_id}/position", response_model=TripPosition)
+def record_trip_position(trip_id: int, ping: TripPositionPing, db: Session = Depends(get_db)):
+    # Cada envio confere a viagem no registro de viagens ativas, em memória (a versão é
+    # lida no banco no máximo uma vez por segundo): uma viagem encerrada por outro worker
+    # deixa de aceitar posições aqui e o buffer deste worker é descartado
+    active_trips.sync(db)
+    if not active_trips.trip(trip_id):
+        trip_positions.close(trip_id)
+        raise HTTPException(status_code=404, detail="Viagem ativa não encontrada")
+
+    return trip_positions.record(
+        trip_id, ping.latitude, ping.longitude, ping.speed, ping.heading, ping.recorded_at
+    )
+
+@router.get("/{trip_id}/position", response_model=TripPosition)
+def get_trip_position(trip_id: int, db: Session = Depends(get_read_db)):
+    # Última posição recebida, lida da memória; o banco só é consultado quando este
+    # worker não recebeu as posições da viagem. O registro de viagens ativas (sem nova
+    # consulta: a sessão pode ser de uma réplica) descarta o buffer de uma viagem encerrada
+    if not active_trips.trip(trip_id):
+        trip_positions.close(trip_id)
+    position = trip_positions.latest(trip_id, db)
+    if not position:
+        raise HTTPException(status_code=404, detail="Nenhuma posição registrada para esta viagem")
+    return position
+
 @router.get("/active/{driver_id}", response_model=Trip)
 def check_active_trip(driver_id: int, db: Session = Depends(get_db)):
-    active_trip = db.query(TripModel).filter(
-        TripModel.driver_id == driver_id,
-        TripModel.status == TripStatusEnum.ATIVA,
-        TripModel.system_deleted == 0
-    ).first()
+    active_trips.sync(db)
+    active_trip = active_trips.driver_trip(driver_id)
 
     if not active_trip:
         raise HTTPException(status_code=404, detail="Nenhuma viagem ativa encontrada para este motorista.")
     
     return active_trip
 
-@router.get("/{trip_id}/details", response_model=List[dict])
-def get_trip_student_details(trip_id: int, db: Session = Depends(get_db)):
-    trip_details = db.query(StudentTripModel)\
-        .options(
-            joinedload(StudentTripModel.student), 
-            joinedload(StudentTripModel.bus_stop)
-        )\
-        .filter(
-            StudentTripModel.trip_id == trip_id, 
-            StudentTripModel.system_deleted == 0
-        ).all()
+@router.get("/{trip_id}/details", response_model=List[TripStudentDetail])
+def get_trip_student_details(trip_id: int, db: Session = Depends(get_read_db)):
+    # Viagens concluídas antigas são lidas das tabelas de arquivo
+    for model in (StudentTripModel, StudentTripArchive):
+        trip_details = db.execute(TRIP_DETAILS[model], {"trip_id": trip_id}).all()
+        if trip_details:
+            break
     
     if not trip_details:
         raise HTTPException(status_code=404, detail="Nenhum detalhe de viagem de estudante encontrado para esta viagem")
 
     result = [
         {
-            "student_name": detail.student.name,
-            "bus_stop_name": detail.bus_stop.name,
-            "student_status": StudentStatusEnum(detail.status).label(),
-            "profile_picture": detail.student.profile_picture
-        } for detail in trip_details
+            "student_name": student_name,
+            "bus_stop_name": bus_stop_name,
+            "student_status": StudentStatusEnum(status).label(),
+            "profile_picture": profile_picture
+        } for student_name, bus_stop_name, status, profile_picture in trip_details
     ] 
 
     return result
 
-@router.get("/{trip_id}/bus_stops", response_model=dict)
-def get_trip_bus_stops(trip_id: int, db: Session = Depends(get_db)):
+@router.get("/{trip_id}/changes", response_model=TripChanges)
+def get_trip_changes(trip_id: int, since: int = 0, db: Session = Depends(get_read_db)):
+    # Só os alunos e pontos alterados depois do cursor do cliente (o seq da resposta
+    # anterior). Sem cursor, ou se uma linha foi removida depois dele, a resposta é
+    # completa (full). O seq é lido antes das linhas: uma alteração confirmada entre as
+    # duas leituras pode vir de novo na próxima consulta, mas nunca é perdida
     trip = db.query(TripModel).filter(TripModel.id == trip_id).first()
     if not trip:
         raise HTTPException(status_code=404, detail="Viagem não encontrada")
 
-    # Lista de status permitidos para os alunos
-    allowed_student_statuses = [
-        StudentStatusEnum.PRESENTE,
-        StudentStatusEnum.EM_AULA,
-        StudentStatusEnum.AGUARDANDO_NO_PONTO
+    full = since <= trip.reset_seq
+    changes = {"trip_id": trip_id, "seq": trip.change_seq, "full": full, "students": [], "bus_stops": []}
+    if not full and since >= trip.change_seq:
+        return changes
+
+    models = trip_models(trip)
+    parameters = {"trip_id": trip_id, "since": -1 if full else since}
+    changes["students"] = [
+        {
+            "id": student_trip_id,
+            "student_name": student_name,
+            "bus_stop_name": bus_stop_name,
+            "student_status": StudentStatusEnum(status).label(),
+            "profile_picture": profile_picture,
+            "deleted": bool(system_deleted),
+            "change_seq": change_seq
+        } for student_trip_id, student_name, bus_stop_name, status, profile_picture, system_deleted, change_seq
+        in db.execute(TRIP_CHANGED_STUDENTS[models], parameters)
+    ]
+    changes["bus_stops"] = [
+        {
+            "id": trip_bus_stop_id,
+            "bus_stop_id": bus_stop_id,
+            "bus_stop_name": name,
+            "status": TripBusStopStatusEnum(status).label(),
+            "deleted": bool(system_deleted),
+            "change_seq": change_seq
+        } for trip_bus_stop_id, bus_stop_id, name, status, system_deleted, change_seq
+        in db.execute(TRIP_CHANGED_STOPS[models], parameters)
     ]
+    return changes
 
-    # Consulta para buscar as paradas de ônibus que possuem alunos com status permitido e o mesmo trip_id
-    bus_stops = db.query(
-        BusStop.name,
-        TripBusStop.status
-    ).join(
-        TripBusStop, BusStop.id == TripBusStop.bus_stop_id
-    ).join(
-        StudentTripModel, StudentTripModel.point_id == TripBusStop.bus_stop_id
-    ).filter(
-        TripBusStop.trip_id == trip_id,  # Garante que o trip_id seja o mesmo em TripBusStop
-        StudentTripModel.trip_id == trip_id,  # Garante que o trip_id seja o mesmo em StudentTripModel
-        TripBusStop.system_deleted == 0,  # Filtra apenas paradas não deletadas
-        StudentTripModel.status.in_(allowed_student_statuses),  # Verifica os status dos alunos
-        StudentTripModel.system_deleted == 0  # Filtra apenas student_trips não deletados
-    ).distinct().all()  # Usando distinct() para evitar duplicatas
+@router.get("/{trip_id}/bus_stops", response_model=dict)
+def get_trip_bus_stops(trip_id: int, db: Session = Depends(get_db)):
+    # Todos os alunos da viagem atualizam esta tela quando o ônibus chega a um ponto:
+    # as requisições simultâneas dividem uma única consulta
+    return read_coalescer.run("trip_bus_stops", (trip_id,), lambda: _trip_bus_stops(trip_id, db))
+
+def _trip_bus_stops(trip_id: int, db: Session) -> dict:
+    trip = db.query(TripModel).filter(TripModel.id == trip_id).first()
+    if not trip:
+        raise HTTPException(status_code=404, detail="Viagem não encontrada")
+
+    # Pontos com alunos a bordo ou aguardando; viagens arquivadas são lidas das tabelas de arquivo
+    bus_stops = db.execute(TRIP_STOPS_WITH_RIDERS[trip_models(trip)], {"trip_id": trip_id}).all()
 
     if not bus_stops:
         raise HTTPException(status_code=404, detail="Nenhuma parada de ônibus encontrada para esta viagem")
 
+    # Previsão de chegada (em segundos) dos pontos ainda não visitados
+    estimates = estimate_arrivals(db, trip_id, [(bus_stop_id, status) for _, status, bus_stop_id in bus_stops])
+
     return {
         "bus_issue": trip.bus_issue,  # Flag de problema no ônibus
-        "bus_stops": [{"name": name, "status": TripBusStopStatusEnum(status).label()} for name, status in bus_stops]
+        "bus_stops": [
+            {
+                "name": name,
+                "status": TripBusStopStatusEnum(status).label(),
+                "eta_seconds": estimates.get(bus_stop_id)
+            } for name, status, bus_stop_id in bus_stops
+        ]
     }
 
 @router.delete("/{trip_id}/cancel", response_model=dict)
-def cancel_trip(trip_id: int, db: Session = Depends(get_db)):
+def cancel_trip(trip_id: int, db: Session = Depends(get_transaction)):
     # Verificar se a viagem existe
     trip = db.query(TripModel).filter(TripModel.id == trip_id).first()
     if not trip:
@@ -302,6 +389,6 @@ def cancel_trip(trip_id: int, db: Session = Depends(get_db)):
 
     # Marcar a viagem como cancelada (atualizar o campo system_deleted)
     trip.system_deleted = 1
-    db.commit()
+    on_commit(db, trip_positions.close, trip_id)
 
     return {"status": "Viagem cancelada com sucesso"}
@@ -6,6 +6,9 @@ from typing import List
 from ..models.user import User as UserModel
 from ..schemas.user import User, UserCreate, UserUpdate, UserProfilePicture
 from ..schemas import User as UserSchema
+from ..services.background import background_jobs
+from ..services.replicas import get_read_db
+from ..services.unit_of_work import get_transaction, on_commit
 from smtplib import SMTP
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -14,11 +17,15 @@ import os
 
 load_dotenv()
 
+# Evita que um servidor SMTP lento segure a thread da fila além do prazo de desligamento
+SMTP_TIMEOUT_SECONDS = 10
+
 router = APIRouter(
     prefix="/users",
     tags=["Users"]
 )
 
+@background_jobs.register("welcome_email")
 def send_welcome_email(recipient_email: str, user_type: str):
     smtp_server = os.getenv('SMTP_SERVER')
     smtp_port = int(os.getenv('SMTP_PORT'))
@@ -42,8 +49,9 @@ Equipe Buzz"""
     msg['Subject'] = subject
     msg.attach(MIMEText(body, 'plain'))
 
+    server = None
     try:
-        server = SMTP(smtp_server, smtp_port)
+        server = SMTP(smtp_server, smtp_port, timeout=SMTP_TIMEOUT_SECONDS)
         server.starttls()
         server.login(smtp_user, smtp_password)
         server.sendmail(smtp_user, recipient_email, msg.as_string())
@@ -51,10 +59,11 @@ Equipe Buzz"""
     except Exception as e:
         print(f"Erro ao enviar e-mail: {e}")
     finally:
-        server.quit()
+        if server:
+            server.quit()
 
 @router.post("/", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+def create_user(user: schemas.UserCreate, db: Session = Depends(get_transaction)):
     db_user = db.query(UserModel).filter(
         ((UserModel.email == user.email) | 
          (UserModel.cpf == user.cpf))
@@ -76,8 +85,7 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
             db_user.faculty_id = user.faculty_id
             db_user.user_type_id = user.user_type_id
             db_user.set_password(user.password)
-            db.commit()
-            db.refresh(db_user)
+            db.flush()
             return db_user
 
     # Cria um novo usuário
@@ -92,19 +100,19 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     )
     new_user.set_password(user.cpf)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    db.flush()
 
     # Determinar o tipo de usuário
     user_type = "Motorista" if user.user_type_id == 2 else "Aluno"
     
-    # Enviar email de boas-vindas
-    send_welcome_email(user.email, user_type)
+    # Enviar email de boas-vindas fora da requisição, depois do commit do cadastro; a fila
+    # grava o envio no banco se o worker for desligado antes de concluí-lo
+    on_commit(db, background_jobs.submit, "welcome_email", recipient_email=user.email, user_type=user_type)
 
     return new_user
 
 @router.get("/", response_model=List[schemas.User])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     users = db.query(UserModel).filter(UserModel.system_deleted == 0).offset(skip).limit(limit).all()
     
     # Remove a foto de perfil de cada usuário na lista
@@ -144,7 +152,7 @@ def read_user_with_picture(user_id: int, db: Session = Depends(get_db)):
     return user
 
 @router.put("/{user_id}", response_model=schemas.User)
-def update_user(user_id: int, user: schemas.UserUpdate, db: Session = Depends(get_db)):
+def update_user(user_id: int, user: schemas.UserUpdate, db: Session = Depends(get_transaction)):
     db_user = db.query(UserModel).filter(UserModel.id == user_id, UserModel.system_deleted == 0).first()
     if not db_user:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
@@ -154,36 +162,34 @@ def update_user(user_id: int, user: schemas.UserUpdate, db: Session = Depends(ge
                 db_user.set_password(value)
             else:
                 setattr(db_user, var, value)  # Atualiza o campo `name` se ele estiver no payload
-    db.commit()
+    db.flush()
     return db_user
 
 
 @router.put("/{user_id}/profile-picture", response_model=schemas.User)
-def update_profile_picture(user_id: int, profile_picture: schemas.UserProfilePicture, db: Session = Depends(get_db)):
+def update_profile_picture(user_id: int, profile_picture: schemas.UserProfilePicture, db: Session = Depends(get_transaction)):
     db_user = db.query(UserModel).filter(UserModel.id == user_id, UserModel.system_deleted == 0).first()
     if not db_user:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     db_user.profile_picture = profile_picture.picture
-    db.commit()
+    db.flush()
     return db_user
 
 @router.delete("/{user_id}", response_model=dict)
-def delete_user(user_id: int, db: Session = Depends(get_db)):
+def delete_user(user_id: int, db: Session = Depends(get_transaction)):
     db_user = db.query(UserModel).filter(UserModel.id == user_id).first()
     if not db_user:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     db_user.system_deleted = 1
-    db.commit()
     return {"ok": True}
 
 @router.delete("/{user_id}/profile-picture", response_model=schemas.User)
-def delete_profile_picture(user_id: int, db: Session = Depends(get_db)):
+def delete_profile_picture(user_id: int, db: Session = Depends(get_transaction)):
     db_user = db.query(UserModel).filter(UserModel.id == user_id, UserModel.system_deleted == 0).first()
     if not db_user:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
 
     db_user.profile_picture = None
-    db.commit()
-    db.refresh(db_user)
+    db.flush()
     return db_user
@@ -46,3 +46,12 @@ class BusInDBBase(BusBase):
 
 class Bus(BusInDBBase):
     pass
+
+class ActiveBus(BaseModel):
+    bus_id: int
+    trip_id: int
+    registration_number: str
+    name: str
+    capacity: int
+    trip_type: str
+    available_seats: int
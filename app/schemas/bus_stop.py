@@ -5,6 +5,8 @@ from typing import Optional
 class BusStopBase(BaseModel):
     name: str
     faculty_id: int
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
     @field_validator("name", mode="before")
     def name_must_not_be_empty(cls, value):
@@ -18,6 +20,8 @@ class BusStopCreate(BusStopBase):
 class BusStopUpdate(BaseModel):
     name: Optional[str] = None
     faculty_id: int
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
     @field_validator("name", mode="before")
     def name_must_not_be_empty(cls, value):
@@ -32,3 +36,8 @@ class BusStop(BusStopBase):
     create_date: datetime
 
     model_config = ConfigDict(from_attributes=True)
+
+class TripBusStopOption(BaseModel):
+    id: int
+    name: str
+    status: str
@@ -0,0 +1,16 @@
+from pydantic import BaseModel, ConfigDict
+from datetime import date
+
+class RidershipCounts(BaseModel):
+    trips: int
+    riders: int
+    waitlisted: int
+    not_returning: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+class RidershipTotal(RidershipCounts):
+    key_id: int
+
+class RidershipDay(RidershipCounts):
+    day: date
@@ -24,6 +24,7 @@ class StudentTripUpdate(BaseModel):
 
 class StudentTripInDBBase(StudentTripBase):
     id: int
+    waitlist_position: Optional[int] = None
     system_deleted: int
     update_date: datetime
     create_date: datetime
@@ -32,3 +33,9 @@ class StudentTripInDBBase(StudentTripBase):
 
 class StudentTrip(StudentTripInDBBase):
     pass
+
+class WaitlistPosition(BaseModel):
+    student_trip_id: int
+    trip_id: int
+    position: int  # 1 é o próximo a receber uma vaga
+    waiting: int
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from ..models.trip import TripTypeEnum, TripStatusEnum
 
@@ -34,3 +34,33 @@ class TripInDBBase(TripBase):
 
 class Trip(TripInDBBase):
     pass
+
+class TripStudentDetail(BaseModel):
+    student_name: str
+    bus_stop_name: str
+    student_status: str
+    profile_picture: Optional[str] = None
+
+class TripStudentChange(BaseModel):
+    id: int
+    student_name: str
+    bus_stop_name: str
+    student_status: str
+    profile_picture: Optional[str] = None
+    deleted: bool
+    change_seq: int
+
+class TripBusStopChange(BaseModel):
+    id: int
+    bus_stop_id: int
+    bus_stop_name: str
+    status: str
+    deleted: bool
+    change_seq: int
+
+class TripChanges(BaseModel):
+    trip_id: int
+    seq: int  # Cursor para a próxima consulta (since)
+    full: bool  # True: a lista é completa e substitui a que o cliente tem
+    students: List[TripStudentChange]
+    bus_stops: List[TripBusStopChange]
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, ConfigDict
 from enum import Enum
-from typing import Optional
+from typing import List, Optional
 
 class TripBusStopStatusEnum(int, Enum):
     A_CAMINHO = 1
@@ -8,6 +8,7 @@ class TripBusStopStatusEnum(int, Enum):
     PROXIMO_PONTO = 3
     JA_PASSOU = 4
     ONIBUS_COM_PROBLEMA = 5
+    DESENBARQUE = 6
 
 class TripBusStopBase(BaseModel):
     trip_id: int
@@ -26,5 +27,18 @@ class TripBusStopUpdate(BaseModel):
 
 class TripBusStop(TripBusStopBase):
     id: int
+    version: int = 0
 
     model_config = ConfigDict(from_attributes=True, use_enum_values=True)
+
+
+class StopOnTheWay(TripBusStopBase):
+    id: int
+    name: str
+
+
+class RouteState(BaseModel):
+    trip_id: int
+    current_stop: Optional[TripBusStop] = None
+    next_stop: Optional[TripBusStop] = None
+    stops: List[TripBusStop]
@@ -0,0 +1,18 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+
+class TripPositionPing(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    speed: Optional[float] = Field(None, ge=0)
+    heading: Optional[float] = Field(None, ge=0, lt=360)
+    recorded_at: Optional[datetime] = None
+
+class TripPosition(BaseModel):
+    trip_id: int
+    latitude: float
+    longitude: float
+    speed: Optional[float] = None
+    heading: Optional[float] = None
+    recorded_at: datetime
@@ -1,9 +1,15 @@
 from pydantic import BaseModel, EmailStr, field_validator, ConfigDict
+from functools import lru_cache
 from typing import Optional
 import phonenumbers
 import re
 
+# Telefones e CPFs já verificados: o mesmo valor enviado de novo (cadastro repetido,
+# atualização do perfil) não passa outra vez pelo phonenumbers
+VALIDATION_CACHE_SIZE = 4096
+
 # Função para validar o CPF
+@lru_cache(maxsize=VALIDATION_CACHE_SIZE)
 def validate_cpf(cpf: str) -> bool:
     cpf = re.sub(r'\D', '', cpf)
     if len(cpf) != 11:
@@ -17,7 +23,30 @@ def validate_cpf(cpf: str) -> bool:
             return False
     return True
 
-# Modelo base para o usuário
+@lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def phone_error(phone: str) -> Optional[str]:
+    # Mensagem de erro do telefone, ou None quando é válido
+    try:
+        phone_number = phonenumbers.parse(phone, "BR")
+    except phonenumbers.phonenumberutil.NumberParseException:
+        return "Formato de número de telefone inválido"
+    if not phonenumbers.is_valid_number(phone_number):
+        return "Número de telefone inválido"
+    return None
+
+def check_phone(v):
+    if v:
+        error = phone_error(v)
+        if error:
+            raise ValueError(error)
+    return v
+
+def check_cpf(v):
+    if v and not validate_cpf(v):
+        raise ValueError("CPF inválido")
+    return v
+
+# Modelo base para o usuário (entrada)
 class UserBase(BaseModel):
     email: Optional[EmailStr] = None
     name: Optional[str] = None
@@ -29,21 +58,12 @@ class UserBase(BaseModel):
     # Validador de telefone
     @field_validator('phone')
     def validate_phone(cls, v):
-        if v:
-            try:
-                phone_number = phonenumbers.parse(v, "BR")
-                if not phonenumbers.is_valid_number(phone_number):
-                    raise ValueError("Número de telefone inválido")
-            except phonenumbers.phonenumberutil.NumberParseException:
-                raise ValueError("Formato de número de telefone inválido")
-        return v
+        return check_phone(v)
 
     # Validador de CPF
     @field_validator('cpf')
     def validate_cpf(cls, v):
-        if v and not validate_cpf(v):
-            raise ValueError("CPF inválido")
-        return v
+        return check_cpf(v)
 
 # Modelo para criação de um usuário
 class UserCreate(UserBase):
@@ -66,33 +86,28 @@ class UserUpdate(BaseModel):
     # Validador de telefone para atualização
     @field_validator('phone', check_fields=False)
     def validate_phone(cls, v):
-        if v:
-            try:
-                phone_number = phonenumbers.parse(v, "BR")
-                if not phonenumbers.is_valid_number(phone_number):
-                    raise ValueError("Número de telefone inválido")
-            except phonenumbers.phonenumberutil.NumberParseException:
-                raise ValueError("Formato de número de telefone inválido")
-        return v
+        return check_phone(v)
 
     # Validador de CPF para atualização
     @field_validator('cpf', check_fields=False)
     def validate_cpf(cls, v):
-        if v and not validate_cpf(v):
-            raise ValueError("CPF inválido")
-        return v
+        return check_cpf(v)
 
 # Modelo para foto de perfil do usuário
 class UserProfilePicture(BaseModel):
     picture: str
 
-# Modelo base de usuário no banco de dados
-class UserInDBBase(UserBase):
-    id: int
-    email: EmailStr
+# Modelo base de usuário no banco de dados (saída). Não herda de UserBase: os dados já
+# foram validados na entrada, e a resposta não repete o parse do telefone, os dígitos
+# do CPF e a validação do e-mail de cada usuário da lista
+class UserInDBBase(BaseModel):
+    email: str
     name: str
     cpf: str
     phone: str
+    faculty_id: Optional[int] = None
+    device_token: Optional[str] = None
+    id: int
     user_type_id: int
     profile_picture: Optional[str] = None
     faculty_name: Optional[str] = None  
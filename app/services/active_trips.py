@@ -0,0 +1,285 @@
+import threading
+import time
+from itertools import chain
+from sqlalchemy import event, inspect, insert, select, update
+from sqlalchemy.orm import Session
+from ..models.cache_version import CacheVersion
+from ..models.trip import Trip as TripModel, TripStatusEnum
+from ..models.student_trip import StudentTrip as StudentTripModel
+
+CACHE_NAME = "active_trips"
+# Intervalo máximo em que uma consulta confia na versão já conhecida; alterações feitas
+# por esta instância aparecem na hora, as feitas por outras instâncias em até 1 s
+VERSION_CHECK_SECONDS = 1.0
+# Recarga completa periódica: cobre uma instância que caiu entre o commit e o incremento
+RELOAD_SECONDS = 60.0
+# Chave em session.info com as viagens e alunos alterados na transação, publicados após o commit
+PENDING_KEY = "active_trips_pending"
+# Campos de StudentTrip que mudam o índice por aluno (alterações de status não mudam)
+STUDENT_TRIP_KEYS = ("trip_id", "student_id", "system_deleted")
+
+
+class ActiveTrip:
+    # Mesmos campos do schema Trip, para servir as respostas direto da memória
+    __slots__ = ("id", "trip_type", "status", "bus_id", "driver_id", "bus_issue",
+                 "system_deleted", "update_date", "create_date")
+
+    def __init__(self, trip):
+        for field in self.__slots__:
+            setattr(self, field, getattr(trip, field))
+
+
+class ActiveStudentTrip:
+    __slots__ = ("id", "trip_id", "student_id")
+
+    def __init__(self, student_trip):
+        self.id = student_trip.id
+        self.trip_id = student_trip.trip_id
+        self.student_id = student_trip.student_id
+
+
+def read_version(db: Session) -> int:
+    return db.query(CacheVersion.version).filter(CacheVersion.name == CACHE_NAME).scalar() or 0
+
+def ensure_version(db: Session):
+    # Cria a linha do contador na inicialização, antes das primeiras escritas
+    if not db.get(CacheVersion, CACHE_NAME):
+        db.add(CacheVersion(name=CACHE_NAME, version=0))
+        db.commit()
+
+def bump_version(connection) -> int:
+    # Incrementa a versão numa transação curta, depois do commit da escrita: a linha fica
+    # travada só durante o incremento, não durante as transações das rotas
+    version = connection.execute(
+        update(CacheVersion.__table__).where(CacheVersion.name == CACHE_NAME)
+        .values(version=CacheVersion.version + 1).returning(CacheVersion.version)
+    ).scalar()
+    if version is None:
+        connection.execute(insert(CacheVersion.__table__).values(name=CACHE_NAME, version=1))
+        version = 1
+    return version
+
+
+class ActiveTripRegistry:
+    # Viagens ativas (e os alunos vinculados) indexadas por motorista, ônibus e aluno
+    def __init__(self, check_seconds: float = VERSION_CHECK_SECONDS, reload_seconds: float = RELOAD_SECONDS):
+        self.check_seconds = check_seconds
+        self.reload_seconds = reload_seconds
+        self._lock = threading.RLock()
+        self._publish_lock = threading.Lock()
+        self._bind = None
+        self._version = None
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+        self._clear()
+
+    def _clear(self):
+        self._trips = {}
+        self._by_driver = {}
+        self._by_bus = {}
+        self._student_trips = {}
+        self._by_student = {}
+        self._by_trip = {}
+
+    def load(self, db: Session):
+        # A versão é lida antes dos dados: uma escrita concorrente só causa outra recarga
+        version = read_version(db)
+        trips = db.query(*[getattr(TripModel, field) for field in ActiveTrip.__slots__]).filter(
+            TripModel.status == TripStatusEnum.ATIVA
+        ).all()
+        student_trips = db.query(
+            StudentTripModel.id, StudentTripModel.trip_id, StudentTripModel.student_id
+        ).join(TripModel, StudentTripModel.trip_id == TripModel.id).filter(
+            TripModel.status == TripStatusEnum.ATIVA,
+            StudentTripModel.system_deleted == 0
+        ).all()
+        with self._lock:
+            self._clear()
+            for trip in trips:
+                self._put_trip(ActiveTrip(trip))
+            for student_trip in student_trips:
+                self._put_student_trip(ActiveStudentTrip(student_trip))
+            self._bind = db.get_bind()
+            self._version = version
+            self._checked_at = self._loaded_at = time.monotonic()
+
+    def sync(self, db: Session, force: bool = False):
+        # Uma leitura da versão (chave primária) no lugar das consultas das rotas;
+        # force é usado antes de escritas que dependem do registro estar atualizado
+        now = time.monotonic()
+        if not force and self._version is not None and now - self._checked_at < self.check_seconds:
+            return
+        if (self._version is None or db.get_bind() is not self._bind or now - self._loaded_at >= self.reload_seconds
+                or read_version(db) != self._version):
+            self.load(db)
+        else:
+            self._checked_at = now
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+    def publish(self, bind, trip_ids, student_trip_ids):
+        # Chamado depois do commit de uma escrita: incrementa a versão e relê, na mesma
+        # transação curta, as linhas alteradas. Relidas depois do incremento, refletem o
+        # último commit mesmo quando duas transações publicam fora da ordem dos commits.
+        # Custo: cada commit que altera viagens ou vínculos de alunos usa uma segunda
+        # conexão do pool depois do commit, para essa transação curta
+        with self._publish_lock, bind.begin() as connection:
+            version = bump_version(connection)
+            trips = {trip_id: None for trip_id in trip_ids}
+            if trip_ids:
+                for row in connection.execute(
+                    select(*[getattr(TripModel, field) for field in ActiveTrip.__slots__])
+                    .where(TripModel.id.in_(trip_ids), TripModel.status == TripStatusEnum.ATIVA)
+                ):
+                    trips[row.id] = ActiveTrip(row)
+            student_trips = {student_trip_id: None for student_trip_id in student_trip_ids}
+            if student_trip_ids:
+                for row in connection.execute(
+                    select(StudentTripModel.id, StudentTripModel.trip_id, StudentTripModel.student_id)
+                    .where(StudentTripModel.id.in_(student_trip_ids), StudentTripModel.system_deleted == 0)
+                ):
+                    student_trips[row.id] = ActiveStudentTrip(row)
+            self.apply(bind, version, trips.items(), student_trips.items())
+
+    def apply(self, bind, version: int, trips, student_trips):
+        with self._lock:
+            if self._version is None or bind is not self._bind:
+                return
+            if version != self._version + 1:
+                # Outra instância gravou antes desta transação: recarrega na próxima consulta
+                self._version = None
+                return
+            for trip_id, trip in trips:
+                if trip is None:
+                    self._drop_trip(trip_id)
+                else:
+                    self._put_trip(trip)
+            for student_trip_id, student_trip in student_trips:
+                if student_trip is None:
+                    self._drop_student_trip(student_trip_id)
+                else:
+                    self._put_student_trip(student_trip)
+            self._version = version
+
+    def _put_trip(self, trip: ActiveTrip):
+        previous = self._trips.get(trip.id)
+        if previous:
+            self._unindex_trip(previous)
+        self._trips[trip.id] = trip
+        if not trip.system_deleted:
+            self._by_driver.setdefault(trip.driver_id, set()).add(trip.id)
+            self._by_bus.setdefault(trip.bus_id, set()).add(trip.id)
+
+    def _drop_trip(self, trip_id: int):
+        trip = self._trips.pop(trip_id, None)
+        if trip:
+            self._unindex_trip(trip)
+        for student_trip_id in list(self._by_trip.get(trip_id, ())):
+            self._drop_student_trip(student_trip_id)
+
+    def _unindex_trip(self, trip: ActiveTrip):
+        for index, key in ((self._by_driver, trip.driver_id), (self._by_bus, trip.bus_id)):
+            ids = index.get(key)
+            if ids:
+                ids.discard(trip.id)
+                if not ids:
+                    del index[key]
+
+    def _put_student_trip(self, student_trip: ActiveStudentTrip):
+        self._drop_student_trip(student_trip.id)
+        # Só entram alunos de viagens ativas
+        if student_trip.trip_id not in self._trips:
+            return
+        self._student_trips[student_trip.id] = student_trip
+        self._by_student.setdefault(student_trip.student_id, set()).add(student_trip.id)
+        self._by_trip.setdefault(student_trip.trip_id, set()).add(student_trip.id)
+
+    def _drop_student_trip(self, student_trip_id: int):
+        student_trip = self._student_trips.pop(student_trip_id, None)
+        if not student_trip:
+            return
+        for index, key in ((self._by_student, student_trip.student_id), (self._by_trip, student_trip.trip_id)):
+            ids = index[key]
+            ids.discard(student_trip_id)
+            if not ids:
+                del index[key]
+
+    def trip(self, trip_id: int):
+        # ActiveTrip da viagem, se estiver ativa e não excluída, ou None
+        with self._lock:
+            trip = self._trips.get(trip_id)
+            return trip if trip and not trip.system_deleted else None
+
+    def driver_trip(self, driver_id: int):
+        with self._lock:
+            ids = self._by_driver.get(driver_id)
+            return self._trips[min(ids)] if ids else None
+
+    def student_trip(self, student_id: int):
+        # (ActiveStudentTrip, ActiveTrip) da viagem ativa do aluno, ou None
+        with self._lock:
+            ids = self._by_student.get(student_id)
+            if not ids:
+                return None
+            student_trip = self._student_trips[min(ids)]
+            return student_trip, self._trips[student_trip.trip_id]
+
+    def busy_buses(self) -> set:
+        with self._lock:
+            return set(self._by_bus)
+
+    def has_conflict(self, bus_id: int, driver_id: int) -> bool:
+        with self._lock:
+            return bus_id in self._by_bus or driver_id in self._by_driver
+
+
+active_trips = ActiveTripRegistry()
+
+
+def _student_trip_moved(student_trip: StudentTripModel) -> bool:
+    attrs = inspect(student_trip).attrs
+    return any(attrs[key].history.has_changes() for key in STUDENT_TRIP_KEYS)
+
+@event.listens_for(Session, "after_flush")
+def track_active_trip_changes(session, flush_context):
+    # Só anota quais viagens e alunos mudaram; a versão é incrementada depois do commit,
+    # para que as escritas de viagens e alunos não disputem a mesma linha de cache_versions
+    trip_ids, student_trip_ids = set(), set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, TripModel):
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            trip_ids.add(obj.id)
+        elif isinstance(obj, StudentTripModel):
+            if obj in session.dirty and not _student_trip_moved(obj):
+                continue
+            student_trip_ids.add(obj.id)
+    track_changes(session, trip_ids, student_trip_ids)
+
+def track_changes(session, trip_ids=(), student_trip_ids=()):
+    # Também usado pelos UPDATE diretos (compare-and-set), que não passam pelo flush
+    if not trip_ids and not student_trip_ids:
+        return
+    pending = session.info.setdefault(PENDING_KEY, {"trips": set(), "student_trips": set()})
+    pending["trips"].update(trip_ids)
+    pending["student_trips"].update(student_trip_ids)
+
+@event.listens_for(Session, "after_commit")
+def apply_active_trip_changes(session):
+    pending = session.info.pop(PENDING_KEY, None)
+    if not pending:
+        return
+    bind = session.get_bind()
+    try:
+        active_trips.publish(bind, pending["trips"], pending["student_trips"])
+    except Exception as error:
+        # A escrita já foi confirmada; sem o incremento, as outras instâncias a veem na
+        # próxima recarga completa e esta recarrega na próxima consulta
+        print(f"Erro ao publicar alterações das viagens ativas: {error}")
+        active_trips.invalidate()
+
+@event.listens_for(Session, "after_rollback")
+def discard_active_trip_changes(session):
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,95 @@
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, select, union_all, update
+from sqlalchemy.orm import Session
+from ..models.trip import Trip as TripModel, TripStatusEnum
+from ..models.student_trip import StudentTrip as StudentTripModel
+from ..models.trip_bus_stop import TripBusStop as TripBusStopModel
+from ..models.trip_bus_stop_transition import TripBusStopTransition
+from ..models.archive import StudentTripArchive, TripBusStopArchive, TripBusStopTransitionArchive
+
+# Viagens concluídas há mais de ARCHIVE_AFTER_DAYS dias saem das tabelas ativas
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "200"))
+
+# Tabela ativa -> tabela de arquivo, na ordem segura para a remoção
+# (as transições referenciam os pontos da viagem)
+ARCHIVED_TABLES = [
+    (StudentTripModel, StudentTripArchive),
+    (TripBusStopTransition, TripBusStopTransitionArchive),
+    (TripBusStopModel, TripBusStopArchive),
+]
+
+def archive_completed_trips(db: Session, after_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE, now: datetime = None) -> dict:
+    # Move em lotes os registros das viagens concluídas antigas; cada lote é uma transação
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=after_days)
+    totals = {"trips": 0, **{live.__tablename__: 0 for live, _ in ARCHIVED_TABLES}}
+
+    while True:
+        trip_ids = db.execute(
+            select(TripModel.id).where(
+                TripModel.status == TripStatusEnum.CONCLUIDA,
+                TripModel.completed_date < cutoff,
+                TripModel.archived_date.is_(None)
+            ).order_by(TripModel.id).limit(batch_size)
+        ).scalars().all()
+        if not trip_ids:
+            break
+
+        for live, archive in ARCHIVED_TABLES:
+            columns = [column.name for column in live.__table__.columns]
+            db.execute(
+                insert(archive).from_select(
+                    columns,
+                    select(*[live.__table__.c[name] for name in columns]).where(live.trip_id.in_(trip_ids))
+                )
+            )
+            result = db.execute(
+                delete(live).where(live.trip_id.in_(trip_ids)).execution_options(synchronize_session=False)
+            )
+            totals[live.__tablename__] += result.rowcount
+
+        # update_date é mantido: o arquivamento não é uma alteração da viagem
+        db.execute(
+            update(TripModel).where(TripModel.id.in_(trip_ids))
+            .values(archived_date=now, update_date=TripModel.update_date)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        totals["trips"] += len(trip_ids)
+    return totals
+
+def backfill_completed_dates(db: Session) -> int:
+    # Implantação: viagens concluídas antes da coluna completed_date usam update_date
+    updated = db.query(TripModel).filter(
+        TripModel.status == TripStatusEnum.CONCLUIDA,
+        TripModel.completed_date.is_(None)
+    ).update({TripModel.completed_date: TripModel.update_date, TripModel.update_date: TripModel.update_date},
+             synchronize_session=False)
+    db.commit()
+    return updated
+
+def trip_models(trip: TripModel):
+    # Modelos de onde ler os alunos e pontos de uma viagem (ativa ou arquivada)
+    if trip.archived_date is not None:
+        return StudentTripArchive, TripBusStopArchive
+    return StudentTripModel, TripBusStopModel
+
+def find_archived(db: Session, live, archive, row_id: int, *filters):
+    # Busca por id na tabela ativa e, se não existir, no arquivo.
+    # Cada filtro recebe o modelo e devolve a condição (ex.: lambda m: m.system_deleted == 0)
+    for model in (live, archive):
+        row = db.query(model).filter(model.id == row_id, *[condition(model) for condition in filters]).first()
+        if row is not None:
+            return row
+    return None
+
+def read_both(db: Session, live, archive, skip: int, limit: int, *filters):
+    # Paginação sobre as tabelas ativa e de arquivo juntas, ordenada por id
+    columns = [column.name for column in live.__table__.columns]
+    statement = union_all(
+        select(*[live.__table__.c[name] for name in columns]).where(*[condition(live) for condition in filters]),
+        select(*[archive.__table__.c[name] for name in columns]).where(*[condition(archive) for condition in filters])
+    ).order_by("id").offset(skip).limit(limit)
+    return db.execute(statement).all()
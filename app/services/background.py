@@ -0,0 +1,198 @@
+import json
+import os
+import queue
+import threading
+import time
+from sqlalchemy import delete, insert, select
+from ..config.database import SessionLocal
+from ..models.background_job import BackgroundJob as BackgroundJobModel
+
+QUEUE_CAPACITY = 1000
+WORKERS = 2
+# A fila é considerada saturada (readyz responde 503) a partir desta fração da capacidade
+SATURATION_RATIO = 0.8
+# Tempo máximo de espera no desligamento; o que sobrar é gravado no banco
+DRAIN_SECONDS = float(os.getenv("BACKGROUND_DRAIN_SECONDS", "8"))
+RESUME_BATCH = 100
+
+
+class BackgroundJobQueue:
+    # Fila em memória atendida por threads próprias. Cada tarefa tem um tipo registrado
+    # e argumentos serializáveis em JSON, para que possa ser gravada no banco quando a
+    # fila estiver cheia ou o worker estiver desligando. A entrega é "pelo menos uma vez":
+    # uma tarefa em execução quando o prazo do desligamento acaba também é gravada.
+    def __init__(self, session_factory=SessionLocal, capacity: int = QUEUE_CAPACITY, workers: int = WORKERS):
+        self.session_factory = session_factory
+        self.capacity = capacity
+        self.workers = workers
+        self._handlers = {}
+        self._queue = queue.Queue(maxsize=capacity)
+        self._running = {}
+        self._lock = threading.Lock()
+        self._resume_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self.accepting = False
+        self.processed = 0
+        self.failed = 0
+        self.persisted = 0
+
+    def register(self, kind: str):
+        def decorator(handler):
+            self._handlers[kind] = handler
+            return handler
+        return decorator
+
+    def submit(self, kind: str, **payload) -> bool:
+        # Retorna False quando a tarefa foi gravada no banco em vez de entrar na fila
+        if kind not in self._handlers:
+            raise ValueError(f"Tarefa desconhecida: {kind}")
+        if self.accepting:
+            try:
+                self._queue.put_nowait((kind, payload))
+                return True
+            except queue.Full:
+                pass
+        self._persist([(kind, payload)])
+        return False
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() + len(self._running)
+
+    @property
+    def saturated(self) -> bool:
+        return self._queue.qsize() >= self.capacity * SATURATION_RATIO
+
+    def stats(self) -> dict:
+        return {
+            "accepting": self.accepting,
+            "queued": self._queue.qsize(),
+            "running": len(self._running),
+            "capacity": self.capacity,
+            "processed": self.processed,
+            "failed": self.failed,
+            "persisted": self.persisted
+        }
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        self.accepting = True
+        self._threads = [
+            threading.Thread(target=self._run, name=f"background-jobs-{index}", daemon=True)
+            for index in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        # Tarefas deixadas por instâncias anteriores voltam para a fila fora da subida
+        threading.Thread(target=self.resume, name="background-jobs-resume", daemon=True).start()
+
+    def stop(self, deadline: float = DRAIN_SECONDS) -> int:
+        # Para de aceitar tarefas, espera a fila esvaziar até o prazo e grava o restante.
+        # Retorna quantas tarefas ficaram gravadas para a próxima instância.
+        with self._resume_lock:
+            self.accepting = False
+        limit = time.monotonic() + deadline
+        while self.pending and time.monotonic() < limit:
+            time.sleep(0.01)
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=0.1)
+        self._threads = []
+
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        with self._lock:
+            leftover.extend(self._running.values())
+        self._persist(leftover)
+        return len(leftover)
+
+    def resume(self) -> int:
+        # Move para a fila as tarefas gravadas, em lotes, enquanto houver espaço. Cada lote
+        # é retirado da tabela por um único DELETE ... RETURNING sobre linhas travadas com
+        # SKIP LOCKED: workers subindo juntos nunca retomam a mesma tarefa
+        resumed = 0
+        while self.accepting:
+            space = min(RESUME_BATCH, self._queue.maxsize - self._queue.qsize())
+            if space <= 0:
+                return resumed
+            claimed = (
+                select(BackgroundJobModel.id)
+                .order_by(BackgroundJobModel.id)
+                .limit(space)
+                .with_for_update(skip_locked=True)
+            )
+            try:
+                with self.session_factory() as session:
+                    # Leitura simples antes: com a tabela vazia (o caso comum) a subida não escreve
+                    if session.execute(select(BackgroundJobModel.id).limit(1)).first() is None:
+                        return resumed
+                    rows = session.execute(
+                        delete(BackgroundJobModel).where(BackgroundJobModel.id.in_(claimed))
+                        .returning(BackgroundJobModel.id, BackgroundJobModel.kind, BackgroundJobModel.payload)
+                    ).all()
+                    if not rows:
+                        return resumed
+                    # O desligamento não pode acontecer entre o commit e a entrada na fila:
+                    # ou o lote volta para a tabela (rollback), ou stop() o encontra na fila
+                    with self._resume_lock:
+                        if not self.accepting:
+                            session.rollback()
+                            return resumed
+                        session.commit()
+                        overflow = []
+                        for row in sorted(rows, key=lambda row: row.id):
+                            try:
+                                self._queue.put_nowait((row.kind, json.loads(row.payload)))
+                            except queue.Full:
+                                overflow.append((row.kind, json.loads(row.payload)))
+            except Exception as error:
+                print(f"Erro ao retomar tarefas em segundo plano: {error}")
+                return resumed
+            # Sem espaço (a fila encheu com tarefas novas): o excedente volta para a tabela
+            self._persist(overflow)
+            resumed += len(rows) - len(overflow)
+            if overflow:
+                return resumed
+        return resumed
+
+    def _persist(self, jobs: list):
+        if not jobs:
+            return
+        rows = [{"kind": kind, "payload": json.dumps(payload)} for kind, payload in jobs]
+        try:
+            with self.session_factory() as session:
+                session.execute(insert(BackgroundJobModel), rows)
+                session.commit()
+            self.persisted += len(rows)
+        except Exception as error:
+            print(f"Erro ao gravar tarefas em segundo plano: {error}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            kind, payload = job
+            key = object()
+            with self._lock:
+                self._running[key] = job
+            try:
+                self._handlers[kind](**payload)
+                self.processed += 1
+            except Exception as error:
+                self.failed += 1
+                print(f"Erro na tarefa em segundo plano {kind}: {error}")
+            finally:
+                with self._lock:
+                    self._running.pop(key, None)
+
+
+background_jobs = BackgroundJobQueue()
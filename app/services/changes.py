@@ -0,0 +1,85 @@
+from collections import defaultdict
+from itertools import chain
+from sqlalchemy import event, inspect, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from ..models.student_trip import StudentTrip as StudentTripModel
+from ..models.trip import Trip as TripModel
+from ..models.trip_bus_stop import TripBusStop as TripBusStopModel
+
+# Cada alteração de aluno ou ponto de uma viagem recebe o próximo valor de
+# trips.change_seq, incrementado por um UPDATE na linha da viagem. O bloqueio dessa
+# linha vai até o commit, então as alterações de uma mesma viagem são confirmadas na
+# ordem da sequência e um cliente com o cursor N não perde uma alteração N - 1
+# confirmada depois. Linhas removidas (ou que mudaram de viagem) não podem ser
+# devolvidas pela consulta incremental: nesse caso reset_seq avança e o cliente
+# recarrega tudo.
+TRACKED_MODELS = (StudentTripModel, TripBusStopModel)
+
+
+def next_change_seq(db: Session, trip_id: int, reset: bool = False):
+    # update_date é mantido: é a data da própria viagem, não das alterações de alunos e pontos
+    values = {"change_seq": TripModel.change_seq + 1, "update_date": TripModel.update_date}
+    if reset:
+        values["reset_seq"] = TripModel.change_seq + 1
+    return db.execute(
+        update(TripModel)
+        .where(TripModel.id == trip_id)
+        .values(**values)
+        .returning(TripModel.change_seq)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+
+def stamp_change_seq(db: Session, model, row):
+    # Sequência para uma linha de aluno ou ponto já alterada por um UPDATE direto (sem
+    # o ORM); chamada só depois que o UPDATE encontrou a linha
+    seq = next_change_seq(db, row.trip_id)
+    if seq is None:
+        return None
+    db.execute(
+        update(model)
+        .where(model.id == row.id)
+        .values(change_seq=seq)
+        .execution_options(synchronize_session=False)
+    )
+    set_committed_value(row, "change_seq", seq)
+    return seq
+
+def _previous_trip_id(obj):
+    history = inspect(obj).attrs.trip_id.history
+    return history.deleted[0] if history.deleted else None
+
+@event.listens_for(Session, "before_flush")
+def stamp_trip_changes(session, flush_context, instances):
+    changed = defaultdict(list)
+    resets = set()
+    for obj in chain(session.new, session.dirty):
+        if not isinstance(obj, TRACKED_MODELS):
+            continue
+        if obj in session.dirty:
+            if not session.is_modified(obj, include_collections=False):
+                continue
+            previous = _previous_trip_id(obj)
+            if previous is not None and previous != obj.trip_id:
+                resets.add(previous)
+        if obj.trip_id is not None:
+            changed[obj.trip_id].append(obj)
+    for obj in session.deleted:
+        if isinstance(obj, TRACKED_MODELS) and obj.trip_id is not None:
+            resets.add(obj.trip_id)
+
+    # Viagens gravadas neste mesmo flush ainda não existem no banco
+    new_trips = {obj.id: obj for obj in session.new if isinstance(obj, TripModel) and obj.id is not None}
+
+    for trip_id in resets - set(changed):
+        next_change_seq(session, trip_id, reset=True)
+    for trip_id, rows in changed.items():
+        if trip_id in new_trips:
+            trip = new_trips[trip_id]
+            trip.change_seq = seq = (trip.change_seq or 0) + 1
+        else:
+            seq = next_change_seq(session, trip_id, reset=trip_id in resets)
+        if seq is None:
+            continue
+        for obj in rows:
+            obj.change_seq = seq
@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from itertools import chain
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Resultado reaproveitado por este intervalo depois de calculado; curto o bastante para
+# que o aplicativo, que atualiza a tela a cada poucos segundos, não perceba o atraso
+COALESCE_WINDOW_SECONDS = float(os.getenv("COALESCE_WINDOW_SECONDS", "0.5"))
+# Acima deste número de resultados guardados, os vencidos são descartados
+MAX_RESULTS = 1024
+TABLES_KEY = "coalescing_tables"
+
+
+class _Flight:
+    __slots__ = ("generation", "done", "value", "error")
+
+    def __init__(self, generation: int):
+        self.generation = generation
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def _shared_error(error: BaseException) -> BaseException:
+    # Cada requisição que aguardava recebe a sua própria HTTPException
+    if isinstance(error, HTTPException):
+        return HTTPException(status_code=error.status_code, detail=error.detail, headers=error.headers)
+    return error
+
+
+class SingleFlight:
+    # Leituras idênticas e simultâneas dividem uma única consulta: a primeira requisição
+    # calcula e as demais esperam pelo mesmo resultado, que ainda vale pelo intervalo
+    # `window`. Um commit nesta instância que altere as tabelas de uma leitura descarta
+    # o resultado guardado e o que estiver sendo calculado.
+    def __init__(self, window: float = COALESCE_WINDOW_SECONDS):
+        self.window = window
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._results = {}
+        self._tables = {}
+        self._generations = defaultdict(int)
+        self._stats = defaultdict(lambda: {"computed": 0, "coalesced": 0, "hits": 0})
+
+    def register(self, name: str, tables):
+        self._tables[name] = frozenset(tables)
+
+    def run(self, name: str, args: tuple, compute):
+        if not self.enabled:
+            return compute()
+        key = (name, *args)
+        with self._lock:
+            stats = self._stats[name]
+            cached = self._results.get(key)
+            if cached and cached[0] > time.monotonic():
+                stats["hits"] += 1
+                return cached[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight(self._generations[name])
+                stats["computed"] += 1
+            else:
+                stats["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise _shared_error(flight.error)
+            return flight.value
+
+        try:
+            flight.value = compute()
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if flight.error is None and self.window > 0 and flight.generation == self._generations[name]:
+                    self._store(key, flight.value)
+            flight.done.set()
+        return flight.value
+
+    def invalidate(self, tables=None):
+        # Sem tabelas, descarta tudo
+        with self._lock:
+            names = [name for name, used in self._tables.items() if tables is None or used & tables]
+            for name in names:
+                self._generations[name] += 1
+            for key in [key for key in self._results if key[0] in names]:
+                del self._results[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = {}
+            for name, stats in self._stats.items():
+                requests = stats["computed"] + stats["coalesced"] + stats["hits"]
+                result[name] = {
+                    **stats,
+                    "requests": requests,
+                    "shared_ratio": round(1 - stats["computed"] / requests, 4) if requests else 0.0
+                }
+            return result
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+    def _store(self, key, value):
+        now = time.monotonic()
+        if len(self._results) >= MAX_RESULTS:
+            for stale in [stale for stale, (expires, _) in self._results.items() if expires <= now]:
+                del self._results[stale]
+        self._results[key] = (now + self.window, value)
+
+
+read_coalescer = SingleFlight()
+
+
+@event.listens_for(Session, "after_flush")
+def track_coalesced_tables(session, flush_context):
+    tables = {obj.__tablename__ for obj in chain(session.new, session.dirty, session.deleted)}
+    if tables:
+        session.info.setdefault(TABLES_KEY, set()).update(tables)
+
+@event.listens_for(Session, "do_orm_execute")
+def track_coalesced_statements(orm_execute_state):
+    # UPDATE e DELETE diretos (StateMachine.apply, sequência de alterações, arquivamento)
+    # não passam pelo flush: a tabela alterada vem do próprio comando
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None:
+            orm_execute_state.session.info.setdefault(TABLES_KEY, set()).add(table.name)
+
+@event.listens_for(Session, "after_commit")
+def invalidate_coalesced_reads(session):
+    tables = session.info.pop(TABLES_KEY, None)
+    if tables:
+        read_coalescer.invalidate(tables)
+
+@event.listens_for(Session, "after_rollback")
+def discard_coalesced_tables(session):
+    session.info.pop(TABLES_KEY, None)
@@ -0,0 +1,119 @@
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from ..config.database import SessionLocal
+from ..models.device_token import DeviceToken as DeviceTokenModel
+from ..models.student_trip import StudentTrip as StudentTripModel
+from ..models.trip import Trip as TripModel, TripStatusEnum
+from ..models.user import User as UserModel
+from .background import background_jobs
+from .unit_of_work import on_commit
+
+# Aparelhos que não se registram há mais que isto são removidos pelo comando de limpeza
+STALE_DEVICE_DAYS = int(os.getenv("STALE_DEVICE_DAYS", "60"))
+
+
+def trip_topic(trip_id: int) -> str:
+    # Tópico do FCM com os aparelhos dos alunos inscritos na viagem
+    return f"trip-{trip_id}"
+
+def register_device(db: Session, user_id: int, token: str, now: datetime = None) -> DeviceTokenModel:
+    # O mesmo aparelho pode passar a outro usuário (outro login): o token acompanha o último
+    now = now or datetime.utcnow()
+    device = db.query(DeviceTokenModel).filter(DeviceTokenModel.token == token).first()
+    if device:
+        if device.user_id != user_id:
+            # O aparelho deixa os tópicos das viagens ativas do dono anterior, para não
+            # receber os avisos delas
+            for trip_id in active_trip_ids(db, device.user_id):
+                on_commit(db, background_jobs.submit, "topic_subscription",
+                          tokens=[token], topic=trip_topic(trip_id), subscribe=False)
+        device.user_id = user_id
+        device.last_seen = now
+    else:
+        device = DeviceTokenModel(user_id=user_id, token=token, last_seen=now)
+        db.add(device)
+    return device
+
+def active_trip_ids(db: Session, user_id: int) -> list:
+    # Viagens ativas em que o aluno está inscrito
+    return list(db.execute(
+        select(StudentTripModel.trip_id).distinct()
+        .join(TripModel, TripModel.id == StudentTripModel.trip_id)
+        .where(
+            StudentTripModel.student_id == user_id,
+            StudentTripModel.system_deleted == 0,
+            TripModel.status == TripStatusEnum.ATIVA,
+            TripModel.system_deleted == 0
+        ).order_by(StudentTripModel.trip_id)
+    ).scalars())
+
+def device_tokens(db: Session, user_ids) -> list:
+    # Todos os aparelhos dos usuários, em uma única consulta
+    user_ids = list(user_ids)
+    if not user_ids:
+        return []
+    return list(db.execute(
+        select(DeviceTokenModel.token).where(DeviceTokenModel.user_id.in_(user_ids))
+    ).scalars())
+
+def subscribe_to_trip(db: Session, user_ids, trip_id: int, previous_trip_id: int = None):
+    # Inscreve os aparelhos dos alunos no tópico da viagem (e os retira da anterior)
+    # depois do commit, pela fila em segundo plano: uma tarefa para todos os alunos
+    tokens = device_tokens(db, user_ids)
+    if not tokens:
+        return
+    if previous_trip_id is not None and previous_trip_id != trip_id:
+        on_commit(db, background_jobs.submit, "topic_subscription",
+                  tokens=tokens, topic=trip_topic(previous_trip_id), subscribe=False)
+    on_commit(db, background_jobs.submit, "topic_subscription", tokens=tokens, topic=trip_topic(trip_id), subscribe=True)
+
+def unsubscribe_from_trip(db: Session, user_ids, trip_id: int):
+    tokens = device_tokens(db, user_ids)
+    if tokens:
+        on_commit(db, background_jobs.submit, "topic_subscription", tokens=tokens, topic=trip_topic(trip_id), subscribe=False)
+
+def notify_trip(db: Session, trip_id: int, title: str, body: str, unsubscribe_user_ids=None):
+    # Um único envio ao tópico alcança todos os alunos da viagem. Os aparelhos de
+    # unsubscribe_user_ids saem do tópico na mesma tarefa, depois do envio: em tarefas
+    # separadas a retirada poderia chegar ao FCM antes e os alunos perderiam o aviso
+    payload = {"topic": trip_topic(trip_id), "title": title, "body": body}
+    tokens = device_tokens(db, unsubscribe_user_ids or [])
+    if tokens:
+        payload["unsubscribe_tokens"] = tokens
+    on_commit(db, background_jobs.submit, "topic_notification", **payload)
+
+def prune_tokens(tokens, session_factory=SessionLocal) -> int:
+    # Tokens que o FCM informou como inválidos ou desinstalados
+    tokens = list(tokens)
+    if not tokens:
+        return 0
+    with session_factory() as session:
+        removed = session.execute(delete(DeviceTokenModel).where(DeviceTokenModel.token.in_(tokens))).rowcount
+        session.query(UserModel).filter(UserModel.device_token.in_(tokens)).update(
+            {UserModel.device_token: None}, synchronize_session=False
+        )
+        session.commit()
+    return removed
+
+def purge_stale_devices(db: Session, days: int = STALE_DEVICE_DAYS, now: datetime = None) -> int:
+    cutoff = (now or datetime.utcnow()) - timedelta(days=days)
+    removed = db.execute(delete(DeviceTokenModel).where(DeviceTokenModel.last_seen < cutoff)).rowcount
+    db.commit()
+    return removed
+
+def import_user_device_tokens(db: Session) -> int:
+    # Implantação: o token único que ficava em users.device_token vira o primeiro aparelho
+    known = select(DeviceTokenModel.token)
+    users = db.query(UserModel.id, UserModel.device_token).filter(
+        UserModel.device_token.isnot(None),
+        UserModel.device_token.notin_(known)
+    ).all()
+    seen = set()
+    for user_id, token in users:
+        if token not in seen:
+            seen.add(token)
+            db.add(DeviceTokenModel(user_id=user_id, token=token))
+    db.commit()
+    return len(seen)
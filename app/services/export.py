@@ -0,0 +1,173 @@
+import csv
+import io
+from datetime import date, datetime, time, timedelta
+from enum import Enum
+from importlib.util import find_spec
+from sqlalchemy import select, union_all
+from ..models.archive import StudentTripArchive
+from ..models.bus import Bus as BusModel
+from ..models.bus_stop import BusStop as BusStopModel
+from ..models.faculty import Faculty as FacultyModel
+from ..models.student_trip import StudentTrip as StudentTripModel, StudentStatusEnum
+from ..models.trip import Trip as TripModel, TripStatusEnum, TripTypeEnum
+from ..models.user import User
+
+# Linhas buscadas do cursor por vez; também é o tamanho de cada bloco enviado
+EXPORT_CHUNK_SIZE = 2000
+
+# Nome da coluna e tipo no Parquet ("int", "str" ou "datetime")
+EXPORT_COLUMNS = [
+    ("trip_id", "int"),
+    ("trip_type", "str"),
+    ("trip_status", "str"),
+    ("trip_date", "datetime"),
+    ("bus_id", "int"),
+    ("bus_name", "str"),
+    ("driver_id", "int"),
+    ("student_trip_id", "int"),
+    ("student_id", "int"),
+    ("student_name", "str"),
+    ("faculty_id", "int"),
+    ("faculty_name", "str"),
+    ("bus_stop_id", "int"),
+    ("bus_stop_name", "str"),
+    ("student_status", "str"),
+]
+
+
+class ExportFormatEnum(str, Enum):
+    CSV = "csv"
+    PARQUET = "parquet"
+
+    @property
+    def media_type(self) -> str:
+        return "text/csv; charset=utf-8" if self is ExportFormatEnum.CSV else "application/vnd.apache.parquet"
+
+
+def parquet_available() -> bool:
+    # pyarrow é opcional: sem ele a exportação fica só em CSV
+    return find_spec("pyarrow") is not None
+
+def _student_trip_select(model, start_date: date = None, end_date: date = None, bus_id: int = None, faculty_id: int = None):
+    columns = [
+        TripModel.id, TripModel.trip_type, TripModel.status, TripModel.create_date,
+        BusModel.id, BusModel.name, TripModel.driver_id,
+        model.id, User.id, User.name, FacultyModel.id, FacultyModel.name,
+        BusStopModel.id, BusStopModel.name, model.status
+    ]
+    statement = select(
+        *[column.label(name) for column, (name, _) in zip(columns, EXPORT_COLUMNS)]
+    ).select_from(model).join(
+        TripModel, TripModel.id == model.trip_id
+    ).join(
+        BusModel, BusModel.id == TripModel.bus_id
+    ).join(
+        User, User.id == model.student_id
+    ).outerjoin(
+        FacultyModel, FacultyModel.id == User.faculty_id
+    ).outerjoin(
+        BusStopModel, BusStopModel.id == model.point_id
+    ).where(
+        model.system_deleted == 0,
+        TripModel.system_deleted == 0
+    )
+    # Os filtros vão para o SQL: só as linhas exportadas saem do banco
+    if start_date:
+        statement = statement.where(TripModel.create_date >= datetime.combine(start_date, time.min))
+    if end_date:
+        statement = statement.where(TripModel.create_date < datetime.combine(end_date + timedelta(days=1), time.min))
+    if bus_id is not None:
+        statement = statement.where(TripModel.bus_id == bus_id)
+    if faculty_id is not None:
+        statement = statement.where(User.faculty_id == faculty_id)
+    return statement
+
+def export_statement(start_date: date = None, end_date: date = None, bus_id: int = None, faculty_id: int = None):
+    # Alunos das viagens, ativos e arquivados, ordenados por viagem
+    return union_all(
+        _student_trip_select(StudentTripModel, start_date, end_date, bus_id, faculty_id),
+        _student_trip_select(StudentTripArchive, start_date, end_date, bus_id, faculty_id)
+    ).order_by("trip_id", "student_trip_id")
+
+def _export_row(row) -> list:
+    (trip_id, trip_type, trip_status, trip_date, bus_id, bus_name, driver_id, student_trip_id,
+     student_id, student_name, faculty_id, faculty_name, bus_stop_id, bus_stop_name, student_status) = row
+    return [
+        trip_id, TripTypeEnum(trip_type).name, TripStatusEnum(trip_status).name, trip_date,
+        bus_id, bus_name, driver_id, student_trip_id, student_id, student_name,
+        faculty_id, faculty_name, bus_stop_id, bus_stop_name, StudentStatusEnum(student_status).label()
+    ]
+
+def iter_export_rows(session_factory, statement, chunk_size: int = EXPORT_CHUNK_SIZE):
+    # yield_per usa um cursor no servidor (no PostgreSQL) e entrega blocos de chunk_size
+    # linhas: a memória usada não depende do total exportado. A sessão é aberta aqui porque
+    # o corpo da resposta é gerado depois que as dependências da rota já foram encerradas.
+    with session_factory() as session:
+        result = session.execute(statement.execution_options(yield_per=chunk_size))
+        for partition in result.partitions():
+            yield [_export_row(row) for row in partition]
+
+def csv_chunks(partitions):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for rows in partitions:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    # Destino do ParquetWriter que acumula os bytes escritos até o próximo bloco enviado
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def parquet_chunks(partitions):
+    # Cada bloco do cursor vira um row group; os bytes são enviados assim que escritos
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"int": pa.int64(), "str": pa.string(), "datetime": pa.timestamp("us")}
+    schema = pa.schema([(name, types[kind]) for name, kind in EXPORT_COLUMNS])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for rows in partitions:
+            if not rows:
+                continue
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+            ))
+            data = sink.take()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.take()
+
+def export_chunks(export_format: ExportFormatEnum, partitions):
+    if export_format == ExportFormatEnum.PARQUET:
+        return parquet_chunks(partitions)
+    return csv_chunks(partitions)
@@ -0,0 +1,187 @@
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import Header, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from ..config.database import SessionLocal
+from ..models.idempotency_key import IdempotencyKey as IdempotencyKeyModel
+from .unit_of_work import deferred_commit, finish
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAY_HEADER = "Idempotent-Replayed"
+# Tempo em que uma nova tentativa ainda recebe a resposta original
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+# Prazo mínimo antes de uma chave sem resposta ser considerada abandonada (worker derrubado
+# no meio); mesmo depois dele, a chave só é liberada se nenhuma transação a estiver travando
+IN_PROGRESS_SECONDS = 60
+PURGE_BATCH_SIZE = int(os.getenv("IDEMPOTENCY_PURGE_BATCH_SIZE", "500"))
+
+
+def idempotency_key(
+    key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER, max_length=255,
+                                description="Chave única da operação; novas tentativas com a mesma chave recebem a resposta original")
+):
+    # Declarada nas rotas idempotentes: documenta o cabeçalho e marca a rota para o IdempotentRoute
+    return key
+
+
+class IdempotencyStore:
+    def __init__(self, session_factory=SessionLocal, ttl: timedelta = timedelta(hours=IDEMPOTENCY_TTL_HOURS)):
+        self.session_factory = session_factory
+        self.ttl = ttl
+
+    def claim(self, key: str, scope: str, request_hash: str, now: datetime = None) -> Optional[Response]:
+        # Reserva a chave antes de executar a rota. Retorna a resposta gravada quando a
+        # chave já foi usada; None quando esta requisição deve executar a rota.
+        now = now or datetime.utcnow()
+        with self.session_factory() as session:
+            for _ in range(2):
+                session.add(IdempotencyKeyModel(key=key, scope=scope, request_hash=request_hash, expires_date=now + self.ttl))
+                try:
+                    session.commit()
+                    return None
+                except IntegrityError:
+                    session.rollback()
+
+                stored = session.execute(
+                    select(IdempotencyKeyModel).where(IdempotencyKeyModel.scope == scope, IdempotencyKeyModel.key == key)
+                ).scalar_one_or_none()
+                if stored is None:
+                    continue
+                abandoned = (stored.status_code is None and stored.create_date < now - timedelta(seconds=IN_PROGRESS_SECONDS)
+                             and self._unlocked(session, stored))
+                if stored.expires_date <= now or abandoned:
+                    session.delete(stored)
+                    session.commit()
+                    continue
+                if stored.request_hash != request_hash:
+                    raise HTTPException(status_code=422, detail="Chave de idempotência já usada com outros dados")
+                if stored.status_code is None:
+                    raise HTTPException(status_code=409, detail="Requisição com esta chave ainda em processamento")
+                return Response(content=stored.body, status_code=stored.status_code, media_type=stored.media_type,
+                                headers={REPLAY_HEADER: "true"})
+        raise HTTPException(status_code=409, detail="Requisição com esta chave ainda em processamento")
+
+    @staticmethod
+    def _unlocked(session: Session, stored: IdempotencyKeyModel) -> bool:
+        # A transação da rota trava a linha da chave até o commit (lock): uma requisição
+        # apenas demorada continua travando, um worker derrubado não trava mais nada
+        return session.execute(
+            select(IdempotencyKeyModel.id).where(IdempotencyKeyModel.id == stored.id)
+            .with_for_update(skip_locked=True)
+        ).first() is not None
+
+    @staticmethod
+    def lock(db: Session, key: str, scope: str):
+        # Início da transação da rota: trava a chave enquanto a rota executa
+        db.execute(
+            select(IdempotencyKeyModel.id).where(IdempotencyKeyModel.scope == scope, IdempotencyKeyModel.key == key)
+            .with_for_update()
+        )
+
+    @staticmethod
+    def complete(db: Session, key: str, scope: str, response: Response):
+        # Grava a resposta na mesma transação das escritas da rota: ou as duas são
+        # confirmadas, ou nenhuma
+        db.execute(
+            update(IdempotencyKeyModel)
+            .where(IdempotencyKeyModel.scope == scope, IdempotencyKeyModel.key == key)
+            .values(status_code=response.status_code, media_type=response.media_type, body=bytes(response.body))
+            .execution_options(synchronize_session=False)
+        )
+
+    def record(self, key: str, scope: str, response: Response):
+        # Rotas sem a transação da requisição: a resposta é gravada numa transação própria
+        with self.session_factory() as session:
+            self.complete(session, key, scope, response)
+            session.commit()
+
+    def release(self, key: str, scope: str):
+        # A rota falhou: a chave é liberada para que a próxima tentativa execute de novo
+        with self.session_factory() as session:
+            session.execute(
+                delete(IdempotencyKeyModel).where(
+                    IdempotencyKeyModel.scope == scope,
+                    IdempotencyKeyModel.key == key,
+                    IdempotencyKeyModel.status_code.is_(None)
+                )
+            )
+            session.commit()
+
+
+def purge_expired_keys(db: Session, batch_size: int = PURGE_BATCH_SIZE, now: datetime = None) -> int:
+    # Remove em lotes as chaves vencidas; cada lote é uma transação curta
+    now = now or datetime.utcnow()
+    purged = 0
+    while True:
+        ids = db.execute(
+            select(IdempotencyKeyModel.id).where(IdempotencyKeyModel.expires_date <= now)
+            .order_by(IdempotencyKeyModel.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return purged
+        db.execute(
+            delete(IdempotencyKeyModel).where(IdempotencyKeyModel.id.in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        purged += len(ids)
+
+
+idempotency_store = IdempotencyStore()
+
+
+class IdempotentRoute(APIRoute):
+    # Classe de rota dos routers com operações idempotentes. Só age nas rotas que declaram
+    # a dependência idempotency_key e nas requisições que enviam o cabeçalho; as respostas
+    # 2xx são gravadas na transação da rota e devolvidas nas novas tentativas sem executar
+    # a rota outra vez.
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        if not any(dependency.call is idempotency_key for dependency in self.dependant.dependencies):
+            return handler
+
+        async def idempotent_handler(request: Request) -> Response:
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key or len(key) > 255:
+                # Sem cabeçalho a rota funciona como antes; a chave longa demais é recusada pela validação
+                return await handler(request)
+
+            scope = f"{request.method} {request.url.path}"
+            request_hash = hashlib.sha256(str(request.query_params).encode("utf-8") + b"\0" + await request.body()).hexdigest()
+            stored = await run_in_threadpool(idempotency_store.claim, key, scope, request_hash)
+            if stored is not None:
+                return stored
+
+            # A transação da rota (get_transaction) é confirmada aqui, junto com a resposta
+            with deferred_commit(begin=lambda db: idempotency_store.lock(db, key, scope)) as transaction:
+                try:
+                    response = await handler(request)
+                except BaseException:
+                    await run_in_threadpool(idempotency_store.release, key, scope)
+                    raise
+            successful = 200 <= response.status_code < 300 and hasattr(response, "body")
+            if transaction.session is None:
+                if successful:
+                    await run_in_threadpool(idempotency_store.record, key, scope, response)
+                else:
+                    await run_in_threadpool(idempotency_store.release, key, scope)
+                return response
+            try:
+                await run_in_threadpool(
+                    finish, transaction.session,
+                    (lambda db: idempotency_store.complete(db, key, scope, response)) if successful else None
+                )
+            except BaseException:
+                await run_in_threadpool(idempotency_store.release, key, scope)
+                raise
+            if not successful:
+                await run_in_threadpool(idempotency_store.release, key, scope)
+            return response
+
+        return idempotent_handler
@@ -0,0 +1,199 @@
+import math
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from ..config.database import SessionLocal
+from ..models.trip import Trip as TripModel, TripStatusEnum
+from ..models.trip_position import TripPosition as TripPositionModel
+
+# Cada posição ocupa FIELDS valores double: latitude, longitude, velocidade, direção e instante (epoch)
+FIELDS = 5
+BUFFER_CAPACITY = 256
+FLUSH_SECONDS = 5.0
+# Posições que falharam ao gravar são mantidas para a próxima tentativa até este limite
+MAX_UNSAVED_ROWS = 10000
+# Buffer sem posições novas há mais que isto é descartado na gravação: cobre as viagens
+# encerradas por outro worker, cujo close() não roda neste
+IDLE_SECONDS = 600.0
+
+
+class PositionBuffer:
+    # Buffer circular sobre um array compacto; as posições mais antigas ainda não
+    # gravadas são sobrescritas se o banco ficar indisponível por muito tempo
+    __slots__ = ("values", "capacity", "head", "size", "pending", "closed", "touched")
+
+    def __init__(self, capacity: int = BUFFER_CAPACITY):
+        self.values = array("d", bytes(8 * FIELDS * capacity))
+        self.capacity = capacity
+        self.head = 0
+        self.size = 0
+        self.pending = 0
+        self.closed = False
+        self.touched = time.monotonic()
+
+    def append(self, latitude, longitude, speed, heading, timestamp):
+        offset = self.head * FIELDS
+        values = self.values
+        values[offset] = latitude
+        values[offset + 1] = longitude
+        values[offset + 2] = math.nan if speed is None else speed
+        values[offset + 3] = math.nan if heading is None else heading
+        values[offset + 4] = timestamp
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.pending = min(self.pending + 1, self.capacity)
+        self.touched = time.monotonic()
+
+    def _read(self, slot: int):
+        offset = slot * FIELDS
+        return tuple(self.values[offset:offset + FIELDS])
+
+    def latest(self):
+        if not self.size:
+            return None
+        return self._read((self.head - 1) % self.capacity)
+
+    def take_pending(self) -> list:
+        # Posições ainda não gravadas, da mais antiga para a mais recente
+        start = self.head - self.pending
+        rows = [self._read((start + index) % self.capacity) for index in range(self.pending)]
+        self.pending = 0
+        return rows
+
+
+def _to_timestamp(recorded_at: datetime) -> float:
+    if recorded_at.tzinfo is None:
+        recorded_at = recorded_at.replace(tzinfo=timezone.utc)
+    return recorded_at.timestamp()
+
+def _to_datetime(timestamp: float) -> datetime:
+    # As datas do banco são gravadas em UTC sem fuso, como o datetime.utcnow dos modelos
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+def _optional(value: float):
+    return None if math.isnan(value) else value
+
+
+class TripPositionStore:
+    def __init__(self, session_factory=SessionLocal, capacity: int = BUFFER_CAPACITY, flush_seconds: float = FLUSH_SECONDS,
+                 idle_seconds: float = IDLE_SECONDS):
+        self.session_factory = session_factory
+        self.capacity = capacity
+        self.flush_seconds = flush_seconds
+        self.idle_seconds = idle_seconds
+        self._buffers = {}
+        self._unsaved = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def is_tracking(self, trip_id: int) -> bool:
+        buffer = self._buffers.get(trip_id)
+        return buffer is not None and not buffer.closed
+
+    def record(self, trip_id: int, latitude: float, longitude: float, speed=None, heading=None, recorded_at: datetime = None) -> dict:
+        timestamp = _to_timestamp(recorded_at or datetime.utcnow())
+        with self._lock:
+            buffer = self._buffers.get(trip_id)
+            if buffer is None or buffer.closed:
+                buffer = self._buffers[trip_id] = PositionBuffer(self.capacity)
+            buffer.append(latitude, longitude, speed, heading, timestamp)
+            fix = buffer.latest()
+        return self._as_dict(trip_id, fix)
+
+    def latest(self, trip_id: int, db: Session = None):
+        # O(1): leitura da última posição do buffer, sem acesso ao banco. Com mais de um
+        # worker, o que recebe a leitura pode não ser o que recebe as posições: sem nada
+        # no buffer, a última posição gravada de uma viagem ativa é lida do banco
+        with self._lock:
+            buffer = self._buffers.get(trip_id)
+            fix = buffer.latest() if buffer and not buffer.closed else None
+        if fix:
+            return self._as_dict(trip_id, fix)
+        return self.persisted(db, trip_id) if db is not None else None
+
+    @staticmethod
+    def persisted(db: Session, trip_id: int):
+        # Pelo índice (trip_id, recorded_at): uma única linha
+        row = db.execute(
+            select(TripPositionModel.latitude, TripPositionModel.longitude, TripPositionModel.speed,
+                   TripPositionModel.heading, TripPositionModel.recorded_at)
+            .join(TripModel, TripModel.id == TripPositionModel.trip_id)
+            .where(TripPositionModel.trip_id == trip_id, TripModel.status == TripStatusEnum.ATIVA)
+            .order_by(TripPositionModel.recorded_at.desc())
+            .limit(1)
+        ).first()
+        return {"trip_id": trip_id, **row._mapping} if row else None
+
+    def close(self, trip_id: int):
+        # Viagem encerrada: o buffer é descartado depois de gravar o que falta
+        with self._lock:
+            buffer = self._buffers.get(trip_id)
+            if buffer:
+                buffer.closed = True
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            idle = time.monotonic() - self.idle_seconds
+            with self._lock:
+                rows = self._unsaved
+                self._unsaved = []
+                for trip_id, buffer in list(self._buffers.items()):
+                    rows.extend(self._as_row(trip_id, fix) for fix in buffer.take_pending())
+                    if buffer.closed or buffer.touched < idle:
+                        del self._buffers[trip_id]
+            if not rows:
+                return 0
+            try:
+                with self.session_factory() as session:
+                    session.execute(insert(TripPositionModel), rows)
+                    session.commit()
+            except Exception as error:
+                print(f"Erro ao gravar posições dos ônibus: {error}")
+                with self._lock:
+                    self._unsaved = (rows + self._unsaved)[-MAX_UNSAVED_ROWS:]
+                return 0
+            return len(rows)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="trip-positions-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_seconds):
+            self.flush()
+
+    @staticmethod
+    def _as_dict(trip_id: int, fix) -> dict:
+        latitude, longitude, speed, heading, timestamp = fix
+        return {
+            "trip_id": trip_id,
+            "latitude": latitude,
+            "longitude": longitude,
+            "speed": _optional(speed),
+            "heading": _optional(heading),
+            "recorded_at": _to_datetime(timestamp)
+        }
+
+    @staticmethod
+    def _as_row(trip_id: int, fix) -> dict:
+        row = TripPositionStore._as_dict(trip_id, fix)
+        row["create_date"] = datetime.utcnow()
+        return row
+
+
+trip_positions = TripPositionStore()
@@ -0,0 +1,224 @@
+from sqlalchemy import bindparam, func, or_, select
+from sqlalchemy.orm import aliased
+# As consultas são montadas na importação: os modelos dos relacionamentos resolvidos
+# por nome precisam estar registrados antes
+from ..models import faculty, user_type  # noqa: F401
+from ..models.archive import StudentTripArchive, TripBusStopArchive
+from ..models.bus import Bus as BusModel
+from ..models.bus_stop import BusStop as BusStopModel
+from ..models.student_trip import StudentTrip as StudentTripModel, StudentStatusEnum
+from ..models.trip import Trip as TripModel, TripStatusEnum
+from ..models.trip_bus_stop import TripBusStop as TripBusStopModel, TripBusStopStatusEnum
+from ..models.user import User as UserModel
+
+# Consultas das rotas mais acessadas, montadas uma única vez na importação. Os valores
+# de cada requisição entram por bindparam, então a chave de cache da instrução é
+# calculada uma vez por processo e o SQL é compilado uma vez por engine; a cada
+# requisição só os parâmetros mudam. Uso: db.execute(ACTIVE_BUSES).all() ou
+# db.execute(TRIP_DETAILS[model], {"trip_id": trip_id}).all()
+
+# Alunos que ainda ocupam lugar no ônibus e cujos pontos continuam no percurso
+RIDING_STATUSES = (
+    StudentStatusEnum.PRESENTE,
+    StudentStatusEnum.EM_AULA,
+    StudentStatusEnum.AGUARDANDO_NO_PONTO
+)
+
+
+def _active_buses():
+    trip_alias = aliased(TripModel)
+    student_trip_alias = aliased(StudentTripModel)
+    return (
+        select(
+            BusModel.id.label("bus_id"),
+            BusModel.registration_number,
+            BusModel.name,
+            BusModel.capacity,
+            trip_alias.id.label("trip_id"),
+            trip_alias.trip_type,
+            func.count(student_trip_alias.id).label("occupied_seats")
+        )
+        .select_from(BusModel)
+        .join(trip_alias, BusModel.id == trip_alias.bus_id)
+        .outerjoin(
+            student_trip_alias,
+            (student_trip_alias.trip_id == trip_alias.id) &
+            (student_trip_alias.status.in_(RIDING_STATUSES)) &
+            (student_trip_alias.system_deleted == 0)
+        )
+        .where(
+            trip_alias.status == TripStatusEnum.ATIVA,
+            trip_alias.system_deleted == 0,
+            BusModel.system_deleted == 0
+        )
+        .group_by(
+            BusModel.id,
+            BusModel.registration_number,
+            BusModel.name,
+            BusModel.capacity,
+            trip_alias.id,
+            trip_alias.trip_type
+        )
+    ), trip_alias
+
+# Ônibus em viagens ativas com os lugares ocupados
+ACTIVE_BUSES, _trip = _active_buses()
+# O mesmo, sem o ônibus em que o aluno já está (parâmetro exclude_bus_id)
+ACTIVE_BUSES_EXCEPT = ACTIVE_BUSES.where(_trip.bus_id != bindparam("exclude_bus_id"))
+
+
+def _stops_with_riders(student_trip_model, trip_bus_stop_model):
+    return select(
+        BusStopModel.name,
+        trip_bus_stop_model.status,
+        trip_bus_stop_model.bus_stop_id
+    ).join(
+        trip_bus_stop_model, BusStopModel.id == trip_bus_stop_model.bus_stop_id
+    ).join(
+        student_trip_model, student_trip_model.point_id == trip_bus_stop_model.bus_stop_id
+    ).where(
+        trip_bus_stop_model.trip_id == bindparam("trip_id"),
+        student_trip_model.trip_id == bindparam("trip_id"),
+        trip_bus_stop_model.system_deleted == 0,
+        student_trip_model.status.in_(RIDING_STATUSES),
+        student_trip_model.system_deleted == 0
+    ).distinct()
+
+# Pontos da viagem com alunos a bordo ou aguardando, pelos modelos de trip_models(trip)
+TRIP_STOPS_WITH_RIDERS = {
+    (StudentTripModel, TripBusStopModel): _stops_with_riders(StudentTripModel, TripBusStopModel),
+    (StudentTripArchive, TripBusStopArchive): _stops_with_riders(StudentTripArchive, TripBusStopArchive),
+}
+
+
+def _trip_details(model):
+    return select(
+        UserModel.name,
+        BusStopModel.name,
+        model.status,
+        UserModel.profile_picture
+    ).join(
+        UserModel, UserModel.id == model.student_id
+    ).join(
+        BusStopModel, BusStopModel.id == model.point_id
+    ).where(
+        model.trip_id == bindparam("trip_id"),
+        model.system_deleted == 0
+    ).order_by(model.id)
+
+# Alunos da viagem com nome, ponto, status e foto, na tabela ativa ou no arquivo
+TRIP_DETAILS = {
+    StudentTripModel: _trip_details(StudentTripModel),
+    StudentTripArchive: _trip_details(StudentTripArchive),
+}
+
+# Pontos "A caminho" que ainda têm alunos para buscar
+STOPS_ON_THE_WAY = select(
+    TripBusStopModel.trip_id,
+    TripBusStopModel.bus_stop_id,
+    TripBusStopModel.status,
+    TripBusStopModel.id,
+    BusStopModel.name
+).join(
+    BusStopModel, BusStopModel.id == TripBusStopModel.bus_stop_id
+).join(
+    StudentTripModel, StudentTripModel.point_id == TripBusStopModel.bus_stop_id
+).where(
+    TripBusStopModel.trip_id == bindparam("trip_id"),
+    StudentTripModel.trip_id == bindparam("trip_id"),
+    TripBusStopModel.status == TripBusStopStatusEnum.A_CAMINHO,
+    TripBusStopModel.system_deleted == 0,
+    StudentTripModel.status.in_(RIDING_STATUSES),
+    StudentTripModel.system_deleted == 0
+).distinct()
+
+
+def _changed_students(model):
+    return select(
+        model.id,
+        UserModel.name,
+        BusStopModel.name,
+        model.status,
+        UserModel.profile_picture,
+        model.system_deleted,
+        model.change_seq
+    ).join(
+        UserModel, UserModel.id == model.student_id
+    ).join(
+        BusStopModel, BusStopModel.id == model.point_id
+    ).where(
+        model.trip_id == bindparam("trip_id"),
+        model.change_seq > bindparam("since")
+    ).order_by(model.change_seq, model.id)
+
+def _changed_stops(model):
+    return select(
+        model.id,
+        model.bus_stop_id,
+        BusStopModel.name,
+        model.status,
+        model.system_deleted,
+        model.change_seq
+    ).join(
+        BusStopModel, BusStopModel.id == model.bus_stop_id
+    ).where(
+        model.trip_id == bindparam("trip_id"),
+        model.change_seq > bindparam("since")
+    ).order_by(model.change_seq, model.id)
+
+# Alunos e pontos alterados depois do cursor (parâmetro since), pelo índice
+# (trip_id, change_seq) e pelos modelos de trip_models(trip)
+TRIP_CHANGED_STUDENTS = {
+    (StudentTripModel, TripBusStopModel): _changed_students(StudentTripModel),
+    (StudentTripArchive, TripBusStopArchive): _changed_students(StudentTripArchive),
+}
+TRIP_CHANGED_STOPS = {
+    (StudentTripModel, TripBusStopModel): _changed_stops(TripBusStopModel),
+    (StudentTripArchive, TripBusStopArchive): _changed_stops(TripBusStopArchive),
+}
+
+# Todos os pontos da viagem com as coordenadas
+TRIP_STOPS_WITH_LOCATION = select(TripBusStopModel, BusStopModel).join(
+    BusStopModel, BusStopModel.id == TripBusStopModel.bus_stop_id
+).where(
+    TripBusStopModel.trip_id == bindparam("trip_id"),
+    TripBusStopModel.system_deleted == 0
+)
+
+# Pontos com alunos que ainda serão buscados
+WAITING_STOP_IDS = select(StudentTripModel.point_id).where(
+    StudentTripModel.trip_id == bindparam("trip_id"),
+    StudentTripModel.status.in_(RIDING_STATUSES),
+    StudentTripModel.system_deleted == 0
+).distinct()
+
+# Primeiro da fila de espera cujo ponto ainda não passou, com o tipo da viagem; pelo
+# índice (trip_id, waitlist_position), sem ler os demais alunos
+WAITLIST_HEAD = select(
+    StudentTripModel.id,
+    TripModel.trip_type
+).join(
+    TripModel, TripModel.id == StudentTripModel.trip_id
+).outerjoin(
+    TripBusStopModel,
+    (TripBusStopModel.trip_id == StudentTripModel.trip_id) &
+    (TripBusStopModel.bus_stop_id == StudentTripModel.point_id) &
+    (TripBusStopModel.system_deleted == 0)
+).where(
+    StudentTripModel.trip_id == bindparam("trip_id"),
+    StudentTripModel.waitlist_position.isnot(None),
+    StudentTripModel.status == StudentStatusEnum.FILA_DE_ESPERA,
+    or_(TripBusStopModel.status.is_(None), TripBusStopModel.status != TripBusStopStatusEnum.JA_PASSOU)
+).order_by(StudentTripModel.waitlist_position).limit(1)
+
+# Posição e tamanho da fila numa única leitura do intervalo da viagem no índice
+# (trip_id, waitlist_position). Não é O(1): promoções (que pulam quem teve o ponto
+# passado) e desistências deixam lacunas na numeração, então nem a posição nem o
+# tamanho saem de waitlist_tail e da cabeça; o custo é proporcional ao tamanho da fila
+WAITLIST_POSITION = select(
+    func.count().filter(StudentTripModel.waitlist_position < bindparam("position")),
+    func.count()
+).select_from(StudentTripModel).where(
+    StudentTripModel.trip_id == bindparam("trip_id"),
+    StudentTripModel.waitlist_position.isnot(None)
+)
@@ -0,0 +1,221 @@
+import os
+import threading
+import time
+from collections import deque
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event, insert, update
+from sqlalchemy.orm import Session, sessionmaker
+from ..config.database import SessionLocal
+from ..models.cache_version import CacheVersion
+
+# URLs das réplicas de leitura, separadas por vírgula; sem réplicas, tudo vai para o primário
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Uma réplica mais atrasada que isto deixa de receber leituras até alcançar o primário
+MAX_REPLICA_LAG_SECONDS = float(os.getenv("MAX_REPLICA_LAG_SECONDS", "5"))
+REPLICA_CHECK_SECONDS = 1.0
+# Depois de uma escrita, o cliente lê do primário por este tempo (lê o que acabou de gravar)
+STICKY_SECONDS = float(os.getenv("READ_STICKY_SECONDS", "10"))
+STICKY_COOKIE = "buzz_read_primary"
+# Identificador que o aplicativo envia em cada requisição, para quem não guarda o cookie
+STICKY_HEADER = "X-Client-Id"
+# Linha de cache_versions que o roteador incrementa no primário a cada medição
+HEARTBEAT_NAME = "replica_heartbeat"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+MAX_STICKY_CLIENTS = 10000
+MAX_VERSION_HISTORY = 10000
+
+
+class Replica:
+    def __init__(self, url: str, engine=None):
+        self.engine = engine or create_engine(url, pool_pre_ping=True)
+        self.name = self.engine.url.render_as_string(hide_password=True)
+        self.session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.healthy = False
+        self.lag = None
+        self.version = None
+        self.error = None
+
+    def status(self) -> dict:
+        return {"name": self.name, "healthy": self.healthy, "lag_seconds": self.lag, "version": self.version, "error": self.error}
+
+
+def read_heartbeat(db: Session) -> int:
+    return db.query(CacheVersion.version).filter(CacheVersion.name == HEARTBEAT_NAME).scalar() or 0
+
+def beat(db: Session) -> int:
+    # Incrementa o batimento no primário e confirma, para que as réplicas o recebam
+    version = db.execute(
+        update(CacheVersion.__table__).where(CacheVersion.name == HEARTBEAT_NAME)
+        .values(version=CacheVersion.version + 1).returning(CacheVersion.version)
+    ).scalar()
+    if version is None:
+        db.execute(insert(CacheVersion.__table__).values(name=HEARTBEAT_NAME, version=1))
+        version = 1
+    db.commit()
+    return version
+
+
+class ReplicaRouter:
+    # Escolhe o banco de cada leitura. A cada medição o roteador incrementa um batimento
+    # no primário (linha própria em cache_versions) e lê o valor que cada réplica já tem:
+    # o atraso é o tempo desde que o primário passou do batimento que a réplica ainda tem.
+    # Como o batimento anda mesmo sem escritas, uma réplica que parou de aplicar o log
+    # aparece atrasada. Funciona igual no Postgres e em dois arquivos SQLite.
+    def __init__(self, primary_factory=SessionLocal, replicas=(), max_lag: float = MAX_REPLICA_LAG_SECONDS,
+                 check_seconds: float = REPLICA_CHECK_SECONDS, sticky_seconds: float = STICKY_SECONDS):
+        self.primary_factory = primary_factory
+        self.replicas = [replica if isinstance(replica, Replica) else Replica(replica) for replica in replicas]
+        self.max_lag = max_lag
+        self.check_seconds = check_seconds
+        self.sticky_seconds = sticky_seconds
+        self.primary_version = None
+        self._versions = deque()
+        self._sticky = {}
+        self._next = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.reads = {"replica": 0, "sticky": 0, "fallback": 0}
+
+    def start(self):
+        # O batimento é uma escrita no primário: roda numa thread própria, fora das
+        # requisições de leitura. Até a primeira medição as leituras vão para o primário
+        if not self.replicas or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="replica-heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        self.refresh()
+        while not self._stop.wait(self.check_seconds):
+            self.refresh()
+
+    def refresh(self):
+        try:
+            self.check()
+        except Exception as error:
+            # Sem o primário não há como medir o atraso: as leituras vão para o primário
+            print(f"Erro ao verificar as réplicas de leitura: {error}")
+            for replica in self.replicas:
+                replica.healthy = False
+
+    def check(self, now: float = None):
+        now = time.monotonic() if now is None else now
+        with self.primary_factory() as session:
+            self.primary_version = beat(session)
+        if not self._versions or self.primary_version > self._versions[-1][0]:
+            # Não se sabe desde quando o primário tem a versão da primeira medição: uma
+            # réplica que ainda não a alcançou é tratada como atrasada demais
+            self._versions.append((self.primary_version, now if self._versions else float("-inf")))
+            if len(self._versions) > MAX_VERSION_HISTORY:
+                self._versions.popleft()
+
+        for replica in self.replicas:
+            try:
+                with replica.session_factory() as session:
+                    replica.version = read_heartbeat(session)
+            except Exception as error:
+                replica.healthy, replica.lag, replica.error = False, None, str(error)
+                continue
+            replica.healthy, replica.error = True, None
+            replica.lag = self._lag(replica.version, now)
+
+        # Versões que todas as réplicas saudáveis já alcançaram não são mais necessárias
+        versions = [replica.version for replica in self.replicas if replica.healthy]
+        if versions:
+            while len(self._versions) > 1 and self._versions[0][0] <= min(versions):
+                self._versions.popleft()
+
+    def _lag(self, version: int, now: float) -> float:
+        if version >= self.primary_version:
+            return 0.0
+        for primary_version, seen in self._versions:
+            if primary_version > version:
+                return round(now - seen, 3)
+        return float("inf")
+
+    def mark_write(self, request: Request, response: Response):
+        # Chamado depois de cada requisição de escrita bem-sucedida. O cookie cobre os
+        # clientes que o guardam, em qualquer worker. O cabeçalho X-Client-Id cobre o
+        # aplicativo, que pode não guardá-lo, mas fica na memória deste processo: com
+        # vários workers, só as leituras atendidas pelo mesmo worker da escrita vão para o
+        # primário. O endereço não serve: atrás do proxy ou de um NAT é o de muitos clientes
+        if not self.replicas or request.method in SAFE_METHODS or response.status_code >= 400:
+            return
+        response.set_cookie(STICKY_COOKIE, "1", max_age=int(self.sticky_seconds), httponly=True)
+        client = request.headers.get(STICKY_HEADER)
+        if client:
+            with self._lock:
+                if len(self._sticky) >= MAX_STICKY_CLIENTS:
+                    now = time.monotonic()
+                    self._sticky = {key: until for key, until in self._sticky.items() if until > now}
+                self._sticky[client] = time.monotonic() + self.sticky_seconds
+
+    def is_sticky(self, request: Request) -> bool:
+        if request.cookies.get(STICKY_COOKIE):
+            return True
+        client = request.headers.get(STICKY_HEADER)
+        until = self._sticky.get(client) if client else None
+        return until is not None and until > time.monotonic()
+
+    def session_for(self, request: Request) -> Session:
+        if not self.replicas:
+            return self.primary_factory()
+        if self.is_sticky(request):
+            self.reads["sticky"] += 1
+            return self.primary_factory()
+
+        # A leitura usa a última medição da thread do batimento, sem acessar o primário
+        usable = [replica for replica in self.replicas if replica.healthy and replica.lag is not None and replica.lag <= self.max_lag]
+        if not usable:
+            self.reads["fallback"] += 1
+            return self.primary_factory()
+        self._next = index = (self._next + 1) % len(usable)
+        session = usable[index].session_factory()
+        session.info["replica"] = usable[index].name
+        self.reads["replica"] += 1
+        return session
+
+    def status(self) -> dict:
+        return {
+            "primary_version": self.primary_version,
+            "max_lag_seconds": self.max_lag,
+            "replicas": [replica.status() for replica in self.replicas],
+            "reads": dict(self.reads)
+        }
+
+
+read_router = ReplicaRouter(replicas=DATABASE_REPLICA_URLS)
+
+
+def get_read_db(request: Request):
+    # Dependência das rotas só de leitura: réplica quando houver uma em dia, primário
+    # quando não houver, quando estiverem atrasadas ou logo após uma escrita do cliente
+    db = read_router.session_for(request)
+    try:
+        yield db
+    finally:
+        db.close()
+
+def read_source(db: Session) -> str:
+    return db.info.get("replica", "primary")
+
+async def read_your_writes(request: Request, call_next):
+    # Middleware: depois de uma escrita, as leituras do mesmo cliente vão para o
+    # primário por alguns segundos, até as réplicas receberem a alteração
+    response = await call_next(request)
+    read_router.mark_write(request, response)
+    return response
+
+
+@event.listens_for(Session, "before_flush")
+def refuse_replica_writes(session, flush_context, instances):
+    if "replica" in session.info and (session.new or session.deleted or any(session.is_modified(obj) for obj in session.dirty)):
+        raise RuntimeError("Sessão de réplica de leitura não aceita escritas")
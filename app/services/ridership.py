@@ -0,0 +1,112 @@
+from collections import defaultdict
+from datetime import date, datetime
+from sqlalchemy import delete, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from ..models.ridership_rollup import RidershipRollup, RidershipDimensionEnum
+from ..models.student_trip import StudentStatusEnum
+from ..models.trip import Trip as TripModel, TripStatusEnum
+from ..models.user import User
+from .archive import trip_models
+
+COUNTERS = ("trips", "riders", "waitlisted", "not_returning")
+REBUILD_BATCH_SIZE = 200
+
+def _counter(status) -> str:
+    if status == StudentStatusEnum.FILA_DE_ESPERA:
+        return "waitlisted"
+    if status == StudentStatusEnum.NAO_VOLTARA:
+        return "not_returning"
+    return "riders"
+
+def record_trip_ridership(db: Session, trip: TripModel):
+    # Soma os alunos da viagem nos totais do dia. Chamado na mesma transação que conclui
+    # a viagem: lê apenas os alunos desta viagem, nunca o histórico
+    student_trip_model, _ = trip_models(trip)
+    rows = db.query(
+        student_trip_model.point_id,
+        User.faculty_id,
+        student_trip_model.status,
+        func.count(student_trip_model.id)
+    ).outerjoin(User, User.id == student_trip_model.student_id).filter(
+        student_trip_model.trip_id == trip.id,
+        student_trip_model.system_deleted == 0
+    ).group_by(student_trip_model.point_id, User.faculty_id, student_trip_model.status).all()
+
+    bus_key = (RidershipDimensionEnum.BUS, trip.bus_id)
+    totals = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    totals[bus_key]["trips"] = 1
+    for point_id, faculty_id, status, count in rows:
+        counter = _counter(status)
+        totals[bus_key][counter] += count
+        for key in ((RidershipDimensionEnum.STOP, point_id), (RidershipDimensionEnum.FACULTY, faculty_id)):
+            if key[1] is not None:
+                # Cada ponto ou faculdade atendido conta a viagem uma vez
+                totals[key]["trips"] = 1
+                totals[key][counter] += count
+
+    day = trip.create_date.date()
+    now = datetime.utcnow()
+    _upsert(db, [
+        {"day": day, "dimension": dimension.value, "key_id": key_id, "trip_type": trip.trip_type, "update_date": now, **counts}
+        for (dimension, key_id), counts in totals.items()
+    ])
+
+def _upsert(db: Session, rows: list):
+    # INSERT ... ON CONFLICT somando os contadores: viagens concluídas ao mesmo tempo
+    # no mesmo dia não disputam a leitura e regravação da linha
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    table = RidershipRollup.__table__
+    statement = dialect.insert(table).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=["dimension", "day", "key_id", "trip_type"],
+        set_={
+            **{counter: table.c[counter] + statement.excluded[counter] for counter in COUNTERS},
+            "update_date": statement.excluded.update_date
+        }
+    )
+    db.execute(statement)
+
+def rebuild_ridership(db: Session, batch_size: int = REBUILD_BATCH_SIZE) -> int:
+    # Recalcula os totais a partir das viagens concluídas (ativas e arquivadas)
+    db.execute(delete(RidershipRollup))
+    last_id, total = 0, 0
+    while True:
+        trips = db.query(TripModel).filter(
+            TripModel.status == TripStatusEnum.CONCLUIDA,
+            TripModel.system_deleted == 0,
+            TripModel.id > last_id
+        ).order_by(TripModel.id).limit(batch_size).all()
+        if not trips:
+            break
+        for trip in trips:
+            record_trip_ridership(db, trip)
+        db.commit()
+        last_id = trips[-1].id
+        total += len(trips)
+    db.commit()
+    return total
+
+def _report_filters(dimension: RidershipDimensionEnum, start_date: date, end_date: date, trip_type):
+    filters = [
+        RidershipRollup.dimension == dimension.value,
+        RidershipRollup.day >= start_date,
+        RidershipRollup.day <= end_date
+    ]
+    if trip_type is not None:
+        filters.append(RidershipRollup.trip_type == trip_type)
+    return filters
+
+def _sums():
+    return [func.sum(getattr(RidershipRollup, counter)).label(counter) for counter in COUNTERS]
+
+def ridership_totals(db: Session, dimension: RidershipDimensionEnum, start_date: date, end_date: date, trip_type=None) -> list:
+    return db.query(RidershipRollup.key_id, *_sums()).filter(
+        *_report_filters(dimension, start_date, end_date, trip_type)
+    ).group_by(RidershipRollup.key_id).order_by(RidershipRollup.key_id).all()
+
+def ridership_daily(db: Session, dimension: RidershipDimensionEnum, key_id: int, start_date: date, end_date: date, trip_type=None) -> list:
+    return db.query(RidershipRollup.day, *_sums()).filter(
+        *_report_filters(dimension, start_date, end_date, trip_type),
+        RidershipRollup.key_id == key_id
+    ).group_by(RidershipRollup.day).order_by(RidershipRollup.day).all()
@@ -0,0 +1,63 @@
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+from ..models.student_trip import StudentTrip as StudentTripModel, StudentStatusEnum
+from ..models.trip_bus_stop import TripBusStop as TripBusStopModel, TripBusStopStatusEnum
+from ..schemas.trip_bus_stop import RouteState, TripBusStop
+
+# Status que só um ponto da viagem pode ter de cada vez
+SINGLE_STOP_STATUSES = (TripBusStopStatusEnum.NO_PONTO, TripBusStopStatusEnum.PROXIMO_PONTO)
+
+def load_route(db: Session, trip_id: int):
+    # Todas as paradas da viagem em uma única consulta, na ordem de criação
+    return db.query(TripBusStopModel).filter(
+        TripBusStopModel.trip_id == trip_id,
+        TripBusStopModel.system_deleted == 0
+    ).order_by(TripBusStopModel.id).all()
+
+def find_stop(stops, status):
+    return next((stop for stop in stops if stop.status == status), None)
+
+def students_waiting(db: Session, trip_id: int, bus_stop_id: int) -> bool:
+    # Alunos "Em aula" ou "Aguardando no ponto" impedem a saída do ponto
+    return db.query(StudentTripModel.id).filter(
+        StudentTripModel.trip_id == trip_id,
+        StudentTripModel.point_id == bus_stop_id,
+        StudentTripModel.status.in_([StudentStatusEnum.AGUARDANDO_NO_PONTO, StudentStatusEnum.EM_AULA])
+    ).first() is not None
+
+def route_state(trip_id: int, stops) -> RouteState:
+    items = [TripBusStop.model_validate(stop) for stop in stops]
+    return RouteState(
+        trip_id=trip_id,
+        current_stop=next((item for item in items if item.status == TripBusStopStatusEnum.NO_PONTO), None),
+        next_stop=next((item for item in items if item.status == TripBusStopStatusEnum.PROXIMO_PONTO), None),
+        stops=items
+    )
+
+def route_conflict(db: Session, trip_id: int) -> bool:
+    # Chamado depois das escritas de pontos da viagem. Cada uma incrementa trips.change_seq
+    # na mesma transação (app/services/changes.py), o que trava a linha da viagem até o
+    # commit: duas requisições na mesma rota passam por aqui uma de cada vez, e a segunda
+    # já vê o que a primeira gravou, mesmo que tenham alterado pontos diferentes
+    return db.query(TripBusStopModel.status).filter(
+        TripBusStopModel.trip_id == trip_id,
+        TripBusStopModel.system_deleted == 0,
+        TripBusStopModel.status.in_(SINGLE_STOP_STATUSES)
+    ).group_by(TripBusStopModel.status).having(func.count() > 1).first() is not None
+
+def flush_route(db: Session, trip_id: int, stops) -> RouteState:
+    # O flush faz UPDATE ... WHERE version = ? em cada parada alterada; se outra
+    # requisição alterou alguma delas antes, ou se a rota ficou com dois pontos "No ponto"
+    # ou "Próximo ponto", a transação é desfeita e a operação recusada.
+    # O commit fica com a unidade de trabalho da requisição
+    try:
+        db.flush()
+        conflict = route_conflict(db, trip_id)
+    except StaleDataError:
+        conflict = True
+    if conflict:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="O status foi alterado por outra requisição, tente novamente")
+    return route_state(trip_id, stops)
@@ -0,0 +1,140 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+EARTH_RADIUS_METERS = 6371000.0
+# Tempo máximo gasto melhorando uma rota (2-opt) por requisição
+IMPROVEMENT_BUDGET_SECONDS = 0.005
+MAX_CACHED_ROUTES = 512
+
+def haversine(origin, destination) -> float:
+    # Distância em metros entre duas coordenadas (latitude, longitude) em graus
+    lat1, lon1 = map(math.radians, origin)
+    lat2, lon2 = map(math.radians, destination)
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(a))
+
+@lru_cache(maxsize=256)
+def distance_matrix(stops: tuple):
+    # Matriz de distâncias calculada uma vez por conjunto de pontos.
+    # stops é uma tupla ordenada de (bus_stop_id, latitude, longitude); a chave
+    # inclui as coordenadas, então mover um ponto gera uma nova matriz.
+    index = {stop_id: position for position, (stop_id, _, _) in enumerate(stops)}
+    coordinates = [(latitude, longitude) for _, latitude, longitude in stops]
+    matrix = tuple(
+        tuple(haversine(origin, destination) for destination in coordinates)
+        for origin in coordinates
+    )
+    return index, matrix
+
+def path_length(matrix, origin, path) -> float:
+    total = matrix[origin][path[0]] if origin is not None and path else 0.0
+    return total + sum(matrix[a][b] for a, b in zip(path, path[1:]))
+
+def nearest_neighbor(matrix, origin, stops) -> list:
+    remaining = set(stops)
+    if origin is None:
+        # Sem posição conhecida, começa pelo ponto mais afastado dos demais
+        current = max(remaining, key=lambda stop: sum(matrix[stop][other] for other in remaining))
+        remaining.discard(current)
+        path = [current]
+    else:
+        current, path = origin, []
+    while remaining:
+        current = min(remaining, key=lambda stop: matrix[current][stop])
+        remaining.discard(current)
+        path.append(current)
+    return path
+
+def cheapest_insertion(matrix, origin, path, stop) -> list:
+    # Insere um ponto novo na posição que menos aumenta o percurso
+    sequence = [origin] + path
+    best_position, best_cost = len(path), None
+    for position in range(len(sequence)):
+        before = sequence[position]
+        after = sequence[position + 1] if position + 1 < len(sequence) else None
+        cost = (matrix[before][stop] if before is not None else 0.0)
+        cost += (matrix[stop][after] if after is not None else 0.0)
+        cost -= (matrix[before][after] if before is not None and after is not None else 0.0)
+        if best_cost is None or cost < best_cost:
+            best_position, best_cost = position, cost
+    return path[:best_position] + [stop] + path[best_position:]
+
+def two_opt(matrix, origin, path, deadline: float) -> list:
+    # Melhora o percurso invertendo trechos enquanto houver ganho e tempo disponível
+    def distance(a, b):
+        return matrix[a][b] if a is not None and b is not None else 0.0
+
+    path = list(path)
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(len(path) - 1):
+            before = path[i - 1] if i > 0 else origin
+            for j in range(i + 1, len(path)):
+                after = path[j + 1] if j + 1 < len(path) else None
+                delta = (distance(before, path[j]) + distance(path[i], after)
+                         - distance(before, path[i]) - distance(path[j], after))
+                if delta < -1e-9:
+                    path[i:j + 1] = reversed(path[i:j + 1])
+                    improved = True
+            if time.perf_counter() >= deadline:
+                break
+    return path
+
+def plan_route(matrix, origin, stops, previous=None, budget: float = IMPROVEMENT_BUDGET_SECONDS) -> list:
+    # Ordem de visita quase ótima (caminho aberto a partir de origin). Com uma rota
+    # anterior, os pontos que saíram são removidos e os novos inseridos, em vez de
+    # recalcular tudo do zero.
+    if not stops:
+        return []
+    deadline = time.perf_counter() + budget
+    wanted = set(stops)
+    if previous:
+        path = [stop for stop in previous if stop in wanted]
+        for stop in sorted(wanted.difference(path)):
+            path = cheapest_insertion(matrix, origin, path, stop)
+    else:
+        path = nearest_neighbor(matrix, origin, wanted)
+    return two_opt(matrix, origin, path, deadline)
+
+
+class RouteOrderCache:
+    # Última ordem calculada por viagem, usada como ponto de partida do próximo cálculo
+    def __init__(self, maxsize: int = MAX_CACHED_ROUTES):
+        self.maxsize = maxsize
+        self._routes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def order(self, trip_id: int, stops: tuple, origin_id, waiting_ids) -> list:
+        index, matrix = distance_matrix(stops)
+        origin = index.get(origin_id)
+        waiting = [index[stop_id] for stop_id in waiting_ids if stop_id in index]
+
+        with self._lock:
+            cached = self._routes.get(trip_id)
+        previous = cached[1] if cached and cached[0] == stops else None
+        path = plan_route(matrix, origin, waiting, previous)
+
+        with self._lock:
+            self._routes[trip_id] = (stops, path)
+            self._routes.move_to_end(trip_id)
+            while len(self._routes) > self.maxsize:
+                self._routes.popitem(last=False)
+
+        ids = [stop_id for stop_id, _, _ in stops]
+        legs = []
+        current = origin
+        for position in path:
+            legs.append((ids[position], matrix[current][position] if current is not None else 0.0))
+            current = position
+        return legs
+
+    def discard(self, trip_id: int):
+        with self._lock:
+            self._routes.pop(trip_id, None)
+
+
+route_orders = RouteOrderCache()
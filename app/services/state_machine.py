@@ -0,0 +1,141 @@
+from datetime import datetime
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from ..models.student_trip import StudentStatusEnum
+from ..models.trip import Trip as TripModel, TripStatusEnum
+from ..models.trip_bus_stop import TripBusStopStatusEnum
+from .stop_history import record_transition
+from .active_trips import track_changes
+from .changes import stamp_change_seq
+
+
+class StateMachine:
+    def __init__(self, transitions: dict, history=None):
+        # history(db, row, from_status, to_status) registra cada transição aplicada
+        self.history = history
+        # Tabelas calculadas uma única vez: destinos por status e origens por destino
+        self.transitions = {status: frozenset(targets) for status, targets in transitions.items()}
+        self.sources = {}
+        for status, targets in self.transitions.items():
+            for target in targets:
+                self.sources.setdefault(target, set()).add(status)
+        self.sources = {target: frozenset(origins) for target, origins in self.sources.items()}
+
+    def allows(self, current_status, new_status) -> bool:
+        return new_status in self.transitions.get(current_status, ())
+
+    def sources_for(self, new_status) -> frozenset:
+        return self.sources.get(new_status, frozenset())
+
+    def apply(self, db: Session, model, row_id: int, new_status, from_statuses, *criteria):
+        # Compare-and-set: um único UPDATE ... WHERE id = ? AND status IN (...).
+        # Retorna a linha atualizada ou None se o status mudou (ou não era permitido).
+        if not from_statuses:
+            return None
+        values = {"status": new_status, "update_date": datetime.utcnow()}
+        # Modelos com controle de versão também têm a versão incrementada
+        if hasattr(model, "version"):
+            values["version"] = model.version + 1
+        # O status anterior é lido pelo próprio UPDATE (o lado direito do SET usa os valores antigos)
+        if hasattr(model, "previous_status"):
+            values["previous_status"] = model.status
+        keys = list(values)
+        statement = (
+            update(model)
+            .where(model.id == row_id, model.status.in_(list(from_statuses)), *criteria)
+            .values(**values)
+            .returning(model, *[getattr(model, key) for key in keys])
+        )
+        result = db.execute(statement).first()
+        if result is None:
+            return None
+        row = result[0]
+        # A sincronização da sessão avalia as expressões (version + 1, previous_status = status)
+        # com os valores em memória; os valores gravados de fato vêm do RETURNING
+        for key, value in zip(keys, result[1:]):
+            set_committed_value(row, key, value)
+        # Alunos e pontos entram na sequência de alterações da viagem; só depois do
+        # UPDATE, para que uma tentativa que não encontrou a linha não trave a viagem
+        if hasattr(model, "change_seq"):
+            stamp_change_seq(db, model, row)
+        if self.history:
+            self.history(db, row, row.previous_status, new_status)
+        return row
+
+
+def complete_trip(db: Session, trip_id: int, trip_type):
+    # Conclusão da viagem como compare-and-set, no mesmo padrão de StateMachine.apply: de
+    # duas finalizações simultâneas só uma encontra a viagem ATIVA (e soma os totais).
+    # Retorna a viagem concluída ou None se ela já não estava ativa.
+    now = datetime.utcnow()
+    result = db.execute(
+        update(TripModel)
+        .where(TripModel.id == trip_id, TripModel.trip_type == trip_type, TripModel.status == TripStatusEnum.ATIVA)
+        .values(status=TripStatusEnum.CONCLUIDA, completed_date=now, update_date=now)
+        .returning(TripModel)
+    ).first()
+    if result is None:
+        return None
+    # O UPDATE não passa pelo flush: a viagem sai do registro de viagens ativas após o commit
+    track_changes(db, [trip_id])
+    return result[0]
+
+
+STUDENT_TRIP_STATES = StateMachine({
+    StudentStatusEnum.EM_AULA: [
+        StudentStatusEnum.AGUARDANDO_NO_PONTO,
+        StudentStatusEnum.NAO_VOLTARA,
+        StudentStatusEnum.PRESENTE
+    ],
+    StudentStatusEnum.AGUARDANDO_NO_PONTO: [
+        StudentStatusEnum.PRESENTE,
+        StudentStatusEnum.EM_AULA,
+        StudentStatusEnum.NAO_VOLTARA
+    ],
+    StudentStatusEnum.NAO_VOLTARA: [
+        StudentStatusEnum.PRESENTE,
+        StudentStatusEnum.EM_AULA,
+        StudentStatusEnum.AGUARDANDO_NO_PONTO
+    ],
+    StudentStatusEnum.FILA_DE_ESPERA: [
+        StudentStatusEnum.PRESENTE,
+        StudentStatusEnum.EM_AULA,
+        StudentStatusEnum.AGUARDANDO_NO_PONTO,
+        StudentStatusEnum.NAO_VOLTARA
+    ],
+    StudentStatusEnum.PRESENTE: [StudentStatusEnum.NAO_VOLTARA]
+})
+
+# Saídas de NAO_VOLTARA e FILA_DE_ESPERA ocupam uma vaga e exigem verificações extras
+STUDENT_STATUSES_REQUIRING_CHECKS = frozenset([
+    StudentStatusEnum.NAO_VOLTARA,
+    StudentStatusEnum.FILA_DE_ESPERA
+])
+
+TRIP_BUS_STOP_STATES = StateMachine({
+    TripBusStopStatusEnum.A_CAMINHO: [
+        TripBusStopStatusEnum.NO_PONTO,
+        TripBusStopStatusEnum.PROXIMO_PONTO,
+        TripBusStopStatusEnum.ONIBUS_COM_PROBLEMA
+    ],
+    TripBusStopStatusEnum.NO_PONTO: [
+        TripBusStopStatusEnum.JA_PASSOU,
+        TripBusStopStatusEnum.ONIBUS_COM_PROBLEMA
+    ],
+    TripBusStopStatusEnum.PROXIMO_PONTO: [
+        TripBusStopStatusEnum.NO_PONTO,
+        TripBusStopStatusEnum.ONIBUS_COM_PROBLEMA
+    ],
+    TripBusStopStatusEnum.JA_PASSOU: [],
+    TripBusStopStatusEnum.ONIBUS_COM_PROBLEMA: [
+        TripBusStopStatusEnum.A_CAMINHO,
+        TripBusStopStatusEnum.NO_PONTO,
+        TripBusStopStatusEnum.PROXIMO_PONTO,
+        TripBusStopStatusEnum.JA_PASSOU
+    ],
+    # Pontos de desembarque (viagens de ida) nunca tiveram restrição de transição
+    TripBusStopStatusEnum.DESENBARQUE: [
+        status for status in TripBusStopStatusEnum if status != TripBusStopStatusEnum.DESENBARQUE
+    ]
+}, history=record_transition)
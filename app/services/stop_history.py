@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from ..models.trip_bus_stop import TripBusStop as TripBusStopModel, TripBusStopStatusEnum
+from ..models.trip_bus_stop_transition import TripBusStopTransition
+from ..models.stop_travel_stat import StopTravelStat
+
+# Média móvel sobre aproximadamente as últimas ROLLING_WINDOW viagens de cada trecho
+ROLLING_WINDOW = 50
+# Passo dos quantis proporcional à média do trecho, com um mínimo em segundos
+QUANTILE_STEP = 0.05
+MIN_QUANTILE_STEP_SECONDS = 1.0
+# Intervalos maiores que isso (ônibus parado, viagem esquecida aberta) não entram nas estatísticas
+MAX_TRAVEL_SECONDS = timedelta(hours=2).total_seconds()
+
+PENDING_STATUSES = (TripBusStopStatusEnum.A_CAMINHO, TripBusStopStatusEnum.PROXIMO_PONTO)
+
+def update_travel_stat(stat: StopTravelStat, seconds: float):
+    # Atualização incremental: média móvel e quantis por aproximação estocástica
+    # (q sobe passo * tau ou desce passo * (1 - tau)), sem guardar as amostras
+    stat.sample_count = (stat.sample_count or 0) + 1
+    if stat.sample_count == 1:
+        stat.mean_seconds = stat.median_seconds = stat.p90_seconds = seconds
+        return
+    stat.mean_seconds += (seconds - stat.mean_seconds) / min(stat.sample_count, ROLLING_WINDOW)
+    step = max(stat.mean_seconds * QUANTILE_STEP, MIN_QUANTILE_STEP_SECONDS)
+    stat.median_seconds = _move_quantile(stat.median_seconds, seconds, 0.5, step)
+    stat.p90_seconds = max(_move_quantile(stat.p90_seconds, seconds, 0.9, step), stat.median_seconds)
+
+def _move_quantile(estimate: float, seconds: float, quantile: float, step: float) -> float:
+    if seconds > estimate:
+        return estimate + step * quantile
+    if seconds < estimate:
+        return estimate - step * (1 - quantile)
+    return estimate
+
+def record_transition(db: Session, stop: TripBusStopModel, from_status, to_status, moment: datetime = None):
+    # Grava a transição na mesma transação da alteração do ponto
+    moment = moment or datetime.utcnow()
+    transition = TripBusStopTransition(
+        trip_id=stop.trip_id,
+        bus_stop_id=stop.bus_stop_id,
+        from_status=from_status,
+        to_status=to_status,
+        create_date=moment
+    )
+    if stop.id is None:
+        transition.trip_bus_stop = stop
+    else:
+        transition.trip_bus_stop_id = stop.id
+    db.add(transition)
+
+    if to_status == TripBusStopStatusEnum.NO_PONTO:
+        _record_arrival(db, stop, moment)
+    return transition
+
+def _record_arrival(db: Session, stop: TripBusStopModel, moment: datetime):
+    with db.no_autoflush:
+        previous = db.query(
+            TripBusStopTransition.bus_stop_id, TripBusStopTransition.create_date
+        ).filter(
+            TripBusStopTransition.trip_id == stop.trip_id,
+            TripBusStopTransition.to_status == TripBusStopStatusEnum.NO_PONTO
+        ).order_by(TripBusStopTransition.id.desc()).first()
+        if not previous or previous.bus_stop_id == stop.bus_stop_id:
+            return
+        seconds = (moment - previous.create_date).total_seconds()
+        if seconds <= 0 or seconds > MAX_TRAVEL_SECONDS:
+            return
+
+        # O FOR UPDATE não trava uma linha que ainda não existe: o trecho é criado antes com
+        # INSERT ... ON CONFLICT DO NOTHING, e duas viagens chegando ao mesmo trecho novo
+        # ao mesmo tempo não esbarram na restrição única
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        db.execute(dialect.insert(StopTravelStat.__table__).values(
+            from_bus_stop_id=previous.bus_stop_id, to_bus_stop_id=stop.bus_stop_id, sample_count=0
+        ).on_conflict_do_nothing(index_elements=["from_bus_stop_id", "to_bus_stop_id"]))
+        stat = db.query(StopTravelStat).filter(
+            StopTravelStat.from_bus_stop_id == previous.bus_stop_id,
+            StopTravelStat.to_bus_stop_id == stop.bus_stop_id
+        ).with_for_update().one()
+    update_travel_stat(stat, seconds)
+
+@event.listens_for(Session, "before_flush")
+def record_flushed_transitions(session, flush_context, instances):
+    # Alterações de status feitas pelo ORM (atribuição + commit) entram no mesmo flush
+    for obj in list(session.new):
+        if isinstance(obj, TripBusStopModel) and obj.status is not None:
+            record_transition(session, obj, None, obj.status)
+    for obj in list(session.dirty):
+        if not isinstance(obj, TripBusStopModel):
+            continue
+        history = inspect(obj).attrs.status.history
+        if history.deleted and history.deleted[0] != obj.status:
+            obj.previous_status = history.deleted[0]
+            record_transition(session, obj, history.deleted[0], obj.status)
+
+def estimate_arrivals(db: Session, trip_id: int, stops, now: datetime = None) -> dict:
+    # ETA em segundos para cada ponto pendente (bus_stop_id -> segundos ou None).
+    # A partir da última chegada da viagem, o percurso segue o próximo ponto
+    # escolhido e depois, a cada passo, o ponto pendente com menor tempo mediano.
+    now = now or datetime.utcnow()
+    pending = {bus_stop_id for bus_stop_id, status in stops if status in PENDING_STATUSES}
+    estimates = dict.fromkeys(pending)
+    if not pending:
+        return estimates
+
+    last_arrival = db.query(
+        TripBusStopTransition.bus_stop_id, TripBusStopTransition.create_date
+    ).filter(
+        TripBusStopTransition.trip_id == trip_id,
+        TripBusStopTransition.to_status == TripBusStopStatusEnum.NO_PONTO
+    ).order_by(TripBusStopTransition.id.desc()).first()
+    if not last_arrival:
+        return estimates
+
+    medians = {
+        (stat.from_bus_stop_id, stat.to_bus_stop_id): stat.median_seconds
+        for stat in db.query(StopTravelStat).filter(
+            StopTravelStat.from_bus_stop_id.in_(pending | {last_arrival.bus_stop_id}),
+            StopTravelStat.to_bus_stop_id.in_(pending)
+        )
+    }
+    next_stops = [bus_stop_id for bus_stop_id, status in stops if status == TripBusStopStatusEnum.PROXIMO_PONTO]
+
+    current = last_arrival.bus_stop_id
+    elapsed = 0.0
+    remaining = set(pending)
+    while remaining:
+        candidates = [stop for stop in next_stops if stop in remaining] or [
+            stop for stop in remaining if (current, stop) in medians
+        ]
+        leg = min(candidates, key=lambda stop: medians.get((current, stop), float("inf")), default=None)
+        if leg is None or (current, leg) not in medians:
+            break
+        elapsed += medians[(current, leg)]
+        remaining.discard(leg)
+        arrival = last_arrival.create_date + timedelta(seconds=elapsed)
+        estimates[leg] = max(0, round((arrival - now).total_seconds()))
+        current = leg
+    return estimates
@@ -0,0 +1,119 @@
+import math
+import threading
+import time
+from sqlalchemy.orm import Session
+from ..models.bus_stop import BusStop as BusStopModel
+from ..models.faculty import Faculty as FacultyModel
+from .routing import haversine
+
+# Células de ~550 m de lado em latitude
+CELL_DEGREES = 0.005
+METERS_PER_DEGREE = 111_320.0
+# Outras instâncias da aplicação também alteram os pontos; o índice é recarregado
+# por completo depois desse intervalo, uma consulta por minuto e não por requisição
+REFRESH_SECONDS = 60.0
+
+
+class StopIndex:
+    # Índice espacial em grade: cada ponto geocodificado fica na célula
+    # (latitude // CELL_DEGREES, longitude // CELL_DEGREES)
+    def __init__(self, cell_degrees: float = CELL_DEGREES, refresh_seconds: float = REFRESH_SECONDS):
+        self.cell_degrees = cell_degrees
+        self.refresh_seconds = refresh_seconds
+        self._stops = {}
+        self._cells = {}
+        self._bounds = None
+        self._loaded_at = None
+        self._lock = threading.RLock()
+
+    def _cell(self, latitude: float, longitude: float):
+        return math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees)
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds
+
+    def load(self, db: Session):
+        rows = db.query(BusStopModel, FacultyModel.name).join(
+            FacultyModel, BusStopModel.faculty_id == FacultyModel.id
+        ).filter(
+            BusStopModel.system_deleted == 0,
+            FacultyModel.system_deleted == 0,
+            BusStopModel.latitude.isnot(None),
+            BusStopModel.longitude.isnot(None)
+        ).all()
+        with self._lock:
+            self._stops.clear()
+            self._cells.clear()
+            self._bounds = None
+            for bus_stop, faculty_name in rows:
+                self._add(bus_stop.id, f"{bus_stop.name} - {faculty_name}", bus_stop.latitude, bus_stop.longitude)
+            self._loaded_at = time.monotonic()
+
+    def _add(self, stop_id: int, name: str, latitude: float, longitude: float):
+        cell = self._cell(latitude, longitude)
+        self._stops[stop_id] = (name, latitude, longitude, cell)
+        self._cells.setdefault(cell, set()).add(stop_id)
+        self._bounds = None
+
+    def upsert(self, bus_stop: BusStopModel, faculty_name: str):
+        # Chamado depois de criar ou alterar um ponto; pontos sem coordenadas saem do índice
+        with self._lock:
+            self.remove(bus_stop.id)
+            if bus_stop.system_deleted == 0 and bus_stop.latitude is not None and bus_stop.longitude is not None:
+                self._add(bus_stop.id, f"{bus_stop.name} - {faculty_name}", bus_stop.latitude, bus_stop.longitude)
+
+    def remove(self, stop_id: int):
+        with self._lock:
+            entry = self._stops.pop(stop_id, None)
+            if entry:
+                cell_stops = self._cells[entry[3]]
+                cell_stops.discard(stop_id)
+                if not cell_stops:
+                    del self._cells[entry[3]]
+                self._bounds = None
+
+    def nearest(self, latitude: float, longitude: float, k: int) -> list:
+        # Busca em anéis de células ao redor da posição até que nenhum ponto fora
+        # dos anéis visitados possa estar mais perto que o k-ésimo encontrado
+        origin = (latitude, longitude)
+        with self._lock:
+            if not self._stops:
+                return []
+            if self._bounds is None:
+                rows = [cell[0] for cell in self._cells]
+                columns = [cell[1] for cell in self._cells]
+                self._bounds = (min(rows), max(rows), min(columns), max(columns))
+            min_row, max_row, min_column, max_column = self._bounds
+            row, column = self._cell(latitude, longitude)
+            max_ring = max(abs(row - min_row), abs(row - max_row), abs(column - min_column), abs(column - max_column))
+            # Menor lado de uma célula em metros (a longitude encolhe com a latitude)
+            cell_meters = self.cell_degrees * METERS_PER_DEGREE * max(math.cos(math.radians(abs(latitude) + self.cell_degrees)), 1e-6)
+
+            found = []
+            for ring in range(max_ring + 1):
+                for cell in _ring_cells(row, column, ring):
+                    for stop_id in self._cells.get(cell, ()):
+                        name, stop_latitude, stop_longitude, _ = self._stops[stop_id]
+                        found.append((haversine(origin, (stop_latitude, stop_longitude)), stop_id, name))
+                if len(found) >= k:
+                    found.sort()
+                    if found[k - 1][0] <= ring * cell_meters:
+                        break
+            found.sort()
+            return found[:k]
+
+
+def _ring_cells(row: int, column: int, ring: int):
+    # Células na borda do quadrado de raio ring ao redor de (row, column)
+    if ring == 0:
+        yield row, column
+        return
+    for cell_column in range(column - ring, column + ring + 1):
+        yield row - ring, cell_column
+        yield row + ring, cell_column
+    for cell_row in range(row - ring + 1, row + ring):
+        yield cell_row, column - ring
+        yield cell_row, column + ring
+
+
+stop_index = StopIndex()
@@ -0,0 +1,76 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+from sqlalchemy.orm import Session
+from ..config.database import SessionLocal
+
+ON_COMMIT_KEY = "on_commit"
+# Transação que a classe da rota termina ela mesma, depois da resposta montada (ver deferred_commit)
+_deferred = ContextVar("deferred_transaction", default=None)
+
+
+class DeferredTransaction:
+    __slots__ = ("session", "begin")
+
+    def __init__(self, begin=None):
+        # begin(db) roda no início da transação da rota, antes do corpo da rota
+        self.session = None
+        self.begin = begin
+
+
+def unit_of_work(session_factory=SessionLocal):
+    # Uma transação por requisição: a rota só faz flush e o commit acontece uma única
+    # vez, depois da resposta montada e antes de ela ser enviada. Qualquer exceção,
+    # inclusive HTTPException, desfaz tudo o que a requisição gravou.
+    db = session_factory()
+    deferred = _deferred.get()
+    try:
+        if deferred is not None:
+            deferred.session = db
+            if deferred.begin:
+                deferred.begin(db)
+        yield db
+    except BaseException:
+        db.rollback()
+        db.close()
+        raise
+    if deferred is None:
+        finish(db)
+
+def finish(db: Session, before_commit=None):
+    # Confirma a transação da requisição; before_commit(db) grava na mesma transação
+    try:
+        if before_commit:
+            before_commit(db)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    else:
+        for callback in db.info.pop(ON_COMMIT_KEY, ()):
+            try:
+                callback()
+            except Exception as error:
+                print(f"Erro ao executar ação posterior ao commit: {error}")
+    finally:
+        db.close()
+
+@contextmanager
+def deferred_commit(begin=None):
+    # Dentro deste bloco, a transação aberta por unit_of_work não é confirmada ao fim da
+    # rota: fica em DeferredTransaction.session para quem chamou terminá-la com finish()
+    deferred = DeferredTransaction(begin)
+    token = _deferred.set(deferred)
+    try:
+        yield deferred
+    finally:
+        _deferred.reset(token)
+
+def get_transaction():
+    # Dependência das rotas de escrita
+    yield from unit_of_work()
+
+def on_commit(db: Session, callback, *args, **kwargs):
+    # Efeitos fora do banco (notificações, caches em memória) só depois do commit;
+    # descartados se a requisição falhar
+    db.info.setdefault(ON_COMMIT_KEY, []).append(partial(callback, *args, **kwargs))
@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from ..config.database import SessionLocal
+from ..models.bus import Bus as BusModel
+from ..models.student_trip import StudentTrip as StudentTripModel, StudentStatusEnum
+from ..models.trip import Trip as TripModel, TripTypeEnum
+from ..dependencies.notifications import deliver_multicast_notification
+from .background import background_jobs
+from .devices import device_tokens
+from .queries import WAITLIST_HEAD, WAITLIST_POSITION
+from .state_machine import STUDENT_TRIP_STATES
+from .unit_of_work import on_commit
+
+# Vagas liberadas na mesma viagem dentro desta janela viram uma única notificação por
+# aluno da fila, com o número de vagas livres no momento do envio
+WAITLIST_NOTIFY_WINDOW_SECONDS = float(os.getenv("WAITLIST_NOTIFY_WINDOW_SECONDS", "30"))
+# Intervalo máximo entre as verificações das janelas vencidas
+TICK_SECONDS = 1.0
+# Status que não ocupam lugar no ônibus, como em check_capacity
+NOT_SEATED = (StudentStatusEnum.NAO_VOLTARA, StudentStatusEnum.FILA_DE_ESPERA)
+# Tentativas de promover a cabeça da fila quando outra requisição a promoveu antes
+PROMOTION_ATTEMPTS = 3
+
+
+class WaitlistNotifier:
+    # Junta as vagas liberadas de cada viagem: a primeira abre a janela e as seguintes
+    # só são contadas. Quando a janela fecha, uma única tarefa da fila em segundo plano
+    # lê as vagas livres e avisa os alunos da fila de espera. A janela é de cada
+    # processo; com vários workers, cada um envia no máximo um aviso por janela.
+    def __init__(self, window: float = WAITLIST_NOTIFY_WINDOW_SECONDS):
+        self.window = window
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.freed = 0
+        self.sent = 0
+
+    def seat_freed(self, trip_id: int):
+        with self._lock:
+            self.freed += 1
+            if trip_id not in self._pending:
+                self._pending[trip_id] = time.monotonic() + self.window
+
+    def pending(self) -> dict:
+        with self._lock:
+            return dict(self._pending)
+
+    def flush(self, force: bool = False) -> int:
+        # Envia as janelas vencidas (todas, com force); retorna quantas viagens foram avisadas
+        now = time.monotonic()
+        with self._lock:
+            due = [trip_id for trip_id, deadline in self._pending.items() if force or deadline <= now]
+            for trip_id in due:
+                del self._pending[trip_id]
+        for trip_id in due:
+            background_jobs.submit("waitlist_notification", trip_id=trip_id)
+        self.sent += len(due)
+        return len(due)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="waitlist-notifier", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        # As janelas abertas são enviadas já, antes de a fila parar
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush(force=True)
+
+    def _run(self):
+        while not self._stop.wait(min(self.window, TICK_SECONDS)):
+            self.flush()
+
+
+def free_seats(db, trip_id: int) -> int:
+    occupied = select(func.count(StudentTripModel.id)).where(
+        StudentTripModel.trip_id == trip_id,
+        StudentTripModel.status.notin_(NOT_SEATED)
+    ).scalar_subquery()
+    capacity = db.execute(
+        select(BusModel.capacity - occupied).join(TripModel, TripModel.bus_id == BusModel.id).where(TripModel.id == trip_id)
+    ).scalar()
+    return max(capacity or 0, 0)
+
+def waitlist_message(seats: int) -> str:
+    if seats == 1:
+        return "Uma vaga no ônibus foi liberada. Verifique se você pode ser alocado."
+    return f"{seats} vagas no ônibus estão livres. Verifique se você pode ser alocado."
+
+@background_jobs.register("waitlist_notification")
+def notify_waitlist(trip_id: int, session_factory=SessionLocal) -> int:
+    # Uma notificação por aparelho dos alunos da fila, com as vagas livres agora; se
+    # as vagas já foram ocupadas, ninguém é avisado
+    with session_factory() as session:
+        seats = free_seats(session, trip_id)
+        if not seats:
+            return 0
+        waiting_students = session.execute(select(StudentTripModel.student_id).where(
+            StudentTripModel.trip_id == trip_id,
+            StudentTripModel.status == StudentStatusEnum.FILA_DE_ESPERA
+        )).scalars()
+        tokens = device_tokens(session, waiting_students)
+    if not tokens:
+        return 0
+    return deliver_multicast_notification(tokens, "Vaga disponível!", waitlist_message(seats))
+
+
+def waitlist_ticket(db: Session, trip_id: int) -> int:
+    # Próxima posição da fila da viagem, tirada do contador trips.waitlist_tail por um
+    # único UPDATE ... RETURNING: inscrições simultâneas nunca recebem a mesma posição
+    return db.execute(
+        update(TripModel)
+        .where(TripModel.id == trip_id)
+        .values(waitlist_tail=TripModel.waitlist_tail + 1, update_date=TripModel.update_date)
+        .returning(TripModel.waitlist_tail)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+
+def backfill_waitlist_positions(db: Session) -> int:
+    # Implantação: as posições da fila de cada viagem são renumeradas 1..n na ordem atual
+    # (posição e id; quem não tinha posição vai para o fim), o que desfaz posições
+    # repetidas antes do índice único, e o contador da viagem continua depois da última
+    db.query(StudentTripModel).filter(
+        StudentTripModel.status != StudentStatusEnum.FILA_DE_ESPERA,
+        StudentTripModel.waitlist_position.isnot(None)
+    ).update({StudentTripModel.waitlist_position: None}, synchronize_session=False)
+    queued = db.execute(
+        select(StudentTripModel.id, StudentTripModel.trip_id, StudentTripModel.waitlist_position)
+        .where(StudentTripModel.status == StudentStatusEnum.FILA_DE_ESPERA)
+        .order_by(StudentTripModel.trip_id, StudentTripModel.waitlist_position.is_(None),
+                  StudentTripModel.waitlist_position, StudentTripModel.id)
+    ).all()
+    tails, renumbered = {}, []
+    for row in queued:
+        tails[row.trip_id] = position = tails.get(row.trip_id, 0) + 1
+        if row.waitlist_position != position:
+            renumbered.append({"id": row.id, "waitlist_position": position})
+    if renumbered:
+        # Primeiro valores negativos, para a renumeração não colidir com as posições atuais
+        db.execute(update(StudentTripModel), [{**row, "waitlist_position": -row["waitlist_position"]} for row in renumbered])
+        db.execute(update(StudentTripModel), renumbered)
+    for trip_id, tail in tails.items():
+        db.query(TripModel).filter(TripModel.id == trip_id, TripModel.waitlist_tail < tail).update(
+            {TripModel.waitlist_tail: tail, TripModel.update_date: TripModel.update_date}, synchronize_session=False
+        )
+    db.commit()
+    return len(renumbered)
+
+def waitlist_position(db: Session, student_trip: StudentTripModel) -> dict:
+    ahead, waiting = db.execute(
+        WAITLIST_POSITION, {"trip_id": student_trip.trip_id, "position": student_trip.waitlist_position}
+    ).one()
+    return {
+        "student_trip_id": student_trip.id,
+        "trip_id": student_trip.trip_id,
+        "position": ahead + 1,
+        "waiting": waiting
+    }
+
+def promote_waitlist_head(db: Session, trip_id: int):
+    # A vaga liberada vai para o primeiro da fila na mesma transação, e só ele é avisado:
+    # os demais não disputam a vaga. Retorna a viagem do aluno promovido ou None
+    if free_seats(db, trip_id) <= 0:
+        return None
+    for _ in range(PROMOTION_ATTEMPTS):
+        head = db.execute(WAITLIST_HEAD, {"trip_id": trip_id}).first()
+        if not head:
+            return None
+        student_trip_id, trip_type = head
+        seated = StudentStatusEnum.PRESENTE if trip_type == TripTypeEnum.IDA else StudentStatusEnum.EM_AULA
+        promoted = STUDENT_TRIP_STATES.apply(
+            db, StudentTripModel, student_trip_id, seated, [StudentStatusEnum.FILA_DE_ESPERA]
+        )
+        if not promoted:
+            continue
+        promoted.waitlist_position = None
+        db.flush()
+        tokens = device_tokens(db, [promoted.student_id])
+        if tokens:
+            on_commit(db, background_jobs.submit, "multicast_notification", tokens=tokens, title="Você saiu da fila de espera!",
+                      body="Uma vaga foi liberada e você já está na viagem.")
+        return promoted
+    return None
+
+
+waitlist_notifier = WaitlistNotifier()
@@ -0,0 +1,3 @@
+# benchmarks/__init__.py
+# Suíte de benchmarks do Buzz: popula um campus sintético em um banco local e
+# mede a aplicação FastAPI real através de um cliente em processo.
@@ -0,0 +1,207 @@
+# benchmarks/compile_cache.py
+# CPU por requisição das rotas quentes e taxa de acerto do cache de compilação do
+# SQLAlchemy. A segunda tabela compara, consulta a consulta, a montagem com db.query()
+# a cada chamada (caminho antigo) com as instruções prontas de app/services/queries.py.
+# Uso:
+#   python -m benchmarks.compile_cache
+#   python -m benchmarks.compile_cache --requests 500 --json
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine.default import CACHE_HIT
+
+from . import environment
+
+DEFAULT_REQUESTS = 200
+
+
+class CacheProbe:
+    # Conta as execuções e quantas reaproveitaram o SQL já compilado
+    def __init__(self, engine):
+        self.engine = engine
+        self.executions = 0
+        self.hits = 0
+
+    def __enter__(self):
+        event.listen(self.engine, "after_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "after_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.executions += 1
+        if context is not None and context.cache_hit is CACHE_HIT:
+            self.hits += 1
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.executions if self.executions else 0.0
+
+
+def legacy_queries():
+    # Mesmas consultas no formato antigo, montadas a cada chamada
+    from sqlalchemy import func
+    from sqlalchemy.orm import aliased, joinedload
+    from app.models.bus import Bus
+    from app.models.bus_stop import BusStop
+    from app.models.student_trip import StudentTrip, StudentStatusEnum
+    from app.models.trip import Trip, TripStatusEnum
+    from app.models.trip_bus_stop import TripBusStop, TripBusStopStatusEnum
+
+    allowed = [StudentStatusEnum.PRESENTE, StudentStatusEnum.EM_AULA, StudentStatusEnum.AGUARDANDO_NO_PONTO]
+
+    def active_buses(db, trip_id):
+        trip_alias = aliased(Trip)
+        student_trip_alias = aliased(StudentTrip)
+        return db.query(
+            Bus.id, Bus.registration_number, Bus.name, Bus.capacity, trip_alias.id, trip_alias.trip_type,
+            func.count(student_trip_alias.id)
+        ).select_from(Bus).join(trip_alias, Bus.id == trip_alias.bus_id).outerjoin(
+            student_trip_alias,
+            (student_trip_alias.trip_id == trip_alias.id) & (student_trip_alias.status.in_([1, 2, 3])) &
+            (student_trip_alias.system_deleted == 0)
+        ).filter(
+            trip_alias.status == TripStatusEnum.ATIVA, trip_alias.system_deleted == 0, Bus.system_deleted == 0
+        ).group_by(Bus.id, Bus.registration_number, Bus.name, Bus.capacity, trip_alias.id, trip_alias.trip_type).all()
+
+    def trip_stops(db, trip_id):
+        return db.query(BusStop.name, TripBusStop.status, TripBusStop.bus_stop_id).join(
+            TripBusStop, BusStop.id == TripBusStop.bus_stop_id
+        ).join(StudentTrip, StudentTrip.point_id == TripBusStop.bus_stop_id).filter(
+            TripBusStop.trip_id == trip_id, StudentTrip.trip_id == trip_id, TripBusStop.system_deleted == 0,
+            StudentTrip.status.in_(allowed), StudentTrip.system_deleted == 0
+        ).distinct().all()
+
+    def trip_details(db, trip_id):
+        return db.query(StudentTrip).options(joinedload(StudentTrip.student), joinedload(StudentTrip.bus_stop)).filter(
+            StudentTrip.trip_id == trip_id, StudentTrip.system_deleted == 0
+        ).all()
+
+    def stops_on_the_way(db, trip_id):
+        return db.query(TripBusStop).options(joinedload(TripBusStop.bus_stop)).join(
+            StudentTrip, StudentTrip.point_id == TripBusStop.bus_stop_id
+        ).filter(
+            TripBusStop.trip_id == trip_id, StudentTrip.trip_id == trip_id,
+            TripBusStop.status == TripBusStopStatusEnum.A_CAMINHO, TripBusStop.system_deleted == 0,
+            StudentTrip.status.in_(allowed), StudentTrip.system_deleted == 0
+        ).distinct().all()
+
+    return {
+        "active_buses": active_buses,
+        "trip_bus_stops": trip_stops,
+        "trip_details": trip_details,
+        "stops_on_the_way": stops_on_the_way,
+    }
+
+
+def cached_queries():
+    from app.models.student_trip import StudentTrip
+    from app.models.trip_bus_stop import TripBusStop
+    from app.services import queries
+
+    return {
+        "active_buses": lambda db, trip_id: db.execute(queries.ACTIVE_BUSES).all(),
+        "trip_bus_stops": lambda db, trip_id: db.execute(
+            queries.TRIP_STOPS_WITH_RIDERS[(StudentTrip, TripBusStop)], {"trip_id": trip_id}).all(),
+        "trip_details": lambda db, trip_id: db.execute(queries.TRIP_DETAILS[StudentTrip], {"trip_id": trip_id}).all(),
+        "stops_on_the_way": lambda db, trip_id: db.execute(queries.STOPS_ON_THE_WAY, {"trip_id": trip_id}).all(),
+    }
+
+
+def measure_queries(session_factory, engine, trip_ids, runs: int, builders: dict) -> dict:
+    results = {}
+    with session_factory() as db:
+        for name, run in builders.items():
+            for trip_id in trip_ids:
+                run(db, trip_id)
+            with CacheProbe(engine) as probe:
+                started = time.process_time()
+                for index in range(runs):
+                    run(db, trip_ids[index % len(trip_ids)])
+                    # Mantém o mapa de identidade pequeno, como numa sessão por requisição
+                    db.expunge_all()
+                cpu = (time.process_time() - started) / runs * 1000
+            results[name] = {"cpu_ms": round(cpu, 3), "hit_rate": round(probe.hit_rate, 4)}
+    return results
+
+
+def measure_routes(client, engine, routes, requests: int) -> dict:
+    results = {}
+    for name, urls in routes.items():
+        for url in urls:
+            client.get(url).raise_for_status()
+        with CacheProbe(engine) as probe:
+            started = time.process_time()
+            for index in range(requests):
+                client.get(urls[index % len(urls)])
+            cpu = (time.process_time() - started) / requests * 1000
+        results[name] = {
+            "cpu_ms": round(cpu, 3),
+            "queries_per_request": round(probe.executions / requests, 2),
+            "hit_rate": round(probe.hit_rate, 4)
+        }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CPU por requisição e acerto do cache de compilação das consultas quentes")
+    parser.add_argument("--profile", default="small", help="Perfil do campus sintético (small, campus)")
+    parser.add_argument("--database-url", default=None, help="Banco local usado no benchmark (padrão: SQLite em benchmarks/.data)")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="Requisições (e execuções) por rota")
+    parser.add_argument("--json", action="store_true", help="Imprime o resultado em JSON")
+    args = parser.parse_args(argv)
+
+    environment.configure(args.database_url)
+
+    from fastapi.testclient import TestClient
+    from app.config.database import SessionLocal, engine
+    from app.services.coalescing import read_coalescer
+    from .seed import PROFILES, seed_campus
+
+    app = environment.load_app()
+    campus = seed_campus(engine, PROFILES[args.profile])
+    # Sem coalescência: cada requisição precisa chegar ao banco
+    read_coalescer.enabled = False
+
+    volta, ida = campus.active_volta_trip_ids, campus.active_ida_trip_ids
+    routes = {
+        "active_buses": ["/buses/active_trips"],
+        "trip_bus_stops": [f"/trips/{trip_id}/bus_stops" for trip_id in volta],
+        "trip_details": [f"/trips/{trip_id}/details" for trip_id in ida + volta],
+        "stops_on_the_way": [f"/trip_bus_stops/stops_on_the_way/{trip_id}" for trip_id in volta],
+        "route_order": [f"/trip_bus_stops/route_order/{trip_id}" for trip_id in volta],
+    }
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), TestClient(app) as client:
+        route_results = measure_routes(client, engine, routes, args.requests)
+    query_results = {
+        "antigo": measure_queries(SessionLocal, engine, volta, args.requests, legacy_queries()),
+        "pronto": measure_queries(SessionLocal, engine, volta, args.requests, cached_queries()),
+    }
+
+    if args.json:
+        print(json.dumps({"routes": route_results, "queries": query_results}, indent=2))
+        return 0
+
+    print(f"{'rota':<18} {'CPU ms/req':>11} {'consultas/req':>14} {'acerto cache':>13}")
+    for name, item in route_results.items():
+        print(f"{name:<18} {item['cpu_ms']:>11.3f} {item['queries_per_request']:>14} {item['hit_rate']:>12.1%}")
+    print()
+    print(f"{'consulta':<18} {'antigo ms':>10} {'pronto ms':>10} {'ganho':>7} {'acerto antigo':>14} {'acerto pronto':>14}")
+    for name, legacy in query_results["antigo"].items():
+        cached = query_results["pronto"][name]
+        gain = legacy["cpu_ms"] / cached["cpu_ms"] if cached["cpu_ms"] else float("inf")
+        print(
+            f"{name:<18} {legacy['cpu_ms']:>10.3f} {cached['cpu_ms']:>10.3f} {gain:>6.1f}x"
+            f" {legacy['hit_rate']:>13.1%} {cached['hit_rate']:>13.1%}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
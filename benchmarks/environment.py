@@ -0,0 +1,89 @@
+# benchmarks/environment.py
+# Prepara o ambiente antes de importar a aplicação: o app lê DATABASE_URL e as
+# credenciais do Firebase no momento da importação, então tudo precisa estar
+# definido antes do primeiro "import app".
+import json
+import os
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+DEFAULT_DATABASE_URL = "sqlite:///benchmarks/.data/campus.db"
+
+# Notificações que a aplicação tentou enviar durante o benchmark
+sent_notifications = []
+
+
+def configure(database_url: str = None) -> str:
+    url = database_url or os.getenv("BENCH_DATABASE_URL") or DEFAULT_DATABASE_URL
+    if url.startswith("sqlite:///"):
+        directory = os.path.dirname(url[len("sqlite:///"):])
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    os.environ["DATABASE_URL"] = url
+
+    # Nunca usamos as credenciais reais: uma conta de serviço descartável basta
+    # para a inicialização do firebase_admin, e os envios são interceptados
+    if not os.getenv("FIREBASE_CREDENTIALS_JSON"):
+        os.environ["FIREBASE_CREDENTIALS_JSON"] = json.dumps(_offline_service_account())
+    return url
+
+
+def load_app():
+    from app.main import app
+    from app.routers import notifications
+    from app.services import waitlist
+    from app.services.background import background_jobs
+
+    # O benchmark não deve disparar push reais para o FCM: nem pela rota, nem pelas
+    # tarefas em segundo plano (push, tópicos e envios em lote)
+    notifications.send_push_notification = _discard_push_notification
+    background_jobs.register("push_notification")(_discard_queued_push)
+    background_jobs.register("topic_notification")(_discard_topic_notification)
+    background_jobs.register("topic_subscription")(_discard_topic_subscription)
+    background_jobs.register("multicast_notification")(_discard_multicast_notification)
+    # O aviso da fila de espera chama o envio em lote diretamente
+    waitlist.deliver_multicast_notification = _discard_multicast_notification
+    return app
+
+
+async def _discard_push_notification(token: str, title: str, body: str):
+    sent_notifications.append((token, title))
+    return {"success": True, "message_id": "benchmark"}
+
+
+def _discard_queued_push(token: str, title: str, body: str) -> str:
+    sent_notifications.append((token, title))
+    return "benchmark"
+
+
+def _discard_topic_notification(topic: str, title: str, body: str, unsubscribe_tokens: list = None) -> str:
+    sent_notifications.append((topic, title))
+    return "benchmark"
+
+
+def _discard_topic_subscription(tokens: list, topic: str, subscribe: bool = True) -> int:
+    return len(tokens)
+
+
+def _discard_multicast_notification(tokens: list, title: str, body: str) -> int:
+    sent_notifications.extend((token, title) for token in tokens)
+    return len(tokens)
+
+
+def _offline_service_account() -> dict:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode("utf-8")
+    return {
+        "type": "service_account",
+        "project_id": "buzz-benchmark",
+        "private_key_id": "benchmark",
+        "private_key": pem,
+        "client_email": "benchmark@buzz-benchmark.iam.gserviceaccount.com",
+        "client_id": "0",
+        "token_uri": "https://oauth2.googleapis.com/token",
+    }
@@ -0,0 +1,119 @@
+# benchmarks/herd.py
+# Estouro de requisições: a cada chegada do ônibus a um ponto, todos os alunos da
+# viagem atualizam /trips/{id}/bus_stops e /buses/active_trips no mesmo instante.
+# Compara consultas ao banco por segundo com e sem a coalescência das leituras.
+# Uso:
+#   python -m benchmarks.herd
+#   python -m benchmarks.herd --riders 40 120 --waves 30 --interval 0.1
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+
+from sqlalchemy import event
+
+from . import environment
+from .stats import summarize
+
+DEFAULT_RIDERS = (40,)
+DEFAULT_WAVES = 20
+DEFAULT_INTERVAL = 0.1
+
+
+async def run_herd(app, trip_ids, riders: int, waves: int, interval: float):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    samples, errors = [], 0
+
+    async def refresh(url):
+        nonlocal errors
+        started = time.perf_counter()
+        response = await client.get(url)
+        samples.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            errors += 1
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://buzz.bench", timeout=None) as client:
+        started = time.perf_counter()
+        for wave in range(waves):
+            trip_id = trip_ids[wave % len(trip_ids)]
+            # Metade dos alunos olha os pontos da viagem e a outra metade a lista de ônibus
+            urls = [f"/trips/{trip_id}/bus_stops" if index % 2 else "/buses/active_trips" for index in range(riders)]
+            await asyncio.gather(*(refresh(url) for url in urls))
+            await asyncio.sleep(interval)
+        elapsed = time.perf_counter() - started
+    return summarize(samples, errors), elapsed
+
+
+def measure(app, engine, trip_ids, riders: int, waves: int, interval: float, enabled: bool) -> dict:
+    from app.services.coalescing import read_coalescer
+
+    statements = []
+    count = lambda conn, cursor, statement, *args: statements.append(statement)
+    read_coalescer.enabled = enabled
+    read_coalescer.invalidate()
+    read_coalescer.reset_stats()
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            summary, elapsed = asyncio.run(run_herd(app, trip_ids, riders, waves, interval))
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+        read_coalescer.enabled = True
+    return {
+        **summary,
+        "seconds": round(elapsed, 2),
+        "queries": len(statements),
+        "queries_per_second": round(len(statements) / elapsed, 1),
+        "queries_per_request": round(len(statements) / summary["requests"], 3),
+        "coalescing": read_coalescer.stats() if enabled else {}
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consultas ao banco sob estouro de leituras idênticas")
+    parser.add_argument("--profile", default="small", help="Perfil do campus sintético (small, campus)")
+    parser.add_argument("--database-url", default=None, help="Banco local usado no benchmark (padrão: SQLite em benchmarks/.data)")
+    parser.add_argument("--riders", type=int, nargs="+", default=list(DEFAULT_RIDERS), help="Requisições simultâneas por chegada")
+    parser.add_argument("--waves", type=int, default=DEFAULT_WAVES, help="Quantidade de chegadas do ônibus")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="Intervalo (s) entre as chegadas")
+    parser.add_argument("--json", action="store_true", help="Imprime o resultado em JSON")
+    args = parser.parse_args(argv)
+
+    environment.configure(args.database_url)
+
+    from app.config.database import engine
+    from .seed import PROFILES, seed_campus
+
+    app = environment.load_app()
+    campus = seed_campus(engine, PROFILES[args.profile])
+
+    results = {}
+    for riders in args.riders:
+        results[riders] = {
+            mode: measure(app, engine, campus.active_volta_trip_ids, riders, args.waves, args.interval, enabled)
+            for mode, enabled in (("sem", False), ("com", True))
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return 0
+
+    print(f"{'alunos':>7} {'modo':>5} {'req':>6} {'consultas':>10} {'consultas/s':>12} {'por req':>8} {'p50 ms':>8} {'p95 ms':>8} {'erros':>6}")
+    for riders, modes in results.items():
+        for mode, item in modes.items():
+            print(
+                f"{riders:>7} {mode:>5} {item['requests']:>6} {item['queries']:>10} {item['queries_per_second']:>12}"
+                f" {item['queries_per_request']:>8} {item['p50_ms']:>8} {item['p95_ms']:>8} {item['errors']:>6}"
+            )
+        for name, stats in modes["com"]["coalescing"].items():
+            print(f"        {name}: {stats['computed']} consultas, {stats['coalesced']} aguardaram, {stats['hits']} reaproveitadas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+# benchmarks/probe.py
+# Instrumentação do engine durante a simulação: tempo das escritas (que inclui a
+# espera por locks), erros de concorrência, espera e ocupação do pool de conexões.
+import threading
+import time
+
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.pool import NullPool
+
+from .stats import percentile
+
+# Escritas mais lentas que isso são contadas como espera por lock
+LOCK_WAIT_THRESHOLD = 0.020
+CONTENTION_MARKERS = ("locked", "deadlock", "could not serialize", "lock timeout", "lock not available")
+
+
+class DbProbe:
+    def __init__(self, engine, lock_wait_threshold: float = LOCK_WAIT_THRESHOLD):
+        self.engine = engine
+        self.lock_wait_threshold = lock_wait_threshold
+        self.write_durations = []
+        self.contention_errors = 0
+        self.other_errors = 0
+        self.pool_samples = []
+        self.waiting_locks_samples = []
+        self.pool_waits = []
+        self.pool_timeouts = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def start(self):
+        event.listen(self.engine, "before_cursor_execute", self._before_execute)
+        event.listen(self.engine, "after_cursor_execute", self._after_execute)
+        event.listen(self.engine, "handle_error", self._handle_error)
+        # O pool não expõe eventos antes do checkout, então medimos a espera no próprio connect()
+        pool = self.engine.pool
+        original_connect = pool.connect
+
+        def timed_connect():
+            started = time.perf_counter()
+            try:
+                return original_connect()
+            except exc.TimeoutError:
+                with self._lock:
+                    self.pool_timeouts += 1
+                raise
+            finally:
+                with self._lock:
+                    self.pool_waits.append(time.perf_counter() - started)
+
+        pool.connect = timed_connect
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+        event.remove(self.engine, "before_cursor_execute", self._before_execute)
+        event.remove(self.engine, "after_cursor_execute", self._after_execute)
+        event.remove(self.engine, "handle_error", self._handle_error)
+        del self.engine.pool.connect
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("probe_started", []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["probe_started"].pop()
+        if statement.lstrip()[:6].upper() in ("INSERT", "UPDATE", "DELETE"):
+            with self._lock:
+                self.write_durations.append(elapsed)
+
+    def _handle_error(self, context):
+        message = str(context.original_exception).lower()
+        with self._lock:
+            if any(marker in message for marker in CONTENTION_MARKERS):
+                self.contention_errors += 1
+            else:
+                self.other_errors += 1
+
+    def _sample(self):
+        # No Postgres também contamos as sessões bloqueadas esperando um lock,
+        # usando uma conexão fora do pool para não disputar vaga com a aplicação
+        is_postgres = self.engine.dialect.name == "postgresql"
+        monitor = create_engine(self.engine.url, poolclass=NullPool) if is_postgres else None
+        while not self._stop.wait(0.25):
+            pool = self.engine.pool
+            checked_out = pool.checkedout() if hasattr(pool, "checkedout") else 0
+            self.pool_samples.append(checked_out)
+            if is_postgres:
+                with monitor.connect() as conn:
+                    waiting = conn.execute(text("SELECT count(*) FROM pg_locks WHERE NOT granted")).scalar()
+                self.waiting_locks_samples.append(waiting)
+
+    def report(self) -> dict:
+        writes = sorted(self.write_durations)
+        lock_waits = [duration for duration in writes if duration >= self.lock_wait_threshold]
+        pool_waits = sorted(self.pool_waits)
+        return {
+            "pool_checkouts": len(pool_waits),
+            "pool_wait_p95_ms": round(percentile(pool_waits, 0.95) * 1000, 3),
+            "pool_wait_max_ms": round(pool_waits[-1] * 1000, 3) if pool_waits else 0.0,
+            "pool_timeouts": self.pool_timeouts,
+            "write_statements": len(writes),
+            "lock_waits": len(lock_waits),
+            "lock_wait_seconds": round(sum(lock_waits), 3),
+            "contention_errors": self.contention_errors,
+            "other_db_errors": self.other_errors,
+            "max_pool_checked_out": max(self.pool_samples, default=0),
+            "max_waiting_locks": max(self.waiting_locks_samples, default=0),
+        }
@@ -0,0 +1,117 @@
+# benchmarks/run.py
+# Uso:
+#   python -m benchmarks.run --profile small
+#   python -m benchmarks.run --profile campus --save-baseline
+#   BENCH_DATABASE_URL=postgresql://... python -m benchmarks.run --fail-on-regression
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+
+from . import environment
+from .stats import DEFAULT_TOLERANCE, compare, load_baseline, save_baseline, summarize
+
+WARMUP_ITERATIONS = 5
+
+
+def run_scenario(client, ctx, scenario):
+    samples = []
+    errors = 0
+    for iteration in range(scenario.iterations + WARMUP_ITERATIONS):
+        method, url, kwargs = scenario.prepare(ctx)
+        started = time.perf_counter()
+        response = client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - started
+        if scenario.cleanup:
+            scenario.cleanup(ctx, response)
+        if iteration < WARMUP_ITERATIONS:
+            continue
+        if response.status_code != scenario.expected_status:
+            errors += 1
+        samples.append(elapsed)
+    return summarize(samples, errors)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dos endpoints principais do Buzz")
+    parser.add_argument("--profile", default="small", help="Perfil do campus sintético (small, campus)")
+    parser.add_argument("--database-url", default=None, help="Banco local usado no benchmark (padrão: SQLite em benchmarks/.data)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplicador do número de requisições por cenário")
+    parser.add_argument("--only", nargs="*", default=None, help="Executa apenas os cenários informados")
+    parser.add_argument("--save-baseline", action="store_true", help="Grava o resultado como nova baseline do perfil")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Piora relativa do p95 aceita antes de acusar regressão")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Sai com código 1 se algum cenário regredir")
+    parser.add_argument("--json", action="store_true", help="Imprime o resultado em JSON")
+    args = parser.parse_args(argv)
+
+    database_url = environment.configure(args.database_url)
+
+    # A aplicação só pode ser importada depois que o ambiente foi configurado
+    from fastapi.testclient import TestClient
+    from app.config.database import SessionLocal, engine
+    from .scenarios import BenchContext, default_scenarios
+    from .seed import PROFILES, seed_campus
+
+    app = environment.load_app()
+    profile = PROFILES[args.profile]
+
+    started = time.perf_counter()
+    campus = seed_campus(engine, profile)
+    seed_seconds = time.perf_counter() - started
+    print(f"Campus '{args.profile}' populado em {seed_seconds:.1f}s: {campus.row_counts}", file=sys.stderr)
+
+    ctx = BenchContext(campus, SessionLocal)
+    scenarios = default_scenarios(args.scale)
+    if args.only:
+        scenarios = [scenario for scenario in scenarios if scenario.name in args.only]
+
+    results = {}
+    # Os prints de depuração dos routers continuam sendo executados, mas não poluem o relatório
+    with open(os.devnull, "w") as devnull, TestClient(app) as client:
+        for scenario in scenarios:
+            with contextlib.redirect_stdout(devnull):
+                results[scenario.name] = run_scenario(client, ctx, scenario)
+            print(f"  {scenario.name}: {results[scenario.name]}", file=sys.stderr)
+
+    baseline = load_baseline(args.profile)
+    comparison = compare(results, baseline, args.tolerance)
+
+    if args.json:
+        print(json.dumps({"results": results, "comparison": comparison}, indent=2))
+    else:
+        _print_table(results, comparison)
+
+    if args.save_baseline:
+        save_baseline(args.profile, results, {
+            "database": database_url.split("://")[0],
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "row_counts": campus.row_counts,
+        })
+        print(f"Baseline do perfil '{args.profile}' atualizada", file=sys.stderr)
+
+    regressions = [name for name, item in comparison.items() if item["regression"]]
+    if regressions and args.fail_on_regression:
+        print(f"Regressões detectadas: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _print_table(results, comparison):
+    header = f"{'cenário':<24}{'req':>6}{'erros':>7}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'Δp95':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, item in results.items():
+        delta = comparison.get(name)
+        delta_text = f"{delta['delta']:+.0%}{'!' if delta['regression'] else ''}" if delta else "-"
+        print(
+            f"{name:<24}{item['requests']:>6}{item['errors']:>7}{item['throughput_rps']:>9}"
+            f"{item['p50_ms']:>10}{item['p95_ms']:>10}{item['p99_ms']:>10}{delta_text:>9}"
+        )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
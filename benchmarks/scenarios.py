@@ -0,0 +1,185 @@
+# benchmarks/scenarios.py
+# Cenários medidos pelo benchmark. Cada cenário prepara o estado necessário fora
+# da medição (prepare), a requisição é cronometrada e depois o estado é
+# normalizado (cleanup) para não contaminar os cenários seguintes.
+import itertools
+import random
+from datetime import datetime
+
+from sqlalchemy import insert, select, update
+
+from app.models.student_trip import StudentTrip, StudentStatusEnum
+from app.models.trip import Trip, TripTypeEnum, TripStatusEnum
+from app.models.trip_bus_stop import TripBusStop, TripBusStopStatusEnum
+
+from .seed import CAMPUS_CENTER
+
+
+class Scenario:
+    def __init__(self, name, prepare, cleanup=None, iterations=200, expected_status=200):
+        self.name = name
+        self.prepare = prepare
+        self.cleanup = cleanup
+        self.iterations = iterations
+        self.expected_status = expected_status
+
+
+class BenchContext:
+    def __init__(self, campus, session_factory, seed: int = 42):
+        self.campus = campus
+        self.session_factory = session_factory
+        self.rng = random.Random(seed)
+        self.free_students = iter(campus.free_student_ids[campus.profile.riders_per_trip:])
+        # Alunos reservados para as viagens criadas pelos cenários de finalização
+        self.spare_roster = campus.free_student_ids[:campus.profile.riders_per_trip]
+        self.spare_fleet = itertools.cycle(zip(campus.spare_bus_ids, campus.spare_driver_ids))
+        self.outbound_trips = itertools.cycle(campus.active_ida_trip_ids)
+
+        with session_factory() as session:
+            rows = session.execute(
+                select(StudentTrip.id).filter(
+                    StudentTrip.trip_id.in_(campus.active_volta_trip_ids),
+                    StudentTrip.status == StudentStatusEnum.EM_AULA
+                )
+            ).scalars().all()
+        # Alterna cada aluno entre "Em aula" e "Aguardando no ponto"
+        self.toggle_targets = itertools.cycle(rows)
+        self.toggle_state = {student_trip_id: StudentStatusEnum.EM_AULA for student_trip_id in rows}
+
+    def create_trip(self, trip_type, student_status, stop_status, current_stop_status=None):
+        bus_id, driver_id = next(self.spare_fleet)
+        now = datetime.utcnow()
+        with self.session_factory() as session:
+            trip_id = session.execute(
+                insert(Trip).returning(Trip.id),
+                [{
+                    "trip_type": trip_type,
+                    "status": TripStatusEnum.ATIVA,
+                    "bus_id": bus_id,
+                    "driver_id": driver_id,
+                    "bus_issue": False,
+                    "system_deleted": 0,
+                    "create_date": now,
+                    "update_date": now,
+                }]
+            ).scalar_one()
+            stops = self.campus.stop_ids
+            points = {student_id: stops[index % len(stops)] for index, student_id in enumerate(self.spare_roster)}
+            session.execute(insert(StudentTrip), [
+                {"trip_id": trip_id, "student_id": student_id, "status": student_status,
+                 "point_id": point_id, "system_deleted": 0}
+                for student_id, point_id in points.items()
+            ])
+            distinct_points = sorted(set(points.values()))
+            session.execute(insert(TripBusStop), [
+                {"trip_id": trip_id, "bus_stop_id": point_id,
+                 "status": current_stop_status if current_stop_status and index == 0 else stop_status,
+                 "system_deleted": 0}
+                for index, point_id in enumerate(distinct_points)
+            ])
+            session.commit()
+        return trip_id
+
+    def conclude_trip(self, trip_id):
+        with self.session_factory() as session:
+            session.execute(update(Trip).where(Trip.id == trip_id).values(
+                status=TripStatusEnum.CONCLUIDA, completed_date=datetime.utcnow()
+            ))
+            session.commit()
+
+
+def _enroll_student(ctx):
+    body = {
+        "trip_id": next(ctx.outbound_trips),
+        "student_id": next(ctx.free_students),
+        "point_id": ctx.rng.choice(ctx.campus.stop_ids),
+    }
+    return "POST", "/student_trips/?waitlist=true", {"json": body}
+
+
+def _toggle_status(ctx):
+    student_trip_id = next(ctx.toggle_targets)
+    current = ctx.toggle_state[student_trip_id]
+    new_status = StudentStatusEnum.AGUARDANDO_NO_PONTO if current == StudentStatusEnum.EM_AULA else StudentStatusEnum.EM_AULA
+    ctx.toggle_state[student_trip_id] = new_status
+    return "PUT", f"/student_trips/{student_trip_id}/update_status?new_status={new_status.value}", {}
+
+
+def _finalize_outbound(ctx):
+    trip_id = ctx.create_trip(TripTypeEnum.IDA, StudentStatusEnum.PRESENTE, TripBusStopStatusEnum.DESENBARQUE)
+    return "PUT", f"/trips/{trip_id}/finalize_outbound_trip", {}
+
+
+def _conclude_return_trip(ctx, response):
+    if response.status_code == 200:
+        ctx.conclude_trip(response.json()["new_trip_id"])
+
+
+def _finalize_return(ctx):
+    trip_id = ctx.create_trip(TripTypeEnum.VOLTA, StudentStatusEnum.PRESENTE, TripBusStopStatusEnum.JA_PASSOU)
+    return "PUT", f"/trips/{trip_id}/finalize_return_trip", {}
+
+
+def _finalize_current_stop(ctx):
+    trip_id = ctx.create_trip(
+        TripTypeEnum.VOLTA, StudentStatusEnum.PRESENTE, TripBusStopStatusEnum.A_CAMINHO,
+        current_stop_status=TripBusStopStatusEnum.NO_PONTO
+    )
+    ctx.last_trip_id = trip_id
+    return "PUT", f"/trip_bus_stops/finalize_current_stop/{trip_id}", {}
+
+
+def _conclude_last_trip(ctx, response):
+    ctx.conclude_trip(ctx.last_trip_id)
+
+
+def _active_trips(ctx):
+    return "GET", "/buses/active_trips", {}
+
+
+def _trip_bus_stops(ctx):
+    return "GET", f"/trips/{ctx.rng.choice(ctx.campus.active_volta_trip_ids)}/bus_stops", {}
+
+
+def _trip_details(ctx):
+    trip_ids = ctx.campus.active_ida_trip_ids + ctx.campus.active_volta_trip_ids
+    return "GET", f"/trips/{ctx.rng.choice(trip_ids)}/details", {}
+
+
+def _route_order(ctx):
+    return "GET", f"/trip_bus_stops/route_order/{ctx.rng.choice(ctx.campus.active_volta_trip_ids)}", {}
+
+
+def _nearest_stops(ctx):
+    latitude = CAMPUS_CENTER[0] + ctx.rng.uniform(-0.02, 0.02)
+    longitude = CAMPUS_CENTER[1] + ctx.rng.uniform(-0.02, 0.02)
+    return "GET", "/bus_stops/nearest", {"params": {"lat": latitude, "lon": longitude, "k": 5}}
+
+
+def _driver_active_trip(ctx):
+    return "GET", f"/trips/active/{ctx.rng.choice(ctx.campus.active_driver_ids)}", {}
+
+
+def _student_active_trip(ctx):
+    return "GET", f"/student_trips/active/{ctx.rng.choice(ctx.campus.riding_student_ids)}", {}
+
+
+def default_scenarios(scale: float = 1.0):
+    def n(iterations):
+        return max(1, int(iterations * scale))
+
+    # A ordem importa: leituras primeiro, depois as escritas que alteram o estado
+    return [
+        Scenario("active_trips", _active_trips, iterations=n(300)),
+        Scenario("trip_bus_stops", _trip_bus_stops, iterations=n(300)),
+        Scenario("trip_details", _trip_details, iterations=n(300)),
+        Scenario("route_order", _route_order, iterations=n(300)),
+        Scenario("nearest_stops", _nearest_stops, iterations=n(300)),
+        Scenario("driver_active_trip", _driver_active_trip, iterations=n(300)),
+        Scenario("student_active_trip", _student_active_trip, iterations=n(300)),
+        Scenario("enroll_student", _enroll_student, iterations=n(200)),
+        Scenario("update_status", _toggle_status, iterations=n(200)),
+        Scenario("finalize_outbound_trip", _finalize_outbound, cleanup=_conclude_return_trip, iterations=n(40)),
+        Scenario("finalize_return_trip", _finalize_return, iterations=n(40)),
+        Scenario("finalize_current_stop", _finalize_current_stop, cleanup=_conclude_last_trip, iterations=n(40)),
+    ]
@@ -0,0 +1,278 @@
+# benchmarks/seed.py
+# Gera um campus sintético e realista: faculdades, pontos, ônibus, motoristas,
+# milhares de alunos e meses de viagens concluídas, além das viagens ativas do dia.
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+import bcrypt
+from sqlalchemy import func, insert, select
+
+from app.config.database import Base
+from app.models import bus_stop, faculty, user_type  # noqa: F401 (registra as tabelas)
+from app.models.bus import Bus
+from app.models.bus_stop import BusStop
+from app.models.faculty import Faculty
+from app.models.student_trip import StudentTrip, StudentStatusEnum
+from app.models.trip import Trip, TripTypeEnum, TripStatusEnum
+from app.models.trip_bus_stop import TripBusStop, TripBusStopStatusEnum
+from app.models.user import User
+from app.models.user_type import UserType, UserTypeNames
+
+STUDENT_TYPE_ID = 1
+DRIVER_TYPE_ID = 2
+ADMIN_TYPE_ID = 3
+BUS_CAPACITY = 44
+CHUNK_SIZE = 5000
+CAMPUS_CENTER = (-21.2245, -47.8325)
+
+
+@dataclass(frozen=True)
+class CampusProfile:
+    faculties: int
+    stops_per_faculty: int
+    buses: int
+    students: int
+    months: int
+    riders_per_trip: int
+    # Ônibus e motoristas reservados para cenários que criam viagens novas
+    spare_buses: int = 4
+
+
+PROFILES = {
+    "small": CampusProfile(faculties=4, stops_per_faculty=4, buses=6, students=2000, months=1, riders_per_trip=30),
+    "campus": CampusProfile(faculties=8, stops_per_faculty=5, buses=12, students=12000, months=4, riders_per_trip=38),
+}
+
+
+@dataclass
+class Campus:
+    profile: CampusProfile
+    stop_ids: list = field(default_factory=list)
+    stop_names: dict = field(default_factory=dict)
+    bus_ids: list = field(default_factory=list)
+    spare_bus_ids: list = field(default_factory=list)
+    spare_driver_ids: list = field(default_factory=list)
+    active_ida_trip_ids: list = field(default_factory=list)
+    active_volta_trip_ids: list = field(default_factory=list)
+    active_driver_ids: list = field(default_factory=list)
+    riding_student_ids: list = field(default_factory=list)
+    # Alunos sem viagem ativa, consumidos pelos cenários de inscrição
+    free_student_ids: list = field(default_factory=list)
+    row_counts: dict = field(default_factory=dict)
+
+
+def seed_campus(engine, profile: CampusProfile, seed: int = 42, today: datetime = None, active_day: bool = True) -> Campus:
+    rng = random.Random(seed)
+    today = (today or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+    campus = Campus(profile=profile)
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as conn:
+        conn.execute(insert(UserType), [
+            {"id": STUDENT_TYPE_ID, "description": UserTypeNames.STUDENT},
+            {"id": DRIVER_TYPE_ID, "description": UserTypeNames.DRIVER},
+            {"id": ADMIN_TYPE_ID, "description": UserTypeNames.ADMIN},
+        ])
+
+        faculty_ids = _insert_returning_ids(conn, Faculty, [
+            {"name": f"Faculdade {i + 1}", "system_deleted": 0}
+            for i in range(profile.faculties)
+        ])
+        # Coordenadas em torno de um campus de ~3 km, com gerador próprio para não
+        # alterar a sequência usada no restante da população
+        geo = random.Random(seed)
+        stop_rows = [
+            {
+                "name": f"Ponto {f + 1}.{s + 1}", "faculty_id": faculty_id, "system_deleted": 0,
+                "latitude": CAMPUS_CENTER[0] + geo.uniform(-0.015, 0.015),
+                "longitude": CAMPUS_CENTER[1] + geo.uniform(-0.015, 0.015),
+            }
+            for f, faculty_id in enumerate(faculty_ids)
+            for s in range(profile.stops_per_faculty)
+        ]
+        campus.stop_ids = _insert_returning_ids(conn, BusStop, stop_rows)
+        campus.stop_names = {stop_id: row["name"] for stop_id, row in zip(campus.stop_ids, stop_rows)}
+
+        total_buses = profile.buses + profile.spare_buses
+        bus_ids = _insert_returning_ids(conn, Bus, [
+            {"registration_number": f"BZZ{i:04d}", "name": f"Ônibus {i + 1}", "capacity": BUS_CAPACITY, "system_deleted": 0}
+            for i in range(total_buses)
+        ])
+        campus.bus_ids, campus.spare_bus_ids = bus_ids[:profile.buses], bus_ids[profile.buses:]
+
+        # Todos compartilham o mesmo hash: bcrypt por usuário tornaria a carga lenta
+        password = bcrypt.hashpw(b"benchmark", bcrypt.gensalt(rounds=4)).decode("utf-8")
+        driver_ids = _insert_returning_ids(conn, User, [
+            _user_row(f"motorista{i}", i, DRIVER_TYPE_ID, None, password)
+            for i in range(total_buses)
+        ])
+        drivers, campus.spare_driver_ids = driver_ids[:profile.buses], driver_ids[profile.buses:]
+
+        student_ids = _insert_returning_ids(conn, User, [
+            _user_row(f"aluno{i}", total_buses + i, STUDENT_TYPE_ID, rng.choice(faculty_ids), password)
+            for i in range(profile.students)
+        ])
+
+        _seed_history(conn, rng, campus, drivers, student_ids, today)
+        if active_day:
+            _seed_active_day(conn, rng, campus, drivers, student_ids, today)
+        else:
+            campus.active_driver_ids = list(drivers)
+            campus.free_student_ids = list(student_ids)
+
+        for model in (Faculty, BusStop, Bus, User, Trip, StudentTrip, TripBusStop):
+            campus.row_counts[model.__tablename__] = conn.execute(
+                select(func.count()).select_from(model)
+            ).scalar_one()
+
+    return campus
+
+
+def _seed_history(conn, rng, campus, drivers, student_ids, today):
+    profile = campus.profile
+    start = today - timedelta(days=30 * profile.months)
+
+    trip_rows = []
+    rosters = []
+    day = start
+    while day < today:
+        if day.weekday() < 5:
+            for bus_id, driver_id in zip(campus.bus_ids, drivers):
+                riders = rng.sample(student_ids, profile.riders_per_trip)
+                points = {student_id: rng.choice(campus.stop_ids) for student_id in riders}
+                for trip_type, hour in ((TripTypeEnum.IDA, 7), (TripTypeEnum.VOLTA, 17)):
+                    moment = day + timedelta(hours=hour)
+                    trip_rows.append({
+                        "trip_type": trip_type,
+                        "status": TripStatusEnum.CONCLUIDA,
+                        "bus_id": bus_id,
+                        "driver_id": driver_id,
+                        "bus_issue": False,
+                        "system_deleted": 0,
+                        "create_date": moment,
+                        "update_date": moment + timedelta(hours=1),
+                        "completed_date": moment + timedelta(hours=1),
+                    })
+                    rosters.append((trip_type, moment, points))
+        day += timedelta(days=1)
+
+    trip_ids = _insert_returning_ids(conn, Trip, trip_rows)
+
+    student_trip_rows = []
+    trip_bus_stop_rows = []
+    for trip_id, (trip_type, moment, points) in zip(trip_ids, rosters):
+        for student_id, point_id in points.items():
+            if trip_type == TripTypeEnum.IDA:
+                status = StudentStatusEnum.EM_AULA
+            else:
+                status = StudentStatusEnum.NAO_VOLTARA if rng.random() < 0.08 else StudentStatusEnum.PRESENTE
+            student_trip_rows.append(_student_trip_row(trip_id, student_id, status, point_id, moment))
+        stop_status = TripBusStopStatusEnum.DESENBARQUE if trip_type == TripTypeEnum.IDA else TripBusStopStatusEnum.JA_PASSOU
+        for point_id in set(points.values()):
+            trip_bus_stop_rows.append(_trip_bus_stop_row(trip_id, point_id, stop_status, moment))
+
+    _insert_chunked(conn, StudentTrip, student_trip_rows)
+    _insert_chunked(conn, TripBusStop, trip_bus_stop_rows)
+
+
+def _seed_active_day(conn, rng, campus, drivers, student_ids, today):
+    # Metade da frota está na ida e a outra metade já fez a ida e aguarda a volta
+    profile = campus.profile
+    shuffled = list(student_ids)
+    rng.shuffle(shuffled)
+    riders_needed = profile.riders_per_trip * profile.buses
+    campus.riding_student_ids = shuffled[:riders_needed]
+    campus.free_student_ids = shuffled[riders_needed:]
+
+    morning = today + timedelta(hours=7)
+    trip_rows = []
+    for index, (bus_id, driver_id) in enumerate(zip(campus.bus_ids, drivers)):
+        trip_type = TripTypeEnum.IDA if index % 2 == 0 else TripTypeEnum.VOLTA
+        trip_rows.append({
+            "trip_type": trip_type,
+            "status": TripStatusEnum.ATIVA,
+            "bus_id": bus_id,
+            "driver_id": driver_id,
+            "bus_issue": False,
+            "system_deleted": 0,
+            "create_date": morning,
+            "update_date": morning,
+        })
+    trip_ids = _insert_returning_ids(conn, Trip, trip_rows)
+    campus.active_driver_ids = list(drivers)
+
+    student_trip_rows = []
+    trip_bus_stop_rows = []
+    riders = iter(campus.riding_student_ids)
+    for trip_id, row in zip(trip_ids, trip_rows):
+        is_outbound = row["trip_type"] == TripTypeEnum.IDA
+        (campus.active_ida_trip_ids if is_outbound else campus.active_volta_trip_ids).append(trip_id)
+        points = set()
+        for _ in range(profile.riders_per_trip):
+            point_id = rng.choice(campus.stop_ids)
+            points.add(point_id)
+            status = StudentStatusEnum.PRESENTE if is_outbound else StudentStatusEnum.EM_AULA
+            student_trip_rows.append(_student_trip_row(trip_id, next(riders), status, point_id, morning))
+        stop_status = TripBusStopStatusEnum.DESENBARQUE if is_outbound else TripBusStopStatusEnum.A_CAMINHO
+        for point_id in points:
+            trip_bus_stop_rows.append(_trip_bus_stop_row(trip_id, point_id, stop_status, morning))
+
+    _insert_chunked(conn, StudentTrip, student_trip_rows)
+    _insert_chunked(conn, TripBusStop, trip_bus_stop_rows)
+
+
+def _user_row(prefix, number, user_type_id, faculty_id, password):
+    return {
+        "name": prefix.capitalize(),
+        "email": f"{prefix}@buzz.bench",
+        "cpf": f"{number:011d}",
+        "phone": "+5534999999999",
+        "user_type_id": user_type_id,
+        "faculty_id": faculty_id,
+        "password": password,
+        "first_login": "false",
+        "system_deleted": 0,
+    }
+
+
+def _student_trip_row(trip_id, student_id, status, point_id, moment):
+    return {
+        "trip_id": trip_id,
+        "student_id": student_id,
+        "status": status,
+        "point_id": point_id,
+        "system_deleted": 0,
+        "create_date": moment,
+        "update_date": moment,
+    }
+
+
+def _trip_bus_stop_row(trip_id, bus_stop_id, status, moment):
+    return {
+        "trip_id": trip_id,
+        "bus_stop_id": bus_stop_id,
+        "status": status,
+        "system_deleted": 0,
+        "create_date": moment,
+        "update_date": moment,
+    }
+
+
+def _insert_returning_ids(conn, model, rows):
+    # RETURNING ordenado mantém os ids alinhados às linhas (e às sequences do Postgres)
+    ids = []
+    for start in range(0, len(rows), CHUNK_SIZE):
+        result = conn.execute(
+            insert(model).returning(model.id, sort_by_parameter_order=True),
+            rows[start:start + CHUNK_SIZE],
+        )
+        ids.extend(result.scalars().all())
+    return ids
+
+
+def _insert_chunked(conn, model, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        conn.execute(insert(model), rows[start:start + CHUNK_SIZE])
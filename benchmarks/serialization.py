@@ -0,0 +1,105 @@
+# benchmarks/serialization.py
+# CPU gasto por requisição para serializar listas grandes, comparando o caminho
+# antigo (response_model=List[dict] com o JSONResponse padrão), o schema tipado com
+# validação e o caminho rápido (dicionários direto para o FastJSONResponse).
+# Uso:
+#   python -m benchmarks.serialization
+#   python -m benchmarks.serialization --sizes 100 1000 10000 --requests 200
+import argparse
+import json
+import sys
+import time
+from typing import List
+
+from . import environment
+
+DEFAULT_SIZES = (50, 500, 5000)
+DEFAULT_REQUESTS = 100
+
+
+def build_roster(size: int) -> list:
+    # Mesmo formato da resposta de /trips/{id}/details
+    statuses = ("Presente", "Em aula", "Aguardando ônibus", "Não voltará", "Fila de espera")
+    return [
+        {
+            "student_name": f"Aluno {index:05d}",
+            "bus_stop_name": f"Ponto {index % 40} - Faculdade {index % 7}",
+            "student_status": statuses[index % len(statuses)],
+            "profile_picture": None if index % 3 else f"https://storage.example.com/perfil/{index}.jpg"
+        }
+        for index in range(size)
+    ]
+
+
+def build_app(roster: list):
+    from fastapi import FastAPI, Response
+    from fastapi.responses import JSONResponse
+    from app.config.responses import FastJSONResponse
+    from app.schemas.trip import TripStudentDetail
+
+    app = FastAPI()
+
+    @app.get("/baseline")
+    def baseline():
+        # Custo fixo do framework e do cliente, descontado dos demais
+        return Response(b"[]", media_type="application/json")
+
+    @app.get("/dict", response_model=List[dict], response_class=JSONResponse)
+    def as_dict():
+        return roster
+
+    @app.get("/typed", response_model=List[TripStudentDetail], response_class=FastJSONResponse)
+    def typed():
+        return roster
+
+    @app.get("/fast", response_model=List[TripStudentDetail])
+    def fast():
+        return FastJSONResponse(roster)
+
+    return app
+
+
+def cpu_per_request(client, path: str, requests: int) -> float:
+    for _ in range(5):
+        client.get(path)
+    started = time.process_time()
+    for _ in range(requests):
+        response = client.get(path)
+        response.raise_for_status()
+    return (time.process_time() - started) / requests * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CPU de serialização por requisição em listas grandes")
+    parser.add_argument("--sizes", nargs="*", type=int, default=list(DEFAULT_SIZES), help="Tamanhos da lista")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="Requisições por caminho e tamanho")
+    parser.add_argument("--json", action="store_true", help="Imprime o resultado em JSON")
+    args = parser.parse_args(argv)
+
+    # Os schemas importam os modelos, que criam o engine a partir de DATABASE_URL
+    environment.configure("sqlite://")
+    from fastapi.testclient import TestClient
+
+    results = {}
+    for size in args.sizes:
+        with TestClient(build_app(build_roster(size))) as client:
+            baseline = cpu_per_request(client, "/baseline", args.requests)
+            results[size] = {
+                path: max(cpu_per_request(client, f"/{path}", args.requests) - baseline, 0.0)
+                for path in ("dict", "typed", "fast")
+            }
+            results[size]["bytes"] = len(client.get("/fast").content)
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f"{'itens':>7} {'bytes':>9} {'List[dict] ms':>14} {'tipado ms':>10} {'rápido ms':>10} {'ganho':>7}")
+    for size, result in results.items():
+        gain = result["dict"] / result["fast"] if result["fast"] else float("inf")
+        print(f"{size:>7} {result['bytes']:>9} {result['dict']:>14.3f} {result['typed']:>10.3f} {result['fast']:>10.3f} {gain:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
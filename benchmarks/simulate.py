@@ -0,0 +1,378 @@
+# benchmarks/simulate.py
+# Simulador de um dia de operação com motoristas e alunos agindo em paralelo
+# contra a aplicação real (httpx + ASGITransport, sem rede).
+#
+# Uso:
+#   python -m benchmarks.simulate --riders 300
+#   python -m benchmarks.simulate --riders 200 500 1000 --time-scale 2
+#   BENCH_DATABASE_URL=postgresql://... python -m benchmarks.simulate --riders 1000
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+
+from . import environment
+from .stats import summarize
+
+STUDENT_STATUS = {"EM_AULA": 2, "AGUARDANDO_NO_PONTO": 3, "NAO_VOLTARA": 4, "PRESENTE": 1}
+MAX_BOARDING_ATTEMPTS = 40
+
+
+class DayOver(Exception):
+    pass
+
+
+class DayClock:
+    # Durações (em segundos de relógio) das fases do dia, multiplicadas por time_scale
+    def __init__(self, time_scale: float = 1.0):
+        self.enrollment_window = 3.0 * time_scale
+        self.class_window = 3.0 * time_scale
+        self.travel_time = 0.15 * time_scale
+        self.dwell_time = 0.2 * time_scale
+        self.poll_interval = 0.5 * time_scale
+
+
+class Simulation:
+    def __init__(self, client, campus, clock: DayClock, seed: int = 7):
+        self.client = client
+        self.campus = campus
+        self.clock = clock
+        self.seed = seed
+        self.started = time.perf_counter()
+        self.samples = []
+        self.failed_transitions = Counter()
+        self.stranded_trips = 0
+        self.unfinished_trips = 0
+        self.stopping = False
+        # Viagem de ida -> viagem de volta criada pelo motorista ao finalizar a ida
+        self.return_trips = {}
+
+    async def call(self, label, method, url, **kwargs):
+        # Requisições em andamento nunca são canceladas; o dia acaba na próxima chamada
+        if self.stopping:
+            raise DayOver()
+        started = time.perf_counter()
+        response = await self.client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - started
+        self.samples.append((started - self.started, label, elapsed, response.status_code))
+        if response.status_code == 400:
+            self.failed_transitions[(label, _detail(response))] += 1
+        return response
+
+    async def sleep(self, seconds, rng):
+        await asyncio.sleep(seconds * rng.uniform(0.5, 1.5))
+
+    async def driver_day(self, index, bus_id, driver_id):
+        rng = random.Random(self.seed * 1000 + index)
+        response = await self.call("POST /trips/", "POST", "/trips/", json={
+            "trip_type": 1, "status": 1, "bus_id": bus_id, "driver_id": driver_id
+        })
+        if response.status_code != 200:
+            return
+        outbound_trip_id = response.json()["id"]
+
+        await asyncio.sleep(self.clock.enrollment_window)
+        response = await self.call(
+            "PUT /trips/{id}/finalize_outbound_trip", "PUT", f"/trips/{outbound_trip_id}/finalize_outbound_trip"
+        )
+        if response.status_code != 200:
+            return
+        trip_id = response.json()["new_trip_id"]
+        self.return_trips[outbound_trip_id] = trip_id
+
+        await asyncio.sleep(self.clock.class_window)
+        await self.drive_return_route(trip_id, rng)
+        await self.call("PUT /trips/{id}/finalize_return_trip", "PUT", f"/trips/{trip_id}/finalize_return_trip")
+
+    async def drive_return_route(self, trip_id, rng):
+        at_stop = False
+        while True:
+            response = await self.call(
+                "GET /trip_bus_stops/stops_on_the_way/{id}", "GET", f"/trip_bus_stops/stops_on_the_way/{trip_id}"
+            )
+            next_stops = response.json() if response.status_code == 200 else []
+
+            # Com alunos embarcando, o motorista tenta seguir até que todos estejam a bordo
+            for _ in range(MAX_BOARDING_ATTEMPTS):
+                if next_stops:
+                    response = await self.call(
+                        "PUT /trip_bus_stops/select_next_stop/{id}", "PUT",
+                        f"/trip_bus_stops/select_next_stop/{trip_id}", params={"new_stop_id": next_stops[0]["id"]}
+                    )
+                elif at_stop:
+                    response = await self.call(
+                        "PUT /trip_bus_stops/finalize_current_stop/{id}", "PUT",
+                        f"/trip_bus_stops/finalize_current_stop/{trip_id}"
+                    )
+                else:
+                    return
+                if response.status_code != 400:
+                    break
+                await self.sleep(self.clock.dwell_time, rng)
+            else:
+                self.stranded_trips += 1
+                return
+
+            if not next_stops:
+                return
+            await self.sleep(self.clock.travel_time, rng)
+            await self.call(
+                "PUT /trip_bus_stops/update_next_bus_stop/{id}", "PUT", f"/trip_bus_stops/update_next_bus_stop/{trip_id}"
+            )
+            at_stop = True
+            await self.sleep(self.clock.dwell_time, rng)
+
+    async def student_day(self, index, student_id):
+        rng = random.Random(self.seed * 100000 + index)
+        await asyncio.sleep(rng.uniform(0, self.clock.enrollment_window * 0.8))
+
+        response = await self.call("GET /buses/active_trips", "GET", "/buses/active_trips")
+        if response.status_code != 200:
+            return
+        outbound = [bus for bus in response.json() if bus["trip_type"] == "Ida"]
+        if not outbound:
+            return
+        with_seats = [bus for bus in outbound if bus["available_seats"] > 0]
+        chosen = rng.choice(with_seats or outbound)
+        point_id = rng.choice(self.campus.stop_ids)
+        response = await self.call("POST /student_trips/", "POST", "/student_trips/", params={"waitlist": "true"}, json={
+            "trip_id": chosen["trip_id"], "student_id": student_id, "point_id": point_id
+        })
+        if response.status_code != 200:
+            return
+        outbound_trip_id = chosen["trip_id"]
+
+        # Consulta a viagem até a volta ser criada pelo motorista
+        while outbound_trip_id not in self.return_trips:
+            await self.call("GET /student_trips/active/{id}", "GET", f"/student_trips/active/{student_id}")
+            await self.sleep(self.clock.poll_interval * 2, rng)
+
+        response = await self.call("GET /student_trips/active/{id}", "GET", f"/student_trips/active/{student_id}")
+        if response.status_code != 200:
+            return
+        active = response.json()
+        student_trip_id, trip_id = active["student_trip_id"], active["trip_id"]
+
+        await self.sleep(self.clock.class_window * 0.3, rng)
+        roll = rng.random()
+        if roll < 0.08:
+            await self.update_status(student_trip_id, "NAO_VOLTARA")
+            return
+        if roll < 0.15:
+            trip_id = await self.switch_bus(student_id, student_trip_id, trip_id, rng)
+        await self.update_status(student_trip_id, "AGUARDANDO_NO_PONTO")
+        if rng.random() < 0.2:
+            await self.update_status(student_trip_id, "EM_AULA")
+            await self.sleep(self.clock.poll_interval, rng)
+            await self.update_status(student_trip_id, "AGUARDANDO_NO_PONTO")
+
+        # Aguarda o ônibus chegar ao ponto e embarca
+        stop_name = self.campus.stop_names[point_id]
+        while True:
+            response = await self.call("GET /trips/{id}/bus_stops", "GET", f"/trips/{trip_id}/bus_stops")
+            if response.status_code != 200:
+                return
+            stops = {stop["name"]: stop["status"] for stop in response.json()["bus_stops"]}
+            status = stops.get(stop_name)
+            if status is None or status == "Já passou":
+                return
+            if status == "No ponto":
+                await self.update_status(student_trip_id, "PRESENTE")
+                return
+            await self.sleep(self.clock.poll_interval, rng)
+
+    async def update_status(self, student_trip_id, status):
+        return await self.call(
+            "PUT /student_trips/{id}/update_status", "PUT", f"/student_trips/{student_trip_id}/update_status",
+            params={"new_status": STUDENT_STATUS[status]}
+        )
+
+    async def switch_bus(self, student_id, student_trip_id, trip_id, rng):
+        response = await self.call(
+            "GET /buses/available_for_student", "GET", "/buses/available_for_student", params={"student_id": student_id}
+        )
+        if response.status_code != 200:
+            return trip_id
+        candidates = [bus for bus in response.json() if bus["trip_type"] == "Volta"]
+        if not candidates:
+            return trip_id
+        new_trip_id = rng.choice(candidates)["trip_id"]
+        response = await self.call(
+            "PUT /student_trips/{id}/update_trip", "PUT", f"/student_trips/{student_trip_id}/update_trip",
+            params={"new_trip_id": new_trip_id, "waitlist": "true"}
+        )
+        return new_trip_id if response.status_code == 200 else trip_id
+
+
+def _detail(response):
+    try:
+        return response.json().get("detail", "")
+    except ValueError:
+        return response.text[:80]
+
+
+async def run_day(app, campus, riders: int, clock: DayClock, seed: int, deadline: float):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://buzz.bench", timeout=None) as client:
+        sim = Simulation(client, campus, clock, seed)
+        drivers = [
+            sim.driver_day(index, bus_id, driver_id)
+            for index, (bus_id, driver_id) in enumerate(zip(campus.bus_ids, campus.active_driver_ids))
+        ]
+        students = [
+            sim.student_day(index, student_id)
+            for index, student_id in enumerate(campus.free_student_ids[:riders])
+        ]
+        driver_tasks = [asyncio.ensure_future(_until_day_over(task)) for task in drivers]
+        student_tasks = [asyncio.ensure_future(_until_day_over(task)) for task in students]
+        _, unfinished = await asyncio.wait(driver_tasks, timeout=deadline)
+        sim.unfinished_trips = len(unfinished)
+        # Alunos que ainda esperam um ônibus que já encerrou a rota param na próxima chamada
+        sim.stopping = True
+        await asyncio.gather(*driver_tasks, *student_tasks)
+        return sim
+
+
+async def _until_day_over(agent):
+    try:
+        await agent
+    except DayOver:
+        pass
+
+
+def build_report(sim, probe_report, riders, bucket_seconds):
+    duration = max((offset + elapsed for offset, _, elapsed, _ in sim.samples), default=0.0)
+    by_label = defaultdict(list)
+    by_bucket = defaultdict(list)
+    for offset, label, elapsed, status in sim.samples:
+        by_label[label].append((elapsed, status))
+        by_bucket[int(offset // bucket_seconds)].append((elapsed, status))
+
+    def describe(entries):
+        summary = summarize([elapsed for elapsed, _ in entries], errors=sum(1 for _, status in entries if status >= 500))
+        summary["rejected"] = sum(1 for _, status in entries if 400 <= status < 500)
+        del summary["throughput_rps"]
+        return summary
+
+    timeline = []
+    for bucket in sorted(by_bucket):
+        entry = describe(by_bucket[bucket])
+        entry["t"] = bucket * bucket_seconds
+        entry["rps"] = round(len(by_bucket[bucket]) / bucket_seconds, 1)
+        timeline.append(entry)
+
+    all_entries = [(elapsed, status) for _, _, elapsed, status in sim.samples]
+    overall = describe(all_entries)
+    overall["rps"] = round(len(all_entries) / duration, 1) if duration else 0.0
+    overall["duration_s"] = round(duration, 2)
+    return {
+        "riders": riders,
+        "overall": overall,
+        "stranded_trips": sim.stranded_trips,
+        "unfinished_trips": sim.unfinished_trips,
+        "database": probe_report,
+        "endpoints": {label: describe(entries) for label, entries in sorted(by_label.items())},
+        "failed_transitions": [
+            {"endpoint": label, "detail": detail, "count": count}
+            for (label, detail), count in sim.failed_transitions.most_common()
+        ],
+        "timeline": timeline,
+    }
+
+
+def print_report(report):
+    overall = report["overall"]
+    database = report["database"]
+    print(f"\n=== {report['riders']} alunos ===")
+    print(
+        f"duração {overall['duration_s']}s | {overall['requests']} req ({overall['rps']} req/s) | "
+        f"p50 {overall['p50_ms']}ms p95 {overall['p95_ms']}ms p99 {overall['p99_ms']}ms | "
+        f"5xx {overall['errors']} | rejeitadas {overall['rejected']} | "
+        f"viagens travadas {report['stranded_trips']} | não concluídas no prazo {report['unfinished_trips']}"
+    )
+    print(
+        f"pool: {database['pool_checkouts']} checkouts, espera p95 {database['pool_wait_p95_ms']}ms "
+        f"máx {database['pool_wait_max_ms']}ms, {database['pool_timeouts']} timeouts"
+    )
+    print(
+        f"banco: {database['write_statements']} escritas, {database['lock_waits']} esperas por lock "
+        f"({database['lock_wait_seconds']}s), {database['contention_errors']} erros de contenção, "
+        f"pool máx {database['max_pool_checked_out']}, locks aguardando máx {database['max_waiting_locks']}"
+    )
+    print(f"\n{'endpoint':<48}{'req':>7}{'p50':>11}{'p95':>11}{'p99':>11}{'4xx':>6}{'5xx':>6}")
+    for label, item in report["endpoints"].items():
+        print(
+            f"{label:<48}{item['requests']:>7}{item['p50_ms']:>11}{item['p95_ms']:>11}{item['p99_ms']:>11}"
+            f"{item['rejected']:>6}{item['errors']:>6}"
+        )
+    if report["failed_transitions"]:
+        print("\ntransições recusadas:")
+        for item in report["failed_transitions"][:10]:
+            print(f"  {item['count']:>5}  {item['endpoint']}: {item['detail']}")
+    print(f"\n{'t (s)':>7}{'req/s':>9}{'p50':>11}{'p95':>11}{'4xx':>6}{'5xx':>6}")
+    for item in report["timeline"]:
+        print(f"{item['t']:>7.1f}{item['rps']:>9}{item['p50_ms']:>11}{item['p95_ms']:>11}{item['rejected']:>6}{item['errors']:>6}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulação concorrente de um dia de operação do Buzz")
+    parser.add_argument("--profile", default="small", help="Perfil do campus sintético (small, campus)")
+    parser.add_argument("--database-url", default=None, help="Banco local usado na simulação (padrão: SQLite em benchmarks/.data)")
+    parser.add_argument("--riders", type=int, nargs="+", default=[200], help="Quantidade de alunos; vários valores fazem uma varredura")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiplicador da duração das fases do dia")
+    parser.add_argument("--bucket", type=float, default=1.0, help="Janela (s) da série de latência ao longo do tempo")
+    parser.add_argument("--deadline", type=float, default=180.0, help="Tempo máximo (s) de cada dia simulado")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="Imprime os relatórios em JSON")
+    args = parser.parse_args(argv)
+
+    environment.configure(args.database_url)
+
+    from app.config.database import engine
+    from .probe import DbProbe
+    from .seed import PROFILES, seed_campus
+
+    app = environment.load_app()
+    profile = PROFILES[args.profile]
+    clock = DayClock(args.time_scale)
+
+    reports = []
+    for riders in args.riders:
+        campus = seed_campus(engine, profile, active_day=False)
+        if riders > len(campus.free_student_ids):
+            parser.error(f"o perfil '{args.profile}' tem apenas {len(campus.free_student_ids)} alunos")
+        probe = DbProbe(engine)
+        probe.start()
+        try:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                sim = asyncio.run(run_day(app, campus, riders, clock, args.seed, args.deadline))
+        finally:
+            probe.stop()
+        report = build_report(sim, probe.report(), riders, args.bucket)
+        reports.append(report)
+        if not args.json:
+            print_report(report)
+
+    if args.json:
+        print(json.dumps(reports, indent=2, ensure_ascii=False))
+    elif len(reports) > 1:
+        print(f"\n{'alunos':>7}{'req/s':>9}{'p95':>11}{'p99':>11}{'5xx':>6}{'pool máx':>11}{'locks':>7}{'travadas':>10}")
+        for report in reports:
+            overall = report["overall"]
+            print(
+                f"{report['riders']:>7}{overall['rps']:>9}{overall['p95_ms']:>11}{overall['p99_ms']:>11}"
+                f"{overall['errors']:>6}{report['database']['pool_wait_max_ms']:>11}{report['database']['lock_waits']:>7}"
+                f"{report['stranded_trips'] + report['unfinished_trips']:>10}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
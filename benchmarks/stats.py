@@ -0,0 +1,67 @@
+# benchmarks/stats.py
+# Agregação das amostras de latência e comparação com as baselines salvas.
+import json
+import os
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+# Quanto o p95 pode piorar em relação à baseline antes de acusar regressão
+DEFAULT_TOLERANCE = 0.25
+
+
+def percentile(sorted_samples, q: float) -> float:
+    # Interpolação linear entre as duas amostras mais próximas
+    if not sorted_samples:
+        return 0.0
+    position = (len(sorted_samples) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_samples) - 1)
+    weight = position - lower
+    return sorted_samples[lower] * (1 - weight) + sorted_samples[upper] * weight
+
+
+def summarize(samples, errors: int = 0) -> dict:
+    ordered = sorted(samples)
+    total = sum(ordered)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / total, 1) if total else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+    }
+
+
+def baseline_path(profile_name: str) -> str:
+    return os.path.join(BASELINE_DIR, f"{profile_name}.json")
+
+
+def load_baseline(profile_name: str) -> dict:
+    path = baseline_path(profile_name)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as fp:
+        return json.load(fp)
+
+
+def save_baseline(profile_name: str, results: dict, metadata: dict = None):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    with open(baseline_path(profile_name), "w", encoding="utf-8") as fp:
+        json.dump({"metadata": metadata or {}, "results": results}, fp, indent=2, ensure_ascii=False, sort_keys=True)
+        fp.write("\n")
+
+
+def compare(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> dict:
+    # Retorna, por cenário, a variação relativa do p95 e se ela é uma regressão
+    comparison = {}
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous or not previous.get("p95_ms"):
+            continue
+        delta = (current["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"]
+        comparison[name] = {
+            "baseline_p95_ms": previous["p95_ms"],
+            "delta": round(delta, 3),
+            "regression": delta > tolerance,
+        }
+    return comparison
@@ -0,0 +1,149 @@
+# benchmarks/users.py
+# CPU gasto para serializar páginas de /users/, comparando o schema de saída antigo
+# (herdava de UserBase e repetia a validação do telefone, do CPF e do e-mail de cada
+# usuário) com o schema de saída atual, sem validações. Mede também a validação de
+# entrada (UserCreate) sem e com o cache dos validadores.
+# Uso:
+#   python -m benchmarks.users
+#   python -m benchmarks.users --sizes 100 1000 --requests 100
+import argparse
+import json
+import sys
+import time
+from typing import List, Optional
+
+from . import environment
+from .serialization import cpu_per_request
+
+DEFAULT_SIZES = (100, 1000, 5000)
+DEFAULT_REQUESTS = 50
+VALIDATIONS = 2000
+
+
+def build_cpf(index: int) -> str:
+    digits = [int(digit) for digit in f"{100000000 + index * 7919 % 800000000:09d}"]
+    for length in (9, 10):
+        value = sum(digit * (length + 1 - position) for position, digit in enumerate(digits))
+        digits.append(value * 10 % 11 % 10)
+    return "".join(map(str, digits))
+
+
+def build_users(size: int) -> list:
+    from app.models.user import User as UserModel
+
+    return [
+        UserModel(
+            id=index + 1,
+            name=f"Aluno {index:05d}",
+            email=f"aluno{index}@campus.example.com",
+            cpf=build_cpf(index),
+            phone=f"+55119{81000000 + index:08d}",
+            faculty_id=index % 7 + 1,
+            user_type_id=1,
+            device_token=None
+        )
+        for index in range(size)
+    ]
+
+
+def legacy_schema():
+    # Schema de saída anterior, com os validadores herdados de UserBase
+    from pydantic import ConfigDict, EmailStr
+    from app.schemas.user import UserBase
+
+    class LegacyUser(UserBase):
+        id: int
+        email: EmailStr
+        name: str
+        cpf: str
+        phone: str
+        user_type_id: int
+        profile_picture: Optional[str] = None
+        faculty_name: Optional[str] = None
+
+        model_config = ConfigDict(from_attributes=True)
+
+    return LegacyUser
+
+
+def build_app(users: list):
+    from fastapi import FastAPI, Response
+    from app.schemas.user import User
+
+    app = FastAPI()
+    LegacyUser = legacy_schema()
+
+    @app.get("/baseline")
+    def baseline():
+        return Response(b"[]", media_type="application/json")
+
+    @app.get("/legacy", response_model=List[LegacyUser])
+    def legacy():
+        return users
+
+    @app.get("/users", response_model=List[User])
+    def current():
+        return users
+
+    return app
+
+
+def validation_us(users: list, cached: bool) -> float:
+    from app.schemas.user import UserCreate, phone_error, validate_cpf
+
+    payloads = [
+        {"email": user.email, "password": "senha", "name": user.name, "cpf": user.cpf, "phone": user.phone, "user_type_id": 1}
+        for user in users
+    ]
+    if cached:
+        for payload in payloads:
+            UserCreate(**payload)
+    started = time.process_time()
+    for index in range(VALIDATIONS):
+        if not cached:
+            phone_error.cache_clear()
+            validate_cpf.cache_clear()
+        UserCreate(**payloads[index % len(payloads)])
+    return (time.process_time() - started) / VALIDATIONS * 1_000_000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CPU de serialização de /users/ com e sem os validadores de entrada")
+    parser.add_argument("--sizes", nargs="*", type=int, default=list(DEFAULT_SIZES), help="Usuários por página")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="Requisições por caminho e tamanho")
+    parser.add_argument("--json", action="store_true", help="Imprime o resultado em JSON")
+    args = parser.parse_args(argv)
+
+    environment.configure("sqlite://")
+    from fastapi.testclient import TestClient
+
+    # Importa todos os modelos, para que os relacionamentos de User sejam resolvidos
+    environment.load_app()
+
+    results = {}
+    for size in args.sizes:
+        users = build_users(size)
+        with TestClient(build_app(users)) as client:
+            baseline = cpu_per_request(client, "/baseline", args.requests)
+            results[size] = {
+                path: max(cpu_per_request(client, f"/{path}", args.requests) - baseline, 0.0)
+                for path in ("legacy", "users")
+            }
+    sample = build_users(100)
+    validation = {"sem_cache_us": validation_us(sample, False), "com_cache_us": validation_us(sample, True)}
+
+    if args.json:
+        json.dump({"pages": results, "validation": validation}, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f"{'usuários':>9} {'antigo ms':>10} {'atual ms':>9} {'ganho':>7}")
+    for size, result in results.items():
+        gain = result["legacy"] / result["users"] if result["users"] else float("inf")
+        print(f"{size:>9} {result['legacy']:>10.3f} {result['users']:>9.3f} {gain:>6.1f}x")
+    print()
+    print(f"UserCreate: {validation['sem_cache_us']:.1f} µs sem cache, {validation['com_cache_us']:.1f} µs com cache")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.config.database import Base, get_db
+from app.models import bus, bus_stop, faculty, user, user_type  # noqa: F401
+from app.routers import student_trips, trip_bus_stops, trips
+from app.services.active_trips import active_trips, ensure_version
+from app.services.background import background_jobs
+from app.services.coalescing import read_coalescer
+from app.services.replicas import get_read_db
+from app.services.unit_of_work import get_transaction, unit_of_work
+
+@pytest.fixture
+def seed():
+    """
+    Dados iniciais do banco de session_factory; cada módulo sobrescreve com o seu cenário.
+    """
+    return lambda session: None
+
+@pytest.fixture
+def routers():
+    """
+    Routers incluídos no aplicativo do client.
+    """
+    return (trips, student_trips, trip_bus_stops)
+
+@pytest.fixture
+def session_factory(seed):
+    """
+    Fixture com um banco SQLite em memória compartilhado entre as sessões (o da rota,
+    o das tarefas e o do teste), com os dados de seed e o registro de viagens carregado.
+    """
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with factory() as session:
+        ensure_version(session)
+        seed(session)
+        session.commit()
+        active_trips.load(session)
+    yield factory
+    active_trips.invalidate()
+    read_coalescer.invalidate()
+
+@pytest.fixture
+def client(session_factory, routers):
+    app = FastAPI()
+    for module in routers:
+        app.include_router(module.router)
+
+    def override_get_db():
+        with session_factory() as session:
+            yield session
+
+    def override_get_transaction():
+        yield from unit_of_work(session_factory)
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    app.dependency_overrides[get_transaction] = override_get_transaction
+    return TestClient(app)
+
+@pytest.fixture
+def submitted(monkeypatch):
+    # Tarefas enviadas à fila em segundo plano, sem executá-las
+    jobs = []
+    monkeypatch.setattr(background_jobs, "submit", lambda kind, **payload: jobs.append((kind, payload)) or True)
+    return jobs
@@ -0,0 +1,112 @@
+import pytest
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+from app.config.database import Base
+from app.models import bus, bus_stop, faculty, user, user_type  # noqa: F401
+from app.models.cache_version import CacheVersion
+from app.models.student_trip import StudentTrip, StudentStatusEnum
+from app.models.trip import Trip, TripStatusEnum, TripTypeEnum
+from app.services.active_trips import ActiveTripRegistry, active_trips, ensure_version, read_version
+
+@pytest.fixture
+def db_session():
+    """
+    Fixture com um banco SQLite em memória e o registro carregado a partir dele.
+    """
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    ensure_version(session)
+    session.add(Trip(id=1, trip_type=TripTypeEnum.IDA, status=TripStatusEnum.ATIVA, bus_id=1, driver_id=10))
+    session.add(StudentTrip(id=1, trip_id=1, student_id=100, status=StudentStatusEnum.PRESENTE, point_id=1))
+    session.commit()
+    active_trips.load(session)
+    yield session
+    active_trips.invalidate()
+    session.close()
+
+# Teste da carga inicial: índices por motorista, ônibus e aluno
+def test_load_indexes_active_trips(db_session):
+    assert active_trips.driver_trip(10).id == 1
+    assert active_trips.busy_buses() == {1}
+    student_trip, trip = active_trips.student_trip(100)
+    assert (student_trip.id, trip.id) == (1, 1)
+    assert active_trips.has_conflict(bus_id=2, driver_id=10)
+    assert not active_trips.has_conflict(bus_id=2, driver_id=11)
+
+# Teste das escritas pelo ORM: o registro desta instância é atualizado no commit
+def test_commits_update_registry(db_session):
+    version = read_version(db_session)
+    db_session.add(Trip(id=2, trip_type=TripTypeEnum.VOLTA, status=TripStatusEnum.ATIVA, bus_id=2, driver_id=20))
+    db_session.add(StudentTrip(id=2, trip_id=2, student_id=200, status=StudentStatusEnum.EM_AULA, point_id=1))
+    # A versão só é incrementada depois do commit, fora da transação da escrita
+    db_session.flush()
+    assert read_version(db_session) == version
+    db_session.commit()
+    assert read_version(db_session) == version + 1
+    assert active_trips.driver_trip(20).id == 2
+    assert active_trips.student_trip(200)[1].id == 2
+
+    # Troca de viagem do aluno e conclusão da viagem de origem
+    student_trip = db_session.get(StudentTrip, 1)
+    student_trip.trip_id = 2
+    db_session.commit()
+    assert active_trips.student_trip(100)[1].id == 2
+
+    db_session.get(Trip, 1).status = TripStatusEnum.CONCLUIDA
+    db_session.commit()
+    assert active_trips.driver_trip(10) is None
+    assert active_trips.busy_buses() == {2}
+
+    # Mudanças de status do aluno não incrementam a versão
+    version = read_version(db_session)
+    db_session.get(StudentTrip, 2).status = StudentStatusEnum.NAO_VOLTARA
+    db_session.commit()
+    assert read_version(db_session) == version
+
+    db_session.delete(db_session.get(StudentTrip, 2))
+    db_session.commit()
+    assert active_trips.student_trip(200) is None
+
+# Teste do rollback: alterações descartadas não chegam ao registro
+def test_rollback_discards_changes(db_session):
+    db_session.add(Trip(id=3, trip_type=TripTypeEnum.IDA, status=TripStatusEnum.ATIVA, bus_id=3, driver_id=30))
+    db_session.flush()
+    db_session.rollback()
+    assert active_trips.driver_trip(30) is None
+
+# Teste da invalidação entre instâncias: outra instância recarrega ao ver a nova versão
+def test_other_worker_reloads_on_version_change(db_session):
+    other_worker = ActiveTripRegistry(check_seconds=0)
+    other_worker.load(db_session)
+    db_session.commit()
+
+    db_session.get(Trip, 1).bus_issue = True
+    db_session.add(Trip(id=4, trip_type=TripTypeEnum.IDA, status=TripStatusEnum.ATIVA, bus_id=4, driver_id=40))
+    db_session.commit()
+    assert other_worker.driver_trip(40) is None
+    other_worker.sync(db_session)
+    assert other_worker.driver_trip(40).id == 4
+    assert other_worker.driver_trip(10).bus_issue
+
+# Teste da publicação fora de ordem: as linhas são relidas, então vale o último commit
+def test_publish_reads_committed_rows(db_session):
+    trip = db_session.get(Trip, 1)
+    trip.bus_id = 7
+    db_session.commit()
+    trip.bus_id = 8
+    db_session.commit()
+    # A publicação da primeira escrita chegando por último não volta ao ônibus 7
+    active_trips.publish(db_session.get_bind(), {1}, set())
+    assert active_trips.busy_buses() == {8}
+
+# Teste da lacuna de versão: uma escrita de outra instância no meio força a recarga
+def test_version_gap_invalidates(db_session):
+    db_session.execute(update(CacheVersion).values(version=CacheVersion.version + 1))
+    db_session.commit()
+    db_session.add(Trip(id=5, trip_type=TripTypeEnum.IDA, status=TripStatusEnum.ATIVA, bus_id=5, driver_id=50))
+    db_session.commit()
+    assert active_trips.driver_trip(50) is None
+
+    active_trips.sync(db_session)
+    assert active_trips.driver_trip(50).id == 5
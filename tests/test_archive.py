@@ -0,0 +1,87 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.config.database import Base
+from app.models import bus_stop, faculty, user_type  # noqa: F401
+from app.models.archive import StudentTripArchive, TripBusStopArchive, TripBusStopTransitionArchive
+from app.models.student_trip import StudentTrip, StudentStatusEnum
+from app.models.trip import Trip, TripStatusEnum, TripTypeEnum
+from app.models.trip_bus_stop import TripBusStop, TripBusStopStatusEnum
+from app.models.trip_bus_stop_transition import TripBusStopTransition
+from app.services import stop_history  # noqa: F401 (registra o histórico de transições)
+from app.services.archive import archive_completed_trips, backfill_completed_dates, find_archived, read_both, trip_models
+
+NOW = datetime(2024, 6, 1, 12, 0, 0)
+
+@pytest.fixture
+def db_session():
+    """
+    Fixture com um banco SQLite em memória com uma viagem concluída antiga,
+    uma concluída recente e uma ativa.
+    """
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    trips = [
+        (1, TripStatusEnum.CONCLUIDA, NOW - timedelta(days=45)),
+        (2, TripStatusEnum.CONCLUIDA, NOW - timedelta(days=2)),
+        (3, TripStatusEnum.ATIVA, NOW - timedelta(days=60)),
+    ]
+    for trip_id, status, moment in trips:
+        completed = moment if status == TripStatusEnum.CONCLUIDA else None
+        session.add(Trip(id=trip_id, trip_type=TripTypeEnum.VOLTA, status=status, bus_id=1, driver_id=1,
+                         update_date=moment, create_date=moment, completed_date=completed))
+        session.add(StudentTrip(id=trip_id, trip_id=trip_id, student_id=1, status=StudentStatusEnum.PRESENTE, point_id=1))
+        session.add(TripBusStop(id=trip_id, trip_id=trip_id, bus_stop_id=1, status=TripBusStopStatusEnum.JA_PASSOU))
+    session.commit()
+    yield session
+    session.close()
+
+# Teste do arquivamento: somente a viagem concluída fora da janela é movida
+def test_archive_completed_trips(db_session):
+    totals = archive_completed_trips(db_session, after_days=30, batch_size=1, now=NOW)
+
+    assert totals["trips"] == 1
+    assert totals["student_trips"] == 1
+    assert totals["trip_bus_stops"] == 1
+    # Cada ponto criado registrou uma transição, que também foi arquivada
+    assert totals["trip_bus_stop_transitions"] == 1
+    assert db_session.query(TripBusStopTransitionArchive).count() == 1
+    assert {row.trip_id for row in db_session.query(StudentTrip)} == {2, 3}
+    assert db_session.query(StudentTripArchive).one().id == 1
+
+    trip = db_session.get(Trip, 1)
+    assert trip.archived_date == NOW
+    assert trip.update_date == NOW - timedelta(days=45)
+    assert trip_models(trip) == (StudentTripArchive, TripBusStopArchive)
+
+    # Uma segunda execução não encontra mais nada
+    assert archive_completed_trips(db_session, after_days=30, now=NOW)["trips"] == 0
+
+# Teste da data de conclusão: alterações depois da conclusão não adiam o arquivamento
+def test_archive_counts_from_completion(db_session):
+    db_session.get(Trip, 1).bus_issue = True
+    db_session.commit()
+    assert db_session.get(Trip, 1).update_date > NOW
+    assert archive_completed_trips(db_session, after_days=30, now=NOW)["trips"] == 1
+
+# Teste da implantação: viagens concluídas sem completed_date usam update_date
+def test_backfill_completed_dates(db_session):
+    db_session.get(Trip, 1).completed_date = None
+    db_session.commit()
+    assert backfill_completed_dates(db_session) == 1
+    trip = db_session.get(Trip, 1)
+    assert trip.completed_date == trip.update_date
+
+# Teste da leitura transparente das tabelas ativa e de arquivo
+def test_reads_from_live_and_archive(db_session):
+    archive_completed_trips(db_session, after_days=30, now=NOW)
+
+    assert isinstance(find_archived(db_session, StudentTrip, StudentTripArchive, 1), StudentTripArchive)
+    assert isinstance(find_archived(db_session, StudentTrip, StudentTripArchive, 2), StudentTrip)
+    assert find_archived(db_session, TripBusStop, TripBusStopArchive, 1, lambda model: model.system_deleted == 1) is None
+
+    rows = read_both(db_session, TripBusStop, TripBusStopArchive, 0, 10)
+    assert [row.id for row in rows] == [1, 2, 3]
+    assert [row.id for row in read_both(db_session, TripBusStop, TripBusStopArchive, 1, 1)] == [2]
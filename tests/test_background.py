@@ -0,0 +1,127 @@
+import threading
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.config.database import Base
+from app.models.background_job import BackgroundJob
+from app.routers import health
+from app.services.background import BackgroundJobQueue, background_jobs
+
+@pytest.fixture
+def session_factory():
+    """
+    Fixture com um banco SQLite em memória compartilhado entre as threads.
+    """
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+def _queue(session_factory, handler, **options):
+    jobs = BackgroundJobQueue(session_factory=session_factory, **options)
+    jobs.register("email")(handler)
+    return jobs
+
+def _persisted(session_factory) -> list:
+    with session_factory() as session:
+        return [(row.kind, row.payload) for row in session.query(BackgroundJob).order_by(BackgroundJob.id)]
+
+# Teste do desligamento com folga: a fila é esvaziada e nada fica gravado
+def test_stop_drains_queue(session_factory):
+    sent = []
+    jobs = _queue(session_factory, lambda recipient: (time.sleep(0.01), sent.append(recipient)))
+    jobs.start()
+    for index in range(20):
+        assert jobs.submit("email", recipient=f"aluno{index}@teste.com")
+
+    assert jobs.stop(deadline=5.0) == 0
+    assert len(sent) == 20
+    assert jobs.stats()["processed"] == 20
+    assert _persisted(session_factory) == []
+
+# Teste do prazo esgotado: a tarefa em execução e as da fila são gravadas e retomadas
+def test_stop_persists_and_resumes(session_factory):
+    release = threading.Event()
+    jobs = _queue(session_factory, lambda recipient: release.wait(5), workers=1)
+    jobs.start()
+    for index in range(3):
+        jobs.submit("email", recipient=f"aluno{index}@teste.com")
+
+    assert jobs.stop(deadline=0.1) == 3
+    release.set()
+    assert len(_persisted(session_factory)) == 3
+    # Depois do desligamento as tarefas vão direto para o banco
+    assert jobs.submit("email", recipient="tarde@teste.com") is False
+
+    sent = []
+    resumed = _queue(session_factory, lambda recipient: sent.append(recipient))
+    resumed.accepting = True
+    assert resumed.resume() == 4
+    assert _persisted(session_factory) == []
+    resumed.start()
+    resumed.stop(deadline=5.0)
+    assert sorted(sent) == ["aluno0@teste.com", "aluno1@teste.com", "aluno2@teste.com", "tarde@teste.com"]
+
+# Teste da retomada por vários workers: cada tarefa gravada é retomada uma única vez
+def test_resume_claims_each_job_once(session_factory):
+    jobs = _queue(session_factory, lambda recipient: None)
+    for index in range(5):
+        jobs.submit("email", recipient=f"aluno{index}@teste.com")
+
+    first, second = (_queue(session_factory, lambda recipient: None) for _ in range(2))
+    first.accepting = second.accepting = True
+    assert first.resume() + second.resume() == 5
+    assert first.stats()["queued"] + second.stats()["queued"] == 5
+    assert _persisted(session_factory) == []
+
+# Teste do desligamento durante a retomada: o lote já retirado volta para a tabela
+def test_stop_during_resume_keeps_jobs(session_factory):
+    jobs = _queue(session_factory, lambda recipient: None)
+    for index in range(3):
+        jobs.submit("email", recipient=f"aluno{index}@teste.com")
+
+    resumed = _queue(session_factory, lambda recipient: None)
+    resumed.accepting = True
+
+    def stop_after_delete(conn, cursor, statement, *args):
+        if statement.startswith("DELETE"):
+            resumed.accepting = False
+    event.listen(session_factory.kw["bind"], "after_cursor_execute", stop_after_delete)
+    assert resumed.resume() == 0
+    assert resumed.stats()["queued"] == 0
+    assert len(_persisted(session_factory)) == 3
+
+# Teste da fila cheia: o excedente é gravado em vez de descartado
+def test_full_queue_persists(session_factory):
+    jobs = _queue(session_factory, lambda recipient: None, capacity=2)
+    jobs.accepting = True
+    assert [jobs.submit("email", recipient=str(index)) for index in range(3)] == [True, True, False]
+    assert jobs.saturated
+    assert _persisted(session_factory) == [("email", '{"recipient": "2"}')]
+    with pytest.raises(ValueError):
+        jobs.submit("sms", recipient="1")
+
+# Teste dos endpoints de saúde: readyz falha enquanto a fila não aceita tarefas
+def test_health_endpoints():
+    app = FastAPI()
+    app.include_router(health.router)
+    client = TestClient(app)
+
+    assert client.get("/healthz").json() == {"status": "ok"}
+
+    accepting = background_jobs.accepting
+    try:
+        background_jobs.accepting = False
+        response = client.get("/readyz")
+        assert response.status_code == 503
+        assert response.json()["background"]["status"] == "desligando"
+
+        background_jobs.accepting = True
+        response = client.get("/readyz")
+        assert response.status_code == 200
+        assert response.json()["database"] == "ok"
+    finally:
+        background_jobs.accepting = accepting
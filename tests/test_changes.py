@@ -0,0 +1,108 @@
+import pytest
+from app.models.bus import Bus
+from app.models.bus_stop import BusStop
+from app.models.student_trip import StudentTrip, StudentStatusEnum
+from app.models.trip import Trip, TripStatusEnum, TripTypeEnum
+from app.models.trip_bus_stop import TripBusStop, TripBusStopStatusEnum
+from app.models.user import User
+from app.services.queries import TRIP_CHANGED_STUDENTS
+from app.services.state_machine import STUDENT_TRIP_STATES
+
+@pytest.fixture
+def seed():
+    """
+    Fixture com duas viagens de volta ativas: a primeira com três alunos e dois pontos.
+    """
+    def add(session):
+        session.add_all([
+            Bus(id=1, name="Ônibus 1", registration_number="AAA1111", capacity=40),
+            Bus(id=2, name="Ônibus 2", registration_number="BBB2222", capacity=40),
+            Trip(id=1, trip_type=TripTypeEnum.VOLTA, status=TripStatusEnum.ATIVA, bus_id=1, driver_id=10),
+            Trip(id=2, trip_type=TripTypeEnum.VOLTA, status=TripStatusEnum.ATIVA, bus_id=2, driver_id=11),
+            BusStop(id=1, name="Ponto 1", faculty_id=1),
+            BusStop(id=2, name="Ponto 2", faculty_id=1),
+        ])
+        for index in range(3):
+            session.add(User(id=100 + index, name=f"Aluno {index}", email=f"aluno{index}@example.com", cpf=str(index),
+                             profile_picture=f"foto-{index}.png"))
+            session.add(StudentTrip(id=index + 1, trip_id=1, student_id=100 + index, status=StudentStatusEnum.EM_AULA,
+                                    point_id=index % 2 + 1))
+        session.add_all([
+            TripBusStop(id=1, trip_id=1, bus_stop_id=1, status=TripBusStopStatusEnum.A_CAMINHO),
+            TripBusStop(id=2, trip_id=1, bus_stop_id=2, status=TripBusStopStatusEnum.A_CAMINHO),
+        ])
+    return add
+
+def _changes(client, since=0, trip_id=1):
+    response = client.get(f"/trips/{trip_id}/changes", params={"since": since})
+    assert response.status_code == 200
+    return response.json()
+
+# Teste do cursor: sem cursor a lista é completa; depois, só as linhas alteradas
+def test_changes_since_cursor(client):
+    first = _changes(client)
+    assert first["full"] is True
+    assert [student["id"] for student in first["students"]] == [1, 2, 3]
+    assert len(first["bus_stops"]) == 2
+
+    assert client.put("/student_trips/2/update_status",
+                      params={"new_status": StudentStatusEnum.AGUARDANDO_NO_PONTO.value}).status_code == 200
+    second = _changes(client, first["seq"])
+    assert second["seq"] > first["seq"]
+    assert second["full"] is False
+    assert [(student["id"], student["student_status"], student["profile_picture"]) for student in second["students"]] == [
+        (2, "Aguardando ônibus", "foto-1.png")
+    ]
+    assert second["bus_stops"] == []
+
+    assert client.put("/trip_bus_stops/select_next_stop/1", params={"new_stop_id": 2}).status_code == 200
+    third = _changes(client, second["seq"])
+    assert [(stop["bus_stop_id"], stop["status"]) for stop in third["bus_stops"]] == [(2, "Próximo ponto")]
+    assert third["students"] == []
+
+    # Nada mudou: a resposta vem vazia e o cursor não anda
+    assert _changes(client, third["seq"]) == {
+        "trip_id": 1, "seq": third["seq"], "full": False, "students": [], "bus_stops": []
+    }
+
+# Teste das remoções: a exclusão ou troca de viagem obriga o cliente a recarregar tudo
+def test_removed_rows_force_full_reload(client):
+    cursor = _changes(client)["seq"]
+    assert client.put("/student_trips/1/update_trip", params={"new_trip_id": 2}).status_code == 200
+
+    old_trip = _changes(client, cursor)
+    assert old_trip["full"] is True
+    assert [student["id"] for student in old_trip["students"]] == [2, 3]
+    assert [student["id"] for student in _changes(client, trip_id=2)["students"]] == [1]
+
+    cursor = old_trip["seq"]
+    assert client.delete("/student_trips/3").status_code == 200
+    assert _changes(client, cursor)["full"] is True
+
+# Teste do compare-and-set: uma tentativa que não encontra a linha não consome sequência,
+# e as alterações dos alunos não mudam a data de atualização da viagem
+def test_sequence_only_after_matching_update(session_factory):
+    with session_factory() as session:
+        trip = session.get(Trip, 1)
+        seq, update_date = trip.change_seq, trip.update_date
+        assert STUDENT_TRIP_STATES.apply(session, StudentTrip, 1, StudentStatusEnum.PRESENTE,
+                                         [StudentStatusEnum.NAO_VOLTARA]) is None
+        session.commit()
+        assert session.get(Trip, 1).change_seq == seq
+
+        row = STUDENT_TRIP_STATES.apply(session, StudentTrip, 1, StudentStatusEnum.PRESENTE,
+                                        [StudentStatusEnum.EM_AULA])
+        session.commit()
+        trip = session.get(Trip, 1)
+        assert row.change_seq == trip.change_seq == seq + 1
+        assert trip.update_date == update_date
+
+# Teste do índice: a consulta incremental não percorre os alunos da viagem
+def test_changed_rows_lookup_uses_index(session_factory):
+    query = TRIP_CHANGED_STUDENTS[(StudentTrip, TripBusStop)]
+    with session_factory() as session:
+        compiled = query.compile(session.get_bind())
+        plan = session.connection().exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {compiled}", (1, 0)
+        ).all()
+    assert any("ix_student_trips_trip_change" in row[-1] for row in plan)
@@ -0,0 +1,97 @@
+import threading
+import time
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+from app.config.database import Base
+from app.models import user_type  # noqa: F401
+from app.models.bus import Bus
+from app.services.coalescing import SingleFlight, read_coalescer
+
+def _herd(coalescer, name, compute, size=50):
+    barrier = threading.Barrier(size)
+    results, errors = [], []
+
+    def request():
+        barrier.wait()
+        try:
+            results.append(coalescer.run(name, (1,), compute))
+        except HTTPException as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=request) for _ in range(size)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+# Teste do estouro de requisições: uma única consulta atende todas as simultâneas
+def test_thundering_herd_runs_one_query():
+    coalescer = SingleFlight(window=0.5)
+    coalescer.register("paradas", ["trip_bus_stops"])
+    queries = []
+
+    def compute():
+        queries.append(1)
+        time.sleep(0.05)
+        return {"bus_stops": ["Portaria"]}
+
+    results, _ = _herd(coalescer, "paradas", compute)
+    assert len(queries) == 1
+    assert len(results) == 50 and all(result is results[0] for result in results)
+
+    # Dentro do intervalo o resultado é reaproveitado; outra chave calcula de novo
+    assert coalescer.run("paradas", (1,), compute) is results[0]
+    coalescer.run("paradas", (2,), compute)
+    stats = coalescer.stats()["paradas"]
+    assert stats["computed"] == 2
+    assert stats["coalesced"] + stats["hits"] == 50
+    assert stats["requests"] == 52
+
+# Teste dos erros: todas as requisições recebem o 404, que não fica guardado
+def test_errors_are_shared_but_not_cached():
+    coalescer = SingleFlight(window=0.5)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        raise HTTPException(status_code=404, detail="Viagem não encontrada")
+
+    results, errors = _herd(coalescer, "paradas", compute, size=10)
+    assert results == [] and len(errors) == 10
+    assert {error.status_code for error in errors} == {404}
+    with pytest.raises(HTTPException):
+        coalescer.run("paradas", (1,), compute)
+    assert len(calls) == 2
+
+# Teste da invalidação: um commit nas tabelas da leitura descarta o resultado guardado
+def test_commit_invalidates_results():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    read_coalescer.register("teste_onibus", [Bus.__tablename__])
+    counter = iter(range(100))
+
+    assert read_coalescer.run("teste_onibus", (), lambda: next(counter)) == 0
+    assert read_coalescer.run("teste_onibus", (), lambda: next(counter)) == 0
+
+    session.add(Bus(name="Ônibus 1", registration_number="AAA1111", capacity=40))
+    session.commit()
+    assert read_coalescer.run("teste_onibus", (), lambda: next(counter)) == 1
+
+    # UPDATE direto, sem passar pelo flush (como em StateMachine.apply)
+    session.execute(update(Bus).values(capacity=44))
+    assert read_coalescer.run("teste_onibus", (), lambda: next(counter)) == 1
+    session.commit()
+    assert read_coalescer.run("teste_onibus", (), lambda: next(counter)) == 2
+    session.close()
+
+# Teste sem coalescência: cada chamada consulta
+def test_disabled_coalescer():
+    coalescer = SingleFlight()
+    coalescer.enabled = False
+    counter = iter(range(10))
+    assert [coalescer.run("paradas", (), lambda: next(counter)) for _ in range(3)] == [0, 1, 2]
@@ -0,0 +1,143 @@
+import pytest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from firebase_admin import messaging
+from app.dependencies import notifications
+from app.models.bus import Bus
+from app.models.device_token import DeviceToken
+from app.models.student_trip import StudentTrip, StudentStatusEnum
+from app.models.trip import Trip, TripStatusEnum, TripTypeEnum
+from app.models.user import User
+from app.services.unit_of_work import unit_of_work
+from app.services.devices import import_user_device_tokens, prune_tokens, purge_stale_devices, register_device
+
+@pytest.fixture
+def seed():
+    """
+    Fixture com duas viagens ativas e um aluno com dois aparelhos.
+    """
+    return lambda session: session.add_all([
+        User(id=100, name="Aluno", email="aluno@example.com", cpf="1", phone="1", user_type_id=1, password="x"),
+        Bus(id=1, name="Ônibus 1", registration_number="AAA1111", capacity=40),
+        Bus(id=2, name="Ônibus 2", registration_number="BBB2222", capacity=40),
+        Trip(id=1, trip_type=TripTypeEnum.VOLTA, status=TripStatusEnum.ATIVA, bus_id=1, driver_id=10),
+        Trip(id=2, trip_type=TripTypeEnum.VOLTA, status=TripStatusEnum.ATIVA, bus_id=2, driver_id=11),
+        DeviceToken(user_id=100, token="celular"),
+        DeviceToken(user_id=100, token="tablet"),
+    ])
+
+# Teste do registro: o mesmo token é atualizado, e não duplicado, e acompanha o último usuário
+def test_register_device_upserts_by_token(session_factory):
+    earlier = datetime(2026, 1, 1)
+    with session_factory() as session:
+        register_device(session, 100, "notebook", now=earlier)
+        session.commit()
+        register_device(session, 200, "notebook", now=earlier + timedelta(days=1))
+        session.commit()
+        devices = session.query(DeviceToken).filter(DeviceToken.token == "notebook").all()
+        assert [(device.user_id, device.last_seen) for device in devices] == [(200, earlier + timedelta(days=1))]
+
+# Teste da inscrição: todos os aparelhos do aluno entram no tópico em uma única tarefa
+def test_enroll_subscribes_devices_to_trip_topic(client, submitted):
+    response = client.post("/student_trips/", json={"trip_id": 1, "student_id": 100, "point_id": 1})
+    assert response.status_code == 200
+    assert submitted == [
+        ("topic_subscription", {"tokens": ["celular", "tablet"], "topic": "trip-1", "subscribe": True})
+    ]
+
+# Teste da troca de viagem: sai do tópico antigo e entra no novo
+def test_switching_trip_moves_subscription(client, session_factory, submitted):
+    with session_factory() as session:
+        session.add(StudentTrip(id=1, trip_id=1, student_id=100, status=StudentStatusEnum.EM_AULA, point_id=1))
+        session.commit()
+
+    response = client.put("/student_trips/1/update_trip", params={"new_trip_id": 2})
+    assert response.status_code == 200
+    assert [(payload["topic"], payload["subscribe"]) for _, payload in submitted] == [("trip-1", False), ("trip-2", True)]
+
+# Teste do aviso para a viagem inteira: um envio ao tópico, e não um por aluno
+def test_bus_issue_is_a_single_topic_send(client, session_factory, submitted):
+    with session_factory() as session:
+        session.add_all([
+            StudentTrip(trip_id=1, student_id=student_id, status=StudentStatusEnum.EM_AULA, point_id=1)
+            for student_id in range(100, 130)
+        ])
+        session.commit()
+
+    assert client.put("/trips/1/report_bus_issue").status_code == 200
+    assert [(kind, payload["topic"]) for kind, payload in submitted] == [("topic_notification", "trip-1")]
+    # Ao resolver o problema nada é enviado
+    assert client.put("/trips/1/report_bus_issue").status_code == 200
+    assert len(submitted) == 1
+
+# Teste da finalização da ida: os aparelhos saem do tópico da ida na mesma tarefa do
+# aviso, depois do envio, e entram no tópico da volta
+def test_finalize_outbound_unsubscribes_after_send(client, session_factory, submitted, monkeypatch):
+    with session_factory() as session:
+        session.add_all([
+            Trip(id=3, trip_type=TripTypeEnum.IDA, status=TripStatusEnum.ATIVA, bus_id=1, driver_id=12),
+            StudentTrip(trip_id=3, student_id=100, status=StudentStatusEnum.PRESENTE, point_id=1),
+        ])
+        session.commit()
+
+    response = client.put("/trips/3/finalize_outbound_trip")
+    assert response.status_code == 200
+    return_trip_id = response.json()["new_trip_id"]
+    assert submitted == [
+        ("topic_notification", {"topic": "trip-3", "title": "Viagem finalizada", "body": "A viagem de ida foi finalizada.",
+                                "unsubscribe_tokens": ["celular", "tablet"]}),
+        ("topic_subscription", {"tokens": ["celular", "tablet"], "topic": f"trip-{return_trip_id}", "subscribe": True}),
+    ]
+
+    calls = []
+    monkeypatch.setattr(notifications, "get_firebase_app", lambda: None)
+    monkeypatch.setattr(messaging, "send", lambda message, app=None: calls.append(("send", message.topic)) or "id")
+    monkeypatch.setattr(messaging, "unsubscribe_from_topic", lambda tokens, topic, app=None: (
+        calls.append(("unsubscribe", topic)), SimpleNamespace(success_count=len(tokens), errors=[])
+    )[1])
+    notifications.deliver_topic_notification(**submitted[0][1])
+    assert calls == [("send", "trip-3"), ("unsubscribe", "trip-3")]
+
+# Teste da troca de dono: o aparelho sai dos tópicos das viagens ativas do usuário anterior
+def test_device_moving_to_another_user_leaves_old_topics(session_factory, submitted):
+    with session_factory() as session:
+        session.add(StudentTrip(trip_id=1, student_id=100, status=StudentStatusEnum.EM_AULA, point_id=1))
+        session.commit()
+
+    transaction = unit_of_work(session_factory)
+    db = next(transaction)
+    register_device(db, 100, "celular")
+    register_device(db, 200, "celular")
+    with pytest.raises(StopIteration):
+        next(transaction)
+    assert submitted == [("topic_subscription", {"tokens": ["celular"], "topic": "trip-1", "subscribe": False})]
+
+# Teste da limpeza: os tokens recusados pelo FCM saem da tabela
+def test_rejected_tokens_are_pruned(session_factory, monkeypatch):
+    pruned = []
+    monkeypatch.setattr(notifications, "get_firebase_app", lambda: None)
+    monkeypatch.setattr(notifications, "prune_tokens", lambda tokens: pruned.extend(tokens))
+    monkeypatch.setattr(messaging, "subscribe_to_topic", lambda tokens, topic, app=None: SimpleNamespace(
+        success_count=1, errors=[SimpleNamespace(index=1, reason="NOT_FOUND")]
+    ))
+
+    assert notifications.manage_topic_subscription(["celular", "tablet"], "trip-1") == 1
+    assert pruned == ["tablet"]
+
+    assert prune_tokens(pruned, session_factory) == 1
+    with session_factory() as session:
+        assert [device.token for device in session.query(DeviceToken)] == ["celular"]
+
+# Teste da remoção dos aparelhos antigos e da importação de users.device_token
+def test_purge_stale_and_import_legacy_tokens(session_factory):
+    with session_factory() as session:
+        session.query(DeviceToken).filter(DeviceToken.token == "tablet").update(
+            {DeviceToken.last_seen: datetime.utcnow() - timedelta(days=90)}
+        )
+        session.query(User).update({User.device_token: "antigo"})
+        session.commit()
+
+        assert purge_stale_devices(session, days=60) == 1
+        assert import_user_device_tokens(session) == 1
+        assert import_user_device_tokens(session) == 0
+        assert sorted(device.token for device in session.query(DeviceToken)) == ["antigo", "celular"]
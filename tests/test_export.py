@@ -0,0 +1,85 @@
+import csv
+import io
+import pytest
+from datetime import date, datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.config.database import Base
+from app.models import user_type  # noqa: F401
+from app.models.archive import StudentTripArchive
+from app.models.bus import Bus
+from app.models.bus_stop import BusStop
+from app.models.faculty import Faculty
+from app.models.student_trip import StudentTrip, StudentStatusEnum
+from app.models.trip import Trip, TripStatusEnum, TripTypeEnum
+from app.models.user import User
+from app.services.export import EXPORT_COLUMNS, csv_chunks, export_statement, iter_export_rows, parquet_chunks
+
+@pytest.fixture
+def session_factory():
+    """
+    Fixture com um banco SQLite em memória com três viagens em dias diferentes,
+    uma delas com os alunos já arquivados.
+    """
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as session:
+        session.add_all([Faculty(id=1, name="Engenharia"), Faculty(id=2, name="Medicina")])
+        session.add_all([Bus(id=1, name="Ônibus 1", registration_number="AAA1111", capacity=40),
+                         Bus(id=2, name="Ônibus 2", registration_number="BBB2222", capacity=40)])
+        session.add(BusStop(id=1, name="Portaria", faculty_id=1))
+        for user_id, faculty_id in ((1, 1), (2, 2), (3, 1)):
+            session.add(User(id=user_id, name=f"Aluno {user_id}", cpf=f"{user_id:011d}", email=f"aluno{user_id}@teste.com",
+                             phone="11999999999", password="x", user_type_id=1, faculty_id=faculty_id))
+        trips = [(1, 1, datetime(2024, 6, 3, 7)), (2, 2, datetime(2024, 6, 4, 7)), (3, 1, datetime(2024, 6, 5, 7))]
+        for trip_id, bus_id, moment in trips:
+            session.add(Trip(id=trip_id, trip_type=TripTypeEnum.IDA, status=TripStatusEnum.CONCLUIDA,
+                             bus_id=bus_id, driver_id=3, create_date=moment))
+        session.add_all([
+            StudentTripArchive(id=1, trip_id=1, student_id=1, status=StudentStatusEnum.PRESENTE, point_id=1, system_deleted=0),
+            StudentTrip(id=2, trip_id=2, student_id=1, status=StudentStatusEnum.PRESENTE, point_id=1),
+            StudentTrip(id=3, trip_id=2, student_id=2, status=StudentStatusEnum.FILA_DE_ESPERA, point_id=1),
+            StudentTrip(id=4, trip_id=3, student_id=2, status=StudentStatusEnum.PRESENTE, point_id=1),
+            StudentTrip(id=5, trip_id=3, student_id=1, status=StudentStatusEnum.PRESENTE, point_id=1, system_deleted=1),
+        ])
+        session.commit()
+    return factory
+
+def _read_csv(chunks) -> list:
+    return list(csv.DictReader(io.StringIO(b"".join(chunks).decode("utf-8"))))
+
+# Teste do CSV: linhas ativas e arquivadas, em blocos do tamanho do cursor
+def test_csv_export_streams_in_chunks(session_factory):
+    chunks = list(csv_chunks(iter_export_rows(session_factory, export_statement(), chunk_size=2)))
+    assert len(chunks) == 2
+
+    rows = _read_csv(chunks)
+    assert list(rows[0]) == [name for name, _ in EXPORT_COLUMNS]
+    assert [row["student_trip_id"] for row in rows] == ["1", "2", "3", "4"]
+    assert rows[2]["student_status"] == "Fila de espera"
+    assert rows[2]["faculty_name"] == "Medicina"
+    assert rows[0]["trip_type"] == "IDA"
+
+# Teste dos filtros aplicados no SQL
+def test_export_filters(session_factory):
+    def exported(**filters):
+        rows = _read_csv(csv_chunks(iter_export_rows(session_factory, export_statement(**filters))))
+        return [row["student_trip_id"] for row in rows]
+
+    assert exported(start_date=date(2024, 6, 4), end_date=date(2024, 6, 4)) == ["2", "3"]
+    assert exported(bus_id=1) == ["1", "4"]
+    assert exported(faculty_id=2) == ["3", "4"]
+    assert exported(start_date=date(2024, 7, 1)) == []
+
+# Teste do CSV vazio: só o cabeçalho
+def test_csv_export_without_rows():
+    assert b"".join(csv_chunks([])).decode("utf-8").strip() == ",".join(name for name, _ in EXPORT_COLUMNS)
+
+# Teste do Parquet (somente com pyarrow instalado)
+def test_parquet_export(session_factory):
+    pq = pytest.importorskip("pyarrow.parquet")
+    data = b"".join(parquet_chunks(iter_export_rows(session_factory, export_statement(), chunk_size=2)))
+    table = pq.read_table(io.BytesIO(data))
+    assert table.num_rows == 4
+    assert table.column("student_trip_id").to_pylist() == [1, 2, 3, 4]
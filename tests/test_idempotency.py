@@ -0,0 +1,82 @@
+import pytest
+from datetime import datetime, timedelta
+from app.models.bus import Bus
+from app.models.idempotency_key import IdempotencyKey
+from app.models.student_trip import StudentTrip
+from app.models.trip import Trip, TripTypeEnum
+from app.services.idempotency import idempotency_store, purge_expired_keys
+
+@pytest.fixture
+def seed():
+    return lambda session: session.add(Bus(id=1, name="Ônibus 1", registration_number="AAA1111", capacity=40))
+
+@pytest.fixture
+def client(client, session_factory, monkeypatch):
+    # As chaves são gravadas no mesmo banco em memória da rota
+    monkeypatch.setattr(idempotency_store, "session_factory", session_factory)
+    return client
+
+# Teste das novas tentativas: a mesma chave devolve a resposta original sem executar a rota
+def test_retries_replay_original_response(client, session_factory):
+    headers = {"Idempotency-Key": "viagem-1"}
+    created = client.post("/trips/", json={"trip_type": 1, "status": 1, "bus_id": 1, "driver_id": 10}, headers=headers)
+    retried = client.post("/trips/", json={"trip_type": 1, "status": 1, "bus_id": 1, "driver_id": 10}, headers=headers)
+    assert created.status_code == retried.status_code == 200
+    assert retried.json() == created.json()
+    assert retried.headers["Idempotent-Replayed"] == "true"
+    trip_id = created.json()["id"]
+
+    student_trip = {"trip_id": trip_id, "student_id": 100, "point_id": 1}
+    first = client.post("/student_trips/", json=student_trip, headers={"Idempotency-Key": "aluno-100"})
+    assert client.post("/student_trips/", json=student_trip, headers={"Idempotency-Key": "aluno-100"}).json() == first.json()
+
+    # Sem a chave a rota executa de novo e recusa a duplicidade
+    assert client.post("/student_trips/", json=student_trip).status_code == 400
+
+    finalize = f"/trips/{trip_id}/finalize_outbound_trip"
+    first = client.put(finalize, headers={"Idempotency-Key": "fim-ida"})
+    second = client.put(finalize, headers={"Idempotency-Key": "fim-ida"})
+    assert first.status_code == second.status_code == 200
+    assert second.json()["new_trip_id"] == first.json()["new_trip_id"]
+
+    with session_factory() as session:
+        assert session.query(Trip).filter(Trip.trip_type == TripTypeEnum.VOLTA).count() == 1
+        assert session.query(StudentTrip).filter(StudentTrip.student_id == 100).count() == 2
+
+# Teste da reutilização indevida e das falhas: erros não ficam gravados
+def test_key_reuse_and_errors(client, session_factory):
+    headers = {"Idempotency-Key": "viagem-2"}
+    assert client.post("/trips/", json={"trip_type": 1, "status": 1, "bus_id": 1, "driver_id": 10}, headers=headers).status_code == 200
+    reused = client.post("/trips/", json={"trip_type": 1, "status": 1, "bus_id": 1, "driver_id": 11}, headers=headers)
+    assert reused.status_code == 422
+
+    # A rota falhou (ônibus ocupado): a chave é liberada para uma nova tentativa
+    failed = client.post("/trips/", json={"trip_type": 1, "status": 1, "bus_id": 1, "driver_id": 11}, headers={"Idempotency-Key": "viagem-3"})
+    assert failed.status_code == 400
+    with session_factory() as session:
+        assert [row.key for row in session.query(IdempotencyKey)] == ["viagem-2"]
+
+# Teste da gravação da resposta: na mesma transação da rota, que é desfeita se ela falhar
+def test_response_stored_in_route_transaction(client, session_factory, monkeypatch):
+    def failing_complete(db, key, scope, response):
+        raise RuntimeError("falha ao gravar a resposta")
+
+    monkeypatch.setattr(idempotency_store, "complete", failing_complete)
+    with pytest.raises(RuntimeError):
+        client.post("/trips/", json={"trip_type": 1, "status": 1, "bus_id": 1, "driver_id": 10},
+                    headers={"Idempotency-Key": "viagem-4"})
+    with session_factory() as session:
+        assert session.query(Trip).count() == 0
+        assert session.query(IdempotencyKey).count() == 0
+
+# Teste da limpeza em lotes das chaves vencidas
+def test_purge_expired_keys(session_factory):
+    now = datetime(2024, 6, 1, 12)
+    with session_factory() as session:
+        for index in range(5):
+            session.add(IdempotencyKey(key=f"chave-{index}", scope="POST /trips/", request_hash="x", status_code=200,
+                                       expires_date=now + timedelta(hours=index - 3)))
+        session.commit()
+
+        assert purge_expired_keys(session, batch_size=2, now=now) == 4
+        assert [row.key for row in session.query(IdempotencyKey)] == ["chave-4"]
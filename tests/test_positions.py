@@ -0,0 +1,109 @@
+from datetime import datetime
+from app.models.trip import Trip, TripStatusEnum, TripTypeEnum
+from app.models.trip_position import TripPosition
+from app.routers import trips
+from app.services import positions
+from app.services.active_trips import active_trips, bump_version
+from app.services.positions import PositionBuffer, TripPositionStore
+
+# Teste do buffer circular: a última posição e as pendentes em ordem
+def test_position_buffer_wraps():
+    buffer = PositionBuffer(capacity=3)
+    assert buffer.latest() is None
+    for index in range(5):
+        buffer.append(-21.0 - index, -47.0, None, 90.0, 1000.0 + index)
+
+    assert buffer.latest()[0] == -25.0
+    assert buffer.size == 3
+    # Somente as 3 mais recentes cabem no buffer
+    assert [row[4] for row in buffer.take_pending()] == [1002.0, 1003.0, 1004.0]
+    assert buffer.take_pending() == []
+
+# Teste da última posição com campos opcionais
+def test_latest_position():
+    store = TripPositionStore(session_factory=None)
+    assert store.latest(1) is None
+    store.record(1, -21.2, -47.8, recorded_at=datetime(2024, 5, 1, 12, 0, 0))
+    position = store.latest(1)
+    assert position["latitude"] == -21.2
+    assert position["speed"] is None
+    assert position["recorded_at"] == datetime(2024, 5, 1, 12, 0, 0)
+
+# Teste da gravação em lote e do descarte das viagens encerradas
+def test_flush_bulk_inserts(session_factory):
+    store = TripPositionStore(session_factory=session_factory)
+    for second in range(10):
+        store.record(1, -21.2, -47.8, 10.0, 45.0, datetime(2024, 5, 1, 12, 0, second))
+    store.record(2, -21.3, -47.9)
+    store.close(2)
+
+    assert store.flush() == 11
+    assert store.flush() == 0
+    assert store.is_tracking(1)
+    assert store.latest(2) is None
+
+    with session_factory() as session:
+        rows = session.query(TripPosition).filter(TripPosition.trip_id == 1).order_by(TripPosition.recorded_at).all()
+        assert len(rows) == 10
+        assert rows[-1].recorded_at == datetime(2024, 5, 1, 12, 0, 9)
+        assert rows[0].speed == 10.0
+
+# Teste de outro worker: sem nada no buffer, a última posição gravada vem do banco
+def test_latest_falls_back_to_database(session_factory):
+    with session_factory() as session:
+        session.add(Trip(id=1, trip_type=TripTypeEnum.IDA, status=TripStatusEnum.ATIVA, bus_id=1, driver_id=1))
+        session.commit()
+    receiver = TripPositionStore(session_factory=session_factory)
+    for second in range(3):
+        receiver.record(1, -21.0 - second, -47.8, recorded_at=datetime(2024, 5, 1, 12, 0, second))
+    receiver.flush()
+
+    other_worker = TripPositionStore(session_factory=session_factory)
+    with session_factory() as session:
+        position = other_worker.latest(1, session)
+        assert position["latitude"] == -23.0
+        assert position["recorded_at"] == datetime(2024, 5, 1, 12, 0, 2)
+
+        # Viagem concluída: a posição gravada não é mais devolvida
+        session.get(Trip, 1).status = TripStatusEnum.CONCLUIDA
+        session.commit()
+        assert other_worker.latest(1, session) is None
+
+# Teste do descarte dos buffers parados: as pendentes são gravadas antes da remoção
+def test_flush_evicts_idle_buffers(session_factory, monkeypatch):
+    store = TripPositionStore(session_factory=session_factory, idle_seconds=600.0)
+    store.record(1, -21.2, -47.8)
+    store.record(2, -21.3, -47.9)
+    now = positions.time.monotonic()
+    monkeypatch.setattr(positions.time, "monotonic", lambda: now + 300.0)
+    store.record(2, -21.4, -47.9)
+
+    monkeypatch.setattr(positions.time, "monotonic", lambda: now + 700.0)
+    assert store.flush() == 3
+    assert not store.is_tracking(1)
+    assert store.is_tracking(2)
+
+# Teste de uma viagem encerrada por outro worker: o close() não roda neste, mas o
+# registro de viagens ativas recusa as posições seguintes e descarta o buffer
+def test_position_rejected_after_trip_finished_elsewhere(client, session_factory, monkeypatch):
+    store = TripPositionStore(session_factory=session_factory)
+    monkeypatch.setattr(trips, "trip_positions", store)
+    monkeypatch.setattr(active_trips, "check_seconds", 0.0)
+    with session_factory() as session:
+        session.add(Trip(id=1, trip_type=TripTypeEnum.IDA, status=TripStatusEnum.ATIVA, bus_id=1, driver_id=1))
+        session.commit()
+        bump_version(session.connection())
+        session.commit()
+
+    assert client.post("/trips/1/position", json={"latitude": -21.2, "longitude": -47.8}).status_code == 200
+    assert client.get("/trips/1/position").json()["latitude"] == -21.2
+
+    with session_factory() as session:
+        session.get(Trip, 1).status = TripStatusEnum.CONCLUIDA
+        session.commit()
+        bump_version(session.connection())
+        session.commit()
+
+    assert client.post("/trips/1/position", json={"latitude": -21.3, "longitude": -47.8}).status_code == 404
+    assert not store.is_tracking(1)
+    assert client.get("/trips/1/position").status_code == 404
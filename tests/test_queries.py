@@ -0,0 +1,22 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine.default import CACHE_HIT
+from sqlalchemy.orm import sessionmaker
+from app.config.database import Base
+from app.models.student_trip import StudentTrip
+from app.services.queries import ACTIVE_BUSES_EXCEPT, TRIP_DETAILS
+
+# As instruções prontas são compiladas uma vez: a partir da segunda execução, com
+# outros parâmetros, o SQL vem do cache de compilação
+def test_prebuilt_statements_hit_compile_cache():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    hits = []
+    event.listen(engine, "after_cursor_execute", lambda *args: hits.append(args[4].cache_hit is CACHE_HIT))
+
+    with sessionmaker(bind=engine)() as db:
+        for trip_id in (1, 2, 3):
+            db.execute(TRIP_DETAILS[StudentTrip], {"trip_id": trip_id}).all()
+        for bus_id in (1, 2):
+            db.execute(ACTIVE_BUSES_EXCEPT, {"exclude_bus_id": bus_id}).all()
+
+    assert hits == [False, True, True, False, True]
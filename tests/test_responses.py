@@ -0,0 +1,59 @@
+import json
+from datetime import datetime
+from typing import List
+import pytest
+from pydantic import TypeAdapter
+from app.config.responses import FastJSONResponse
+from app.models.bus import Bus
+from app.models.bus_stop import BusStop
+from app.models.student_trip import StudentTrip, StudentStatusEnum
+from app.models.trip import Trip, TripStatusEnum, TripTypeEnum
+from app.models.trip_bus_stop import TripBusStop, TripBusStopStatusEnum
+from app.models.user import User
+from app.schemas.trip import TripStudentDetail
+from app.schemas.trip_bus_stop import StopOnTheWay
+
+@pytest.fixture
+def seed():
+    # Viagem de volta com dois alunos no mesmo ponto, um com foto
+    def add(session):
+        session.add_all([
+            Bus(id=1, name="Ônibus 1", registration_number="AAA1111", capacity=40),
+            Trip(id=1, trip_type=TripTypeEnum.VOLTA, status=TripStatusEnum.ATIVA, bus_id=1, driver_id=10),
+            BusStop(id=1, name="Portaria", faculty_id=1),
+            TripBusStop(id=1, trip_id=1, bus_stop_id=1, status=TripBusStopStatusEnum.A_CAMINHO),
+            User(id=100, name="Aluno 0", email="aluno0@example.com", cpf="0", profile_picture="foto.png"),
+            User(id=101, name="Aluno 1", email="aluno1@example.com", cpf="1"),
+            StudentTrip(id=1, trip_id=1, student_id=100, status=StudentStatusEnum.PRESENTE, point_id=1),
+            StudentTrip(id=2, trip_id=1, student_id=101, status=StudentStatusEnum.EM_AULA, point_id=1),
+        ])
+    return add
+
+# Teste da resposta padrão: datas, enums e chaves numéricas
+def test_fast_json_response_renders_common_types():
+    response = FastJSONResponse({
+        "create_date": datetime(2024, 6, 3, 7, 30),
+        "trip_type": TripTypeEnum.VOLTA,
+        "eta_seconds": {12: 90}
+    })
+    assert json.loads(response.body) == {
+        "create_date": "2024-06-03T07:30:00",
+        "trip_type": 2,
+        "eta_seconds": {"12": 90}
+    }
+
+# Teste das rotas tipadas: a resposta é validada pelo response_model e gerada pela
+# classe padrão (orjson), com os mesmos bytes que o próprio schema gera
+def test_routes_send_typed_schema_output(client):
+    details = client.get("/trips/1/details")
+    assert details.status_code == 200
+    assert details.content == TypeAdapter(List[TripStudentDetail]).dump_json([
+        TripStudentDetail(student_name="Aluno 0", bus_stop_name="Portaria", student_status="Presente", profile_picture="foto.png"),
+        TripStudentDetail(student_name="Aluno 1", bus_stop_name="Portaria", student_status="Em aula"),
+    ])
+
+    stops = client.get("/trip_bus_stops/stops_on_the_way/1")
+    assert stops.status_code == 200
+    assert stops.content == TypeAdapter(List[StopOnTheWay]).dump_json([
+        StopOnTheWay(trip_id=1, bus_stop_id=1, status=TripBusStopStatusEnum.A_CAMINHO, id=1, name="Portaria"),
+    ])
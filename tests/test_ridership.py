@@ -0,0 +1,123 @@
+import pytest
+from datetime import date, datetime
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.config.database import Base
+from app.models import bus, bus_stop, faculty, user_type  # noqa: F401
+from app.models.ridership_rollup import RidershipRollup, RidershipDimensionEnum
+from app.models.student_trip import StudentTrip, StudentStatusEnum
+from app.models.trip import Trip, TripStatusEnum, TripTypeEnum
+from app.models.user import User
+from app.routers.reports import report_period
+from app.routers.trips import finalizar_viagem_volta
+from app.services.active_trips import active_trips
+from app.services.ridership import record_trip_ridership, rebuild_ridership, ridership_daily, ridership_totals
+
+DAY = date(2024, 6, 3)
+
+@pytest.fixture
+def db_session():
+    """
+    Fixture com um banco SQLite em memória com duas viagens de volta no mesmo dia e uma no dia seguinte.
+    """
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    for user_id, faculty_id in ((1, 10), (2, 10), (3, 20)):
+        session.add(User(id=user_id, name=f"Aluno {user_id}", cpf=f"{user_id:011d}", email=f"aluno{user_id}@teste.com",
+                         phone="11999999999", password="x", user_type_id=1, faculty_id=faculty_id))
+    trips = [(1, 5, datetime(2024, 6, 3, 17)), (2, 5, datetime(2024, 6, 3, 22)), (3, 6, datetime(2024, 6, 4, 17))]
+    for trip_id, bus_id, moment in trips:
+        session.add(Trip(id=trip_id, trip_type=TripTypeEnum.VOLTA, status=TripStatusEnum.CONCLUIDA,
+                         bus_id=bus_id, driver_id=1, create_date=moment))
+    student_trips = [
+        (1, 1, 1, StudentStatusEnum.EM_AULA, 100),
+        (2, 1, 2, StudentStatusEnum.NAO_VOLTARA, 100),
+        (3, 1, 3, StudentStatusEnum.FILA_DE_ESPERA, 200),
+        (4, 2, 1, StudentStatusEnum.EM_AULA, 100),
+        (5, 3, 3, StudentStatusEnum.EM_AULA, 200),
+    ]
+    for student_trip_id, trip_id, student_id, status, point_id in student_trips:
+        session.add(StudentTrip(id=student_trip_id, trip_id=trip_id, student_id=student_id, status=status, point_id=point_id))
+    session.commit()
+    yield session
+    session.close()
+
+def _record_all(session):
+    for trip in session.query(Trip).order_by(Trip.id):
+        record_trip_ridership(session, trip)
+    session.commit()
+
+# Teste da soma incremental: viagens do mesmo dia acumulam na mesma linha
+def test_record_trip_ridership_accumulates(db_session):
+    _record_all(db_session)
+
+    totals = ridership_totals(db_session, RidershipDimensionEnum.BUS, DAY, DAY)
+    assert [(row.key_id, row.trips, row.riders, row.waitlisted, row.not_returning) for row in totals] == [(5, 2, 2, 1, 1)]
+    assert db_session.query(RidershipRollup).filter(RidershipRollup.dimension == "bus").count() == 2
+
+    stops = ridership_totals(db_session, RidershipDimensionEnum.STOP, DAY, date(2024, 6, 4))
+    assert [(row.key_id, row.trips, row.riders) for row in stops] == [(100, 2, 2), (200, 2, 1)]
+
+    faculties = ridership_totals(db_session, RidershipDimensionEnum.FACULTY, DAY, DAY, TripTypeEnum.VOLTA)
+    assert [(row.key_id, row.riders, row.not_returning, row.waitlisted) for row in faculties] == [(10, 2, 1, 0), (20, 0, 0, 1)]
+    assert ridership_totals(db_session, RidershipDimensionEnum.FACULTY, DAY, DAY, TripTypeEnum.IDA) == []
+
+# Teste da série diária de um ponto
+def test_ridership_daily(db_session):
+    _record_all(db_session)
+    days = ridership_daily(db_session, RidershipDimensionEnum.STOP, 200, DAY, date(2024, 6, 30))
+    assert [(row.day, row.trips, row.riders, row.waitlisted) for row in days] == [(DAY, 1, 0, 1), (date(2024, 6, 4), 1, 1, 0)]
+
+# Teste do recálculo: mesmo resultado que a soma incremental
+def test_rebuild_matches_incremental(db_session):
+    _record_all(db_session)
+    expected = ridership_totals(db_session, RidershipDimensionEnum.STOP, DAY, date(2024, 6, 4))
+    assert rebuild_ridership(db_session, batch_size=2) == 3
+    assert ridership_totals(db_session, RidershipDimensionEnum.STOP, DAY, date(2024, 6, 4)) == expected
+
+# Teste do período do relatório
+def test_report_period_validation():
+    assert report_period(DAY, date(2024, 6, 4)) == (DAY, date(2024, 6, 4))
+    with pytest.raises(HTTPException):
+        report_period(date(2024, 6, 4), DAY)
+    with pytest.raises(HTTPException):
+        report_period(date(2023, 1, 1), DAY)
+
+@pytest.fixture
+def seed():
+    # Viagem de volta ativa, sem pontos, com dois alunos
+    def add(session):
+        session.add(Trip(id=1, trip_type=TripTypeEnum.VOLTA, status=TripStatusEnum.ATIVA, bus_id=5, driver_id=1,
+                         create_date=datetime(2024, 6, 3, 17)))
+        session.add_all([
+            StudentTrip(id=1, trip_id=1, student_id=1, status=StudentStatusEnum.PRESENTE, point_id=100),
+            StudentTrip(id=2, trip_id=1, student_id=2, status=StudentStatusEnum.NAO_VOLTARA, point_id=100),
+        ])
+    return add
+
+# Teste da finalização repetida: uma segunda finalização que leu a viagem ainda ativa
+# não soma os alunos de novo
+def test_finalize_twice_records_once(client, session_factory, submitted):
+    with session_factory() as stale:
+        # Sessão que leu a viagem antes da primeira finalização, como uma requisição concorrente
+        trip = stale.get(Trip, 1)
+        assert trip.status == TripStatusEnum.ATIVA
+        assert active_trips.driver_trip(1).id == 1
+
+        assert client.put("/trips/1/finalize_return_trip").status_code == 200
+        # A conclusão pelo UPDATE direto também tira a viagem do registro de viagens ativas
+        assert active_trips.driver_trip(1) is None
+        with session_factory() as session:
+            expected = ridership_totals(session, RidershipDimensionEnum.BUS, DAY, DAY)
+        assert [(row.trips, row.riders, row.not_returning) for row in expected] == [(1, 1, 1)]
+
+        with pytest.raises(HTTPException) as error:
+            finalizar_viagem_volta(1, db=stale)
+        assert error.value.status_code == 409
+        stale.rollback()
+
+    assert client.put("/trips/1/finalize_return_trip").status_code == 400
+    with session_factory() as session:
+        assert ridership_totals(session, RidershipDimensionEnum.BUS, DAY, DAY) == expected
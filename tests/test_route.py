@@ -0,0 +1,108 @@
+import pytest
+from contextlib import contextmanager
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.config.database import Base
+from app.models import bus_stop, faculty, user_type  # noqa: F401
+from app.models.student_trip import StudentTrip, StudentStatusEnum
+from app.models.trip_bus_stop import TripBusStop, TripBusStopStatusEnum
+from app.services.route import flush_route
+from app.services.unit_of_work import unit_of_work
+from app.routers.trip_bus_stops import advance_to_next_stop, finalize_current_stop, update_next_to_at_stop
+
+# Cada chamada de rota em sua própria transação, como na requisição
+transaction = contextmanager(unit_of_work)
+
+@pytest.fixture
+def sessions():
+    """
+    Fixture com um banco SQLite compartilhado por duas sessões, simulando duas requisições.
+    """
+    engine = create_engine("sqlite:///file:route?mode=memory&cache=shared&uri=true")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    session.add_all([
+        TripBusStop(id=1, trip_id=1, bus_stop_id=1, status=TripBusStopStatusEnum.NO_PONTO),
+        TripBusStop(id=2, trip_id=1, bus_stop_id=2, status=TripBusStopStatusEnum.A_CAMINHO),
+        TripBusStop(id=3, trip_id=1, bus_stop_id=3, status=TripBusStopStatusEnum.A_CAMINHO),
+    ])
+    session.commit()
+    yield Session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+# Teste do avanço: ponto atual e próximo ponto alterados na mesma transação
+def test_advance_returns_route_state(sessions):
+    with transaction(sessions) as db:
+        state = advance_to_next_stop(1, 2, db)
+
+    assert state.current_stop is None
+    assert state.next_stop.id == 2
+    assert [stop.status for stop in state.stops] == [
+        TripBusStopStatusEnum.JA_PASSOU, TripBusStopStatusEnum.PROXIMO_PONTO, TripBusStopStatusEnum.A_CAMINHO
+    ]
+    assert state.stops[0].version == 2
+
+    with transaction(sessions) as db:
+        stop = update_next_to_at_stop(1, db)
+    assert stop.id == 2 and stop.status == TripBusStopStatusEnum.NO_PONTO
+
+# Teste de alunos aguardando: nada é gravado
+def test_advance_blocked_by_waiting_students(sessions):
+    session = sessions()
+    session.add(StudentTrip(id=1, trip_id=1, student_id=1, status=StudentStatusEnum.AGUARDANDO_NO_PONTO, point_id=1))
+    session.commit()
+
+    with pytest.raises(HTTPException) as error, transaction(sessions) as db:
+        advance_to_next_stop(1, 2, db)
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException), transaction(sessions) as db:
+        finalize_current_stop(1, db)
+    assert session.get(TripBusStop, 2).status == TripBusStopStatusEnum.A_CAMINHO
+
+# Teste de dois toques simultâneos: a requisição com a versão antiga é recusada
+def test_concurrent_advance_conflict(sessions):
+    first, second = sessions(), sessions()
+    first_route = first.query(TripBusStop).order_by(TripBusStop.id).all()
+    second_route = second.query(TripBusStop).order_by(TripBusStop.id).all()
+
+    first_route[0].status = TripBusStopStatusEnum.JA_PASSOU
+    first_route[1].status = TripBusStopStatusEnum.PROXIMO_PONTO
+    first.commit()
+
+    second_route[0].status = TripBusStopStatusEnum.JA_PASSOU
+    second_route[2].status = TripBusStopStatusEnum.PROXIMO_PONTO
+    with pytest.raises(HTTPException) as error:
+        flush_route(second, 1, second_route)
+    assert error.value.status_code == 409
+
+    # O terceiro ponto não foi marcado, pois a transação inteira foi desfeita
+    assert sessions().get(TripBusStop, 3).status == TripBusStopStatusEnum.A_CAMINHO
+
+# Teste de dois toques em pontos diferentes: cada um altera outra linha, mas a rota
+# inteira é conferida e a segunda requisição é recusada
+def test_concurrent_taps_on_different_stops(sessions):
+    session = sessions()
+    session.get(TripBusStop, 1).status = TripBusStopStatusEnum.JA_PASSOU
+    session.commit()
+
+    first, second = sessions(), sessions()
+    first_route = first.query(TripBusStop).order_by(TripBusStop.id).all()
+    second_route = second.query(TripBusStop).order_by(TripBusStop.id).all()
+
+    first_route[1].status = TripBusStopStatusEnum.PROXIMO_PONTO
+    flush_route(first, 1, first_route)
+    first.commit()
+
+    second_route[2].status = TripBusStopStatusEnum.PROXIMO_PONTO
+    with pytest.raises(HTTPException) as error:
+        flush_route(second, 1, second_route)
+    assert error.value.status_code == 409
+    assert sessions().get(TripBusStop, 3).status == TripBusStopStatusEnum.A_CAMINHO
+
+    # Em sequência, um segundo próximo ponto é recusado antes de qualquer escrita
+    with pytest.raises(HTTPException) as error, transaction(sessions) as db:
+        advance_to_next_stop(1, 3, db)
+    assert error.value.status_code == 400
@@ -0,0 +1,51 @@
+import itertools
+import random
+from app.services.routing import (
+    RouteOrderCache,
+    distance_matrix,
+    haversine,
+    path_length,
+    plan_route,
+)
+
+def random_stops(count, seed=7):
+    rng = random.Random(seed)
+    return tuple(
+        (stop_id, -22.0 + rng.uniform(-0.02, 0.02), -47.9 + rng.uniform(-0.02, 0.02))
+        for stop_id in range(1, count + 1)
+    )
+
+# Teste da distância entre coordenadas
+def test_haversine():
+    assert haversine((0.0, 0.0), (0.0, 0.0)) == 0
+    # Um grau de latitude tem aproximadamente 111 km
+    assert 110_000 < haversine((0.0, 0.0), (1.0, 0.0)) < 112_000
+
+# Teste do cache da matriz por conjunto de pontos
+def test_distance_matrix_is_cached():
+    stops = random_stops(5)
+    assert distance_matrix(stops) is distance_matrix(stops)
+    index, matrix = distance_matrix(stops)
+    assert matrix[index[1]][index[1]] == 0
+    assert matrix[index[1]][index[2]] == matrix[index[2]][index[1]]
+
+# Teste da qualidade da heurística em relação à força bruta
+def test_plan_route_close_to_optimal():
+    _, matrix = distance_matrix(random_stops(8))
+    stops = list(range(1, 8))
+    best = min(path_length(matrix, 0, list(order)) for order in itertools.permutations(stops))
+    route = plan_route(matrix, 0, stops)
+    assert sorted(route) == stops
+    assert path_length(matrix, 0, route) <= best * 1.1
+
+# Teste do recálculo incremental quando os alunos trocam de ponto
+def test_route_order_incremental():
+    cache = RouteOrderCache()
+    stops = random_stops(10)
+    first = cache.order(1, stops, 1, [2, 3, 4, 5])
+    assert {stop_id for stop_id, _ in first} == {2, 3, 4, 5}
+
+    # Um ponto sai e outro entra: a rota anterior é reaproveitada
+    second = cache.order(1, stops, 1, [2, 3, 5, 9])
+    assert {stop_id for stop_id, _ in second} == {2, 3, 5, 9}
+    assert second[0][1] == haversine(stops[0][1:], stops[second[0][0] - 1][1:])
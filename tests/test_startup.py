@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+
+# Limites generosos para máquinas de CI; localmente a importação leva ~0,5 s e a subida ~20 ms
+IMPORT_BUDGET_SECONDS = 3.0
+STARTUP_BUDGET_SECONDS = 1.0
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executado em um processo novo, como em uma inicialização a frio
+STARTUP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter() - started
+
+from sqlalchemy import event
+from fastapi.testclient import TestClient
+from app.config.database import engine
+statements = []
+event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+
+client = TestClient(app.main.app)
+started = time.perf_counter()
+client.__enter__()
+startup = time.perf_counter() - started
+client.__exit__(None, None, None)
+print(json.dumps({
+    "import_seconds": imported,
+    "startup_seconds": startup,
+    "statements": statements,
+    "modules": [name for name in ("firebase_admin", "pyrebase") if name in sys.modules]
+}))
+"""
+
+def _run(args, database_url):
+    env = {key: value for key, value in os.environ.items() if key not in ("FIREBASE_CREDENTIALS_JSON", "BOOTSTRAP_DB_ON_STARTUP")}
+    env["DATABASE_URL"] = database_url
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+# Teste da inicialização a frio: sem Firebase, sem DDL e dentro do orçamento de tempo
+def test_cold_start_budget(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'startup.db'}"
+    _run(["-m", "app.commands.bootstrap_db"], database_url)
+
+    result = json.loads(_run(["-c", STARTUP_PROBE], database_url).stdout.strip().splitlines()[-1])
+
+    # A importação não exige as credenciais nem carrega os clientes do Firebase
+    assert result["modules"] == []
+    assert result["import_seconds"] < IMPORT_BUDGET_SECONDS
+    assert result["startup_seconds"] < STARTUP_BUDGET_SECONDS
+    # A subida só lê: a criação do esquema ficou no comando de implantação
+    assert all(statement.lstrip().upper().startswith("SELECT") for statement in result["statements"])
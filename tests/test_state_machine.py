@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.config.database import Base
+from app.models import bus_stop, faculty, user_type  # noqa: F401
+from app.models.student_trip import StudentTrip, StudentStatusEnum
+from app.models.trip_bus_stop import TripBusStop, TripBusStopStatusEnum
+from app.services.state_machine import (
+    STUDENT_TRIP_STATES,
+    STUDENT_STATUSES_REQUIRING_CHECKS,
+    TRIP_BUS_STOP_STATES,
+)
+
+@pytest.fixture
+def db_session():
+    """
+    Fixture com um banco SQLite em memória para testar os UPDATEs condicionais.
+    """
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+# Teste das transições permitidas para o status do aluno
+def test_student_trip_transitions():
+    assert STUDENT_TRIP_STATES.allows(StudentStatusEnum.EM_AULA, StudentStatusEnum.AGUARDANDO_NO_PONTO)
+    assert STUDENT_TRIP_STATES.allows(StudentStatusEnum.PRESENTE, StudentStatusEnum.NAO_VOLTARA)
+    assert not STUDENT_TRIP_STATES.allows(StudentStatusEnum.PRESENTE, StudentStatusEnum.EM_AULA)
+    assert not STUDENT_TRIP_STATES.allows(StudentStatusEnum.EM_AULA, StudentStatusEnum.FILA_DE_ESPERA)
+
+# Teste da tabela reversa (origens permitidas para cada destino)
+def test_student_trip_sources():
+    assert STUDENT_TRIP_STATES.sources_for(StudentStatusEnum.PRESENTE) == {
+        StudentStatusEnum.EM_AULA,
+        StudentStatusEnum.AGUARDANDO_NO_PONTO,
+        StudentStatusEnum.NAO_VOLTARA,
+        StudentStatusEnum.FILA_DE_ESPERA,
+    }
+    assert STUDENT_TRIP_STATES.sources_for(StudentStatusEnum.FILA_DE_ESPERA) == frozenset()
+    assert StudentStatusEnum.FILA_DE_ESPERA in STUDENT_STATUSES_REQUIRING_CHECKS
+
+# Teste das transições dos pontos de ônibus da viagem
+def test_trip_bus_stop_transitions():
+    assert TRIP_BUS_STOP_STATES.allows(TripBusStopStatusEnum.A_CAMINHO, TripBusStopStatusEnum.PROXIMO_PONTO)
+    assert TRIP_BUS_STOP_STATES.allows(TripBusStopStatusEnum.ONIBUS_COM_PROBLEMA, TripBusStopStatusEnum.JA_PASSOU)
+    assert not TRIP_BUS_STOP_STATES.allows(TripBusStopStatusEnum.JA_PASSOU, TripBusStopStatusEnum.NO_PONTO)
+    assert not TRIP_BUS_STOP_STATES.allows(TripBusStopStatusEnum.A_CAMINHO, TripBusStopStatusEnum.JA_PASSOU)
+
+# Teste do compare-and-set: a transição só é aplicada se o status ainda for o esperado
+def test_apply_compare_and_set(db_session):
+    db_session.add(StudentTrip(id=1, trip_id=1, student_id=1, status=StudentStatusEnum.EM_AULA, point_id=1))
+    db_session.commit()
+
+    updated = STUDENT_TRIP_STATES.apply(
+        db_session, StudentTrip, 1, StudentStatusEnum.AGUARDANDO_NO_PONTO, [StudentStatusEnum.EM_AULA]
+    )
+    db_session.commit()
+    assert updated.status == StudentStatusEnum.AGUARDANDO_NO_PONTO
+
+    # Uma segunda requisição que leu o status antigo não sobrescreve a primeira
+    stale = STUDENT_TRIP_STATES.apply(
+        db_session, StudentTrip, 1, StudentStatusEnum.NAO_VOLTARA, [StudentStatusEnum.EM_AULA]
+    )
+    assert stale is None
+    assert db_session.get(StudentTrip, 1).status == StudentStatusEnum.AGUARDANDO_NO_PONTO
+
+# Teste de critérios adicionais no UPDATE condicional
+def test_apply_respects_extra_criteria(db_session):
+    db_session.add(TripBusStop(id=1, trip_id=1, bus_stop_id=1, status=TripBusStopStatusEnum.A_CAMINHO, system_deleted=1))
+    db_session.commit()
+
+    updated = TRIP_BUS_STOP_STATES.apply(
+        db_session, TripBusStop, 1, TripBusStopStatusEnum.NO_PONTO,
+        TRIP_BUS_STOP_STATES.sources_for(TripBusStopStatusEnum.NO_PONTO),
+        TripBusStop.system_deleted == 0
+    )
+    assert updated is None
@@ -0,0 +1,105 @@
+import random
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.config.database import Base
+from app.models import bus_stop, faculty, user_type  # noqa: F401
+from app.models.trip_bus_stop import TripBusStop, TripBusStopStatusEnum
+from app.models.trip_bus_stop_transition import TripBusStopTransition
+from app.models.stop_travel_stat import StopTravelStat
+from app.services.state_machine import TRIP_BUS_STOP_STATES
+from app.services.stop_history import estimate_arrivals, record_transition, update_travel_stat
+
+@pytest.fixture
+def db_session():
+    """
+    Fixture com um banco SQLite em memória.
+    """
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+# Teste das estatísticas incrementais contra os valores exatos
+def test_streaming_quantiles_converge():
+    rng = random.Random(5)
+    samples = [rng.gauss(300, 30) for _ in range(2000)]
+    stat = StopTravelStat(sample_count=0)
+    for seconds in samples:
+        update_travel_stat(stat, seconds)
+
+    ordered = sorted(samples)
+    assert stat.sample_count == 2000
+    assert abs(stat.median_seconds - ordered[1000]) < 20
+    assert abs(stat.p90_seconds - ordered[1800]) < 25
+    assert abs(stat.mean_seconds - 300) < 20
+
+# Teste do histórico gravado pelo flush do ORM e pelo UPDATE condicional
+def test_transitions_recorded_in_same_transaction(db_session):
+    stop = TripBusStop(id=1, trip_id=1, bus_stop_id=10, status=TripBusStopStatusEnum.A_CAMINHO)
+    db_session.add(stop)
+    db_session.commit()
+
+    stop.status = TripBusStopStatusEnum.PROXIMO_PONTO
+    db_session.commit()
+    TRIP_BUS_STOP_STATES.apply(db_session, TripBusStop, 1, TripBusStopStatusEnum.NO_PONTO, [TripBusStopStatusEnum.PROXIMO_PONTO])
+    db_session.rollback()
+
+    transitions = db_session.query(TripBusStopTransition).order_by(TripBusStopTransition.id).all()
+    assert [(t.from_status, t.to_status) for t in transitions] == [
+        (None, TripBusStopStatusEnum.A_CAMINHO),
+        (TripBusStopStatusEnum.A_CAMINHO, TripBusStopStatusEnum.PROXIMO_PONTO),
+    ]
+    assert db_session.get(TripBusStop, 1).previous_status == TripBusStopStatusEnum.A_CAMINHO
+
+    TRIP_BUS_STOP_STATES.apply(db_session, TripBusStop, 1, TripBusStopStatusEnum.NO_PONTO, [TripBusStopStatusEnum.PROXIMO_PONTO])
+    db_session.commit()
+    last = db_session.query(TripBusStopTransition).order_by(TripBusStopTransition.id.desc()).first()
+    assert (last.from_status, last.to_status) == (TripBusStopStatusEnum.PROXIMO_PONTO, TripBusStopStatusEnum.NO_PONTO)
+
+# Teste do ETA a partir das chegadas anteriores
+def test_estimate_arrivals(db_session):
+    start = datetime(2024, 5, 1, 18, 0, 0)
+    # Duas viagens anteriores fizeram 10 -> 20 em 120 s e 20 -> 30 em 60 s
+    for trip_id in (1, 2):
+        for offset, bus_stop_id in ((0, 10), (120, 20), (180, 30)):
+            stop = TripBusStop(trip_id=trip_id, bus_stop_id=bus_stop_id, status=TripBusStopStatusEnum.JA_PASSOU)
+            record_transition(db_session, stop, TripBusStopStatusEnum.PROXIMO_PONTO, TripBusStopStatusEnum.NO_PONTO,
+                              start + timedelta(days=trip_id, seconds=offset))
+            db_session.flush()
+    db_session.commit()
+
+    stat = db_session.query(StopTravelStat).filter_by(from_bus_stop_id=10, to_bus_stop_id=20).one()
+    assert stat.sample_count == 2 and stat.median_seconds == 120
+
+    # Viagem atual chegou ao ponto 10 há 30 s
+    current = TripBusStop(trip_id=3, bus_stop_id=10, status=TripBusStopStatusEnum.PROXIMO_PONTO)
+    record_transition(db_session, current, TripBusStopStatusEnum.PROXIMO_PONTO, TripBusStopStatusEnum.NO_PONTO, start)
+    db_session.commit()
+
+    estimates = estimate_arrivals(db_session, 3, [
+        (10, TripBusStopStatusEnum.NO_PONTO),
+        (20, TripBusStopStatusEnum.A_CAMINHO),
+        (30, TripBusStopStatusEnum.A_CAMINHO),
+        (40, TripBusStopStatusEnum.A_CAMINHO),
+    ], now=start + timedelta(seconds=30))
+    assert estimates == {20: 90, 30: 150, 40: None}
+
+# Teste do trecho novo: duas viagens chegando ao mesmo trecho ainda sem estatística
+# somam na mesma linha, sem violar a restrição única
+def test_first_arrivals_on_new_pair_share_the_row(db_session):
+    start = datetime(2024, 5, 1, 18, 0, 0)
+    for trip_id in (1, 2):
+        stop = TripBusStop(trip_id=trip_id, bus_stop_id=10, status=TripBusStopStatusEnum.JA_PASSOU)
+        record_transition(db_session, stop, TripBusStopStatusEnum.PROXIMO_PONTO, TripBusStopStatusEnum.NO_PONTO, start)
+    db_session.flush()
+    for trip_id in (1, 2):
+        stop = TripBusStop(trip_id=trip_id, bus_stop_id=20, status=TripBusStopStatusEnum.JA_PASSOU)
+        record_transition(db_session, stop, TripBusStopStatusEnum.PROXIMO_PONTO, TripBusStopStatusEnum.NO_PONTO,
+                          start + timedelta(seconds=100 + trip_id * 20))
+    db_session.commit()
+
+    stat = db_session.query(StopTravelStat).filter_by(from_bus_stop_id=10, to_bus_stop_id=20).one()
+    assert stat.sample_count == 2
@@ -0,0 +1,48 @@
+import random
+from types import SimpleNamespace
+from app.services.routing import haversine
+from app.services.stop_index import StopIndex
+
+def bus_stop(stop_id, latitude, longitude, system_deleted=0):
+    return SimpleNamespace(id=stop_id, name=f"Ponto {stop_id}", latitude=latitude, longitude=longitude, system_deleted=system_deleted)
+
+def build_index(count, seed=3):
+    rng = random.Random(seed)
+    index = StopIndex()
+    stops = {}
+    for stop_id in range(1, count + 1):
+        stop = bus_stop(stop_id, -21.22 + rng.uniform(-0.05, 0.05), -47.83 + rng.uniform(-0.05, 0.05))
+        index.upsert(stop, "Faculdade")
+        stops[stop_id] = stop
+    return index, stops
+
+# Teste da busca na grade comparada com a força bruta
+def test_nearest_matches_brute_force():
+    index, stops = build_index(200)
+    rng = random.Random(11)
+    for _ in range(50):
+        position = (-21.22 + rng.uniform(-0.08, 0.08), -47.83 + rng.uniform(-0.08, 0.08))
+        expected = sorted(stops, key=lambda stop_id: haversine(position, (stops[stop_id].latitude, stops[stop_id].longitude)))[:5]
+        assert [stop_id for _, stop_id, _ in index.nearest(*position, 5)] == expected
+
+# Teste da atualização incremental do índice
+def test_upsert_and_remove():
+    index = StopIndex()
+    index.upsert(bus_stop(1, -21.22, -47.83), "Faculdade")
+    index.upsert(bus_stop(2, -21.30, -47.90), "Faculdade")
+    assert index.nearest(-21.22, -47.83, 1)[0][1] == 1
+    assert index.nearest(-21.22, -47.83, 1)[0][2] == "Ponto 1 - Faculdade"
+
+    # Mover o ponto 1 para longe faz o ponto 2 ser o mais próximo
+    index.upsert(bus_stop(1, -20.0, -47.0), "Faculdade")
+    assert index.nearest(-21.29, -47.89, 1)[0][1] == 2
+
+    # Pontos excluídos ou sem coordenadas saem do índice
+    index.remove(2)
+    index.upsert(bus_stop(1, None, None), "Faculdade")
+    assert index.nearest(-21.22, -47.83, 3) == []
+
+# Teste de k maior que a quantidade de pontos
+def test_nearest_returns_all_when_k_is_large():
+    index, _ = build_index(4)
+    assert len(index.nearest(-21.22, -47.83, 10)) == 4
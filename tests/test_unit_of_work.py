@@ -0,0 +1,113 @@
+import pytest
+from sqlalchemy import event
+from app.models.bus import Bus
+from app.models.student_trip import StudentTrip, StudentStatusEnum
+from app.models.trip import Trip, TripStatusEnum, TripTypeEnum
+from app.models.trip_bus_stop import TripBusStop, TripBusStopStatusEnum
+from app.services.unit_of_work import on_commit, unit_of_work
+
+@pytest.fixture
+def seed():
+    return lambda session: session.add_all([
+        Bus(id=1, name="Ônibus 1", registration_number="AAA1111", capacity=40),
+        Trip(id=1, trip_type=TripTypeEnum.IDA, status=TripStatusEnum.ATIVA, bus_id=1, driver_id=10),
+        Trip(id=2, trip_type=TripTypeEnum.VOLTA, status=TripStatusEnum.ATIVA, bus_id=1, driver_id=10),
+        StudentTrip(id=1, trip_id=1, student_id=100, status=StudentStatusEnum.PRESENTE, point_id=1),
+        TripBusStop(id=1, trip_id=1, bus_stop_id=1, status=TripBusStopStatusEnum.DESENBARQUE),
+        TripBusStop(id=2, trip_id=2, bus_stop_id=1, status=TripBusStopStatusEnum.NO_PONTO),
+        TripBusStop(id=3, trip_id=2, bus_stop_id=2, status=TripBusStopStatusEnum.A_CAMINHO),
+    ])
+
+@pytest.fixture
+def database(session_factory):
+    """
+    Fixture com o banco de session_factory e os contadores de consultas e commits.
+    """
+    engine = session_factory.kw["bind"]
+    counts = {"queries": 0, "commits": 0}
+    event.listen(engine, "before_cursor_execute", lambda *args: counts.__setitem__("queries", counts["queries"] + 1))
+    event.listen(engine, "commit", lambda conn: counts.__setitem__("commits", counts["commits"] + 1))
+    return session_factory, counts
+
+def _request(client, counts, method, url, **kwargs):
+    counts.update(queries=0, commits=0)
+    return client.request(method, url, **kwargs)
+
+# Teste da troca de ponto: antes eram até cinco commits, agora um único por requisição
+def test_update_point_commits_once(client, database):
+    factory, counts = database
+    response = _request(client, counts, "PUT", "/student_trips/1/update_point", params={"point_id": 2})
+    assert response.status_code == 200
+    assert response.json()["point_id"] == 2
+    assert counts["commits"] == 1
+    # 5 leituras e 4 escritas, mais o incremento da sequência da viagem em cada um
+    # dos dois flushes; antes eram 14 consultas e 3 commits
+    assert counts["queries"] == 11
+
+    with factory() as session:
+        assert session.get(TripBusStop, 1).system_deleted == 1
+        assert session.query(TripBusStop).filter(TripBusStop.trip_id == 1, TripBusStop.bus_stop_id == 2).count() == 1
+
+# Teste da inscrição e do avanço de ponto: um commit cada
+def test_create_and_select_next_stop_commit_once(client, database):
+    _, counts = database
+    response = _request(client, counts, "POST", "/student_trips/", json={"trip_id": 2, "student_id": 200, "point_id": 3})
+    assert response.status_code == 200
+    assert response.json()["id"] is not None
+    # Um commit da requisição e outro, curto, que incrementa a versão das viagens ativas
+    # e relê a inscrição depois dele
+    assert counts["commits"] == 2
+    # Antes eram 13 consultas e 2 commits, com refresh depois de cada um; uma delas
+    # busca os aparelhos do aluno para a inscrição no tópico da viagem, outra
+    # incrementa a sequência de alterações da viagem e duas publicam a alteração
+    assert counts["queries"] == 13
+
+    response = _request(client, counts, "PUT", "/trip_bus_stops/select_next_stop/2", params={"new_stop_id": 3})
+    assert response.status_code == 200
+    assert response.json()["status"] == TripBusStopStatusEnum.PROXIMO_PONTO
+    assert counts["commits"] == 1
+    # Cada transição incrementa também a sequência de alterações da viagem, e a rota
+    # inteira é conferida depois do flush
+    assert counts["queries"] == 8
+
+    response = _request(client, counts, "PUT", "/student_trips/2/update_status",
+                        params={"new_status": StudentStatusEnum.AGUARDANDO_NO_PONTO.value})
+    assert response.status_code == 200
+    # O compare-and-set, o incremento da sequência da viagem e a gravação dela na linha
+    assert counts == {"queries": 3, "commits": 1}
+
+# Teste de falha no meio da requisição: nada do que foi gravado antes permanece
+def test_failure_midway_rolls_back_everything(client, database):
+    factory, counts = database
+    with factory() as session:
+        session.delete(session.get(TripBusStop, 1))
+        session.commit()
+
+    # O novo ponto e a troca já foram gravados (flush) quando o ponto antigo não é encontrado
+    response = _request(client, counts, "PUT", "/student_trips/1/update_point", params={"point_id": 2})
+    assert response.status_code == 404
+    assert counts["commits"] == 0
+
+    with factory() as session:
+        assert session.get(StudentTrip, 1).point_id == 1
+        assert session.query(TripBusStop).filter(TripBusStop.trip_id == 1).count() == 0
+
+# Teste das ações posteriores: só depois do commit e descartadas no rollback
+def test_on_commit_runs_only_after_commit(database):
+    factory, _ = database
+    calls = []
+
+    transaction = unit_of_work(factory)
+    db = next(transaction)
+    on_commit(db, calls.append, "enviado")
+    assert calls == []
+    with pytest.raises(StopIteration):
+        next(transaction)
+    assert calls == ["enviado"]
+
+    transaction = unit_of_work(factory)
+    db = next(transaction)
+    on_commit(db, calls.append, "descartado")
+    with pytest.raises(ValueError):
+        transaction.throw(ValueError("falhou"))
+    assert calls == ["enviado"]
@@ -112,4 +112,32 @@ def test_creation_and_update_dates(mock_user_create):
     )
     user = mock_user_create()
     assert isinstance(create_date, datetime)
-    assert isinstance(update_date, datetime)
\ No newline at end of file
+    assert isinstance(update_date, datetime)
+# 11. Teste do schema de saída: dados já gravados não passam de novo pelos validadores
+@patch('app.schemas.user.phone_error', autospec=True)
+def test_output_schema_skips_input_validators(mock_phone_error):
+    from types import SimpleNamespace
+    from app.schemas import User as UserSchema
+    stored = SimpleNamespace(
+        id=1, email="teste@email.com", name="Teste", cpf="00000000000", phone="123", faculty_id=None,
+        device_token=None, user_type_id=1, profile_picture=None, faculty_name=None
+    )
+    user = UserSchema.model_validate(stored)
+    assert user.cpf == "00000000000" and user.phone == "123"
+    mock_phone_error.assert_not_called()
+
+# 12. Teste do cache dos validadores: o mesmo telefone e CPF só são verificados uma vez
+def test_validation_cache():
+    from app.schemas.user import phone_error
+    phone_error.cache_clear()
+    validate_cpf.cache_clear()
+    data = {"email": "teste@email.com", "password": "senha123", "name": "Teste",
+            "cpf": "12345678909", "phone": "+5511999999999", "user_type_id": 1}
+    UserCreate(**data)
+    UserCreate(**data)
+    assert phone_error.cache_info().hits == 1 and phone_error.cache_info().misses == 1
+    assert validate_cpf.cache_info().hits == 1
+    with pytest.raises(ValidationError):
+        UserCreate(**{**data, "phone": "123"})
+    with pytest.raises(ValidationError):
+        UserCreate(**{**data, "phone": "123"})
@@ -0,0 +1,166 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+from app.models.bus import Bus
+from app.models.device_token import DeviceToken
+from app.models.student_trip import StudentTrip, StudentStatusEnum
+from app.models.trip import Trip, TripStatusEnum, TripTypeEnum
+from app.models.trip_bus_stop import TripBusStop, TripBusStopStatusEnum
+from app.routers import student_trips
+from app.services import waitlist
+from app.services.waitlist import WaitlistNotifier, backfill_waitlist_positions, notify_waitlist, waitlist_ticket
+
+@pytest.fixture
+def seed():
+    """
+    Fixture com um ônibus de 4 lugares: três alunos a bordo e três na fila de espera,
+    cada um com um aparelho. O ponto dos alunos da fila já passou.
+    """
+    def add(session):
+        session.add_all([
+            Bus(id=1, name="Ônibus 1", registration_number="AAA1111", capacity=4),
+            Trip(id=1, trip_type=TripTypeEnum.VOLTA, status=TripStatusEnum.ATIVA, bus_id=1, driver_id=10, waitlist_tail=3),
+            TripBusStop(id=1, trip_id=1, bus_stop_id=1, status=TripBusStopStatusEnum.A_CAMINHO),
+            TripBusStop(id=2, trip_id=1, bus_stop_id=2, status=TripBusStopStatusEnum.JA_PASSOU),
+        ])
+        for index in range(3):
+            session.add(StudentTrip(id=index + 1, trip_id=1, student_id=100 + index, status=StudentStatusEnum.EM_AULA, point_id=1))
+            session.add(StudentTrip(id=index + 4, trip_id=1, student_id=200 + index, status=StudentStatusEnum.FILA_DE_ESPERA,
+                                    point_id=2, waitlist_position=index + 1))
+            session.add(DeviceToken(user_id=200 + index, token=f"fila-{index}"))
+    return add
+
+@pytest.fixture
+def routers():
+    return (student_trips,)
+
+@pytest.fixture
+def notifier(monkeypatch):
+    notifier = WaitlistNotifier(window=60)
+    monkeypatch.setattr(student_trips, "waitlist_notifier", notifier)
+    return notifier
+
+# Teste da janela: sem ninguém apto a ser promovido, várias desistências na mesma
+# viagem viram uma única tarefa de aviso
+def test_freed_seats_coalesce_per_trip(client, notifier, submitted):
+    for student_trip_id in (1, 2, 3):
+        response = client.put(f"/student_trips/{student_trip_id}/update_status",
+                               params={"new_status": StudentStatusEnum.NAO_VOLTARA.value})
+        assert response.status_code == 200
+    assert notifier.freed == 3
+    assert list(notifier.pending()) == [1]
+
+    # A janela ainda está aberta
+    assert notifier.flush() == 0
+    assert notifier.flush(force=True) == 1
+    assert submitted == [("waitlist_notification", {"trip_id": 1})]
+    assert notifier.pending() == {}
+
+# Teste do fechamento da janela pelo prazo e da separação entre viagens
+def test_window_expires_per_trip(submitted):
+    notifier = WaitlistNotifier(window=0)
+    notifier.seat_freed(1)
+    notifier.seat_freed(2)
+    notifier.seat_freed(1)
+    assert notifier.flush() == 2
+    assert sorted(payload["trip_id"] for _, payload in submitted) == [1, 2]
+
+# Teste do envio: um aviso por aluno da fila, com as vagas livres no momento do envio
+def test_notification_carries_free_seat_count(session_factory, monkeypatch):
+    sent = []
+    monkeypatch.setattr(waitlist, "deliver_multicast_notification", lambda tokens, title, body: sent.append((tokens, body)) or len(tokens))
+
+    with session_factory() as session:
+        session.query(StudentTrip).filter(StudentTrip.id.in_([1, 2])).update(
+            {StudentTrip.status: StudentStatusEnum.NAO_VOLTARA}, synchronize_session=False
+        )
+        session.commit()
+
+    assert notify_waitlist(1, session_factory) == 3
+    assert sent == [(["fila-0", "fila-1", "fila-2"], "3 vagas no ônibus estão livres. Verifique se você pode ser alocado.")]
+
+    # As vagas foram ocupadas antes do envio: ninguém é avisado
+    with session_factory() as session:
+        session.query(StudentTrip).filter(StudentTrip.id.in_([4, 5, 6])).update(
+            {StudentTrip.status: StudentStatusEnum.EM_AULA}, synchronize_session=False
+        )
+        session.commit()
+    assert notify_waitlist(1, session_factory) == 0
+    assert len(sent) == 1
+
+def _fill(session_factory):
+    # Ônibus lotado e o ponto da fila ainda por passar
+    with session_factory() as session:
+        session.add(StudentTrip(id=7, trip_id=1, student_id=103, status=StudentStatusEnum.EM_AULA, point_id=1))
+        session.get(TripBusStop, 2).status = TripBusStopStatusEnum.A_CAMINHO
+        session.commit()
+
+# Teste da ordem de chegada: novos alunos entram no fim da fila e a posição é consultada pelo índice
+def test_waitlist_is_fifo(client, session_factory, submitted):
+    _fill(session_factory)
+    response = client.post("/student_trips/", params={"waitlist": True}, json={"trip_id": 1, "student_id": 300, "point_id": 1})
+    assert response.status_code == 200
+    assert response.json()["waitlist_position"] == 4
+
+    assert client.get(f"/student_trips/{response.json()['id']}/waitlist_position").json() == {
+        "student_trip_id": response.json()["id"], "trip_id": 1, "position": 4, "waiting": 4
+    }
+    assert client.get("/student_trips/5/waitlist_position").json()["position"] == 2
+    assert client.get("/student_trips/1/waitlist_position").status_code == 404
+
+# Teste da promoção: a vaga vai para o primeiro da fila na mesma transação e só ele é avisado
+def test_freed_seat_promotes_head_only(client, session_factory, notifier, submitted):
+    _fill(session_factory)
+    response = client.put("/student_trips/1/update_status", params={"new_status": StudentStatusEnum.NAO_VOLTARA.value})
+    assert response.status_code == 200
+
+    with session_factory() as session:
+        head = session.get(StudentTrip, 4)
+        assert (head.status, head.waitlist_position) == (StudentStatusEnum.EM_AULA, None)
+        assert session.get(StudentTrip, 5).status == StudentStatusEnum.FILA_DE_ESPERA
+    assert submitted == [("multicast_notification", {
+        "tokens": ["fila-0"], "title": "Você saiu da fila de espera!", "body": "Uma vaga foi liberada e você já está na viagem."
+    })]
+    assert notifier.pending() == {}
+    assert client.get("/student_trips/5/waitlist_position").json()["position"] == 1
+
+    # A vaga já foi ocupada: quem desistiu não a recupera
+    response = client.put("/student_trips/1/update_status", params={"new_status": StudentStatusEnum.EM_AULA.value})
+    assert response.status_code == 400
+
+# Teste do ponto que já passou: o primeiro da fila é pulado
+def test_head_with_passed_stop_is_skipped(client, session_factory, submitted):
+    _fill(session_factory)
+    with session_factory() as session:
+        session.add(TripBusStop(id=3, trip_id=1, bus_stop_id=3, status=TripBusStopStatusEnum.JA_PASSOU))
+        session.get(StudentTrip, 4).point_id = 3
+        session.commit()
+
+    assert client.delete("/student_trips/2").status_code == 200
+    with session_factory() as session:
+        assert session.get(StudentTrip, 4).status == StudentStatusEnum.FILA_DE_ESPERA
+        assert session.get(StudentTrip, 5).status == StudentStatusEnum.EM_AULA
+
+# Teste do contador: cada posição é entregue uma vez e o banco recusa posições repetidas
+def test_tickets_come_from_trip_counter(session_factory):
+    with session_factory() as session:
+        assert [waitlist_ticket(session, 1) for _ in range(2)] == [4, 5]
+        session.commit()
+        assert session.get(Trip, 1).waitlist_tail == 5
+
+        session.add(StudentTrip(trip_id=1, student_id=300, status=StudentStatusEnum.FILA_DE_ESPERA, point_id=2,
+                                waitlist_position=1))
+        with pytest.raises(IntegrityError):
+            session.flush()
+
+# Teste da implantação: posições repetidas são renumeradas e o contador continua depois delas
+def test_backfill_renumbers_positions(session_factory):
+    with session_factory() as session:
+        session.get(StudentTrip, 4).waitlist_position = None
+        session.get(StudentTrip, 6).waitlist_position = 9
+        session.get(Trip, 1).waitlist_tail = 0
+        session.commit()
+
+        assert backfill_waitlist_positions(session) == 3
+        positions = {row.id: row.waitlist_position for row in session.query(StudentTrip).filter(StudentTrip.id > 3)}
+        assert positions == {5: 1, 6: 2, 4: 3}
+        assert session.get(Trip, 1).waitlist_tail == 3